@@ -2,6 +2,7 @@ import streamlit as st
 from ui.theme import init_page, apply_theme, theme_switcher
 from ui.layout import navbar, sidebar_menu
 from core.auth import ensure_auth_state
+from core.db import unit_of_work
 from core.settings import APP_TITLE
 from path_bootstrap import ROOT  # فقط برای اطمینان از sys.path
 
@@ -22,5 +23,6 @@ def main():
 
 
 if __name__ == "__main__":
-    main()
+    with unit_of_work():
+        main()
 
@@ -0,0 +1,147 @@
+from __future__ import annotations
+
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, MutableMapping, Tuple
+
+from core.resilience import count
+
+CLASS_PUBLIC = "public"
+CLASS_INTERNAL = "internal"
+
+# call sites (core.resilience timeouts) that belong to the public portal
+PUBLIC_SITES = {"public_search"}
+
+
+class Overloaded(RuntimeError):
+    """Raised when a query could not get a DB slot before its deadline."""
+
+    def __init__(self, message: str, retry_after: float = 1.0):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def class_for(site: str) -> str:
+    return CLASS_PUBLIC if site in PUBLIC_SITES else CLASS_INTERNAL
+
+
+# -----------------------------
+# Concurrency limiter with a bounded, deadline-based queue
+# -----------------------------
+
+class _Gate:
+    """
+    At most `slots` queries run at once; at most `max_waiting` callers wait
+    for a slot, each for at most `wait_s` seconds. Everyone else is rejected
+    immediately instead of queueing on MySQL.
+    """
+
+    def __init__(self, name: str, slots: int, max_waiting: int, wait_s: float):
+        self.name = name
+        self.slots = max(1, int(slots))
+        self.max_waiting = max(0, int(max_waiting))
+        self.wait_s = float(wait_s)
+        self._sem = threading.BoundedSemaphore(self.slots)
+        self._lock = threading.Lock()
+        self.running = 0
+        self.waiting = 0
+
+    def acquire(self) -> None:
+        if self._sem.acquire(blocking=False):
+            self._started()
+            return
+
+        with self._lock:
+            if self.waiting >= self.max_waiting:
+                count(f"shed_queue_full:{self.name}")
+                raise Overloaded("Too many requests right now. Please try again in a moment.", self.wait_s)
+            self.waiting += 1
+        try:
+            ok = self._sem.acquire(timeout=self.wait_s)
+        finally:
+            with self._lock:
+                self.waiting -= 1
+        if not ok:
+            count(f"shed_deadline:{self.name}")
+            raise Overloaded("The server is busy. Please try again in a moment.", self.wait_s)
+        self._started()
+
+    def _started(self) -> None:
+        with self._lock:
+            self.running += 1
+
+    def release(self) -> None:
+        with self._lock:
+            self.running -= 1
+        self._sem.release()
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "class": self.name,
+                "slots": self.slots,
+                "running": self.running,
+                "waiting": self.waiting,
+                "max_waiting": self.max_waiting,
+                "wait_s": self.wait_s,
+            }
+
+
+_gates: Dict[str, _Gate] = {}
+_gates_lock = threading.Lock()
+
+
+def _gate(name: str) -> _Gate:
+    gate = _gates.get(name)
+    if gate is not None:
+        return gate
+    with _gates_lock:
+        gate = _gates.get(name)
+        if gate is None:
+            from core.settings import ADMISSION_SLOTS, ADMISSION_QUEUE, ADMISSION_WAIT_S
+
+            gate = _Gate(name, ADMISSION_SLOTS[name], ADMISSION_QUEUE[name], ADMISSION_WAIT_S[name])
+            _gates[name] = gate
+    return gate
+
+
+@contextmanager
+def admit(site: str):
+    """Holds a DB slot of the site's class (public / internal) for the block."""
+    gate = _gate(class_for(site))
+    gate.acquire()
+    try:
+        yield
+    finally:
+        gate.release()
+
+
+def gate_stats() -> list:
+    return [_gate(name).snapshot() for name in (CLASS_PUBLIC, CLASS_INTERNAL)]
+
+
+# -----------------------------
+# Per-session token bucket
+# -----------------------------
+
+def take_token(
+    state: MutableMapping,
+    key: str,
+    rate_per_min: float,
+    burst: int,
+) -> Tuple[bool, float]:
+    """
+    Token bucket kept in a per-session mapping (st.session_state).
+    Returns (allowed, seconds until the next token).
+    """
+    now = time.monotonic()
+    rate = max(rate_per_min, 0.001) / 60.0
+    tokens, last = state.get(key, (float(burst), now))
+    tokens = min(float(burst), tokens + (now - last) * rate)
+    if tokens >= 1.0:
+        state[key] = (tokens - 1.0, now)
+        return True, 0.0
+    state[key] = (tokens, now)
+    count("rate_limited")
+    return False, (1.0 - tokens) / rate
@@ -0,0 +1,358 @@
+from __future__ import annotations
+
+import threading
+import time
+from collections import defaultdict
+from datetime import date, timedelta
+from typing import Callable, Dict, List, Optional, Tuple
+
+import pandas as pd
+
+from core.db import query_df, execute, run_in_transaction
+
+# -----------------------------
+# Daily rollups
+# -----------------------------
+# rollup_registrations_daily: ثبت‌نام‌ها در هر روز و ولایت (Permanent_Province_Code)
+# rollup_assignments_daily:   شروع، پایان و تعداد فعال قراردادها در هر روز و ولایت کاری
+#
+# An assignment counts as active on day d when Start_Date <= d and
+# (End_Date IS NULL or End_Date >= d). Status is not historised, so it is not
+# used: a PLANNED or CANCELLED row inside its dates counts too (the dashboard
+# says so). Only days with a non-zero count are stored.
+
+METRIC_REGISTRATIONS = "registrations"
+METRIC_ACTIVE_ASSIGNMENTS = "active_assignments"
+METRIC_ASSIGNMENT_STARTS = "assignment_starts"
+
+GRANULARITIES = ("day", "week", "month")
+
+# (table, column, aggregate over a week/month)
+_METRICS = {
+    METRIC_REGISTRATIONS: ("rollup_registrations_daily", "Registrations", "SUM"),
+    METRIC_ASSIGNMENT_STARTS: ("rollup_assignments_daily", "Started", "SUM"),
+    METRIC_ACTIVE_ASSIGNMENTS: ("rollup_assignments_daily", "Active", "AVG"),
+}
+
+_PERIOD_SQL = {
+    "day": "Day",
+    "week": "DATE_SUB(Day, INTERVAL WEEKDAY(Day) DAY)",
+    "month": "DATE_FORMAT(Day, '%Y-%m-01')",
+}
+
+# Days re-computed by extend(): late edits (back-dated assignments, deletes) are picked up.
+REFRESH_DAYS = 35
+
+
+def ensure_rollup_tables() -> None:
+    execute(
+        """
+        CREATE TABLE IF NOT EXISTS rollup_registrations_daily (
+          Day           DATE        NOT NULL,
+          Province_Code VARCHAR(10) NOT NULL,
+          Registrations INT         NOT NULL DEFAULT 0,
+          PRIMARY KEY (Day, Province_Code)
+        )
+        """
+    )
+    execute(
+        """
+        CREATE TABLE IF NOT EXISTS rollup_assignments_daily (
+          Day           DATE        NOT NULL,
+          Province_Code VARCHAR(10) NOT NULL,
+          Started       INT         NOT NULL DEFAULT 0,
+          Ended         INT         NOT NULL DEFAULT 0,
+          Active        INT         NOT NULL DEFAULT 0,
+          PRIMARY KEY (Day, Province_Code)
+        )
+        """
+    )
+    execute(
+        """
+        CREATE TABLE IF NOT EXISTS rollup_state (
+          Name       VARCHAR(32) NOT NULL PRIMARY KEY,
+          Last_Day   DATE        NOT NULL,
+          Updated_At TIMESTAMP   NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+        )
+        """
+    )
+
+
+def _days(start: date, end: date):
+    d = start
+    while d <= end:
+        yield d
+        d += timedelta(days=1)
+
+
+def _registration_rows(start: date, end: date) -> List[tuple]:
+    df = query_df(
+        """
+        SELECT DATE(Created_At) AS Day,
+               COALESCE(Permanent_Province_Code, '') AS Province_Code,
+               COUNT(*) AS n
+        FROM surveyors
+        WHERE Created_At >= %s AND Created_At < %s
+        GROUP BY DATE(Created_At), COALESCE(Permanent_Province_Code, '')
+        """,
+        (start, end + timedelta(days=1)),
+        site="batch",
+    )
+    return [(r.Day, r.Province_Code, int(r.n)) for r in df.itertuples()]
+
+
+def _assignment_rows(start: date, end: date) -> List[tuple]:
+    """
+    Active(d) = Active(d-1) + Started(d) - Ended(d-1), seeded with one count
+    for the first day, so only starts/ends inside the range are read.
+    """
+    active = query_df(
+        """
+        SELECT COALESCE(Work_Province_Code, '') AS Province_Code, COUNT(*) AS n
+        FROM project_surveyors
+        WHERE Start_Date < %s AND (End_Date IS NULL OR End_Date >= %s)
+        GROUP BY COALESCE(Work_Province_Code, '')
+        """,
+        (start, start - timedelta(days=1)),
+        site="batch",
+    )
+    starts = query_df(
+        """
+        SELECT Start_Date AS Day, COALESCE(Work_Province_Code, '') AS Province_Code, COUNT(*) AS n
+        FROM project_surveyors
+        WHERE Start_Date BETWEEN %s AND %s
+        GROUP BY Start_Date, COALESCE(Work_Province_Code, '')
+        """,
+        (start, end),
+        site="batch",
+    )
+    ends = query_df(
+        """
+        SELECT End_Date AS Day, COALESCE(Work_Province_Code, '') AS Province_Code, COUNT(*) AS n
+        FROM project_surveyors
+        WHERE End_Date BETWEEN %s AND %s
+        GROUP BY End_Date, COALESCE(Work_Province_Code, '')
+        """,
+        (start - timedelta(days=1), end),
+        site="batch",
+    )
+
+    running: Dict[str, int] = defaultdict(int)
+    for r in active.itertuples():
+        running[r.Province_Code] = int(r.n)
+    started: Dict[Tuple[date, str], int] = {(r.Day, r.Province_Code): int(r.n) for r in starts.itertuples()}
+    ended: Dict[Tuple[date, str], int] = {(r.Day, r.Province_Code): int(r.n) for r in ends.itertuples()}
+    provinces = set(running) | {p for _, p in started} | {p for _, p in ended}
+
+    rows = []
+    for d in _days(start, end):
+        prev = d - timedelta(days=1)
+        for p in provinces:
+            s = started.get((d, p), 0)
+            running[p] += s - ended.get((prev, p), 0)
+            e = ended.get((d, p), 0)
+            if running[p] or s or e:
+                rows.append((d, p, s, e, running[p]))
+    return rows
+
+
+def _write_chunk(start: date, end: date, registrations: List[tuple], assignments: List[tuple]) -> None:
+    def tx(conn):
+        cur = conn.cursor()
+        try:
+            cur.execute("DELETE FROM rollup_registrations_daily WHERE Day BETWEEN %s AND %s", (start, end))
+            cur.execute("DELETE FROM rollup_assignments_daily WHERE Day BETWEEN %s AND %s", (start, end))
+            if registrations:
+                cur.executemany(
+                    "INSERT INTO rollup_registrations_daily (Day, Province_Code, Registrations) VALUES (%s,%s,%s)",
+                    registrations,
+                )
+            if assignments:
+                cur.executemany(
+                    """
+                    INSERT INTO rollup_assignments_daily (Day, Province_Code, Started, Ended, Active)
+                    VALUES (%s,%s,%s,%s,%s)
+                    """,
+                    assignments,
+                )
+            cur.execute(
+                """
+                INSERT INTO rollup_state (Name, Last_Day) VALUES ('daily', %s)
+                ON DUPLICATE KEY UPDATE Last_Day = GREATEST(Last_Day, VALUES(Last_Day))
+                """,
+                (end,),
+            )
+        finally:
+            cur.close()
+
+    run_in_transaction(tx)
+
+
+def rebuild(
+    start: date,
+    end: date,
+    chunk_days: int = 31,
+    progress: Optional[Callable[[date, date], None]] = None,
+) -> int:
+    """
+    (Re)computes both rollups for [start, end] in chunks of chunk_days, one
+    transaction per chunk. Chunks are independent, so an interrupted backfill
+    can simply be restarted. Returns the number of days written.
+    """
+    if end < start:
+        return 0
+    days = 0
+    chunk_start = start
+    while chunk_start <= end:
+        chunk_end = min(end, chunk_start + timedelta(days=chunk_days - 1))
+        _write_chunk(
+            chunk_start,
+            chunk_end,
+            _registration_rows(chunk_start, chunk_end),
+            _assignment_rows(chunk_start, chunk_end),
+        )
+        days += (chunk_end - chunk_start).days + 1
+        if progress:
+            progress(chunk_start, chunk_end)
+        chunk_start = chunk_end + timedelta(days=1)
+    return days
+
+
+def last_rolled_day() -> Optional[date]:
+    df = query_df("SELECT Last_Day FROM rollup_state WHERE Name='daily'", site="lookup")
+    if df.empty:
+        return None
+    return pd.to_datetime(df.iloc[0]["Last_Day"]).date()
+
+
+def first_data_day() -> Optional[date]:
+    df = query_df(
+        """
+        SELECT LEAST(
+          COALESCE((SELECT DATE(MIN(Created_At)) FROM surveyors), CURDATE()),
+          COALESCE((SELECT MIN(Start_Date) FROM project_surveyors), CURDATE())
+        ) AS d
+        """,
+        site="lookup",
+    )
+    if df.empty or df.iloc[0]["d"] is None:
+        return None
+    return pd.to_datetime(df.iloc[0]["d"]).date()
+
+
+def extend(today: Optional[date] = None, refresh_days: int = REFRESH_DAYS) -> Tuple[Optional[date], Optional[date]]:
+    """
+    Brings the rollups up to today: days after the last rolled day plus the
+    last refresh_days (today is partial and is recomputed on every call).
+    The first call backfills from the earliest data; use rebuild() with a
+    progress callback for large backfills. Returns the range written.
+    """
+    today = today or date.today()
+    last = last_rolled_day()
+    if last is None:
+        start = first_data_day() or today
+    else:
+        start = min(last + timedelta(days=1), today - timedelta(days=refresh_days - 1))
+    rebuild(start, today)
+    return start, today
+
+
+_extend_lock = threading.Lock()
+_last_extend = 0.0
+# core.jobs type that runs extend() when given no start day
+JOB_EXTEND = "backfill_analytics"
+
+
+def extend_if_due(min_interval_s: float = 600) -> Optional[int]:
+    """
+    Queues extend() as a background job (core.jobs) at most once per interval
+    per process, unless one is already queued or running; the page renders
+    from the rollups as they are. The attempt is recorded even when queueing
+    fails, so a broken queue is not retried on every render.
+    Returns the Job_ID queued, if any.
+    """
+    global _last_extend
+    if time.monotonic() - _last_extend < min_interval_s:
+        return None
+    if not _extend_lock.acquire(blocking=False):
+        return None
+    try:
+        if time.monotonic() - _last_extend < min_interval_s:
+            return None
+        _last_extend = time.monotonic()
+        from core import jobs
+
+        if jobs.active_job(JOB_EXTEND) is not None:
+            return None
+        job_id = jobs.submit(JOB_EXTEND, {})
+        jobs.ensure_workers()
+        return job_id
+    finally:
+        _extend_lock.release()
+
+
+# -----------------------------
+# Query API
+# -----------------------------
+
+def series(
+    metric: str,
+    start: date,
+    end: date,
+    granularity: str = "day",
+    province_code: Optional[str] = None,
+    by_province: bool = False,
+) -> pd.DataFrame:
+    """
+    Reads a metric from the rollups for [start, end].
+    Columns: Period[, Province_Code], Value. Week periods start on Monday.
+    Registrations and starts are summed per period; active assignments are
+    the daily average over the days of the period inside [start, end]. Days
+    without a stored row count as zero.
+    """
+    if metric not in _METRICS:
+        raise ValueError(f"Unknown metric: {metric}")
+    if granularity not in GRANULARITIES:
+        raise ValueError(f"Unknown granularity: {granularity}")
+    table, column, agg = _METRICS[metric]
+    period = _PERIOD_SQL[granularity]
+
+    where = "Day BETWEEN %s AND %s"
+    params: list = [start, end]
+    if province_code:
+        where += " AND Province_Code = %s"
+        params.append(province_code)
+
+    if by_province:
+        select_cols, group_cols = f"{period} AS Period, Province_Code", "Period, Province_Code"
+    else:
+        select_cols, group_cols = f"{period} AS Period", "Period"
+
+    sql = f"""
+        SELECT {select_cols}, SUM({column}) AS Value
+        FROM {table}
+        WHERE {where}
+        GROUP BY {group_cols}
+        ORDER BY {group_cols}
+    """
+    df = query_df(sql, tuple(params), site="dashboard")
+    if df.empty:
+        cols = ["Period", "Province_Code", "Value"] if by_province else ["Period", "Value"]
+        return pd.DataFrame(columns=cols)
+    df["Period"] = pd.to_datetime(df["Period"])
+    df["Value"] = pd.to_numeric(df["Value"])
+    if agg == "AVG" and granularity != "day":
+        # the sum over the stored days divided by all days of the period: a
+        # day with no active assignment has no row and an AVG would skip it
+        days = df["Period"].map(lambda p: _days_in_period(p.date(), granularity, start, end))
+        df["Value"] = (df["Value"] / days).round(1)
+    return df
+
+
+def _days_in_period(period_start: date, granularity: str, start: date, end: date) -> int:
+    if granularity == "week":
+        period_end = period_start + timedelta(days=6)
+    else:
+        next_month = (period_start.replace(day=28) + timedelta(days=4)).replace(day=1)
+        period_end = next_month - timedelta(days=1)
+    return (min(end, period_end) - max(start, period_start)).days + 1
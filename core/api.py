@@ -0,0 +1,486 @@
+from __future__ import annotations
+
+import base64
+import gzip
+import hashlib
+import hmac
+import json
+import re
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, unquote, urlsplit
+
+import pandas as pd
+
+from core.admission import Overloaded, take_token
+from core.changes import ENTITY_SURVEYOR, OP_DELETE
+from core.db import (
+    get_surveyor_profile,
+    query_df,
+    search_projects,
+    unit_of_work,
+)
+from core.normalize import like_contains, like_prefix, mask_phone, mask_tazkira, name_search_terms
+from core.resilience import DatabaseUnavailable, TIMEOUT_ERRNOS, errno_of
+from core.schema import FEATURE_FILES, FEATURE_NAME_SEARCH, missing_schema
+from core.services import frame_records, json_default
+from core.settings import (
+    API_GZIP_MIN_BYTES,
+    API_HOST,
+    API_KEYS,
+    API_PAGE_MAX,
+    API_PORT,
+    API_PUBLIC_PAGE_MAX,
+    PUBLIC_RATE_BURST,
+    PUBLIC_RATE_PER_MIN,
+)
+
+# -----------------------------
+# Read-only JSON API for partners
+# -----------------------------
+# GET /v1/health
+# GET /v1/surveyors?updated_since=&q=&cursor=&limit=      (key) delta pull, oldest change first;
+#                                                          the first page also lists deletes since then
+# GET /v1/surveyors/<code>                                 (key) surveyor + assignments
+# GET /v1/projects?q=&limit=                               (key) ranked project search
+# GET /v1/projects/<code>/staffing?status=&cursor=&limit=  (key)
+# GET /v1/public/surveyors?q=&province=&cursor=&limit=     (no key) masked, rate limited per client
+#
+# هر درخواست یک unit_of_work (snapshot) دارد: یک اتصال از همان pool مشترک core.db.
+# List responses are {"data": [...], "next_cursor": str | null}; pass next_cursor back
+# as ?cursor= until it is null. Every 200 carries an ETag; a matching If-None-Match
+# gets 304. Single resources and staffing check a version query before loading.
+
+_SURVEYOR_COLS = """s.Surveyor_ID, s.Surveyor_Code, s.Surveyor_Name, s.Gender, s.Father_Name, s.Tazkira_No,
+       s.Email_Address, s.Whatsapp_Number, s.Phone_Number, s.Permanent_Province_Code,
+       s.Current_Province_Code, s.CV_Link, s.Created_At, s.Updated_At"""
+
+_STAFFING_VERSION_SQL = """
+    SELECT p.Project_ID, p.Project_Code, p.Project_Name, p.Status, p.Updated_At,
+           (SELECT CONCAT(COUNT(*), '/', COALESCE(MAX(Updated_At), ''))
+              FROM project_surveyors WHERE Project_ID = p.Project_ID) AS Staff_Version
+    FROM projects p
+    WHERE p.Project_Code = %s
+"""
+
+
+class ApiError(Exception):
+    def __init__(self, status: int, message: str, headers: Optional[Dict[str, str]] = None):
+        super().__init__(message)
+        self.status = status
+        self.headers = headers or {}
+
+
+# ---- helpers ----
+
+def _param(query: Dict[str, List[str]], name: str, default: str = "") -> str:
+    values = query.get(name)
+    return values[0].strip() if values else default
+
+
+def _limit(query: Dict[str, List[str]], default: int, maximum: int) -> int:
+    raw = _param(query, "limit")
+    if not raw:
+        return min(default, maximum)
+    if not raw.isdigit() or int(raw) < 1:
+        raise ApiError(400, "limit must be a positive integer.")
+    return min(int(raw), maximum)
+
+
+def encode_cursor(values: list) -> str:
+    raw = json.dumps(values, default=json_default, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> list:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        values = json.loads(raw)
+    except Exception:
+        raise ApiError(400, "Invalid cursor.")
+    if not isinstance(values, list):
+        raise ApiError(400, "Invalid cursor.")
+    return values
+
+
+def _etag(*parts) -> str:
+    digest = hashlib.sha1(json.dumps(parts, default=json_default).encode()).hexdigest()[:32]
+    return f'"{digest}"'
+
+
+def _page(df: pd.DataFrame, limit: int, cursor_of: Callable[[dict], list]) -> Tuple[List[dict], Optional[str]]:
+    """Rows were fetched with LIMIT limit + 1; the extra row only tells that there is a next page."""
+    rows = frame_records(df.head(limit))
+    more = len(df) > limit
+    return rows, (encode_cursor(cursor_of(rows[-1])) if more and rows else None)
+
+
+def _timestamp(value: str, name: str) -> datetime:
+    try:
+        return datetime.fromisoformat(value.replace("Z", ""))
+    except ValueError:
+        raise ApiError(400, f"{name} must be an ISO date or timestamp.")
+
+
+def _matching_surveyors(q: str, identifiers: bool = False) -> Tuple[str, list]:
+    """
+    Derived table of the Surveyor_IDs that q matches, one index-served branch
+    each: code prefix, name tokens (normalize.name_search_terms), the raw name
+    of rows whose key is not filled yet and, with identifiers, the exact
+    Tazkira/phone/WhatsApp number. A UNION keeps every branch on its own index,
+    where an OR of them scans surveyors. A q without a name key ("." or "-")
+    only matches on the other branches.
+    """
+    if missing_schema(FEATURE_NAME_SEARCH):
+        raise ApiError(503, "Search is not available until the database migrations are applied.")
+    branches = ["SELECT Surveyor_ID FROM surveyors WHERE Surveyor_Code LIKE %s"]
+    params: list = [like_prefix(q)]
+    terms = name_search_terms(q)
+    if terms:
+        branches += [
+            "SELECT t.Surveyor_ID FROM surveyor_name_tokens t JOIN surveyors n ON n.Surveyor_ID = t.Surveyor_ID "
+            "WHERE t.Token LIKE %s AND n.Surveyor_Name_Key LIKE %s",
+            "SELECT Surveyor_ID FROM surveyors WHERE Surveyor_Name_Key IS NULL AND Surveyor_Name LIKE %s",
+        ]
+        params += [terms[0], terms[1], like_contains(q)]
+    if identifiers:
+        # identifiers only match whole: a fragment must not enumerate tazkira or phone numbers
+        for column in ("Tazkira_No", "Phone_Number", "Whatsapp_Number"):
+            branches.append(f"SELECT Surveyor_ID FROM surveyors WHERE {column} = %s")
+            params.append(q)
+    return "(" + "\n        UNION ".join(branches) + ")", params
+
+
+# ---- handlers: (path match, query, if_none_match) -> (payload, etag) ----
+
+def health(match, query, inm):
+    return {"status": "ok"}, None
+
+
+def list_surveyors(match, query, inm):
+    limit = _limit(query, 100, API_PAGE_MAX)
+    where, params = ["1=1"], []
+    join, join_params = "", []
+
+    q = _param(query, "q")
+    if q:
+        matches, join_params = _matching_surveyors(q)
+        join = f"JOIN {matches} m ON m.Surveyor_ID = s.Surveyor_ID"
+
+    since = _param(query, "updated_since")
+    if since:
+        since_at = _timestamp(since, "updated_since")
+        where.append("s.Updated_At >= %s")
+        params.append(since_at)
+
+    cursor = _param(query, "cursor")
+    if cursor:
+        values = decode_cursor(cursor)
+        if len(values) != 2:
+            raise ApiError(400, "Invalid cursor.")
+        updated, sid = _timestamp(str(values[0]), "cursor"), int(values[1])
+        where.append("(s.Updated_At > %s OR (s.Updated_At = %s AND s.Surveyor_ID > %s))")
+        params += [updated, updated, sid]
+
+    # keyset on (Updated_At, Surveyor_ID): idx_surveyors_updated
+    df = query_df(
+        f"""
+        SELECT {_SURVEYOR_COLS}
+        FROM surveyors s
+        {join}
+        WHERE {' AND '.join(where)}
+        ORDER BY s.Updated_At, s.Surveyor_ID
+        LIMIT %s
+        """,
+        tuple(join_params) + tuple(params) + (limit + 1,),
+        site="lookup",
+    )
+    rows, next_cursor = _page(df, limit, lambda r: [r["Updated_At"], r["Surveyor_ID"]])
+    deleted = _deleted_surveyors(since_at) if since and not cursor else []
+    etag = _etag(
+        "surveyors", cursor, since, q, limit,
+        [(r["Surveyor_ID"], r["Updated_At"]) for r in rows],
+        [r["Surveyor_ID"] for r in deleted],
+    )
+    return {"data": rows, "deleted": deleted, "next_cursor": next_cursor}, etag
+
+
+def _deleted_surveyors(since: datetime) -> List[dict]:
+    """
+    Tombstones for a delta pull: surveyors deleted since the timestamp, from
+    change_log (pruned after a while, so a client that lags further than that
+    needs a full pull without updated_since).
+    """
+    df = query_df(
+        """
+        SELECT Entity_ID AS Surveyor_ID, MAX(Changed_At) AS Deleted_At
+        FROM change_log
+        WHERE Entity = %s AND Op = %s AND Changed_At >= %s
+        GROUP BY Entity_ID
+        ORDER BY Deleted_At, Surveyor_ID
+        """,
+        (ENTITY_SURVEYOR, OP_DELETE, since),
+        site="lookup",
+    )
+    return frame_records(df)
+
+
+def get_surveyor(match, query, inm):
+    code = unquote(match.group(1)).strip()
+    # the profile version counts stored files
+    if missing_schema(FEATURE_FILES):
+        raise ApiError(503, "Surveyor profiles are not available until the database migrations are applied.")
+    profile = get_surveyor_profile(code)
+    if profile is None:
+        raise ApiError(404, "Surveyor not found.")
+    etag = _etag("surveyor", profile["version"])
+    if inm == etag:
+        return None, etag
+    # accounts and stored files are not shared with partners
+    return {
+        "surveyor": frame_records(pd.DataFrame([profile["surveyor"]]))[0],
+        "assignments": frame_records(profile["assignments"].drop(columns=["Project_ID"], errors="ignore")),
+    }, etag
+
+
+def list_projects(match, query, inm):
+    limit = _limit(query, 50, API_PAGE_MAX)
+    df = search_projects(_param(query, "q"), limit=limit)
+    return {"data": frame_records(df), "next_cursor": None}, None
+
+
+def project_staffing(match, query, inm):
+    code = unquote(match.group(1)).strip()
+    limit = _limit(query, 200, API_PAGE_MAX)
+    status = _param(query, "status").upper()
+    cursor = _param(query, "cursor")
+
+    head = query_df(_STAFFING_VERSION_SQL, (code,), site="lookup")
+    if head.empty:
+        raise ApiError(404, "Project not found.")
+    project = frame_records(head)[0]
+    etag = _etag("staffing", project["Updated_At"], project["Staff_Version"], status, cursor, limit)
+    if inm == etag:
+        return None, etag
+
+    where, params = ["ps.Project_ID = %s"], [int(project["Project_ID"])]
+    if status:
+        where.append("ps.Status = %s")
+        params.append(status)
+    if cursor:
+        values = decode_cursor(cursor)
+        if len(values) != 1:
+            raise ApiError(400, "Invalid cursor.")
+        where.append("ps.Project_Surveyor_ID > %s")
+        params.append(int(values[0]))
+
+    df = query_df(
+        f"""
+        SELECT ps.Project_Surveyor_ID, s.Surveyor_Code, s.Surveyor_Name, ps.Role, ps.Work_Province_Code,
+               ps.Start_Date, ps.End_Date, ps.Status, ps.Updated_At
+        FROM project_surveyors ps
+        JOIN surveyors s ON s.Surveyor_ID = ps.Surveyor_ID
+        WHERE {' AND '.join(where)}
+        ORDER BY ps.Project_Surveyor_ID
+        LIMIT %s
+        """,
+        tuple(params) + (limit + 1,),
+        site="lookup",
+    )
+    rows, next_cursor = _page(df, limit, lambda r: [r["Project_Surveyor_ID"]])
+    for key in ("Staff_Version", "Updated_At"):
+        project.pop(key, None)
+    return {"project": project, "data": rows, "next_cursor": next_cursor}, etag
+
+
+def public_surveyors(match, query, inm):
+    limit = _limit(query, 20, API_PUBLIC_PAGE_MAX)
+    q = _param(query, "q")
+    province = _param(query, "province")
+    if not q and not province:
+        raise ApiError(400, "Give q or province.")
+
+    where, params = ["1=1"], []
+    join, join_params = "", []
+    if q:
+        matches, join_params = _matching_surveyors(q, identifiers=True)
+        join = f"JOIN {matches} m ON m.Surveyor_ID = s.Surveyor_ID"
+    if province:
+        where.append("(s.Permanent_Province_Code = %s OR s.Current_Province_Code = %s)")
+        params += [province, province]
+    cursor = _param(query, "cursor")
+    if cursor:
+        values = decode_cursor(cursor)
+        if len(values) != 1:
+            raise ApiError(400, "Invalid cursor.")
+        where.append("s.Surveyor_ID < %s")
+        params.append(int(values[0]))
+
+    df = query_df(
+        f"""
+        SELECT s.Surveyor_ID, s.Surveyor_Code, s.Surveyor_Name, s.Gender, s.Father_Name, s.Tazkira_No,
+               s.Whatsapp_Number, s.Phone_Number,
+               pp.Province_Name AS Permanent_Province, cp.Province_Name AS Current_Province,
+               DATE(s.Created_At) AS Created_Date
+        FROM surveyors s
+        {join}
+        LEFT JOIN provinces pp ON pp.Province_Code = s.Permanent_Province_Code
+        LEFT JOIN provinces cp ON cp.Province_Code = s.Current_Province_Code
+        WHERE {' AND '.join(where)}
+        ORDER BY s.Surveyor_ID DESC
+        LIMIT %s
+        """,
+        tuple(join_params) + tuple(params) + (limit + 1,),
+        site="public_search",
+    )
+    rows, next_cursor = _page(df, limit, lambda r: [r["Surveyor_ID"]])
+    for r in rows:
+        r["Tazkira_No"] = mask_tazkira(r["Tazkira_No"])
+        r["Phone_Number"] = mask_phone(r["Phone_Number"])
+        r["Whatsapp_Number"] = mask_phone(r["Whatsapp_Number"])
+    return {"data": rows, "next_cursor": next_cursor}, None
+
+
+# (pattern, handler, needs an API key)
+ROUTES: List[Tuple["re.Pattern", Callable, bool]] = [
+    (re.compile(r"^/v1/health$"), health, False),
+    (re.compile(r"^/v1/surveyors$"), list_surveyors, True),
+    (re.compile(r"^/v1/surveyors/([^/]+)$"), get_surveyor, True),
+    (re.compile(r"^/v1/projects$"), list_projects, True),
+    (re.compile(r"^/v1/projects/([^/]+)/staffing$"), project_staffing, True),
+    (re.compile(r"^/v1/public/surveyors$"), public_surveyors, False),
+]
+
+
+# ---- auth and rate limit ----
+
+def partner_for(key: str) -> Optional[str]:
+    for known, partner in API_KEYS.items():
+        if key and hmac.compare_digest(key.encode(), str(known).encode()):
+            return partner
+    return None
+
+
+_RATE_CLIENTS_MAX = 10000
+_rate_state: "OrderedDict[str, Any]" = OrderedDict()
+_rate_lock = threading.Lock()
+
+
+def _public_allowed(client: str) -> Tuple[bool, float]:
+    # one token bucket per client address, same limits as the public search page;
+    # the least recently seen clients are dropped first, so a flood of new
+    # addresses cannot reset the buckets of clients that are being limited
+    with _rate_lock:
+        result = take_token(_rate_state, client, PUBLIC_RATE_PER_MIN, PUBLIC_RATE_BURST)
+        _rate_state.move_to_end(client)
+        while len(_rate_state) > _RATE_CLIENTS_MAX:
+            _rate_state.popitem(last=False)
+        return result
+
+
+# ---- HTTP ----
+
+class ApiHandler(BaseHTTPRequestHandler):
+    server_version = "PPCApi/1"
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        try:
+            status, body, headers = self._dispatch()
+        except ApiError as ex:
+            status, body, headers = ex.status, {"error": str(ex)}, ex.headers
+        except Exception as ex:
+            status, body, headers = 500, {"error": "Internal error."}, {}
+            self.log_error("%s: %s", type(ex).__name__, ex)
+        self._send(status, body, headers)
+
+    def _dispatch(self) -> Tuple[int, Any, Dict[str, str]]:
+        url = urlsplit(self.path)
+        for pattern, handler, needs_key in ROUTES:
+            match = pattern.match(url.path)
+            if match:
+                break
+        else:
+            raise ApiError(404, "Not found.")
+
+        if needs_key:
+            auth = self.headers.get("Authorization", "")
+            key = auth[7:].strip() if auth.lower().startswith("bearer ") else self.headers.get("X-API-Key", "")
+            if partner_for(key.strip()) is None:
+                raise ApiError(401, "A valid API key is required.", {"WWW-Authenticate": "Bearer"})
+        elif handler is public_surveyors:
+            allowed, wait_s = _public_allowed(self.client_address[0])
+            if not allowed:
+                raise ApiError(429, "Too many requests.", {"Retry-After": str(int(wait_s) + 1)})
+
+        inm = self.headers.get("If-None-Match", "").strip()
+        try:
+            # one pooled connection and one consistent snapshot per request
+            with unit_of_work(snapshot=True, read_only=True):
+                payload, etag = handler(match, parse_qs(url.query), inm)
+        except Overloaded as ex:
+            raise ApiError(503, str(ex), {"Retry-After": str(int(ex.retry_after) + 1)})
+        except DatabaseUnavailable as ex:
+            raise ApiError(503, str(ex), {"Retry-After": "5"})
+        except ApiError:
+            raise
+        except Exception as ex:
+            if errno_of(ex) in TIMEOUT_ERRNOS:
+                raise ApiError(504, "The query took too long; narrow it down.")
+            raise
+
+        if payload is not None and etag is None:
+            body = json.dumps(payload, default=json_default, ensure_ascii=False).encode()
+            etag = "W/" + _etag(hashlib.sha1(body).hexdigest())
+            payload = body
+        headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+        if etag and inm == etag:
+            return 304, None, headers
+        return 200, payload, headers
+
+    def _send(self, status: int, payload: Any, headers: Dict[str, str]) -> None:
+        body = b""
+        if payload is not None:
+            body = payload if isinstance(payload, bytes) else json.dumps(
+                payload, default=json_default, ensure_ascii=False
+            ).encode()
+        encoded = False
+        if len(body) >= API_GZIP_MIN_BYTES and "gzip" in self.headers.get("Accept-Encoding", ""):
+            body = gzip.compress(body, compresslevel=5)
+            encoded = True
+
+        self.send_response(status)
+        if status != 304:
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+        if encoded:
+            self.send_header("Content-Encoding", "gzip")
+        self.send_header("Vary", "Accept-Encoding")
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if body:
+            self.wfile.write(body)
+
+
+class ApiServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+
+def make_server(host: str = API_HOST, port: int = API_PORT) -> ApiServer:
+    """Bound server (port 0 picks a free port: server.server_address[1])."""
+    return ApiServer((host, port), ApiHandler)
+
+
+def serve(host: str = API_HOST, port: int = API_PORT) -> None:
+    server = make_server(host, port)
+    print(f"API listening on http://{server.server_address[0]}:{server.server_address[1]}/v1/")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
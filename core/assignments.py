@@ -0,0 +1,204 @@
+from __future__ import annotations
+
+import heapq
+from collections import defaultdict
+from datetime import date, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import pandas as pd
+
+from core.db import query_df, run_in_transaction, add_assignments_tx
+
+# -----------------------------
+# Assignment intervals
+# -----------------------------
+# هر ردیف project_surveyors یک بازه‌ی [Start_Date, End_Date] است (End_Date خالی = بی‌پایان).
+# فقط ردیف‌های ACTIVE در بررسی تداخل حساب می‌شوند.
+#
+# Index: (Surveyor_ID, Start_Date, End_Date). An overlap test for one
+# surveyor reads only that surveyor's rows that start before the window ends.
+
+OPEN_END = date.max
+
+_OVERLAP_SQL = """
+    SELECT ps.Project_Surveyor_ID, ps.Project_ID, pr.Project_Code, ps.Surveyor_ID,
+           ps.Role, ps.Work_Province_Code, ps.Start_Date, ps.End_Date
+    FROM project_surveyors ps
+    JOIN projects pr ON pr.Project_ID = ps.Project_ID
+    WHERE ps.Surveyor_ID = %s
+      AND ps.Status = 'ACTIVE'
+      AND ps.Start_Date <= %s
+      AND (ps.End_Date IS NULL OR ps.End_Date >= %s)
+    ORDER BY ps.Start_Date
+"""
+
+
+class AssignmentConflict(ValueError):
+    def __init__(self, conflicts: pd.DataFrame):
+        codes = ", ".join(sorted({str(c) for c in conflicts["Project_Code"]})) if not conflicts.empty else ""
+        super().__init__(f"Surveyor is already assigned in this period ({codes}).")
+        self.conflicts = conflicts
+
+
+def _end(d) -> date:
+    if d is None or pd.isna(d):
+        return OPEN_END
+    return pd.Timestamp(d).date()
+
+
+def _start(d) -> date:
+    return pd.Timestamp(d).date()
+
+
+def busy(surveyor_id: int, start: date, end: Optional[date] = None) -> pd.DataFrame:
+    """Active assignments of the surveyor that overlap [start, end] (end None = open)."""
+    return query_df(_OVERLAP_SQL, (int(surveyor_id), end or OPEN_END, start), site="lookup")
+
+
+def free_in_province(
+    province_code: str,
+    start: date,
+    end: date,
+    limit: int = 200,
+) -> pd.DataFrame:
+    """Surveyors currently living in the province with no active assignment overlapping [start, end]."""
+    return query_df(
+        """
+        SELECT s.Surveyor_ID, s.Surveyor_Code, s.Surveyor_Name, s.Phone_Number
+        FROM surveyors s
+        WHERE s.Current_Province_Code = %s
+          AND NOT EXISTS (
+            SELECT 1
+            FROM project_surveyors ps
+            WHERE ps.Surveyor_ID = s.Surveyor_ID
+              AND ps.Status = 'ACTIVE'
+              AND ps.Start_Date <= %s
+              AND (ps.End_Date IS NULL OR ps.End_Date >= %s)
+          )
+        ORDER BY s.Surveyor_Name
+        LIMIT %s
+        """,
+        (province_code, end, start, int(limit)),
+        site="admin_search",
+    )
+
+
+def week_bounds(day: date) -> Tuple[date, date]:
+    """Monday..Sunday of the week containing day."""
+    monday = day - timedelta(days=day.weekday())
+    return monday, monday + timedelta(days=6)
+
+
+def _lock_surveyor(conn, surveyor_id: int) -> None:
+    # serialises concurrent hires of the same surveyor
+    cur = conn.cursor()
+    try:
+        cur.execute("SELECT Surveyor_ID FROM surveyors WHERE Surveyor_ID=%s FOR UPDATE", (int(surveyor_id),))
+        cur.fetchall()
+    finally:
+        cur.close()
+
+
+def _busy_tx(conn, surveyor_id: int, start: date, end: Optional[date]) -> pd.DataFrame:
+    cur = conn.cursor(dictionary=True)
+    try:
+        cur.execute(_OVERLAP_SQL, (int(surveyor_id), end or OPEN_END, start))
+        return pd.DataFrame(cur.fetchall())
+    finally:
+        cur.close()
+
+
+def assign(
+    project_id: int,
+    surveyor_id: int,
+    role: str,
+    province_codes: list,
+    start_date: date,
+    end_date: Optional[date],
+    status: str = "ACTIVE",
+    allow_overlap: bool = False,
+) -> list:
+    """
+    Inserts one assignment per work province. The overlap check and the
+    inserts run in one transaction with the surveyor row locked, so two
+    concurrent hires cannot both pass the check. Raises AssignmentConflict.
+    """
+    def tx(conn):
+        _lock_surveyor(conn, surveyor_id)
+        if status == "ACTIVE" and not allow_overlap:
+            conflicts = _busy_tx(conn, surveyor_id, start_date, end_date)
+            if not conflicts.empty:
+                raise AssignmentConflict(conflicts)
+        return add_assignments_tx(conn, project_id, surveyor_id, role, province_codes, start_date, end_date, status)
+
+    return run_in_transaction(tx)
+
+
+# -----------------------------
+# Batch conflict check (bulk staffing)
+# -----------------------------
+
+def _existing_for(surveyor_ids: List[int], start: date, end: date) -> pd.DataFrame:
+    marks = ",".join(["%s"] * len(surveyor_ids))
+    return query_df(
+        f"""
+        SELECT Project_Surveyor_ID, Surveyor_ID, Start_Date, End_Date
+        FROM project_surveyors
+        WHERE Surveyor_ID IN ({marks})
+          AND Status = 'ACTIVE'
+          AND Start_Date <= %s
+          AND (End_Date IS NULL OR End_Date >= %s)
+        """,
+        tuple(surveyor_ids) + (end, start),
+        site="batch",
+    )
+
+
+def sweep_conflicts(intervals: Iterable[Tuple[Any, Any, date, date]]) -> List[Tuple[Any, Any]]:
+    """
+    intervals: (ref, group, start, end) with inclusive dates. Returns pairs of
+    refs whose intervals overlap, per group (group = surveyor).
+    Sort + sweep with a min-heap of open intervals: O(n log n + conflicts).
+    """
+    by_group: Dict[Any, list] = defaultdict(list)
+    for ref, group, start, end in intervals:
+        by_group[group].append((start, end, ref))
+
+    out: List[Tuple[Any, Any]] = []
+    for items in by_group.values():
+        items.sort(key=lambda x: (x[0], x[1]))
+        open_heap: list = []  # (end, seq, ref)
+        for seq, (start, end, ref) in enumerate(items):
+            while open_heap and open_heap[0][0] < start:
+                heapq.heappop(open_heap)
+            for _, _, other in open_heap:
+                out.append((other, ref))
+            heapq.heappush(open_heap, (end, seq, ref))
+    return out
+
+
+def check_batch(proposed: List[dict]) -> List[Tuple[Any, Any]]:
+    """
+    proposed: dicts with Surveyor_ID, Start_Date, End_Date (None = open),
+    one per hire (not per work province). Returns conflicting pairs; a ref
+    is ("new", index in proposed) or ("existing", Project_Surveyor_ID).
+    Existing assignments are read with one query for all surveyors.
+    """
+    if not proposed:
+        return []
+    rows = [
+        (("new", i), int(p["Surveyor_ID"]), _start(p["Start_Date"]), _end(p.get("End_Date")))
+        for i, p in enumerate(proposed)
+    ]
+    lo = min(r[2] for r in rows)
+    hi = max(r[3] for r in rows)
+    surveyor_ids = sorted({r[1] for r in rows})
+
+    existing = _existing_for(surveyor_ids, lo, hi)
+    for r in existing.itertuples():
+        rows.append(
+            (("existing", int(r.Project_Surveyor_ID)), int(r.Surveyor_ID), _start(r.Start_Date), _end(r.End_Date))
+        )
+
+    # existing rows were already accepted; only report pairs involving a new row
+    return [pair for pair in sweep_conflicts(rows) if pair[0][0] == "new" or pair[1][0] == "new"]
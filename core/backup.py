@@ -0,0 +1,756 @@
+from __future__ import annotations
+
+import gzip
+import hashlib
+import json
+import math
+import os
+import queue
+import re
+import shutil
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from core.cache import cache
+from core.db import get_conn_params, mysql, CACHE_NS_BANKS, CACHE_NS_PROVINCES
+from core.settings import (
+    BACKUP_DIR,
+    BACKUP_WORKERS,
+    BACKUP_CHUNK_MB,
+    BACKUP_GZIP_LEVEL,
+    BACKUP_INSERT_BATCH_MB,
+    BACKUP_RESTORE_METHOD,
+)
+
+# -----------------------------
+# Parallel backup / restore
+# -----------------------------
+# هر جدول به بازه‌های کلید اصلی تقسیم می‌شود و هر بازه یک فایل gzip جدا است؛
+# چند connection هم‌زمان dump/load می‌کنند، پس زمان با تعداد هسته‌ها کم می‌شود.
+#
+# Chunk files use the LOAD DATA default text format (tab separated, backslash
+# escapes, \N for NULL), so restore can hand them to LOAD DATA LOCAL INFILE
+# unchanged. Values are written as MySQL returns them in text form; TIMESTAMPs
+# are read and written in UTC. Files under UPLOAD_DIR are not part of a backup.
+
+FORMAT = "ppc-backup/1"
+MANIFEST = "manifest.json"
+FETCH_SIZE = 500
+SESSION_TIME_ZONE = "+00:00"
+
+METHOD_AUTO = "auto"
+METHOD_LOAD_DATA = "load_data"
+METHOD_INSERT = "insert"
+METHODS = (METHOD_AUTO, METHOD_LOAD_DATA, METHOD_INSERT)
+
+_INT_TYPES = {"tinyint", "smallint", "mediumint", "int", "integer", "bigint"}
+
+# LOCAL INFILE refused by the server or the client
+_LOCAL_INFILE_ERRNOS = {1148, 2068, 3948, 3950}
+
+_ESCAPES = [(b"\\", b"\\\\"), (b"\t", b"\\t"), (b"\n", b"\\n"), (b"\r", b"\\r"), (b"\x00", b"\\0")]
+_UNESCAPE_RE = re.compile(rb"\\(.)", re.S)
+_UNESCAPES = {b"t": b"\t", b"n": b"\n", b"r": b"\r", b"0": b"\x00", b"Z": b"\x1a"}
+
+_LOAD_SQL = (
+    "LOAD DATA LOCAL INFILE %s INTO TABLE {table} CHARACTER SET binary "
+    "FIELDS TERMINATED BY '\\t' ESCAPED BY '\\\\' LINES TERMINATED BY '\\n' ({columns})"
+)
+
+
+class BackupError(RuntimeError):
+    pass
+
+
+def _q(name: str) -> str:
+    return "`" + name.replace("`", "``") + "`"
+
+
+def _connect(params: Dict[str, Any], **extra):
+    if mysql is None:
+        raise RuntimeError("mysql-connector-python is not installed. Run: pip install mysql-connector-python")
+    conn = mysql.connect(**{**params, "charset": "utf8mb4", **extra})
+    cur = conn.cursor()
+    try:
+        cur.execute(f"SET SESSION time_zone='{SESSION_TIME_ZONE}', net_read_timeout=600, net_write_timeout=600")
+    finally:
+        cur.close()
+    return conn
+
+
+def _rows(conn, sql: str, params: Tuple[Any, ...] = ()) -> List[dict]:
+    cur = conn.cursor(dictionary=True)
+    try:
+        cur.execute(sql, params)
+        return cur.fetchall()
+    finally:
+        cur.close()
+
+
+def _exec(conn, sql: str, params: Tuple[Any, ...] = ()) -> int:
+    cur = conn.cursor()
+    try:
+        cur.execute(sql, params)
+        return cur.rowcount
+    finally:
+        cur.close()
+
+
+def _close_all(conns) -> None:
+    for conn in conns:
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+
+def _sha256(path: Path) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def _encode(value) -> bytes:
+    if value is None:
+        return b"\\N"
+    b = bytes(value)
+    for raw, escaped in _ESCAPES:
+        if raw in b:
+            b = b.replace(raw, escaped)
+    return b
+
+
+def _decode(field: bytes) -> Optional[bytes]:
+    if field == b"\\N":
+        return None
+    if b"\\" not in field:
+        return field
+    return _UNESCAPE_RE.sub(lambda m: _UNESCAPES.get(m.group(1), m.group(1)), field)
+
+
+def _run_parallel(tasks: List[Any], conns: List[Any], fn: Callable, progress: Optional[Callable] = None) -> List[Any]:
+    """
+    Runs fn(conn, task) for every task on len(conns) threads, each task on a
+    free connection. Results come back in task order; the first failure stops
+    the tasks not yet started and is raised.
+    """
+    free: "queue.Queue" = queue.Queue()
+    for conn in conns:
+        free.put(conn)
+    stop = threading.Event()
+
+    def run(task):
+        if stop.is_set():
+            return None
+        conn = free.get()
+        try:
+            return fn(conn, task)
+        finally:
+            free.put(conn)
+
+    with ThreadPoolExecutor(max_workers=max(1, len(conns)), thread_name_prefix="ppc-backup") as ex:
+        futures = [ex.submit(run, t) for t in tasks]
+        try:
+            for done, fut in enumerate(as_completed(futures), start=1):
+                fut.result()
+                if progress is not None:
+                    progress(done, len(tasks))
+        except BaseException:
+            stop.set()
+            for fut in futures:
+                fut.cancel()
+            raise
+    return [fut.result() for fut in futures]
+
+
+# -----------------------------
+# Backup
+# -----------------------------
+
+
+def _table_layout(conn, tables: Optional[List[str]]) -> Dict[str, dict]:
+    """Base tables of the current database with columns, primary key and size statistics."""
+    info = _rows(
+        conn,
+        """
+        SELECT TABLE_NAME, TABLE_ROWS, AVG_ROW_LENGTH
+        FROM information_schema.TABLES
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_TYPE = 'BASE TABLE'
+        ORDER BY TABLE_NAME
+        """,
+    )
+    layout = {
+        r["TABLE_NAME"]: {
+            "columns": [],
+            "pk": [],
+            "pk_type": None,
+            "est_rows": int(r["TABLE_ROWS"] or 0),
+            "avg_row_bytes": int(r["AVG_ROW_LENGTH"] or 0),
+        }
+        for r in info
+    }
+    if tables:
+        missing = sorted(set(tables) - set(layout))
+        if missing:
+            raise BackupError(f"Unknown tables: {', '.join(missing)}")
+        layout = {t: layout[t] for t in tables}
+
+    # generated columns are recomputed by the server and cannot be loaded
+    for r in _rows(
+        conn,
+        """
+        SELECT TABLE_NAME, COLUMN_NAME
+        FROM information_schema.COLUMNS
+        WHERE TABLE_SCHEMA = DATABASE() AND IFNULL(GENERATION_EXPRESSION, '') = ''
+        ORDER BY TABLE_NAME, ORDINAL_POSITION
+        """,
+    ):
+        t = layout.get(r["TABLE_NAME"])
+        if t is not None:
+            t["columns"].append(r["COLUMN_NAME"])
+    for r in _rows(
+        conn,
+        """
+        SELECT k.TABLE_NAME, k.COLUMN_NAME, c.DATA_TYPE
+        FROM information_schema.KEY_COLUMN_USAGE k
+        JOIN information_schema.COLUMNS c
+          ON c.TABLE_SCHEMA = k.TABLE_SCHEMA AND c.TABLE_NAME = k.TABLE_NAME AND c.COLUMN_NAME = k.COLUMN_NAME
+        WHERE k.TABLE_SCHEMA = DATABASE() AND k.CONSTRAINT_NAME = 'PRIMARY'
+        ORDER BY k.TABLE_NAME, k.ORDINAL_POSITION
+        """,
+    ):
+        t = layout.get(r["TABLE_NAME"])
+        if t is not None:
+            t["pk"].append(r["COLUMN_NAME"])
+            t["pk_type"] = str(r["DATA_TYPE"]).lower()
+
+    for name, t in layout.items():
+        ddl = _rows(conn, f"SHOW CREATE TABLE {_q(name)}")
+        t["ddl"] = ddl[0]["Create Table"] if ddl else None
+    return layout
+
+
+def _plan_chunks(conn, table: str, t: dict, chunk_bytes: int) -> List[dict]:
+    """
+    Primary-key ranges of about chunk_bytes each. Only a single integer key
+    can be split; other tables (small reference tables here) are one chunk.
+    The first and last range are open so no row falls outside the plan.
+    """
+    whole = [{"table": table, "lo": None, "hi": None}]
+    if len(t["pk"]) != 1 or t["pk_type"] not in _INT_TYPES:
+        return whole
+    pk = _q(t["pk"][0])
+    r = _rows(conn, f"SELECT MIN({pk}) AS lo, MAX({pk}) AS hi FROM {_q(table)}")[0]
+    if r["lo"] is None:
+        return whole
+    lo, hi = int(r["lo"]), int(r["hi"])
+    rows_per_chunk = max(1, chunk_bytes // max(1, t["avg_row_bytes"]))
+    # key gaps (deleted rows) make ranges sparser; widen the step to match
+    span = hi - lo + 1
+    step = max(1, math.ceil(rows_per_chunk * span / max(1, t["est_rows"])))
+    if step >= span:
+        return whole
+
+    chunks = []
+    for start in range(lo, hi + 1, step):
+        end = start + step - 1
+        chunks.append({"table": table, "lo": None if start == lo else start, "hi": None if end >= hi else end})
+    return chunks
+
+
+class _HashingWriter:
+    """File wrapper that hashes and counts the (compressed) bytes written."""
+
+    def __init__(self, f):
+        self.f = f
+        self.sha = hashlib.sha256()
+        self.size = 0
+
+    def write(self, data) -> int:
+        self.sha.update(data)
+        self.size += len(data)
+        return self.f.write(data)
+
+    def flush(self) -> None:
+        self.f.flush()
+
+
+def _dump_chunk(conn, chunk: dict, layout: Dict[str, dict], out_dir: Path, level: int) -> dict:
+    t = layout[chunk["table"]]
+    where, params = [], []
+    if t["pk"] and (chunk["lo"] is not None or chunk["hi"] is not None):
+        pk = _q(t["pk"][0])
+        if chunk["lo"] is not None:
+            where.append(f"{pk} >= %s")
+            params.append(chunk["lo"])
+        if chunk["hi"] is not None:
+            where.append(f"{pk} <= %s")
+            params.append(chunk["hi"])
+    sql = f"SELECT {', '.join(_q(c) for c in t['columns'])} FROM {_q(chunk['table'])}"
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    if t["pk"]:
+        sql += " ORDER BY " + ", ".join(_q(c) for c in t["pk"])
+
+    rel = Path(chunk["table"]) / f"{chunk['table']}.{chunk['seq']:05d}.tsv.gz"
+    path = out_dir / rel
+    path.parent.mkdir(parents=True, exist_ok=True)
+    rows = raw_bytes = 0
+    # raw: values come back as MySQL's own text form, written without conversion
+    cur = conn.cursor(raw=True, buffered=False)
+    try:
+        cur.execute(sql, tuple(params))
+        with open(path, "wb") as f:
+            hw = _HashingWriter(f)
+            with gzip.GzipFile(filename="", mode="wb", fileobj=hw, compresslevel=level, mtime=0) as gz:
+                while True:
+                    batch = cur.fetchmany(FETCH_SIZE)
+                    if not batch:
+                        break
+                    data = b"".join(b"\t".join(_encode(v) for v in row) + b"\n" for row in batch)
+                    gz.write(data)
+                    rows += len(batch)
+                    raw_bytes += len(data)
+    finally:
+        cur.close()
+    return {
+        "table": chunk["table"],
+        "file": rel.as_posix(),
+        "lo": chunk["lo"],
+        "hi": chunk["hi"],
+        "rows": rows,
+        "bytes": raw_bytes,
+        "size": hw.size,
+        "sha256": hw.sha.hexdigest(),
+    }
+
+
+def _snapshot_connections(params: Dict[str, Any], n: int) -> Tuple[List[Any], bool]:
+    """
+    n connections reading one consistent snapshot: their transactions start
+    while a global read lock holds writers back. Without the RELOAD privilege
+    the snapshots are started back to back instead, and the backup is marked
+    not consistent (rows written meanwhile may be in some tables only).
+    """
+    conns = [_connect(params) for _ in range(n)]
+    locker = _connect(params)
+    consistent = True
+    try:
+        try:
+            _exec(locker, "FLUSH TABLES WITH READ LOCK")
+        except Exception:
+            consistent = False
+        try:
+            for conn in conns:
+                conn.start_transaction(consistent_snapshot=True, isolation_level="REPEATABLE READ", readonly=True)
+        finally:
+            if consistent:
+                _exec(locker, "UNLOCK TABLES")
+    except Exception:
+        _close_all(conns)
+        raise
+    finally:
+        _close_all([locker])
+    return conns, consistent
+
+
+def backup(
+    out_dir: Optional[Path] = None,
+    tables: Optional[List[str]] = None,
+    workers: Optional[int] = None,
+    chunk_mb: Optional[float] = None,
+    level: Optional[int] = None,
+    progress: Optional[Callable[[int, int], None]] = None,
+) -> dict:
+    """
+    Dumps the database (or the given tables) into out_dir (default: a new
+    timestamped directory under BACKUP_DIR), one gzip chunk per primary-key
+    range, on `workers` connections sharing one snapshot. manifest.json is
+    written last, so a directory without it is an incomplete backup.
+    Returns the manifest plus "path".
+    """
+    started = time.monotonic()
+    workers = max(1, int(workers or BACKUP_WORKERS))
+    chunk_bytes = int(float(chunk_mb or BACKUP_CHUNK_MB) * 1024 * 1024)
+    level = BACKUP_GZIP_LEVEL if level is None else int(level)
+    out_dir = Path(out_dir) if out_dir else BACKUP_DIR / datetime.now().strftime("%Y%m%d-%H%M%S")
+    if (out_dir / MANIFEST).exists():
+        raise BackupError(f"{out_dir} already holds a backup")
+    out_dir.mkdir(parents=True, exist_ok=True)
+
+    params = get_conn_params()
+    conns, consistent = _snapshot_connections(params, workers)
+    try:
+        # planned inside the snapshot, so the ranges match the rows the workers see
+        layout = _table_layout(conns[0], tables)
+        chunks = []
+        for name, t in layout.items():
+            for seq, chunk in enumerate(_plan_chunks(conns[0], name, t, chunk_bytes)):
+                chunks.append({**chunk, "seq": seq})
+        # largest tables first so one big table does not finish last alone
+        order = sorted(chunks, key=lambda c: -layout[c["table"]]["avg_row_bytes"] * layout[c["table"]]["est_rows"])
+        done = _run_parallel(order, conns, lambda conn, c: _dump_chunk(conn, c, layout, out_dir, level), progress)
+    finally:
+        _close_all(conns)
+
+    by_table: Dict[str, List[dict]] = {name: [] for name in layout}
+    for result in done:
+        by_table[result.pop("table")].append(result)
+    manifest = {
+        "format": FORMAT,
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "database": params.get("database"),
+        "consistent": consistent,
+        "time_zone": SESSION_TIME_ZONE,
+        "tables": {
+            name: {
+                "columns": t["columns"],
+                "pk": t["pk"],
+                "ddl": t["ddl"],
+                "rows": sum(c["rows"] for c in by_table[name]),
+                "chunks": sorted(by_table[name], key=lambda c: c["file"]),
+            }
+            for name, t in layout.items()
+        },
+        "elapsed_s": round(time.monotonic() - started, 1),
+    }
+    tmp = out_dir / (MANIFEST + ".tmp")
+    tmp.write_text(json.dumps(manifest, indent=1, default=str), encoding="utf-8")
+    os.replace(tmp, out_dir / MANIFEST)
+    return {**manifest, "path": str(out_dir)}
+
+
+def read_manifest(src_dir: Path) -> dict:
+    path = Path(src_dir) / MANIFEST
+    if not path.exists():
+        raise BackupError(f"{src_dir} has no {MANIFEST} (incomplete or not a backup)")
+    manifest = json.loads(path.read_text(encoding="utf-8"))
+    if manifest.get("format") != FORMAT:
+        raise BackupError(f"Unsupported backup format: {manifest.get('format')}")
+    return manifest
+
+
+def _check_chunk(src_dir: Path, chunk: dict) -> None:
+    path = Path(src_dir) / chunk["file"]
+    if not path.exists():
+        raise BackupError(f"Missing chunk {chunk['file']}")
+    if _sha256(path) != chunk["sha256"]:
+        raise BackupError(f"Checksum mismatch in {chunk['file']}")
+
+
+def verify(src_dir: Path, workers: Optional[int] = None) -> dict:
+    """Checks every chunk against the manifest checksums, in parallel. Raises BackupError on the first bad chunk."""
+    manifest = read_manifest(src_dir)
+    chunks = [c for t in manifest["tables"].values() for c in t["chunks"]]
+    with ThreadPoolExecutor(max_workers=max(1, int(workers or BACKUP_WORKERS))) as ex:
+        list(ex.map(lambda c: _check_chunk(src_dir, c), chunks))
+    return {
+        "tables": len(manifest["tables"]),
+        "chunks": len(chunks),
+        "rows": sum(t["rows"] for t in manifest["tables"].values()),
+        "consistent": manifest["consistent"],
+    }
+
+
+# -----------------------------
+# Restore
+# -----------------------------
+
+
+def _deferrable_indexes(conn, tables: List[str]) -> Dict[str, List[dict]]:
+    """
+    Secondary indexes of the tables, except those a foreign key needs (MySQL
+    refuses to drop them). Dropped before the load and rebuilt after it: one
+    sorted build per table is much faster than row-by-row index updates.
+    """
+    if not tables:
+        return {}
+    marks = ",".join(["%s"] * len(tables))
+    stats = _rows(
+        conn,
+        f"""
+        SELECT TABLE_NAME, INDEX_NAME, NON_UNIQUE, INDEX_TYPE, SEQ_IN_INDEX, COLUMN_NAME, SUB_PART
+        FROM information_schema.STATISTICS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME IN ({marks}) AND INDEX_NAME <> 'PRIMARY'
+        ORDER BY TABLE_NAME, INDEX_NAME, SEQ_IN_INDEX
+        """,
+        tuple(tables),
+    )
+    fks = _rows(
+        conn,
+        """
+        SELECT TABLE_NAME, CONSTRAINT_NAME, COLUMN_NAME, REFERENCED_TABLE_NAME, REFERENCED_COLUMN_NAME
+        FROM information_schema.KEY_COLUMN_USAGE
+        WHERE TABLE_SCHEMA = DATABASE() AND REFERENCED_TABLE_NAME IS NOT NULL
+        ORDER BY TABLE_NAME, CONSTRAINT_NAME, ORDINAL_POSITION
+        """,
+    )
+    needed: Dict[Tuple[str, str], List[str]] = {}
+    for r in fks:
+        needed.setdefault((r["TABLE_NAME"], "child:" + r["CONSTRAINT_NAME"]), []).append(r["COLUMN_NAME"].lower())
+        needed.setdefault((r["REFERENCED_TABLE_NAME"], "parent:" + r["CONSTRAINT_NAME"]), []).append(
+            r["REFERENCED_COLUMN_NAME"].lower()
+        )
+
+    indexes: Dict[Tuple[str, str], dict] = {}
+    functional = set()
+    for r in stats:
+        if r["COLUMN_NAME"] is None:
+            # functional key part (an expression): left in place, _index_clause cannot rebuild it
+            functional.add((r["TABLE_NAME"], r["INDEX_NAME"]))
+        idx = indexes.setdefault(
+            (r["TABLE_NAME"], r["INDEX_NAME"]),
+            {"name": r["INDEX_NAME"], "unique": not int(r["NON_UNIQUE"]), "type": r["INDEX_TYPE"], "columns": []},
+        )
+        idx["columns"].append((r["COLUMN_NAME"], r["SUB_PART"]))
+
+    out: Dict[str, List[dict]] = {}
+    for (table, name), idx in indexes.items():
+        if (table, name) in functional:
+            continue
+        cols = [c.lower() for c, _ in idx["columns"] if c is not None]
+        if any(t == table and cols[: len(fk)] == fk for (t, _), fk in needed.items()):
+            continue
+        out.setdefault(table, []).append(idx)
+    return out
+
+
+def _index_clause(idx: dict) -> str:
+    cols = ", ".join(_q(c) + (f"({int(sub)})" if sub else "") for c, sub in idx["columns"])
+    kind = {"FULLTEXT": "FULLTEXT INDEX", "SPATIAL": "SPATIAL INDEX"}.get(idx["type"])
+    kind = kind or ("UNIQUE INDEX" if idx["unique"] else "INDEX")
+    return f"ADD {kind} {_q(idx['name'])} ({cols})"
+
+
+def _add_indexes_sql(table: str, idxs: List[dict]) -> str:
+    # one ALTER per table builds all its indexes in one pass
+    return f"ALTER TABLE {_q(table)} " + ", ".join(_index_clause(i) for i in idxs)
+
+
+def _save_index_sql(deferred: Dict[str, List[dict]]) -> Path:
+    """
+    Writes the statements that re-create the deferred indexes before any is
+    dropped, so they can be run by hand if the restore process dies.
+    """
+    path = BACKUP_DIR / f"restore-{datetime.now().strftime('%Y%m%d-%H%M%S')}-indexes.sql"
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text("".join(_add_indexes_sql(t, idxs) + ";\n" for t, idxs in deferred.items()), encoding="utf-8")
+    return path
+
+
+def _rebuild_indexes(deferred: Dict[str, List[dict]], conns: List[Any]) -> Tuple[List[str], List[str]]:
+    """(rebuilt "table.index" names, errors); tables in parallel, a failed table does not stop the others."""
+
+    def build(conn, job):
+        table, idxs = job
+        try:
+            _exec(conn, _add_indexes_sql(table, idxs))
+        except Exception as ex:
+            return f"{table}: {ex}"
+        return None
+
+    results = _run_parallel(list(deferred.items()), conns, build)
+    rebuilt = [f"{table}.{i['name']}" for (table, idxs), err in zip(deferred.items(), results) if err is None for i in idxs]
+    return rebuilt, [err for err in results if err is not None]
+
+
+def _prepare_tables(conn, manifest: dict, tables: List[str], create_tables: bool, truncate: bool) -> None:
+    existing = {r["TABLE_NAME"] for r in _rows(
+        conn, "SELECT TABLE_NAME FROM information_schema.TABLES WHERE TABLE_SCHEMA = DATABASE()"
+    )}
+    for name in tables:
+        t = manifest["tables"][name]
+        if name not in existing:
+            if not create_tables or not t.get("ddl"):
+                raise BackupError(f"Table {name} does not exist in the target database")
+            _exec(conn, t["ddl"])
+            continue
+        if truncate:
+            _exec(conn, f"TRUNCATE TABLE {_q(name)}")
+        elif _rows(conn, f"SELECT 1 AS x FROM {_q(name)} LIMIT 1"):
+            raise BackupError(f"Table {name} is not empty; restore with truncate to replace its rows")
+
+
+class _Loader:
+    """Loads chunks on one connection; switches from LOAD DATA to INSERT when the server refuses LOCAL INFILE."""
+
+    def __init__(self, src_dir: Path, manifest: dict, method: str, batch_bytes: int, tmp_dir: Path):
+        self.src_dir = Path(src_dir)
+        self.manifest = manifest
+        self.method = method
+        self.batch_bytes = batch_bytes
+        self.tmp_dir = tmp_dir
+        self.fallback_reason: Optional[str] = None
+
+    def load(self, conn, chunk: dict) -> int:
+        _check_chunk(self.src_dir, chunk)
+        table = chunk["table"]
+        columns = self.manifest["tables"][table]["columns"]
+        if self.method != METHOD_INSERT:
+            try:
+                n = self._load_data(conn, table, columns, chunk)
+            except Exception as ex:
+                if self.method == METHOD_LOAD_DATA or getattr(ex, "errno", None) not in _LOCAL_INFILE_ERRNOS:
+                    raise
+                conn.rollback()
+                self.method = METHOD_INSERT
+                self.fallback_reason = str(ex)
+            else:
+                return n
+        return self._insert(conn, table, columns, chunk)
+
+    def _load_data(self, conn, table: str, columns: List[str], chunk: dict) -> int:
+        fd, tmp = tempfile.mkstemp(suffix=".tsv", dir=self.tmp_dir)
+        try:
+            with os.fdopen(fd, "wb") as out, gzip.open(self.src_dir / chunk["file"], "rb") as src:
+                shutil.copyfileobj(src, out, 1024 * 1024)
+            n = _exec(conn, _LOAD_SQL.format(table=_q(table), columns=", ".join(_q(c) for c in columns)), (tmp,))
+            # LOCAL turns row errors into warnings (e.g. skipped duplicates): check the count instead
+            if n != chunk["rows"]:
+                raise BackupError(f"{chunk['file']}: loaded {n} of {chunk['rows']} rows")
+            conn.commit()
+            return n
+        finally:
+            os.unlink(tmp)
+
+    def _insert(self, conn, table: str, columns: List[str], chunk: dict) -> int:
+        # executemany() sends each batch as one multi-row INSERT
+        sql = (
+            f"INSERT INTO {_q(table)} ({', '.join(_q(c) for c in columns)}) "
+            f"VALUES ({', '.join(['%s'] * len(columns))})"
+        )
+        n = 0
+        batch: List[tuple] = []
+        size = 0
+        cur = conn.cursor()
+        try:
+            with gzip.open(self.src_dir / chunk["file"], "rb") as src:
+                for line in src:
+                    row = tuple(_decode(f) for f in line.rstrip(b"\n").split(b"\t"))
+                    batch.append(row)
+                    size += len(line)
+                    if size >= self.batch_bytes:
+                        cur.executemany(sql, batch)
+                        n += len(batch)
+                        batch, size = [], 0
+                if batch:
+                    cur.executemany(sql, batch)
+                    n += len(batch)
+            if n != chunk["rows"]:
+                raise BackupError(f"{chunk['file']}: read {n} of {chunk['rows']} rows")
+            conn.commit()
+        finally:
+            cur.close()
+        return n
+
+
+def _loader_connection(params: Dict[str, Any]):
+    conn = _connect(params, allow_local_infile=True, autocommit=False)
+    # the backup was consistent; per-row checks only slow the load down
+    _exec(conn, "SET SESSION foreign_key_checks=0, unique_checks=0")
+    return conn
+
+
+def restore(
+    src_dir: Path,
+    tables: Optional[List[str]] = None,
+    workers: Optional[int] = None,
+    method: Optional[str] = None,
+    create_tables: bool = True,
+    truncate: bool = False,
+    progress: Optional[Callable[[int, int], None]] = None,
+) -> dict:
+    """
+    Loads a backup into the configured database. Target tables must be empty
+    (or truncate=True); missing ones are created from the saved DDL.
+    Secondary indexes are dropped first and rebuilt once all chunks are in,
+    also when the load fails; their statements are saved under BACKUP_DIR
+    before the drop and the file is removed once they are rebuilt. A load
+    error is raised as is, with any rebuild failure noted on it. Chunks load
+    in parallel, biggest first, each in its own transaction after its
+    checksum is verified.
+    """
+    started = time.monotonic()
+    manifest = read_manifest(src_dir)
+    method = method or BACKUP_RESTORE_METHOD
+    if method not in METHODS:
+        raise ValueError(f"Unknown restore method: {method}")
+    names = list(tables) if tables else list(manifest["tables"])
+    unknown = sorted(set(names) - set(manifest["tables"]))
+    if unknown:
+        raise BackupError(f"Not in this backup: {', '.join(unknown)}")
+    workers = max(1, int(workers or BACKUP_WORKERS))
+
+    params = get_conn_params()
+    admin = _loader_connection(params)
+    conns: List[Any] = []
+    rebuilt: List[str] = []
+    try:
+        _prepare_tables(admin, manifest, names, create_tables, truncate)
+        deferred = _deferrable_indexes(admin, names)
+        index_sql = _save_index_sql(deferred) if deferred else None
+        dropped: Dict[str, List[dict]] = {}
+
+        try:
+            for table, idxs in deferred.items():
+                _exec(admin, f"ALTER TABLE {_q(table)} " + ", ".join(f"DROP INDEX {_q(i['name'])}" for i in idxs))
+                dropped[table] = idxs
+            chunks = [
+                {**c, "table": name}
+                for name in names
+                for c in manifest["tables"][name]["chunks"]
+                if c["rows"]
+            ]
+            chunks.sort(key=lambda c: -c["size"])
+            conns = [_loader_connection(params) for _ in range(min(workers, max(1, len(chunks))))]
+            with tempfile.TemporaryDirectory(prefix="ppc-restore-") as tmp:
+                loader = _Loader(src_dir, manifest, method, int(BACKUP_INSERT_BATCH_MB * 1024 * 1024), Path(tmp))
+                loaded = _run_parallel(chunks, conns, loader.load, progress)
+        except BaseException as load_error:
+            if dropped:
+                _, errors = _rebuild_indexes(dropped, conns or [admin])
+                if errors:
+                    # the load error stays the one raised
+                    note = f"Index rebuild also failed ({'; '.join(errors)}); statements in {index_sql}"
+                    if hasattr(load_error, "add_note"):
+                        load_error.add_note(note)
+                    load_error.index_rebuild_errors = errors
+                elif len(dropped) == len(deferred):
+                    index_sql.unlink(missing_ok=True)
+            raise
+        if dropped:
+            rebuilt, errors = _rebuild_indexes(dropped, conns or [admin])
+            if errors:
+                raise BackupError(
+                    f"Rows loaded but the index rebuild failed ({'; '.join(errors)}); statements in {index_sql}"
+                )
+            index_sql.unlink(missing_ok=True)
+
+        for name in names:
+            _rows(admin, f"ANALYZE TABLE {_q(name)}")
+    finally:
+        _close_all(conns + [admin])
+
+    # reference data and charts cached by running servers are now out of date
+    from core.charts import CACHE_NS_CHARTS
+
+    for ns in (CACHE_NS_PROVINCES, CACHE_NS_BANKS, CACHE_NS_CHARTS):
+        cache.invalidate(ns)
+
+    return {
+        "tables": len(names),
+        "chunks": len(loaded),
+        "rows": sum(loaded),
+        "method": loader.method,
+        "fallback_reason": loader.fallback_reason,
+        "indexes_rebuilt": rebuilt,
+        "backup_consistent": manifest["consistent"],
+        "elapsed_s": round(time.monotonic() - started, 1),
+    }
@@ -0,0 +1,356 @@
+from __future__ import annotations
+
+import hashlib
+import pickle
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from core.settings import (
+    CACHE_BACKEND,
+    CACHE_DIR,
+    CACHE_MEMORY_ENTRIES,
+    CACHE_POLL_S,
+    CACHE_REDIS_URL,
+    CACHE_SHARED_MAX_ENTRIES,
+)
+from core.startup import optional_import
+
+# -----------------------------
+# Two-tier cache shared by server processes
+# -----------------------------
+# هر process یک cache در حافظه دارد و همه‌ی processها یک tier مشترک
+# (فایل SQLite روی همان سرور، یا Redis) و یک جریان پیام invalidation.
+#
+# Keys are versioned: namespace generation + caller's data version + key.
+# invalidate(namespace) bumps the generation in the shared tier and appends
+# a message; every process reads new messages at most every CACHE_POLL_S, so
+# a memory entry outlives an invalidation from another process by at most
+# that long. Values are pickled: the shared tier must only be writable by
+# the application's own processes.
+
+# messages older than this are pruned; a process that slept longer reloads all generations
+_MESSAGE_KEEP_S = 24 * 3600
+_PRUNE_INTERVAL_S = 300
+
+
+def _digest(value: Any) -> str:
+    return hashlib.sha1(repr(value).encode("utf-8")).hexdigest()
+
+
+class SqliteTier:
+    """Shared tier in one SQLite file (WAL), for processes on the same machine."""
+
+    name = "sqlite"
+
+    def __init__(self, path: Path, max_entries: int = CACHE_SHARED_MAX_ENTRIES):
+        self.path = Path(path)
+        self.max_entries = max_entries
+        self._local = threading.local()
+        self._last_prune = 0.0
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(str(self.path), timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS entries (Key TEXT PRIMARY KEY, Value BLOB NOT NULL, Expires REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_entries_expires ON entries (Expires)")
+            conn.execute("CREATE TABLE IF NOT EXISTS generations (Namespace TEXT PRIMARY KEY, Gen INTEGER NOT NULL)")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS messages (
+                  Message_ID INTEGER PRIMARY KEY AUTOINCREMENT,
+                  Namespace  TEXT    NOT NULL,
+                  Gen        INTEGER NOT NULL,
+                  At         REAL    NOT NULL
+                )
+                """
+            )
+            self._local.conn = conn
+        return conn
+
+    def get(self, key: str) -> Optional[bytes]:
+        row = self._conn().execute("SELECT Value, Expires FROM entries WHERE Key=?", (key,)).fetchone()
+        if row is None or row[1] < time.time():
+            return None
+        return row[0]
+
+    def set(self, key: str, value: bytes, ttl_s: float) -> None:
+        conn = self._conn()
+        conn.execute(
+            "INSERT OR REPLACE INTO entries (Key, Value, Expires) VALUES (?, ?, ?)",
+            (key, sqlite3.Binary(value), time.time() + ttl_s),
+        )
+        if time.monotonic() - self._last_prune > _PRUNE_INTERVAL_S:
+            self._last_prune = time.monotonic()
+            self.prune()
+
+    def publish(self, namespace: str) -> int:
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(
+                "INSERT INTO generations (Namespace, Gen) VALUES (?, 1) "
+                "ON CONFLICT(Namespace) DO UPDATE SET Gen = Gen + 1",
+                (namespace,),
+            )
+            gen = conn.execute("SELECT Gen FROM generations WHERE Namespace=?", (namespace,)).fetchone()[0]
+            conn.execute("INSERT INTO messages (Namespace, Gen, At) VALUES (?, ?, ?)", (namespace, gen, time.time()))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return int(gen)
+
+    def generations(self) -> Tuple[Dict[str, int], Any]:
+        """(all generations, cursor of the latest message)."""
+        conn = self._conn()
+        last = conn.execute("SELECT COALESCE(MAX(Message_ID), 0) FROM messages").fetchone()[0]
+        gens = dict(conn.execute("SELECT Namespace, Gen FROM generations").fetchall())
+        return gens, int(last)
+
+    def messages_since(self, cursor: Any) -> Tuple[Optional[List[Tuple[str, int]]], Any]:
+        """([(namespace, generation)], new cursor); None when the cursor was pruned away."""
+        conn = self._conn()
+        first = conn.execute("SELECT MIN(Message_ID) FROM messages").fetchone()[0]
+        if first is not None and int(cursor) + 1 < first:
+            return None, cursor
+        rows = conn.execute(
+            "SELECT Message_ID, Namespace, Gen FROM messages WHERE Message_ID > ? ORDER BY Message_ID",
+            (int(cursor),),
+        ).fetchall()
+        if not rows:
+            return [], cursor
+        return [(ns, int(gen)) for _, ns, gen in rows], int(rows[-1][0])
+
+    def prune(self) -> None:
+        conn = self._conn()
+        conn.execute("DELETE FROM entries WHERE Expires < ?", (time.time(),))
+        conn.execute("DELETE FROM messages WHERE At < ?", (time.time() - _MESSAGE_KEEP_S,))
+        count = conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+        if count > self.max_entries:
+            # the soonest to expire go first
+            conn.execute(
+                "DELETE FROM entries WHERE Key IN (SELECT Key FROM entries ORDER BY Expires LIMIT ?)",
+                (count - self.max_entries,),
+            )
+
+
+class RedisTier:
+    """Shared tier on a Redis-protocol server (Redis, Valkey, KeyDB), for processes on several machines."""
+
+    name = "redis"
+    _PREFIX = "ppc:cache:"
+
+    def __init__(self, url: str):
+        redis = optional_import("redis")
+        if redis is None:
+            raise RuntimeError("CACHE_BACKEND=redis needs the redis package.")
+        self._r = redis.Redis.from_url(url)
+
+    def get(self, key: str) -> Optional[bytes]:
+        return self._r.get(self._PREFIX + "e:" + key)
+
+    def set(self, key: str, value: bytes, ttl_s: float) -> None:
+        self._r.set(self._PREFIX + "e:" + key, value, ex=max(1, int(ttl_s)))
+
+    def publish(self, namespace: str) -> int:
+        gen = int(self._r.hincrby(self._PREFIX + "gen", namespace, 1))
+        self._r.xadd(self._PREFIX + "messages", {"ns": namespace, "gen": gen}, maxlen=10000, approximate=True)
+        return gen
+
+    def generations(self) -> Tuple[Dict[str, int], Any]:
+        last = self._r.xrevrange(self._PREFIX + "messages", count=1)
+        cursor = last[0][0] if last else b"0-0"
+        gens = {k.decode(): int(v) for k, v in self._r.hgetall(self._PREFIX + "gen").items()}
+        return gens, cursor
+
+    def messages_since(self, cursor: Any) -> Tuple[Optional[List[Tuple[str, int]]], Any]:
+        rows = self._r.xrange(self._PREFIX + "messages", min=b"(" + cursor, max="+")
+        if not rows:
+            return [], cursor
+        return [(f[b"ns"].decode(), int(f[b"gen"])) for _, f in rows], rows[-1][0]
+
+    def prune(self) -> None:
+        pass  # keys expire by TTL; the stream is capped by MAXLEN
+
+
+class Cache:
+    def __init__(self, shared=None, memory_entries: int = CACHE_MEMORY_ENTRIES, poll_s: float = CACHE_POLL_S):
+        self.shared = shared
+        self.memory_entries = memory_entries
+        self.poll_s = poll_s
+        self._memory: "OrderedDict[str, tuple]" = OrderedDict()  # key -> (expires, value)
+        self._lock = threading.Lock()
+        self._gens: Dict[str, int] = {}
+        self._cursor: Any = None
+        self._synced = 0.0
+        self._stats: Dict[str, int] = {}
+
+    def _count(self, name: str) -> None:
+        self._stats[name] = self._stats.get(name, 0) + 1
+
+    # ---- invalidation stream ----
+
+    def _sync(self) -> None:
+        if self.shared is None or time.monotonic() - self._synced < self.poll_s:
+            return
+        with self._lock:
+            if time.monotonic() - self._synced < self.poll_s:
+                return
+            self._synced = time.monotonic()
+        try:
+            if self._cursor is None:
+                gens, cursor = self.shared.generations()
+            else:
+                messages, cursor = self.shared.messages_since(self._cursor)
+                if messages is None:
+                    gens, cursor = self.shared.generations()
+                else:
+                    gens = {}
+                    for ns, gen in messages:
+                        gens[ns] = max(gens.get(ns, 0), gen)
+                        self._count("invalidations_received")
+        except Exception:
+            self._count("shared_errors")
+            return
+        # merged, not replaced: an invalidate() of this process may have raised
+        # a generation while the shared tier was being read
+        with self._lock:
+            for ns, gen in gens.items():
+                self._gens[ns] = max(self._gens.get(ns, 0), gen)
+            self._cursor = cursor
+
+    def invalidate(self, namespace: str) -> None:
+        """Makes every cached value of the namespace unreachable, in all processes."""
+        gen = None
+        if self.shared is not None:
+            try:
+                gen = self.shared.publish(namespace)
+            except Exception:
+                self._count("shared_errors")
+        with self._lock:
+            self._gens[namespace] = gen if gen is not None else self._gens.get(namespace, 0) + 1
+            self._count("invalidations_sent")
+
+    # ---- lookups ----
+
+    def _key(self, namespace: str, key: Any, version: Any) -> str:
+        return f"{namespace}:{self._gens.get(namespace, 0)}:{_digest((version, key))}"
+
+    def _memory_get(self, full_key: str):
+        with self._lock:
+            entry = self._memory.get(full_key)
+            if entry is None:
+                return None
+            if entry[0] < time.monotonic():
+                del self._memory[full_key]
+                return None
+            self._memory.move_to_end(full_key)
+            return entry
+
+    def _memory_put(self, full_key: str, value: Any, ttl_s: float) -> None:
+        with self._lock:
+            self._memory[full_key] = (time.monotonic() + ttl_s, value)
+            self._memory.move_to_end(full_key)
+            while len(self._memory) > self.memory_entries:
+                self._memory.popitem(last=False)
+
+    def get(self, namespace: str, key: Any, version: Any = None, ttl_s: float = 300) -> Tuple[bool, Any]:
+        """(found, value) from the memory tier, then the shared tier."""
+        self._sync()
+        return self._get(self._key(namespace, key, version), ttl_s)
+
+    def _get(self, full_key: str, ttl_s: float) -> Tuple[bool, Any]:
+        entry = self._memory_get(full_key)
+        if entry is not None:
+            self._count("memory_hits")
+            return True, entry[1]
+        if self.shared is not None:
+            try:
+                raw = self.shared.get(full_key)
+            except Exception:
+                self._count("shared_errors")
+                raw = None
+            if raw is not None:
+                value = pickle.loads(raw)
+                self._memory_put(full_key, value, ttl_s)
+                self._count("shared_hits")
+                return True, value
+        return False, None
+
+    def put(self, namespace: str, key: Any, value: Any, version: Any = None, ttl_s: float = 300) -> None:
+        self._put(self._key(namespace, key, version), value, ttl_s)
+
+    def _put(self, full_key: str, value: Any, ttl_s: float) -> None:
+        self._memory_put(full_key, value, ttl_s)
+        if self.shared is not None:
+            try:
+                self.shared.set(full_key, pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL), ttl_s)
+            except Exception:
+                self._count("shared_errors")
+
+    def get_or_load(
+        self,
+        namespace: str,
+        key: Any,
+        loader: Callable[[], Any],
+        ttl_s: float = 300,
+        version: Any = None,
+        cacheable: Optional[Callable[[Any], bool]] = None,
+    ) -> Any:
+        """
+        Cached value of loader() for (namespace, key, version). version is the
+        caller's data version (e.g. a change-feed watermark); a new version
+        misses without an invalidation. Values failing cacheable are returned
+        but not stored.
+        """
+        self._sync()
+        # the generation is taken before loading: an invalidate() landing
+        # during loader() must not let the old data in under the new one
+        full_key = self._key(namespace, key, version)
+        found, value = self._get(full_key, ttl_s)
+        if found:
+            return value
+        self._count("misses")
+        value = loader()
+        if cacheable is None or cacheable(value):
+            self._put(full_key, value, ttl_s)
+        return value
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            out: Dict[str, Any] = dict(self._stats)
+            out["memory_entries"] = len(self._memory)
+            out["namespaces"] = len(self._gens)
+        out["backend"] = self.shared.name if self.shared is not None else "memory"
+        if _tier_error:
+            out["backend_error"] = _tier_error
+        return out
+
+
+_tier_error: Optional[str] = None
+
+
+def _shared_tier():
+    """The configured shared tier; a tier that cannot start leaves the cache memory-only."""
+    global _tier_error
+    try:
+        if CACHE_BACKEND == "redis":
+            return RedisTier(CACHE_REDIS_URL)
+        if CACHE_BACKEND == "sqlite":
+            return SqliteTier(CACHE_DIR / "cache.sqlite3")
+    except Exception as ex:
+        _tier_error = str(ex)
+    return None
+
+
+cache = Cache(_shared_tier())
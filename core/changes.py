@@ -0,0 +1,144 @@
+from __future__ import annotations
+
+from typing import Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import pandas as pd
+
+# -----------------------------
+# Change feed (outbox)
+# -----------------------------
+# هر writer در core.db در همان تراکنش یک ردیف در change_log می‌نویسد؛
+# مصرف‌کننده‌ها (cache، ایندکس جستجو، خلاصه‌ها) فقط تغییرات بعد از watermark خود را می‌خوانند.
+
+ENTITY_SURVEYOR = "surveyor"
+ENTITY_PROJECT = "project"
+ENTITY_BANK = "bank"
+ENTITY_ACCOUNT = "account"
+ENTITY_ASSIGNMENT = "assignment"
+
+OP_INSERT = "I"
+OP_UPDATE = "U"
+OP_DELETE = "D"
+
+# A change is only handed out once it is this old, so a transaction that got a
+# lower Change_ID but committed later is not skipped by a consumer.
+SETTLE_SECONDS = 5
+
+
+def ensure_change_log_table() -> None:
+    from core.db import execute
+
+    execute(
+        """
+        CREATE TABLE IF NOT EXISTS change_log (
+          Change_ID  BIGINT       NOT NULL AUTO_INCREMENT PRIMARY KEY,
+          Entity     VARCHAR(16)  NOT NULL,
+          Entity_ID  BIGINT       NOT NULL,
+          Op         CHAR(1)      NOT NULL,
+          Changed_At TIMESTAMP(3) NOT NULL DEFAULT CURRENT_TIMESTAMP(3),
+          KEY idx_change_entity (Entity, Change_ID),
+          KEY idx_change_at (Changed_At)
+        )
+        """
+    )
+
+
+def record_change_tx(conn, entity: str, entity_id: int, op: str) -> None:
+    """Writes one change row inside the caller's transaction."""
+    record_changes_tx(conn, entity, [entity_id], op)
+
+
+def record_changes_tx(conn, entity: str, entity_ids: Iterable[int], op: str) -> None:
+    rows = [(entity, int(i), op) for i in entity_ids]
+    if not rows:
+        return
+    cur = conn.cursor()
+    try:
+        cur.executemany("INSERT INTO change_log (Entity, Entity_ID, Op) VALUES (%s,%s,%s)", rows)
+    finally:
+        try:
+            cur.close()
+        except Exception:
+            pass
+
+
+def changes_since(
+    watermark: int,
+    entities: Optional[Sequence[str]] = None,
+    limit: int = 1000,
+) -> Tuple[pd.DataFrame, int]:
+    """
+    Returns (changes, new_watermark). Changes are ordered by Change_ID and
+    collapsed to the latest op per (Entity, Entity_ID); pass new_watermark
+    back on the next call. An empty frame means the consumer is up to date.
+    """
+    from core.db import query_df
+
+    params: List = [int(watermark)]
+    entity_sql = ""
+    if entities:
+        entity_sql = f"AND Entity IN ({','.join(['%s'] * len(entities))})"
+        params.extend(entities)
+    params.append(int(limit))
+
+    df = query_df(
+        f"""
+        SELECT Change_ID, Entity, Entity_ID, Op, Changed_At
+        FROM change_log
+        WHERE Change_ID > %s
+          {entity_sql}
+          AND Changed_At <= NOW(3) - INTERVAL {int(SETTLE_SECONDS)} SECOND
+        ORDER BY Change_ID
+        LIMIT %s
+        """,
+        tuple(params),
+        site="batch",
+    )
+    if df.empty:
+        return pd.DataFrame(columns=["Change_ID", "Entity", "Entity_ID", "Op", "Changed_At"]), int(watermark)
+
+    new_watermark = int(df["Change_ID"].iloc[-1])
+    df = df.drop_duplicates(subset=["Entity", "Entity_ID"], keep="last").reset_index(drop=True)
+    return df, new_watermark
+
+
+def iter_changes(
+    watermark: int,
+    entities: Optional[Sequence[str]] = None,
+    batch_size: int = 1000,
+) -> Iterator[Tuple[pd.DataFrame, int]]:
+    """Yields (batch, watermark_after_batch) until caught up."""
+    while True:
+        df, watermark = changes_since(watermark, entities, batch_size)
+        if df.empty:
+            return
+        yield df, watermark
+
+
+def current_watermark(entities: Optional[Sequence[str]] = None) -> int:
+    """
+    Highest Change_ID for the entities (0 if none). Cheap enough to use as a
+    data-version token for caches.
+    """
+    from core.db import query_df
+
+    if entities:
+        marks = ",".join(["%s"] * len(entities))
+        df = query_df(
+            f"SELECT COALESCE(MAX(Change_ID), 0) AS w FROM change_log WHERE Entity IN ({marks})",
+            tuple(entities),
+            site="lookup",
+        )
+    else:
+        df = query_df("SELECT COALESCE(MAX(Change_ID), 0) AS w FROM change_log", site="lookup")
+    return int(df.iloc[0]["w"]) if not df.empty else 0
+
+
+def prune_changes(keep_days: int = 30) -> int:
+    """Deletes changes older than keep_days (consumers must not lag that far)."""
+    from core.db import execute
+
+    return execute(
+        "DELETE FROM change_log WHERE Changed_At < NOW(3) - INTERVAL %s DAY",
+        (int(keep_days),),
+    )
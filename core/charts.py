@@ -0,0 +1,192 @@
+from __future__ import annotations
+
+import io
+import threading
+import time
+from typing import Callable, Dict, Optional, Tuple
+
+import pandas as pd
+
+from core.cache import cache
+from core.changes import current_watermark, ENTITY_SURVEYOR, ENTITY_PROJECT, ENTITY_ASSIGNMENT
+from core.db import query_df
+from core.startup import optional_import
+
+# -----------------------------
+# Server-rendered charts
+# -----------------------------
+# هر نمودار از یک کوئری تجمیعی ساخته می‌شود و PNG آن بین همه‌ی sessionها
+# نگه داشته می‌شود تا وقتی change_log نسخه‌ی جدیدی نشان دهد.
+
+# Upper bound on the age of a cached chart, for rows changed outside core.db writers.
+CHART_MAX_AGE_S = 900
+
+_THEMES = {
+    "light": {"bg": "#ffffff", "fg": "#1f2937", "bar": "#2563eb", "grid": "#e5e7eb"},
+    "dark": {"bg": "#0f172a", "fg": "#e5e7eb", "bar": "#60a5fa", "grid": "#334155"},
+}
+
+
+def _bar(ax, df: pd.DataFrame, x: str, y: str, colors: dict) -> None:
+    ax.bar(df[x].astype(str), df[y], color=colors["bar"])
+    ax.tick_params(axis="x", labelrotation=45)
+    for label in ax.get_xticklabels():
+        label.set_horizontalalignment("right")
+
+
+def _line(ax, df: pd.DataFrame, x: str, y: str, colors: dict) -> None:
+    ax.plot(df[x].astype(str), df[y], color=colors["bar"], marker="o", linewidth=2)
+    ax.tick_params(axis="x", labelrotation=45)
+    for label in ax.get_xticklabels():
+        label.set_horizontalalignment("right")
+
+
+# name -> (title, change-feed entities, SQL, x column, y column, draw function)
+CHARTS: Dict[str, Tuple[str, tuple, str, str, str, Callable]] = {
+    "surveyors_by_province": (
+        "Surveyors by permanent province",
+        (ENTITY_SURVEYOR,),
+        """
+        SELECT COALESCE(p.Province_Name, '(none)') AS Province_Name, COUNT(*) AS cnt
+        FROM surveyors s
+        LEFT JOIN provinces p ON p.Province_Code = s.Permanent_Province_Code
+        GROUP BY p.Province_Name
+        ORDER BY cnt DESC
+        LIMIT 12
+        """,
+        "Province_Name",
+        "cnt",
+        _bar,
+    ),
+    "assignments_by_project": (
+        "Active assignments by project",
+        (ENTITY_ASSIGNMENT, ENTITY_PROJECT, ENTITY_SURVEYOR),
+        """
+        SELECT pr.Project_Code, a.cnt
+        FROM (
+          SELECT Project_ID, COUNT(*) AS cnt
+          FROM project_surveyors
+          WHERE Status='ACTIVE'
+          GROUP BY Project_ID
+          ORDER BY cnt DESC
+          LIMIT 12
+        ) a
+        JOIN projects pr ON pr.Project_ID = a.Project_ID
+        ORDER BY a.cnt DESC
+        """,
+        "Project_Code",
+        "cnt",
+        _bar,
+    ),
+    "registrations_by_month": (
+        "Registrations per month (last 24 months)",
+        (ENTITY_SURVEYOR,),
+        """
+        SELECT DATE_FORMAT(Created_At, '%Y-%m') AS Month, COUNT(*) AS cnt
+        FROM surveyors
+        WHERE Created_At >= DATE_SUB(CURDATE(), INTERVAL 24 MONTH)
+        GROUP BY Month
+        ORDER BY Month
+        """,
+        "Month",
+        "cnt",
+        _line,
+    ),
+}
+
+
+def _render_png(name: str, df: pd.DataFrame, theme: str) -> Optional[bytes]:
+    figure_mod = optional_import("matplotlib.figure")
+    if figure_mod is None:
+        return None
+    title, _, _, x, y, draw = CHARTS[name]
+    colors = _THEMES.get(theme, _THEMES["light"])
+
+    # Figure() is not registered with pyplot, so nothing is kept after we drop it
+    fig = figure_mod.Figure(figsize=(8, 4), dpi=110, facecolor=colors["bg"])
+    try:
+        ax = fig.subplots()
+        ax.set_facecolor(colors["bg"])
+        draw(ax, df, x, y, colors)
+        ax.set_title(title, color=colors["fg"])
+        ax.tick_params(colors=colors["fg"])
+        ax.grid(axis="y", color=colors["grid"], linewidth=0.8)
+        ax.set_axisbelow(True)
+        for spine in ax.spines.values():
+            spine.set_color(colors["grid"])
+        fig.tight_layout()
+        buf = io.BytesIO()
+        fig.savefig(buf, format="png", facecolor=colors["bg"])
+        return buf.getvalue()
+    finally:
+        fig.clear()
+
+
+# -----------------------------
+# Cross-session cache
+# -----------------------------
+# PNG and data live in core.cache under the change-feed version, so all
+# server processes share one render per version and theme.
+
+CACHE_NS_CHARTS = "charts"
+
+_cache_lock = threading.Lock()
+_key_locks: Dict[Tuple[str, str], threading.Lock] = {}
+_served: Dict[Tuple[str, str], tuple] = {}  # (name, theme) -> (version, served at, png bytes); diagnostics only
+
+
+def _key_lock(key: Tuple[str, str]) -> threading.Lock:
+    with _cache_lock:
+        lock = _key_locks.get(key)
+        if lock is None:
+            lock = threading.Lock()
+            _key_locks[key] = lock
+        return lock
+
+
+def chart(name: str, theme: str = "light") -> Tuple[Optional[bytes], pd.DataFrame]:
+    """
+    Returns (png, data) for a chart in CHARTS. png is None when matplotlib is
+    not installed; the page can then draw `data` itself. Rendering happens
+    once per data version and theme, whichever session (or process) asks
+    first; other sessions of this process asking meanwhile wait for that
+    render instead of repeating it.
+    """
+    _, entities, sql, _, _, _ = CHARTS[name]
+    key = (name, theme)
+    version = current_watermark(entities)
+
+    found, entry = cache.get(CACHE_NS_CHARTS, key, version, CHART_MAX_AGE_S)
+    if not found:
+        with _key_lock(key):
+
+            def render():
+                df = query_df(sql, site="dashboard")
+                return (_render_png(name, df, theme) if not df.empty else None), df
+
+            entry = cache.get_or_load(
+                CACHE_NS_CHARTS,
+                key,
+                render,
+                ttl_s=CHART_MAX_AGE_S,
+                version=version,
+                # data served stale during an outage is shown, not kept
+                cacheable=lambda e: not e[1].attrs.get("stale"),
+            )
+    png, df = entry
+    with _cache_lock:
+        _served[key] = (version, time.monotonic(), len(png) if png else 0)
+    return png, df
+
+
+def cache_info() -> Dict[str, dict]:
+    """Charts served by this process: version, seconds since last served, PNG size."""
+    with _cache_lock:
+        return {
+            f"{name}/{theme}": {
+                "version": entry[0],
+                "age_s": round(time.monotonic() - entry[1], 1),
+                "png_bytes": entry[2],
+            }
+            for (name, theme), entry in _served.items()
+        }
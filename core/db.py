@@ -1,19 +1,82 @@
 from __future__ import annotations
 
-from typing import Optional, Any, Dict, Tuple
+from typing import Optional, Any, Callable, Dict, Iterable, List, Tuple
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 import re
-import streamlit as st
+import sys
+import threading
+import time
 import pandas as pd
 
+from core.settings import HEADLESS, DB_POOL_OVERFLOW, DB_POOL_WAIT_S
+
+if HEADLESS:
+    st = None
+else:
+    import streamlit as st
+
+from core.resilience import resilient_read, guarded_write, deadlock_retry, stale, count
+from core.admission import admit, Overloaded
+from core.cache import cache
+from core.normalize import name_key, name_tokens
+from core.changes import (
+    record_change_tx,
+    record_changes_tx,
+    ENTITY_SURVEYOR,
+    ENTITY_PROJECT,
+    ENTITY_BANK,
+    ENTITY_ACCOUNT,
+    ENTITY_ASSIGNMENT,
+    OP_INSERT,
+    OP_UPDATE,
+    OP_DELETE,
+)
+
 try:
     import mysql.connector as mysql
+    from mysql.connector import pooling as mysql_pooling
 except Exception:
     mysql = None
+    mysql_pooling = None
+
 
+_bound = threading.local()
 
-def get_conn_params() -> Dict[str, Any]:
-    secrets = getattr(st, "secrets", {}) or {}
-    cfg = dict(st.session_state.get("_db_cfg", {}))
+
+@contextmanager
+def bound_conn_params(params: Dict[str, Any]):
+    """
+    Connection params for code running outside the script thread (worker
+    threads cannot read st.session_state); resolve them with
+    get_conn_params() in the script thread first.
+    """
+    previous = getattr(_bound, "params", None)
+    _bound.params = params
+    try:
+        yield
+    finally:
+        _bound.params = previous
+
+
+def get_conn_params(session: bool = True) -> Dict[str, Any]:
+    """
+    Connection params of the current session (its _db_cfg, then secrets and
+    DEFAULT_DB). session=False gives the server-wide params, for threads that
+    outlive the session that starts them.
+    """
+    bound = getattr(_bound, "params", None)
+    if bound is not None:
+        return dict(bound)
+
+    if st is None:
+        from core.settings import file_secrets
+
+        secrets, cfg = file_secrets(), {}
+    else:
+        secrets = getattr(st, "secrets", {}) or {}
+        cfg = dict(st.session_state.get("_db_cfg", {})) if session else {}
 
     if not cfg:
         try:
@@ -41,8 +104,13 @@ def get_conn_params() -> Dict[str, Any]:
 import json
 
 def audit_log(action: str, entity: str, entity_key: str, before: dict | None, after: dict | None):
-    actor_role = st.session_state.get("user_role", "user")
-    actor_name = st.session_state.get("user_name") or None
+    if st is None:
+        import os
+
+        actor_role, actor_name = "cli", os.getenv("PPC_ACTOR") or os.getenv("USER") or None
+    else:
+        actor_role = st.session_state.get("user_role", "user")
+        actor_name = st.session_state.get("user_name") or None
     return execute(
         """
         INSERT INTO audit_log (Actor_Role, Actor_Name, Action, Entity, Entity_Key, Before_JSON, After_JSON)
@@ -60,20 +128,338 @@ def audit_log(action: str, entity: str, entity_key: str, before: dict | None, af
     )
 
 
-def get_connection():
+_pools: Dict[Tuple, Any] = {}
+_pools_lock = threading.Lock()
+
+
+def _get_pool(params: Dict[str, Any]):
+    from core.settings import DB_POOL_SIZE
+
+    key = tuple(sorted((k, str(v)) for k, v in params.items()))
+    pool = _pools.get(key)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(key)
+            if pool is None:
+                # reset_session=False: long-lived sessions keep their prepared statements
+                pool = mysql_pooling.MySQLConnectionPool(
+                    pool_name=f"ppc{len(_pools)}",
+                    pool_size=int(DB_POOL_SIZE),
+                    pool_reset_session=False,
+                    **params,
+                )
+                _pools[key] = pool
+    return pool
+
+
+def get_connection(shared: bool = True):
+    """
+    Returns a pooled connection; close() hands it back to the pool.
+    Falls back to a direct connection when the pool is exhausted.
+    Inside unit_of_work() the run's connection is returned instead, unless
+    shared=False (e.g. for an unbuffered cursor that stays open while other
+    queries run).
+    """
+    scope = getattr(_scope, "current", None)
+    if scope is not None and shared:
+        return scope.connection()
+    return _checkout()
+
+
+# unpooled connections in use; bounded so an exhausted pool does not turn into unbounded connects
+_overflow = threading.BoundedSemaphore(DB_POOL_OVERFLOW) if DB_POOL_OVERFLOW > 0 else None
+
+
+def _checkout():
+    """
+    A pooled connection. When the pool is empty, up to DB_POOL_OVERFLOW
+    direct connections are opened (closed again by _close()); past that the
+    call waits up to DB_POOL_WAIT_S for a free connection and then raises
+    Overloaded.
+    """
     if mysql is None:
         raise RuntimeError("mysql-connector-python is not installed. Run: pip install mysql-connector-python")
-    return mysql.connect(**get_conn_params())
+    params = get_conn_params()
+    if mysql_pooling is None:
+        return mysql.connect(**params)
+    pool = _get_pool(params)
+    deadline = time.monotonic() + DB_POOL_WAIT_S
+    while True:
+        try:
+            return pool.get_connection()
+        except mysql_pooling.errors.PoolError:
+            pass
+        if _overflow is not None and _overflow.acquire(blocking=False):
+            try:
+                conn = mysql.connect(**params)
+            except Exception:
+                _overflow.release()
+                raise
+            conn._ppc_overflow = True
+            count("pool_overflow")
+            return conn
+        if time.monotonic() >= deadline:
+            count("pool_exhausted")
+            raise Overloaded("No database connection is free. Please try again shortly.")
+        time.sleep(0.05)
 
 
 def _close(conn) -> None:
+    if isinstance(conn, _ScopedConnection):
+        # still inside the finally of a failed call: the connection may be broken
+        conn.close(failed=sys.exc_info()[0] is not None)
+        return
+    overflow = getattr(conn, "_ppc_overflow", False)
+    if overflow:
+        conn._ppc_overflow = False
+    try:
+        # connection goes back to the pool; never hand over an open transaction
+        if getattr(conn, "in_transaction", False):
+            conn.rollback()
+    except Exception:
+        pass
     try:
         conn.close()
     except Exception:
         pass
+    if overflow:
+        _overflow.release()
+
+
+# -----------------------------
+# Unit of work (one connection per script run)
+# -----------------------------
+# هر اجرای صفحه یک connection از pool می‌گیرد و همه‌ی helperها از همان استفاده می‌کنند.
+
+_scope = threading.local()
+
+
+class _Scope:
+    def __init__(self, snapshot: bool, read_only: bool):
+        self.snapshot = snapshot
+        self.read_only = read_only
+        self.conn = None
+        self.depth = 0
+        self.snapshot_open = False
+        # (kind, key) -> row, for the batch lookups; cleared on every commit
+        self.identity: Dict[Tuple[str, Any], Any] = {}
+
+    def connection(self) -> "_ScopedConnection":
+        if self.conn is None:
+            self.conn = _checkout()
+            count("uow_checkout")
+            if self.snapshot or self.read_only:
+                try:
+                    self.conn.start_transaction(consistent_snapshot=self.snapshot, readonly=self.read_only or None)
+                except Exception:
+                    self.discard()
+                    raise
+                self.snapshot_open = True
+        else:
+            count("uow_reuse")
+        self.depth += 1
+        return _ScopedConnection(self)
+
+    def busy(self) -> bool:
+        """True while the connection is in use or holds a snapshot / open transaction."""
+        if self.conn is None:
+            return False
+        return self.depth > 0 or self.snapshot_open or bool(getattr(self.conn, "in_transaction", False))
+
+    def release(self, failed: bool) -> None:
+        self.depth = max(0, self.depth - 1)
+        if self.depth or self.conn is None:
+            return
+        if failed and not _is_connected(self.conn):
+            self.discard()
+            return
+        if not self.snapshot_open and getattr(self.conn, "in_transaction", False):
+            # same as _close(): nothing half-done survives the helper that started it
+            try:
+                self.conn.rollback()
+            except Exception:
+                self.discard()
+
+    def end_snapshot(self) -> None:
+        if self.snapshot_open:
+            self.snapshot_open = False
+            try:
+                self.conn.commit()
+            except Exception:
+                pass
+
+    def discard(self) -> None:
+        conn, self.conn = self.conn, None
+        self.snapshot_open = False
+        if conn is not None:
+            _close(conn)
+
+
+def _is_connected(conn) -> bool:
+    try:
+        return bool(conn.is_connected())
+    except Exception:
+        return False
+
 
+class _ScopedConnection:
+    """
+    The run's connection as handed out by get_connection(). close() only
+    ends this use; the connection goes back to the pool when the unit of work
+    ends. The snapshot transaction ends at the first write transaction.
+    """
 
-def query_df(sql: str, params: Optional[Tuple[Any, ...]] = None) -> pd.DataFrame:
+    def __init__(self, scope: _Scope):
+        self._scope = scope
+        self._closed = False
+
+    def __getattr__(self, name):
+        return getattr(self._scope.conn, name)
+
+    def start_transaction(self, *args, **kwargs):
+        if self._scope.read_only:
+            raise RuntimeError("Write attempted inside a read-only unit of work.")
+        self._scope.end_snapshot()
+        return self._scope.conn.start_transaction(*args, **kwargs)
+
+    def commit(self):
+        self._scope.snapshot_open = False
+        self._scope.identity.clear()
+        return self._scope.conn.commit()
+
+    def rollback(self):
+        self._scope.snapshot_open = False
+        return self._scope.conn.rollback()
+
+    def close(self, failed: bool = False) -> None:
+        if not self._closed:
+            self._closed = True
+            self._scope.release(failed)
+
+
+@contextmanager
+def unit_of_work(snapshot: bool = False, read_only: bool = False):
+    """
+    Binds one pooled connection to the current script run (this thread):
+    every get_connection() inside reuses it, and it goes back to the pool
+    when the block exits, including on st.stop()/st.rerun().
+
+    snapshot=True opens a consistent-snapshot transaction, so all reads of
+    the run see the same data; it ends at the first write. read_only=True
+    rejects write transactions. run_many() hands an idle scope connection
+    back to the pool before its workers take their own, and runs inline on
+    it while a snapshot is open. Nested calls join the outer unit of work.
+    """
+    if getattr(_scope, "current", None) is not None:
+        yield
+        return
+    scope = _Scope(snapshot, read_only)
+    _scope.current = scope
+    try:
+        yield
+    finally:
+        _scope.current = None
+        scope.discard()
+
+
+# -----------------------------
+# Prepared statements (per connection, LRU)
+# -----------------------------
+
+_QMARK_RE = re.compile(r"%s")
+_WS_RE = re.compile(r"\s+")
+
+
+def _raw_connection(conn):
+    # PooledMySQLConnection wraps the real connection in ._cnx
+    return getattr(conn, "_cnx", None) or conn
+
+
+def _prepared_cursor(conn, sql: str):
+    """
+    Returns (operation, cursor) for a server-side prepared statement cached on
+    this connection. The same operation object must be passed to execute() so
+    the cursor does not prepare the statement again.
+    """
+    from core.settings import DB_PREPARED_CACHE_SIZE
+
+    raw = _raw_connection(conn)
+    cache = getattr(raw, "_ppc_stmt_cache", None)
+    # a reconnect gives a new server session without our statements
+    session_id = getattr(raw, "connection_id", None)
+    if cache is None or getattr(raw, "_ppc_stmt_session", None) != session_id:
+        _drop_prepared(conn)
+        cache = OrderedDict()
+        setattr(raw, "_ppc_stmt_cache", cache)
+        setattr(raw, "_ppc_stmt_session", session_id)
+
+    fingerprint = _WS_RE.sub(" ", sql).strip()
+    hit = cache.get(fingerprint)
+    if hit is not None:
+        cache.move_to_end(fingerprint)
+        return hit
+
+    operation = _QMARK_RE.sub("?", fingerprint)
+    cur = raw.cursor(prepared=True)
+    cache[fingerprint] = (operation, cur)
+    while len(cache) > int(DB_PREPARED_CACHE_SIZE):
+        _, (_, old) = cache.popitem(last=False)
+        try:
+            old.close()
+        except Exception:
+            pass
+    return operation, cur
+
+
+def _drop_prepared(conn) -> None:
+    raw = _raw_connection(conn)
+    cache = getattr(raw, "_ppc_stmt_cache", None)
+    if not cache:
+        return
+    for _, cur in cache.values():
+        try:
+            cur.close()
+        except Exception:
+            pass
+    cache.clear()
+
+
+def execute_prepared(conn, sql: str, params: Tuple[Any, ...] = ()):
+    """
+    Executes sql as a cached prepared statement (binary protocol) on conn and
+    returns the cursor, positioned on the result. Do not close the cursor.
+    """
+    operation, cur = _prepared_cursor(conn, sql)
+    try:
+        cur.execute(operation, tuple(params))
+    except mysql.errors.Error as ex:
+        # 1243: unknown prepared statement handler (server forgot the statement)
+        if getattr(ex, "errno", None) != 1243:
+            raise
+        _drop_prepared(conn)
+        setattr(_raw_connection(conn), "_ppc_stmt_cache", None)
+        operation, cur = _prepared_cursor(conn, sql)
+        cur.execute(operation, tuple(params))
+    return cur
+
+
+def _query_prepared_once(sql: str, params: Tuple[Any, ...]) -> pd.DataFrame:
+    conn = get_connection()
+    try:
+        cur = execute_prepared(conn, sql, params)
+        rows = cur.fetchall()
+        cols = list(cur.column_names or [])
+        return pd.DataFrame(rows, columns=cols) if cols else pd.DataFrame()
+    finally:
+        _close(conn)
+
+
+def query_prepared(sql: str, params: Tuple[Any, ...] = (), site: str = "lookup") -> pd.DataFrame:
+    """query_df() for hot, repeated queries with positional %s parameters."""
+    return _admitted_read(site, sql, params, lambda timed_sql: _query_prepared_once(timed_sql, params))
+
+
+def _query_df_once(sql: str, params) -> pd.DataFrame:
     conn = get_connection()
     try:
         cur = conn.cursor(dictionary=True)
@@ -85,7 +471,160 @@ def query_df(sql: str, params: Optional[Tuple[Any, ...]] = None) -> pd.DataFrame
         _close(conn)
 
 
-def execute(sql: str, params: Optional[Tuple[Any, ...]] = None) -> int:
+def query_df(sql: str, params: Optional[Tuple[Any, ...]] = None, site: str = "default") -> pd.DataFrame:
+    """
+    Read helper. `site` selects the statement timeout (QUERY_TIMEOUTS_MS) and
+    the admission class (core.admission); see core.resilience for retries, the
+    circuit breaker and stale results.
+    """
+    return _admitted_read(site, sql, params, lambda timed_sql: _query_df_once(timed_sql, params))
+
+
+def _query_multi_once(sql: str, params) -> List[pd.DataFrame]:
+    conn = get_connection()
+    try:
+        cur = conn.cursor(dictionary=True)
+        frames: List[pd.DataFrame] = []
+        try:
+            try:
+                results = cur.execute(sql, params or (), multi=True)
+            except TypeError:
+                # mysql-connector 9.2+: no multi=, the result sets follow with nextset()
+                results = None
+            if results is not None:
+                for res in results:
+                    if res.with_rows:
+                        frames.append(pd.DataFrame(res.fetchall(), columns=list(res.column_names)))
+            else:
+                cur.execute(sql, params or ())
+                while True:
+                    if cur.with_rows:
+                        frames.append(pd.DataFrame(cur.fetchall(), columns=list(cur.column_names)))
+                    if not cur.nextset():
+                        break
+        finally:
+            cur.close()
+        return frames
+    finally:
+        _close(conn)
+
+
+def query_multi(sql: str, params=None, site: str = "default") -> List[pd.DataFrame]:
+    """
+    Several ;-separated statements sent in one round-trip; one frame per
+    result set, in order (statements without rows, e.g. SET, add none).
+    Every SELECT statement gets the statement timeout hint.
+    """
+    return _admitted_read(site, sql, params, lambda timed_sql: _query_multi_once(timed_sql, params))
+
+
+def _admitted_read(site: str, sql: str, params, run) -> pd.DataFrame:
+    """
+    Takes a DB slot of the site's class first. When no slot frees up in time
+    the last known result is returned, otherwise Overloaded is raised.
+    """
+    try:
+        with admit(site):
+            return resilient_read(site, sql, params, run)
+    except Overloaded:
+        cached = stale(sql, params)
+        if cached is None:
+            raise
+        count("shed_stale_served")
+        return cached
+
+
+# -----------------------------
+# Concurrent fan-out of independent reads
+# -----------------------------
+
+_fanout: Optional[ThreadPoolExecutor] = None
+_fanout_lock = threading.Lock()
+
+
+def _fanout_executor() -> ThreadPoolExecutor:
+    global _fanout
+    if _fanout is None:
+        with _fanout_lock:
+            if _fanout is None:
+                from core.settings import DB_FANOUT_WORKERS
+
+                _fanout = ThreadPoolExecutor(max_workers=DB_FANOUT_WORKERS, thread_name_prefix="ppc-fanout")
+    return _fanout
+
+
+def run_many(calls: Dict[str, Callable[[], Any]], return_exceptions: bool = False) -> Dict[str, Any]:
+    """
+    Runs independent read calls concurrently, each on its own pooled
+    connection, and returns {name: result} once all have finished, so the
+    wait is the slowest call rather than the sum. With return_exceptions the
+    exception is returned in place of a failed result; otherwise the first
+    failure (in dict order) is raised after all calls are done.
+    Calls must not touch st.* (they run in worker threads).
+
+    Inside unit_of_work() the page's own connection is returned to the pool
+    first (checked out again on its next use), so a page never holds one
+    idle connection while its fan-out takes more. A scope with an open
+    snapshot or transaction runs the calls inline on its connection instead,
+    which also keeps them on the snapshot.
+    """
+    scope = getattr(_scope, "current", None)
+    inline = len(calls) <= 1 or threading.current_thread().name.startswith("ppc-fanout")
+    if not inline and scope is not None:
+        if scope.busy():
+            inline = True
+        else:
+            scope.discard()
+    if inline:
+        # nothing to overlap, inside a worker, or bound to the page's snapshot: run inline
+        results: Dict[str, Any] = {}
+        for name, fn in calls.items():
+            try:
+                results[name] = fn()
+            except Exception as ex:
+                if not return_exceptions:
+                    raise
+                results[name] = ex
+        return results
+
+    params = get_conn_params()
+
+    def bound(fn):
+        with bound_conn_params(params):
+            return fn()
+
+    executor = _fanout_executor()
+    futures = {name: executor.submit(bound, fn) for name, fn in calls.items()}
+
+    results = {}
+    first_error: Optional[BaseException] = None
+    for name, fut in futures.items():
+        try:
+            results[name] = fut.result()
+        except Exception as ex:
+            results[name] = ex
+            if first_error is None:
+                first_error = ex
+    if first_error is not None and not return_exceptions:
+        raise first_error
+    return results
+
+
+def query_many(queries: Dict[str, tuple], return_exceptions: bool = False) -> Dict[str, Any]:
+    """
+    query_df() for several independent statements at once.
+    queries: {name: (sql,) | (sql, params) | (sql, params, site)}.
+    """
+    def call(spec):
+        sql = spec[0]
+        params = spec[1] if len(spec) > 1 else None
+        site = spec[2] if len(spec) > 2 else "default"
+        return lambda: query_df(sql, params, site=site)
+
+    return run_many({name: call(spec) for name, spec in queries.items()}, return_exceptions=return_exceptions)
+
+
+def _execute_once(sql: str, params) -> int:
     conn = get_connection()
     try:
         cur = conn.cursor()
@@ -104,8 +643,80 @@ def execute(sql: str, params: Optional[Tuple[Any, ...]] = None) -> int:
         _close(conn)
 
 
+def execute(sql: str, params: Optional[Tuple[Any, ...]] = None) -> int:
+    return guarded_write(lambda: _execute_once(sql, params))
+
+
+def run_in_transaction(fn, attempts: int = 4):
+    """
+    Runs fn(conn) inside one transaction and commits. On deadlock or lock wait
+    timeout the whole transaction is rolled back and replayed, so fn must not
+    have side effects outside the database.
+    """
+    def once():
+        conn = get_connection()
+        try:
+            if getattr(conn, "in_transaction", False):
+                conn.rollback()
+            conn.start_transaction()
+            result = fn(conn)
+            conn.commit()
+            return result
+        except Exception:
+            try:
+                conn.rollback()
+            except Exception:
+                pass
+            raise
+        finally:
+            _close(conn)
+
+    return guarded_write(lambda: deadlock_retry(once, attempts))
+
+
+def _execute_tx(conn, sql: str, params: Tuple[Any, ...] = ()) -> int:
+    cur = conn.cursor()
+    try:
+        cur.execute(sql, params)
+        return int(cur.rowcount)
+    finally:
+        try:
+            cur.close()
+        except Exception:
+            pass
+
+
+# -----------------------------
+# Cached reads (core.cache: shared by all server processes)
+# -----------------------------
+
+CACHE_NS_PROVINCES = "provinces"
+CACHE_NS_BANKS = "banks"
+
+
+def cached_query(sql: str, params=None, namespace: str = "query", ttl_s: float = 60, site: str = "default") -> pd.DataFrame:
+    """
+    query_df() through the shared cache: loaded once per TTL for all
+    processes until a writer calls cache.invalidate(namespace). Stale
+    fallback results are not cached. Each caller gets its own copy.
+    """
+    df = cache.get_or_load(
+        namespace,
+        (sql, params),
+        lambda: query_df(sql, params, site=site),
+        ttl_s=ttl_s,
+        cacheable=lambda d: not d.attrs.get("stale"),
+    )
+    return df.copy()
+
+
 def load_provinces() -> pd.DataFrame:
-    df = query_df("SELECT Province_Code, Province_Name FROM provinces ORDER BY Province_Name")
+    # the app never writes provinces; the TTL bounds manual edits
+    df = cached_query(
+        "SELECT Province_Code, Province_Name FROM provinces ORDER BY Province_Name",
+        namespace=CACHE_NS_PROVINCES,
+        ttl_s=3600,
+    )
     if df.empty:
         return pd.DataFrame(columns=["Province_Code", "Province_Name"])
     return df
@@ -113,8 +724,10 @@ def load_provinces() -> pd.DataFrame:
 
 def load_banks(active_only: bool = True) -> pd.DataFrame:
     if active_only:
-        return query_df("SELECT Bank_ID, Bank_Name, Payment_Method FROM banks WHERE Is_Active=1 ORDER BY Bank_Name")
-    return query_df("SELECT Bank_ID, Bank_Name, Payment_Method, Is_Active FROM banks ORDER BY Bank_Name")
+        sql = "SELECT Bank_ID, Bank_Name, Payment_Method FROM banks WHERE Is_Active=1 ORDER BY Bank_Name"
+    else:
+        sql = "SELECT Bank_ID, Bank_Name, Payment_Method, Is_Active FROM banks ORDER BY Bank_Name"
+    return cached_query(sql, namespace=CACHE_NS_BANKS, ttl_s=600)
 
 
 def add_bank(bank_name: str, payment_method: str = "BANK_TRANSFER", is_active: int = 1) -> int:
@@ -126,8 +739,10 @@ def add_bank(bank_name: str, payment_method: str = "BANK_TRANSFER", is_active: i
             (bank_name.strip(), payment_method, int(is_active)),
         )
         new_id = cur.lastrowid
+        record_change_tx(conn, ENTITY_BANK, new_id, OP_INSERT)
         conn.commit()
         cur.close()
+        cache.invalidate(CACHE_NS_BANKS)
         return int(new_id)
     except Exception:
         try:
@@ -139,35 +754,55 @@ def add_bank(bank_name: str, payment_method: str = "BANK_TRANSFER", is_active: i
         _close(conn)
 
 
+def _update_bank(bank_id: int, sql: str, params: Tuple[Any, ...]) -> int:
+    def tx(conn):
+        rc = _execute_tx(conn, sql, params)
+        if rc:
+            record_change_tx(conn, ENTITY_BANK, bank_id, OP_UPDATE)
+        return rc
+
+    rc = run_in_transaction(tx)
+    if rc:
+        cache.invalidate(CACHE_NS_BANKS)
+    return rc
+
+
 def set_bank_active(bank_id: int, is_active: int) -> int:
-    return execute("UPDATE banks SET Is_Active=%s WHERE Bank_ID=%s", (int(is_active), int(bank_id)))
+    return _update_bank(bank_id, "UPDATE banks SET Is_Active=%s WHERE Bank_ID=%s", (int(is_active), int(bank_id)))
 
 
 def set_bank_payment_method(bank_id: int, payment_method: str) -> int:
-    return execute("UPDATE banks SET Payment_Method=%s WHERE Bank_ID=%s", (payment_method, int(bank_id)))
+    return _update_bank(bank_id, "UPDATE banks SET Payment_Method=%s WHERE Bank_ID=%s", (payment_method, int(bank_id)))
 
 
-def search_projects(q: str = "") -> pd.DataFrame:
-    like = f"%{q.strip()}%" if q else "%"
-    return query_df(
-        """
-        SELECT Project_ID, Project_Code, Project_Name, Phase_Number, Project_Type, Client_Name,
-               Implementing_Partner, Start_Date, End_Date, Status, Notes, Project_Document_Link,
-               Created_At, Updated_At
-        FROM projects
-        WHERE Project_Code LIKE %s
-           OR Project_Name LIKE %s
-           OR Client_Name LIKE %s
-           OR Implementing_Partner LIKE %s
-        ORDER BY Project_ID DESC
-        LIMIT 200
-        """,
-        (like, like, like, like),
-    )
+def _projects_changed() -> None:
+    # the next project search checks for changes instead of waiting for its interval
+    from core.project_index import projects
+
+    projects.invalidate()
+
+
+def search_projects(q: str = "", limit: int = 200) -> pd.DataFrame:
+    """
+    Full project rows for the best matches of q, best first. Matching and
+    ranking use the in-memory index (core.project_index); pickers that only
+    need id/label pairs should call project_index.projects.search() directly.
+    """
+    from core.project_index import projects
+
+    ids = [pid for pid, _ in projects.ranked(q, limit)]
+    if not ids:
+        return pd.DataFrame(
+            columns=["Project_ID", "Project_Code", "Project_Name", "Phase_Number", "Project_Type", "Client_Name",
+                     "Implementing_Partner", "Start_Date", "End_Date", "Status", "Notes", "Project_Document_Link",
+                     "Created_At", "Updated_At"]
+        )
+    rows = get_projects_by_ids(ids)
+    return pd.DataFrame([rows[pid] for pid in ids if rows.get(pid) is not None])
 
 
 def get_project_by_id(project_id: int) -> pd.DataFrame:
-    return query_df(
+    return query_prepared(
         """
         SELECT Project_ID, Project_Code, Project_Name, Phase_Number, Project_Type, Client_Name,
                Implementing_Partner, Start_Date, End_Date, Status, Notes, Project_Document_Link,
@@ -206,8 +841,10 @@ def add_project(data: dict) -> int:
             ),
         )
         new_id = cur.lastrowid
+        record_change_tx(conn, ENTITY_PROJECT, new_id, OP_INSERT)
         conn.commit()
         cur.close()
+        _projects_changed()
         return int(new_id)
     except Exception:
         try:
@@ -220,46 +857,466 @@ def add_project(data: dict) -> int:
 
 
 def update_project(project_id: int, data: dict) -> int:
-    return execute(
+    def tx(conn):
+        rc = _execute_tx(
+            conn,
+            """
+            UPDATE projects
+            SET Project_Code=%s,
+                Project_Name=%s,
+                Project_Type=%s,
+                Client_Name=%s,
+                Implementing_Partner=%s,
+                Start_Date=%s,
+                End_Date=%s,
+                Status=%s,
+                Notes=%s,
+                Project_Document_Link=%s
+            WHERE Project_ID=%s
+            """,
+            (
+                data["Project_Code"].strip(),
+                data["Project_Name"].strip(),
+                data["Project_Type"],
+                (data.get("Client_Name") or None),
+                (data.get("Implementing_Partner") or None),
+                (data.get("Start_Date") or None),
+                (data.get("End_Date") or None),
+                data["Status"],
+                (data.get("Notes") or None),
+                (data.get("Project_Document_Link") or None),
+                int(project_id),
+            ),
+        )
+        if rc:
+            record_change_tx(conn, ENTITY_PROJECT, project_id, OP_UPDATE)
+        return rc
+
+    rc = run_in_transaction(tx)
+    _projects_changed()
+    return rc
+
+
+def get_surveyor_by_code(code: str) -> pd.DataFrame:
+    return query_prepared(
+        "SELECT Surveyor_ID, Surveyor_Code, Surveyor_Name FROM surveyors WHERE Surveyor_Code=%s",
+        (code.strip(),),
+    )
+
+
+# -----------------------------
+# Surveyor profile (cached per version)
+# -----------------------------
+
+PROFILE_MAX_AGE_S = 300  # bounds staleness from project/bank renames, which the version does not see
+_PROFILE_CACHE_SIZE = 256
+# Surveyor_ID -> (version, loaded at, profile)
+_profiles: "OrderedDict[int, tuple]" = OrderedDict()
+_profiles_lock = threading.Lock()
+
+# version columns: Updated_At of the surveyor plus count/last change of each
+# child table (deletes change the count, inserts and edits the timestamp)
+PROFILE_VERSION_COLUMNS = ("Updated_At", "Accounts_Version", "Assignments_Version", "Files_Version")
+
+# resolves the code and reads the version in one indexed lookup; a cached
+# profile of the same (Surveyor_ID, version) needs nothing else
+_PROFILE_VERSION_SQL = """
+    SELECT s.Surveyor_ID, s.Updated_At,
+           (SELECT CONCAT(COUNT(*), '/', COALESCE(MAX(Updated_At), ''))
+              FROM surveyor_bank_accounts WHERE Surveyor_ID = s.Surveyor_ID) AS Accounts_Version,
+           (SELECT CONCAT(COUNT(*), '/', COALESCE(MAX(Updated_At), ''))
+              FROM project_surveyors WHERE Surveyor_ID = s.Surveyor_ID) AS Assignments_Version,
+           (SELECT CONCAT(COUNT(*), '/', COALESCE(MAX(File_ID), 0))
+              FROM surveyor_files WHERE Surveyor_ID = s.Surveyor_ID) AS Files_Version
+    FROM surveyors s
+    WHERE s.Surveyor_Code = %s
+"""
+
+# every section in one multi-statement round-trip; each statement is a SELECT,
+# so each gets the statement timeout hint (resilience.with_timeout).
+# blob columns are never selected; stored files are listed by their metadata only
+_PROFILE_SQL = """
+    SELECT s.Surveyor_ID, s.Surveyor_Code, s.Surveyor_Name, s.Gender, s.Father_Name, s.Tazkira_No,
+           s.Email_Address, s.Whatsapp_Number, s.Phone_Number,
+           s.Permanent_Province_Code, pp.Province_Name AS Permanent_Province_Name,
+           s.Current_Province_Code, pc.Province_Name AS Current_Province_Name,
+           s.CV_Link, s.Created_At, s.Updated_At
+    FROM surveyors s
+    LEFT JOIN provinces pp ON pp.Province_Code = s.Permanent_Province_Code
+    LEFT JOIN provinces pc ON pc.Province_Code = s.Current_Province_Code
+    WHERE s.Surveyor_ID = %(sid)s;
+
+    SELECT sba.Bank_Account_ID, sba.Payment_Type, sba.Account_Number, sba.Mobile_Number, sba.Account_Title,
+           sba.Is_Default, sba.Is_Active, sba.Created_At, b.Bank_Name, b.Payment_Method
+    FROM surveyor_bank_accounts sba
+    JOIN banks b ON b.Bank_ID = sba.Bank_ID
+    WHERE sba.Surveyor_ID = %(sid)s
+    ORDER BY sba.Is_Default DESC, sba.Bank_Account_ID DESC;
+
+    SELECT ps.Project_Surveyor_ID, ps.Project_ID, pr.Project_Code, pr.Project_Name, ps.Role,
+           ps.Work_Province_Code, wp.Province_Name AS Work_Province_Name,
+           ps.Start_Date, ps.End_Date, ps.Status
+    FROM project_surveyors ps
+    JOIN projects pr ON pr.Project_ID = ps.Project_ID
+    LEFT JOIN provinces wp ON wp.Province_Code = ps.Work_Province_Code
+    WHERE ps.Surveyor_ID = %(sid)s
+    ORDER BY ps.Start_Date DESC, ps.Project_Surveyor_ID DESC;
+
+    SELECT 'stored' AS Source, File_ID, Kind, File_Name, Mime, Size_Bytes, Created_At
+    FROM surveyor_files
+    WHERE Surveyor_ID = %(sid)s
+    UNION ALL
+    SELECT 'legacy', NULL, 'CV', CV_File_Name, CV_Mime, NULL, Updated_At
+    FROM surveyors WHERE Surveyor_ID = %(sid)s AND CV_File_Name IS NOT NULL
+    UNION ALL
+    SELECT 'legacy', NULL, 'TAZKIRA_IMAGE', Tazkira_Image_Name, Tazkira_Image_Mime, NULL, Updated_At
+    FROM surveyors WHERE Surveyor_ID = %(sid)s AND Tazkira_Image_Name IS NOT NULL
+    UNION ALL
+    SELECT 'legacy', NULL, 'TAZKIRA_PDF', Tazkira_PDF_Name, Tazkira_PDF_Mime, NULL, Updated_At
+    FROM surveyors WHERE Surveyor_ID = %(sid)s AND Tazkira_PDF_Name IS NOT NULL
+    UNION ALL
+    SELECT 'legacy', NULL, 'TAZKIRA_WORD', Tazkira_Word_Name, Tazkira_Word_Mime, NULL, Updated_At
+    FROM surveyors WHERE Surveyor_ID = %(sid)s AND Tazkira_Word_Name IS NOT NULL
+"""
+
+
+def get_surveyor_profile(surveyor_code: str) -> Optional[dict]:
+    """
+    Everything about one surveyor: {"surveyor": row dict (with province
+    names), "accounts", "assignments", "files": frames, "version": tuple,
+    "stale": bool}, or None if there is no such code.
+
+    The version query (PROFILE_VERSION_COLUMNS, e.g. for ETags) also resolves
+    the code; the profile is shared between sessions by (Surveyor_ID,
+    version), so only a changed profile costs the multi-statement load.
+    """
+    probe = query_prepared(_PROFILE_VERSION_SQL, ((surveyor_code or "").strip(),))
+    if probe.empty:
+        return None
+    head = probe.iloc[0]
+    sid = int(head["Surveyor_ID"])
+    version = tuple(str(head[c]) for c in PROFILE_VERSION_COLUMNS)
+
+    with _profiles_lock:
+        entry = _profiles.get(sid)
+        if entry is not None and entry[0] == version and time.monotonic() - entry[1] < PROFILE_MAX_AGE_S:
+            _profiles.move_to_end(sid)
+            count("profile_cache_hit")
+            return entry[2]
+
+    frames = query_multi(_PROFILE_SQL, {"sid": sid}, site="lookup")
+    if len(frames) != 4 or frames[0].empty:
+        with _profiles_lock:
+            _profiles.pop(sid, None)
+        return None
+    surveyor, accounts, assignments, files = frames
+    profile = {
+        "surveyor": surveyor.iloc[0].to_dict(),
+        "accounts": accounts,
+        "assignments": assignments,
+        "files": files,
+        "version": version,
+        "stale": bool(surveyor.attrs.get("stale") or probe.attrs.get("stale")),
+    }
+    if not profile["stale"]:
+        with _profiles_lock:
+            _profiles[sid] = (version, time.monotonic(), profile)
+            _profiles.move_to_end(sid)
+            while len(_profiles) > _PROFILE_CACHE_SIZE:
+                _profiles.popitem(last=False)
+    return profile
+
+
+def add_surveyor_tx(conn, data: dict) -> int:
+    """Inserts a surveyor inside the caller's transaction; returns Surveyor_ID."""
+    cur = conn.cursor()
+    try:
+        cur.execute(
+            """
+            INSERT INTO surveyors
+              (Surveyor_Code, Surveyor_Name, Gender, Father_Name, Tazkira_No,
+               Surveyor_Name_Key, Father_Name_Key,
+               Email_Address, Whatsapp_Number, Phone_Number,
+               Permanent_Province_Code, Current_Province_Code,
+               CV_Link)
+            VALUES
+              (%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s)
+            """,
+            (
+                data["Surveyor_Code"],
+                data["Surveyor_Name"].strip(),
+                data["Gender"],
+                data["Father_Name"].strip(),
+                data["Tazkira_No"].strip(),
+                name_key(data["Surveyor_Name"]),
+                name_key(data["Father_Name"]),
+                (data.get("Email_Address") or "").strip(),
+                data.get("Whatsapp_Number"),
+                data.get("Phone_Number"),
+                data["Permanent_Province_Code"],
+                data["Current_Province_Code"],
+                ((data.get("CV_Link") or "").strip() or None),
+            ),
+        )
+        new_id = int(cur.lastrowid)
+    finally:
+        try:
+            cur.close()
+        except Exception:
+            pass
+    write_name_tokens_tx(conn, [(new_id, data["Surveyor_Name"])])
+    record_change_tx(conn, ENTITY_SURVEYOR, new_id, OP_INSERT)
+    return new_id
+
+
+def _surveyor_id_for_update(conn, surveyor_code: str) -> Optional[int]:
+    cur = conn.cursor()
+    try:
+        cur.execute("SELECT Surveyor_ID FROM surveyors WHERE Surveyor_Code=%s FOR UPDATE", (surveyor_code.strip(),))
+        rows = cur.fetchall()
+        return int(rows[0][0]) if rows else None
+    finally:
+        try:
+            cur.close()
+        except Exception:
+            pass
+
+
+def update_surveyor_tx(conn, surveyor_code: str, data: dict) -> Optional[int]:
+    """
+    Updates the editable profile fields inside the caller's transaction.
+    Returns the Surveyor_ID, or None if the code does not exist.
+    """
+    sid = _surveyor_id_for_update(conn, surveyor_code)
+    if sid is None:
+        return None
+    rc = _execute_tx(
+        conn,
         """
-        UPDATE projects
-        SET Project_Code=%s,
-            Project_Name=%s,
-            Project_Type=%s,
-            Client_Name=%s,
-            Implementing_Partner=%s,
-            Start_Date=%s,
-            End_Date=%s,
-            Status=%s,
-            Notes=%s,
-            Project_Document_Link=%s
-        WHERE Project_ID=%s
+        UPDATE surveyors
+        SET Surveyor_Name=%s,
+            Gender=%s,
+            Father_Name=%s,
+            Surveyor_Name_Key=%s,
+            Father_Name_Key=%s,
+            Tazkira_No=%s,
+            Email_Address=%s,
+            Whatsapp_Number=%s,
+            Phone_Number=%s,
+            CV_Link=%s
+        WHERE Surveyor_ID=%s
         """,
         (
-            data["Project_Code"].strip(),
-            data["Project_Name"].strip(),
-            data["Project_Type"],
-            (data.get("Client_Name") or None),
-            (data.get("Implementing_Partner") or None),
-            (data.get("Start_Date") or None),
-            (data.get("End_Date") or None),
-            data["Status"],
-            (data.get("Notes") or None),
-            (data.get("Project_Document_Link") or None),
-            int(project_id),
+            data["Surveyor_Name"].strip(),
+            data["Gender"],
+            data["Father_Name"].strip(),
+            name_key(data["Surveyor_Name"]),
+            name_key(data["Father_Name"]),
+            data["Tazkira_No"].strip(),
+            (data.get("Email_Address") or "").strip(),
+            data.get("Whatsapp_Number"),
+            data.get("Phone_Number"),
+            ((data.get("CV_Link") or "").strip() or None),
+            sid,
         ),
     )
+    write_name_tokens_tx(conn, [(sid, data["Surveyor_Name"])])
+    if rc:
+        record_change_tx(conn, ENTITY_SURVEYOR, sid, OP_UPDATE)
+    return sid
 
 
-def get_surveyor_by_code(code: str) -> pd.DataFrame:
-    return query_df(
-        "SELECT Surveyor_ID, Surveyor_Code, Surveyor_Name FROM surveyors WHERE Surveyor_Code=%s",
-        (code.strip(),),
+def update_surveyor(surveyor_code: str, data: dict) -> int:
+    """Updates the editable profile fields (admin edit form). Returns 0 if the code does not exist."""
+    sid = run_in_transaction(lambda conn: update_surveyor_tx(conn, surveyor_code, data))
+    return 0 if sid is None else 1
+
+
+def delete_surveyor(surveyor_code: str) -> int:
+    """Deletes by code. Assignments and accounts go with it (FK cascade) and are logged too."""
+    def tx(conn):
+        sid = _surveyor_id_for_update(conn, surveyor_code)
+        if sid is None:
+            return 0
+        cur = conn.cursor()
+        try:
+            cur.execute("SELECT Project_Surveyor_ID FROM project_surveyors WHERE Surveyor_ID=%s", (sid,))
+            assignment_ids = [int(r[0]) for r in cur.fetchall()]
+            cur.execute("SELECT Bank_Account_ID FROM surveyor_bank_accounts WHERE Surveyor_ID=%s", (sid,))
+            account_ids = [int(r[0]) for r in cur.fetchall()]
+        finally:
+            cur.close()
+        rc = _execute_tx(conn, "DELETE FROM surveyors WHERE Surveyor_ID=%s", (sid,))
+        record_changes_tx(conn, ENTITY_ASSIGNMENT, assignment_ids, OP_DELETE)
+        record_changes_tx(conn, ENTITY_ACCOUNT, account_ids, OP_DELETE)
+        record_change_tx(conn, ENTITY_SURVEYOR, sid, OP_DELETE)
+        return rc
+
+    return run_in_transaction(tx)
+
+
+def add_assignments_tx(
+    conn,
+    project_id: int,
+    surveyor_id: int,
+    role: str,
+    province_codes: list,
+    start_date,
+    end_date,
+    status: str,
+) -> list:
+    """One project_surveyors row per work province, inside the caller's transaction."""
+    cur = conn.cursor()
+    ids = []
+    try:
+        for code in province_codes:
+            cur.execute(
+                """
+                INSERT INTO project_surveyors
+                  (Project_ID, Surveyor_ID, Role, Work_Province_Code, Start_Date, End_Date, Status)
+                VALUES
+                  (%s,%s,%s,%s,%s,%s,%s)
+                """,
+                (int(project_id), int(surveyor_id), role.strip(), code, start_date, end_date, status),
+            )
+            ids.append(int(cur.lastrowid))
+    finally:
+        cur.close()
+    record_changes_tx(conn, ENTITY_ASSIGNMENT, ids, OP_INSERT)
+    return ids
+
+
+def add_assignments(
+    project_id: int,
+    surveyor_id: int,
+    role: str,
+    province_codes: list,
+    start_date,
+    end_date,
+    status: str,
+) -> list:
+    """Without an overlap check; see core.assignments.assign()."""
+    return run_in_transaction(
+        lambda conn: add_assignments_tx(conn, project_id, surveyor_id, role, province_codes, start_date, end_date, status)
+    )
+
+
+def ensure_name_key_columns() -> None:
+    """
+    Adds the indexed Surveyor_Name_Key / Father_Name_Key columns if they are missing.
+    Safe to call repeatedly.
+    """
+    have = query_df(
+        """
+        SELECT COLUMN_NAME
+        FROM information_schema.COLUMNS
+        WHERE TABLE_SCHEMA = DATABASE()
+          AND TABLE_NAME = 'surveyors'
+          AND COLUMN_NAME IN ('Surveyor_Name_Key', 'Father_Name_Key')
+        """
     )
+    existing = set(have["COLUMN_NAME"].tolist()) if not have.empty else set()
+    if "Surveyor_Name_Key" not in existing:
+        execute(
+            "ALTER TABLE surveyors ADD COLUMN Surveyor_Name_Key VARCHAR(150) NULL, "
+            "ADD INDEX idx_surveyors_name_key (Surveyor_Name_Key)"
+        )
+    if "Father_Name_Key" not in existing:
+        execute(
+            "ALTER TABLE surveyors ADD COLUMN Father_Name_Key VARCHAR(150) NULL, "
+            "ADD INDEX idx_surveyors_father_key (Father_Name_Key)"
+        )
+
+
+def ensure_name_tokens_table() -> None:
+    """
+    surveyor_name_tokens: one row per name token (see normalize.name_tokens).
+    Name search is a prefix range on the primary key instead of a
+    '%key%' scan of surveyors.
+    """
+    execute(
+        """
+        CREATE TABLE IF NOT EXISTS surveyor_name_tokens (
+          Token       VARCHAR(150) NOT NULL,
+          Surveyor_ID INT          NOT NULL,
+          PRIMARY KEY (Token, Surveyor_ID),
+          KEY idx_name_tokens_surveyor (Surveyor_ID),
+          CONSTRAINT fk_name_tokens_surveyor FOREIGN KEY (Surveyor_ID)
+            REFERENCES surveyors (Surveyor_ID) ON DELETE CASCADE
+        )
+        """
+    )
+
+
+def write_name_tokens_tx(conn, names: List[Tuple[int, str]]) -> None:
+    """Replaces the name tokens of (Surveyor_ID, Surveyor_Name) pairs inside the caller's transaction."""
+    if not names:
+        return
+    ids = [int(sid) for sid, _ in names]
+    rows = [(token, int(sid)) for sid, name in names for token in name_tokens(name)]
+    cur = conn.cursor()
+    try:
+        cur.execute(
+            f"DELETE FROM surveyor_name_tokens WHERE Surveyor_ID IN ({','.join(['%s'] * len(ids))})",
+            tuple(ids),
+        )
+        if rows:
+            cur.executemany("INSERT IGNORE INTO surveyor_name_tokens (Token, Surveyor_ID) VALUES (%s,%s)", rows)
+    finally:
+        cur.close()
+
+
+def backfill_name_keys(batch_size: int = 1000, only_missing: bool = True) -> int:
+    """
+    Recomputes name keys and name tokens in Surveyor_ID order, one batch per
+    transaction. Returns the number of rows updated.
+    """
+    where_missing = "AND (Surveyor_Name_Key IS NULL OR Father_Name_Key IS NULL)" if only_missing else ""
+    last_id = 0
+    total = 0
+    while True:
+        rows = query_df(
+            f"""
+            SELECT Surveyor_ID, Surveyor_Name, Father_Name
+            FROM surveyors
+            WHERE Surveyor_ID > %s {where_missing}
+            ORDER BY Surveyor_ID
+            LIMIT %s
+            """,
+            (int(last_id), int(batch_size)),
+        )
+        if rows.empty:
+            return total
+
+        updates = [
+            (name_key(r.Surveyor_Name), name_key(r.Father_Name), int(r.Surveyor_ID))
+            for r in rows.itertuples()
+        ]
+        conn = get_connection()
+        try:
+            cur = conn.cursor()
+            cur.executemany(
+                "UPDATE surveyors SET Surveyor_Name_Key=%s, Father_Name_Key=%s WHERE Surveyor_ID=%s",
+                updates,
+            )
+            cur.close()
+            write_name_tokens_tx(conn, [(int(r.Surveyor_ID), r.Surveyor_Name) for r in rows.itertuples()])
+            conn.commit()
+        except Exception:
+            try:
+                conn.rollback()
+            except Exception:
+                pass
+            raise
+        finally:
+            _close(conn)
+
+        total += len(updates)
+        last_id = int(rows["Surveyor_ID"].iloc[-1])
 
 
 def list_surveyor_accounts(surveyor_id: int) -> pd.DataFrame:
-    return query_df(
+    return query_prepared(
         """
         SELECT sba.Bank_Account_ID,
                sba.Payment_Type,
@@ -280,6 +1337,151 @@ def list_surveyor_accounts(surveyor_id: int) -> pd.DataFrame:
     )
 
 
+# -----------------------------
+# Batch lookups
+# -----------------------------
+# Keys are looked up in chunks of DB_BATCH_CHUNK per IN (...) list. Inside a
+# unit of work results are kept in the run's identity map, so asking again
+# for the same key in the same run does not query. Unknown keys map to None.
+
+def _chunks(keys: List[Any], size: int) -> Iterable[List[Any]]:
+    for i in range(0, len(keys), size):
+        yield keys[i : i + size]
+
+
+def _batch_lookup(kind: str, keys: Iterable[Any], fetch: Callable[[List[Any]], Dict[Any, Any]]) -> Dict[Any, Any]:
+    """
+    fetch(chunk) returns {key: value} for the keys it found. Returns a value
+    (or None) for every distinct input key, in input order.
+    """
+    from core.settings import DB_BATCH_CHUNK
+
+    scope = getattr(_scope, "current", None)
+    memo = scope.identity if scope is not None else {}
+
+    wanted = list(dict.fromkeys(keys))
+    missing = [k for k in wanted if (kind, k) not in memo]
+    if missing:
+        count(f"batch_{kind}_fetched")
+    for chunk in _chunks(missing, max(1, int(DB_BATCH_CHUNK))):
+        found = fetch(chunk)
+        for k in chunk:
+            memo[(kind, k)] = found.get(k)
+    return {k: memo[(kind, k)] for k in wanted}
+
+
+def _in_marks(chunk: List[Any]) -> str:
+    return ",".join(["%s"] * len(chunk))
+
+
+def get_surveyors_by_codes(codes: Iterable[str]) -> Dict[str, Optional[dict]]:
+    """{code: {Surveyor_ID, Surveyor_Code, Surveyor_Name} | None}; codes are stripped, matched case-insensitively."""
+    def fetch(chunk):
+        df = query_df(
+            f"SELECT Surveyor_ID, Surveyor_Code, Surveyor_Name FROM surveyors WHERE Surveyor_Code IN ({_in_marks(chunk)})",
+            tuple(chunk),
+            site="batch",
+        )
+        by_upper = {str(r["Surveyor_Code"]).upper(): r for r in df.to_dict("records")}
+        return {k: by_upper[k.upper()] for k in chunk if k.upper() in by_upper}
+
+    return _batch_lookup("surveyor_code", (str(c).strip() for c in codes if c is not None), fetch)
+
+
+def get_surveyors_by_ids(surveyor_ids: Iterable[int]) -> Dict[int, Optional[dict]]:
+    """{Surveyor_ID: {Surveyor_ID, Surveyor_Code, Surveyor_Name, Current_Province_Code} | None}."""
+    def fetch(chunk):
+        df = query_df(
+            f"""
+            SELECT Surveyor_ID, Surveyor_Code, Surveyor_Name, Current_Province_Code
+            FROM surveyors
+            WHERE Surveyor_ID IN ({_in_marks(chunk)})
+            """,
+            tuple(chunk),
+            site="batch",
+        )
+        return {int(r["Surveyor_ID"]): r for r in df.to_dict("records")}
+
+    return _batch_lookup("surveyor_id", (int(i) for i in surveyor_ids), fetch)
+
+
+def get_projects_by_codes(codes: Iterable[str]) -> Dict[str, Optional[dict]]:
+    """{code: {Project_ID, Project_Code, Project_Name, Status} | None}; matched case-insensitively."""
+    def fetch(chunk):
+        df = query_df(
+            f"SELECT Project_ID, Project_Code, Project_Name, Status FROM projects WHERE Project_Code IN ({_in_marks(chunk)})",
+            tuple(chunk),
+            site="batch",
+        )
+        by_upper = {str(r["Project_Code"]).upper(): r for r in df.to_dict("records")}
+        return {k: by_upper[k.upper()] for k in chunk if k.upper() in by_upper}
+
+    return _batch_lookup("project_code", (str(c).strip() for c in codes if c is not None), fetch)
+
+
+def get_projects_by_ids(project_ids: Iterable[int]) -> Dict[int, Optional[dict]]:
+    """{Project_ID: project row (same columns as get_project_by_id) | None}."""
+    def fetch(chunk):
+        df = query_df(
+            f"""
+            SELECT Project_ID, Project_Code, Project_Name, Phase_Number, Project_Type, Client_Name,
+                   Implementing_Partner, Start_Date, End_Date, Status, Notes, Project_Document_Link,
+                   Created_At, Updated_At
+            FROM projects
+            WHERE Project_ID IN ({_in_marks(chunk)})
+            """,
+            tuple(chunk),
+            site="batch",
+        )
+        return {int(r["Project_ID"]): r for r in df.to_dict("records")}
+
+    return _batch_lookup("project_id", (int(i) for i in project_ids), fetch)
+
+
+_ACCOUNT_COLS = [
+    "Bank_Account_ID", "Payment_Type", "Account_Number", "Mobile_Number", "Account_Title",
+    "Is_Default", "Is_Active", "Created_At", "Bank_Name", "Payment_Method",
+]
+
+
+def list_accounts_for_surveyors(surveyor_ids: Iterable[int]) -> Dict[int, pd.DataFrame]:
+    """
+    {Surveyor_ID: accounts frame}, each frame like list_surveyor_accounts()
+    (default first, newest first); surveyors without accounts get an empty frame.
+    """
+    def fetch(chunk):
+        df = query_df(
+            f"""
+            SELECT sba.Surveyor_ID,
+                   sba.Bank_Account_ID,
+                   sba.Payment_Type,
+                   sba.Account_Number,
+                   sba.Mobile_Number,
+                   sba.Account_Title,
+                   sba.Is_Default,
+                   sba.Is_Active,
+                   sba.Created_At,
+                   b.Bank_Name,
+                   b.Payment_Method
+            FROM surveyor_bank_accounts sba
+            JOIN banks b ON b.Bank_ID = sba.Bank_ID
+            WHERE sba.Surveyor_ID IN ({_in_marks(chunk)})
+            ORDER BY sba.Surveyor_ID, sba.Is_Default DESC, sba.Bank_Account_ID DESC
+            """,
+            tuple(chunk),
+            site="batch",
+        )
+        if df.empty:
+            return {}
+        return {
+            int(sid): group.drop(columns=["Surveyor_ID"]).reset_index(drop=True)
+            for sid, group in df.groupby("Surveyor_ID", sort=False)
+        }
+
+    found = _batch_lookup("accounts", (int(i) for i in surveyor_ids), fetch)
+    return {sid: (df if df is not None else pd.DataFrame(columns=_ACCOUNT_COLS)) for sid, df in found.items()}
+
+
 def add_surveyor_account_tx(
     conn,
     surveyor_id: int,
@@ -294,7 +1496,7 @@ def add_surveyor_account_tx(
     cur = conn.cursor()
     try:
         if int(make_default) == 1:
-            cur.execute("UPDATE surveyor_bank_accounts SET Is_Default=0 WHERE Surveyor_ID=%s", (int(surveyor_id),))
+            _clear_default_tx(conn, surveyor_id)
         cur.execute(
             """
             INSERT INTO surveyor_bank_accounts
@@ -315,6 +1517,7 @@ def add_surveyor_account_tx(
         )
         new_id = cur.lastrowid
         cur.close()
+        record_change_tx(conn, ENTITY_ACCOUNT, new_id, OP_INSERT)
         return int(new_id)
     except Exception:
         try:
@@ -324,16 +1527,36 @@ def add_surveyor_account_tx(
         raise
 
 
+def _clear_default_tx(conn, surveyor_id: int) -> None:
+    cur = conn.cursor()
+    try:
+        cur.execute(
+            "SELECT Bank_Account_ID FROM surveyor_bank_accounts WHERE Surveyor_ID=%s AND Is_Default=1 FOR UPDATE",
+            (int(surveyor_id),),
+        )
+        ids = [int(r[0]) for r in cur.fetchall()]
+        if ids:
+            cur.execute("UPDATE surveyor_bank_accounts SET Is_Default=0 WHERE Surveyor_ID=%s", (int(surveyor_id),))
+            record_changes_tx(conn, ENTITY_ACCOUNT, ids, OP_UPDATE)
+    finally:
+        try:
+            cur.close()
+        except Exception:
+            pass
+
+
 def set_default_account_tx(conn, surveyor_id: int, bank_account_id: int) -> int:
     cur = conn.cursor()
     try:
-        cur.execute("UPDATE surveyor_bank_accounts SET Is_Default=0 WHERE Surveyor_ID=%s", (int(surveyor_id),))
+        _clear_default_tx(conn, surveyor_id)
         cur.execute(
             "UPDATE surveyor_bank_accounts SET Is_Default=1 WHERE Bank_Account_ID=%s AND Surveyor_ID=%s",
             (int(bank_account_id), int(surveyor_id)),
         )
         rc = cur.rowcount
         cur.close()
+        if rc:
+            record_change_tx(conn, ENTITY_ACCOUNT, bank_account_id, OP_UPDATE)
         return int(rc)
     except Exception:
         try:
@@ -371,7 +1594,8 @@ def generate_project_code_tx(conn, client_name: str, project_name: str, start_da
             """,
             (client_code, project_key, year),
         )
-        cur.execute(
+        pcur = execute_prepared(
+            conn,
             """
             SELECT Last_Phase
             FROM project_phase_sequences
@@ -380,7 +1604,8 @@ def generate_project_code_tx(conn, client_name: str, project_name: str, start_da
             """,
             (client_code, project_key, year),
         )
-        row = cur.fetchone()
+        rows = pcur.fetchall()
+        row = rows[0] if rows else None
         last_phase = int(row[0]) if row else 0
         phase = last_phase + 1
         cur.execute(
@@ -400,17 +1625,15 @@ def generate_project_code_tx(conn, client_name: str, project_name: str, start_da
             pass
 
 
-def add_project_auto(data: dict) -> int:
-    conn = get_connection()
+def add_project_auto_tx(conn, data: dict) -> int:
+    code, phase = generate_project_code_tx(
+        conn,
+        client_name=data.get("Client_Name") or "",
+        project_name=data.get("Project_Name") or "",
+        start_date=data.get("Start_Date"),
+    )
+    cur = conn.cursor()
     try:
-        conn.start_transaction()
-        code, phase = generate_project_code_tx(
-            conn,
-            client_name=data.get("Client_Name") or "",
-            project_name=data.get("Project_Name") or "",
-            start_date=data.get("Start_Date"),
-        )
-        cur = conn.cursor()
         cur.execute(
             """
             INSERT INTO projects
@@ -433,61 +1656,54 @@ def add_project_auto(data: dict) -> int:
                 (data.get("Project_Document_Link") or None),
             ),
         )
-        new_id = cur.lastrowid
-        cur.close()
-        conn.commit()
-        return int(new_id)
-    except Exception:
+        new_id = int(cur.lastrowid)
+        record_change_tx(conn, ENTITY_PROJECT, new_id, OP_INSERT)
+        return new_id
+    finally:
         try:
-            conn.rollback()
+            cur.close()
         except Exception:
             pass
-        raise
-    finally:
-        _close(conn)
+
+
+def add_project_auto(data: dict) -> int:
+    new_id = run_in_transaction(lambda conn: add_project_auto_tx(conn, data))
+    _projects_changed()
+    return new_id
 
 
 def get_next_surveyor_code(perm_prov_code: str, conn=None) -> str:
+    """
+    With conn: runs inside the caller's transaction.
+    Without conn: runs in its own transaction (retried on deadlock).
+    """
     from core.settings import SURVEYOR_CODE_PREFIX
 
-    owns_conn = conn is None
-    if owns_conn:
-        conn = get_connection()
+    if conn is None:
+        return run_in_transaction(lambda c: get_next_surveyor_code(perm_prov_code, conn=c))
 
+    cur = conn.cursor()
     try:
-        if owns_conn:
-            conn.start_transaction()
-
-        cur = conn.cursor()
         cur.execute(
             "INSERT IGNORE INTO province_sequences (Province_Code, Last_Number) VALUES (%s, 0)",
             (perm_prov_code,),
         )
-        cur.execute(
+        pcur = execute_prepared(
+            conn,
             "SELECT Last_Number FROM province_sequences WHERE Province_Code=%s FOR UPDATE",
             (perm_prov_code,),
         )
-        row = cur.fetchone()
+        rows = pcur.fetchall()
+        row = rows[0] if rows else None
         last = int(row[0]) if row else 0
         nxt = last + 1
         cur.execute(
             "UPDATE province_sequences SET Last_Number=%s WHERE Province_Code=%s",
             (int(nxt), perm_prov_code),
         )
-        code = f"{SURVEYOR_CODE_PREFIX}-{perm_prov_code}-{nxt:03d}"
-        cur.close()
-
-        if owns_conn:
-            conn.commit()
-
-        return code
-    except Exception:
-        if owns_conn:
-            try:
-                conn.rollback()
-            except Exception:
-                pass
-        raise
+        return f"{SURVEYOR_CODE_PREFIX}-{perm_prov_code}-{nxt:03d}"
     finally:
-        if owns_conn:
-            _close(conn)
+        try:
+            cur.close()
+        except Exception:
+            pass
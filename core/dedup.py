@@ -0,0 +1,244 @@
+from __future__ import annotations
+
+import re
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+import pandas as pd
+
+from core.db import query_df, execute, get_connection, _close
+from core.normalize import fold_text, _DIGITS, _SEPARATOR_RE
+
+KEY_TAZKIRA = "TAZKIRA"
+KEY_PHONE = "PHONE"
+KEY_NAME_FATHER = "NAME_FATHER"
+
+KEY_LABELS = {
+    KEY_TAZKIRA: "same Tazkira number",
+    KEY_PHONE: "same phone/WhatsApp number",
+    KEY_NAME_FATHER: "same name and father name",
+}
+
+def tazkira_key(value: Optional[str]) -> Optional[str]:
+    digits = re.sub(r"\D", "", (value or "").translate(_DIGITS))
+    return digits if len(digits) >= 6 else None
+
+
+def phone_key(value: Optional[str]) -> Optional[str]:
+    """Last 9 digits, so +93731212123, 0093731212123 and 0731212123 collide."""
+    digits = re.sub(r"\D", "", (value or "").translate(_DIGITS)).lstrip("0")
+    if len(digits) < 7:
+        return None
+    return digits[-9:]
+
+
+def full_name_key(value: Optional[str]) -> str:
+    """
+    Folded name without separators, but with every letter kept: unlike
+    name_key() (a search key), Mohammad and Mahmood do not share a block.
+    """
+    return "".join(t for t in _SEPARATOR_RE.split(fold_text(value)) if t)
+
+
+def blocking_keys(
+    tazkira: Optional[str],
+    phones: Iterable[Optional[str]],
+    name: Optional[str],
+    father: Optional[str],
+) -> Set[Tuple[str, str]]:
+    keys: Set[Tuple[str, str]] = set()
+    t = tazkira_key(tazkira)
+    if t:
+        keys.add((KEY_TAZKIRA, t))
+    for p in phones:
+        pk = phone_key(p)
+        if pk:
+            keys.add((KEY_PHONE, pk))
+    nk, fk = full_name_key(name), full_name_key(father)
+    if nk and fk:
+        keys.add((KEY_NAME_FATHER, f"{nk}|{fk}"[:190]))
+    return keys
+
+
+def ensure_dedup_table() -> None:
+    execute(
+        """
+        CREATE TABLE IF NOT EXISTS surveyor_dedup_keys (
+          Key_Type    VARCHAR(16)  NOT NULL,
+          Key_Value   VARCHAR(190) NOT NULL,
+          Surveyor_ID INT          NOT NULL,
+          PRIMARY KEY (Key_Type, Key_Value, Surveyor_ID),
+          KEY idx_dedup_surveyor (Surveyor_ID),
+          CONSTRAINT fk_dedup_surveyor FOREIGN KEY (Surveyor_ID)
+            REFERENCES surveyors (Surveyor_ID) ON DELETE CASCADE
+        )
+        """
+    )
+
+
+def find_duplicates(keys: Set[Tuple[str, str]], exclude_surveyor_id: Optional[int] = None) -> pd.DataFrame:
+    """
+    Pre-insert check: one primary-key lookup per blocking key.
+    Returns matching surveyors with the Key_Type that matched.
+    """
+    if not keys:
+        return pd.DataFrame(columns=["Surveyor_ID", "Surveyor_Code", "Surveyor_Name", "Father_Name", "Key_Type", "Key_Value"])
+
+    keys = sorted(keys)
+    cond = " OR ".join(["(k.Key_Type=%s AND k.Key_Value=%s)"] * len(keys))
+    params: List = [v for pair in keys for v in pair]
+    extra = ""
+    if exclude_surveyor_id is not None:
+        extra = "AND k.Surveyor_ID <> %s"
+        params.append(int(exclude_surveyor_id))
+
+    return query_df(
+        f"""
+        SELECT s.Surveyor_ID, s.Surveyor_Code, s.Surveyor_Name, s.Father_Name, k.Key_Type, k.Key_Value
+        FROM surveyor_dedup_keys k
+        JOIN surveyors s ON s.Surveyor_ID = k.Surveyor_ID
+        WHERE ({cond}) {extra}
+        ORDER BY s.Surveyor_ID
+        """,
+        tuple(params),
+    )
+
+
+def register_keys_tx(conn, surveyor_id: int, keys: Set[Tuple[str, str]]) -> None:
+    """Replaces the blocking keys of one surveyor inside the caller's transaction."""
+    cur = conn.cursor()
+    try:
+        cur.execute("DELETE FROM surveyor_dedup_keys WHERE Surveyor_ID=%s", (int(surveyor_id),))
+        if keys:
+            cur.executemany(
+                "INSERT IGNORE INTO surveyor_dedup_keys (Key_Type, Key_Value, Surveyor_ID) VALUES (%s,%s,%s)",
+                [(kt, kv, int(surveyor_id)) for kt, kv in sorted(keys)],
+            )
+    finally:
+        try:
+            cur.close()
+        except Exception:
+            pass
+
+
+def rebuild_dedup_keys(batch_size: int = 1000) -> int:
+    """Recomputes blocking keys for every surveyor, batch by batch. Returns rows processed."""
+    last_id = 0
+    total = 0
+    while True:
+        rows = query_df(
+            """
+            SELECT Surveyor_ID, Tazkira_No, Phone_Number, Whatsapp_Number, Surveyor_Name, Father_Name
+            FROM surveyors
+            WHERE Surveyor_ID > %s
+            ORDER BY Surveyor_ID
+            LIMIT %s
+            """,
+            (int(last_id), int(batch_size)),
+        )
+        if rows.empty:
+            return total
+
+        ids = [int(x) for x in rows["Surveyor_ID"].tolist()]
+        inserts = []
+        for r in rows.itertuples():
+            for kt, kv in blocking_keys(r.Tazkira_No, (r.Phone_Number, r.Whatsapp_Number), r.Surveyor_Name, r.Father_Name):
+                inserts.append((kt, kv, int(r.Surveyor_ID)))
+
+        conn = get_connection()
+        try:
+            cur = conn.cursor()
+            marks = ",".join(["%s"] * len(ids))
+            cur.execute(f"DELETE FROM surveyor_dedup_keys WHERE Surveyor_ID IN ({marks})", tuple(ids))
+            if inserts:
+                cur.executemany(
+                    "INSERT IGNORE INTO surveyor_dedup_keys (Key_Type, Key_Value, Surveyor_ID) VALUES (%s,%s,%s)",
+                    inserts,
+                )
+            conn.commit()
+            cur.close()
+        except Exception:
+            try:
+                conn.rollback()
+            except Exception:
+                pass
+            raise
+        finally:
+            _close(conn)
+
+        total += len(ids)
+        last_id = ids[-1]
+
+
+class _UnionFind:
+    def __init__(self):
+        self.parent: Dict[int, int] = {}
+
+    def find(self, x: int) -> int:
+        root = self.parent.setdefault(x, x)
+        while root != self.parent[root]:
+            root = self.parent[root]
+        while x != root:
+            self.parent[x], x = root, self.parent[x]
+        return root
+
+    def union(self, a: int, b: int) -> None:
+        ra, rb = self.find(a), self.find(b)
+        if ra != rb:
+            self.parent[max(ra, rb)] = min(ra, rb)
+
+
+def find_duplicate_clusters() -> List[dict]:
+    """
+    Groups surveyors that share a blocking key.
+
+    Only keys with more than one surveyor are read (one pass over the key
+    index). Tazkira and phone keys identify a person, so those clusters are
+    merged with union-find, linear in the number of keys. A name + father
+    block is its own cluster and is not chained to other blocks: a common
+    name must not pull unrelated people together. A block whose members are
+    all in one Tazkira/phone cluster only adds its reason to it.
+    """
+    rows = query_df(
+        """
+        SELECT k.Key_Type, k.Key_Value, k.Surveyor_ID
+        FROM surveyor_dedup_keys k
+        JOIN (
+          SELECT Key_Type, Key_Value
+          FROM surveyor_dedup_keys
+          GROUP BY Key_Type, Key_Value
+          HAVING COUNT(*) > 1
+        ) d ON d.Key_Type = k.Key_Type AND d.Key_Value = k.Key_Value
+        """
+    )
+    if rows.empty:
+        return []
+
+    uf = _UnionFind()
+    reasons: Dict[int, Set[str]] = {}
+    first_of_key: Dict[Tuple[str, str], int] = {}
+    name_blocks: Dict[str, List[int]] = {}
+    for r in rows.itertuples():
+        sid = int(r.Surveyor_ID)
+        if r.Key_Type == KEY_NAME_FATHER:
+            name_blocks.setdefault(r.Key_Value, []).append(sid)
+            continue
+        first = first_of_key.setdefault((r.Key_Type, r.Key_Value), sid)
+        uf.union(first, sid)
+        reasons.setdefault(sid, set()).add(r.Key_Type)
+
+    clusters: Dict[int, List[int]] = {}
+    for sid in reasons:
+        clusters.setdefault(uf.find(sid), []).append(sid)
+    kinds: Dict[int, Set[str]] = {root: set().union(*(reasons[s] for s in members)) for root, members in clusters.items()}
+
+    out = []
+    for members in name_blocks.values():
+        roots = {uf.find(sid) if sid in reasons else None for sid in members}
+        if len(roots) == 1 and None not in roots:
+            kinds[roots.pop()].add(KEY_NAME_FATHER)
+        else:
+            out.append({"Surveyor_IDs": sorted(members), "Reasons": [KEY_NAME_FATHER]})
+    for root, members in clusters.items():
+        out.append({"Surveyor_IDs": sorted(members), "Reasons": sorted(kinds[root])})
+    out.sort(key=lambda c: c["Surveyor_IDs"])
+    return out
@@ -0,0 +1,679 @@
+from __future__ import annotations
+
+import json
+import os
+import shutil
+import socket
+import threading
+import time
+import traceback
+import uuid
+from contextlib import nullcontext
+from datetime import date
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+import pandas as pd
+
+from core.db import (
+    _close,
+    bound_conn_params,
+    execute,
+    get_conn_params,
+    get_connection,
+    query_df,
+    run_in_transaction,
+    unit_of_work,
+)
+from core.resilience import guarded_write
+from core.settings import JOBS_DIR, JOBS_EMBEDDED, JOB_LIMITS, JOB_POLL_S, JOB_STALE_S, JOB_WORKERS
+
+# -----------------------------
+# Background jobs
+# -----------------------------
+# کارهای طولانی (خروجی، ورود داده، فایل پرداخت، backfill، thumbnail) در جدول jobs
+# صف می‌شوند و workerها اجرایشان می‌کنند؛ refresh مرورگر کار را نمی‌کشد.
+#
+# QUEUED -> RUNNING -> DONE | FAILED | CANCELLED. A failed attempt goes back to
+# QUEUED with a growing delay until Max_Attempts. Workers claim jobs with
+# SELECT ... FOR UPDATE SKIP LOCKED, so several worker processes can share the
+# table. Results are files under JOBS_DIR/<Job_ID>/.
+
+STATUS_QUEUED = "QUEUED"
+STATUS_RUNNING = "RUNNING"
+STATUS_DONE = "DONE"
+STATUS_FAILED = "FAILED"
+STATUS_CANCELLED = "CANCELLED"
+
+FINISHED_STATUSES = (STATUS_DONE, STATUS_FAILED, STATUS_CANCELLED)
+
+# progress is written at most once per interval per job
+_PROGRESS_INTERVAL_S = 1.0
+
+
+def ensure_jobs_table() -> None:
+    execute(
+        """
+        CREATE TABLE IF NOT EXISTS jobs (
+          Job_ID           BIGINT       NOT NULL AUTO_INCREMENT PRIMARY KEY,
+          Job_Type         VARCHAR(40)  NOT NULL,
+          Params_JSON      JSON         NULL,
+          Status           VARCHAR(12)  NOT NULL DEFAULT 'QUEUED',
+          Attempts         INT          NOT NULL DEFAULT 0,
+          Max_Attempts     INT          NOT NULL DEFAULT 1,
+          Progress         DECIMAL(5,4) NOT NULL DEFAULT 0,
+          Message          VARCHAR(255) NULL,
+          Result_JSON      JSON         NULL,
+          Error            TEXT         NULL,
+          Cancel_Requested TINYINT(1)   NOT NULL DEFAULT 0,
+          Submitted_By     VARCHAR(100) NULL,
+          Worker           VARCHAR(100) NULL,
+          Run_After        TIMESTAMP    NOT NULL DEFAULT CURRENT_TIMESTAMP,
+          Heartbeat_At     TIMESTAMP    NULL,
+          Created_At       TIMESTAMP    NOT NULL DEFAULT CURRENT_TIMESTAMP,
+          Started_At       TIMESTAMP    NULL,
+          Finished_At      TIMESTAMP    NULL,
+          KEY idx_jobs_status_run (Status, Run_After)
+        )
+        """
+    )
+
+
+# -----------------------------
+# Job types
+# -----------------------------
+
+class JobCancelled(Exception):
+    pass
+
+
+class JobType:
+    def __init__(self, name: str, fn: Callable, label: str, limit: int, max_attempts: int, retry_delay_s: int):
+        self.name = name
+        self.fn = fn
+        self.label = label
+        self.limit = limit
+        self.max_attempts = max_attempts
+        self.retry_delay_s = retry_delay_s
+
+
+_TYPES: Dict[str, JobType] = {}
+
+
+def job_type(name: str, label: str, limit: int = 1, max_attempts: int = 3, retry_delay_s: int = 30):
+    """
+    Registers fn(ctx, params) -> summary dict as a job type. limit is the
+    number of jobs of this type one worker pool runs at once (JOB_LIMITS
+    overrides it). Use max_attempts=1 for work that must not be replayed.
+    """
+    def deco(fn):
+        _TYPES[name] = JobType(name, fn, label, JOB_LIMITS.get(name, limit), max_attempts, retry_delay_s)
+        return fn
+
+    return deco
+
+
+def job_types() -> Dict[str, JobType]:
+    return dict(_TYPES)
+
+
+# -----------------------------
+# Queue API
+# -----------------------------
+
+def result_dir(job_id: int) -> Path:
+    return JOBS_DIR / str(int(job_id))
+
+
+def result_files(job_id: int) -> List[Path]:
+    d = result_dir(job_id)
+    if not d.is_dir():
+        return []
+    return sorted(p for p in d.iterdir() if p.is_file())
+
+
+def stage_input(data: bytes, suffix: str = "") -> str:
+    """Saves an uploaded input file for a job; pass the returned path in the job params."""
+    incoming = JOBS_DIR / "incoming"
+    incoming.mkdir(parents=True, exist_ok=True)
+    path = incoming / f"{uuid.uuid4().hex}{suffix}"
+    path.write_bytes(data)
+    return str(path)
+
+
+def submit(job_type_name: str, params: Optional[dict] = None, submitted_by: Optional[str] = None) -> int:
+    """Queues a job; returns its Job_ID."""
+    jt = _TYPES.get(job_type_name)
+    if jt is None:
+        raise ValueError(f"Unknown job type: {job_type_name}")
+
+    def tx(conn):
+        cur = conn.cursor()
+        try:
+            cur.execute(
+                """
+                INSERT INTO jobs (Job_Type, Params_JSON, Max_Attempts, Submitted_By)
+                VALUES (%s, %s, %s, %s)
+                """,
+                (jt.name, json.dumps(params or {}, default=str), int(jt.max_attempts), submitted_by),
+            )
+            return int(cur.lastrowid)
+        finally:
+            cur.close()
+
+    return run_in_transaction(tx)
+
+
+def _loads(value) -> Any:
+    if value is None or (not isinstance(value, (str, bytes, bytearray, dict, list)) and pd.isna(value)):
+        return None
+    if isinstance(value, (bytes, bytearray)):
+        value = value.decode("utf-8")
+    return json.loads(value) if isinstance(value, str) else value
+
+
+def get_job(job_id: int) -> Optional[dict]:
+    df = query_df("SELECT * FROM jobs WHERE Job_ID=%s", (int(job_id),), site="lookup")
+    if df.empty:
+        return None
+    job = df.astype(object).where(df.notna(), None).iloc[0].to_dict()
+    job["Params"] = _loads(job.pop("Params_JSON"))
+    job["Result"] = _loads(job.pop("Result_JSON"))
+    return job
+
+
+def list_jobs(limit: int = 50, status: Optional[str] = None) -> pd.DataFrame:
+    where, params = "", []
+    if status:
+        where, params = "WHERE Status=%s", [status]
+    return query_df(
+        f"""
+        SELECT Job_ID, Job_Type, Status, Progress, Message, Attempts, Max_Attempts,
+               Submitted_By, Created_At, Started_At, Finished_At
+        FROM jobs
+        {where}
+        ORDER BY Job_ID DESC
+        LIMIT %s
+        """,
+        tuple(params) + (int(limit),),
+        site="lookup",
+    )
+
+
+def active_job(job_type_name: str) -> Optional[int]:
+    """Job_ID of a queued or running job of this type, if any."""
+    df = query_df(
+        "SELECT Job_ID FROM jobs WHERE Job_Type=%s AND Status IN (%s, %s) ORDER BY Job_ID LIMIT 1",
+        (job_type_name, STATUS_QUEUED, STATUS_RUNNING),
+        site="lookup",
+    )
+    return None if df.empty else int(df.iloc[0]["Job_ID"])
+
+
+def status_counts() -> Dict[str, int]:
+    df = query_df("SELECT Status, COUNT(*) AS n FROM jobs GROUP BY Status", site="lookup")
+    return {r.Status: int(r.n) for r in df.itertuples()}
+
+
+def cancel(job_id: int) -> None:
+    """A queued job is cancelled at once; a running one stops at its next progress report."""
+    # MySQL assigns left to right: Finished_At sees the new Status
+    execute(
+        """
+        UPDATE jobs
+        SET Status = IF(Status='QUEUED', 'CANCELLED', Status),
+            Finished_At = IF(Status='CANCELLED', NOW(), Finished_At),
+            Cancel_Requested = 1
+        WHERE Job_ID=%s AND Status IN ('QUEUED', 'RUNNING')
+        """,
+        (int(job_id),),
+    )
+
+
+def retry(job_id: int) -> int:
+    """Queues a failed or cancelled job again with fresh attempts (not for max_attempts=1 types)."""
+    return execute(
+        """
+        UPDATE jobs
+        SET Status='QUEUED', Attempts=0, Progress=0, Message=NULL, Error=NULL, Result_JSON=NULL,
+            Cancel_Requested=0, Run_After=NOW(), Started_At=NULL, Finished_At=NULL
+        WHERE Job_ID=%s AND Status IN ('FAILED', 'CANCELLED') AND Max_Attempts > 1
+        """,
+        (int(job_id),),
+    )
+
+
+def purge(days: int = 14) -> int:
+    """Deletes finished jobs older than days, with their result files. Returns the number removed."""
+    old = query_df(
+        "SELECT Job_ID FROM jobs WHERE Status IN ('DONE','FAILED','CANCELLED') AND Finished_At < NOW() - INTERVAL %s DAY",
+        (int(days),),
+        site="batch",
+    )
+    for job_id in old["Job_ID"].tolist() if not old.empty else []:
+        shutil.rmtree(result_dir(int(job_id)), ignore_errors=True)
+        execute("DELETE FROM jobs WHERE Job_ID=%s", (int(job_id),))
+    return len(old)
+
+
+# -----------------------------
+# Running a job
+# -----------------------------
+
+class JobContext:
+    """Handed to a job function: params, output directory, progress and cancellation."""
+
+    def __init__(self, job_id: int, params: dict, attempt: int):
+        self.job_id = job_id
+        self.params = params
+        self.attempt = attempt
+        self.out_dir = result_dir(job_id)
+        self._last_report = 0.0
+
+    def progress(self, fraction: float, message: Optional[str] = None, force: bool = False) -> None:
+        """Records progress (0..1) and raises JobCancelled if a cancel was requested."""
+        now = time.monotonic()
+        if not force and now - self._last_report < _PROGRESS_INTERVAL_S:
+            return
+        self._last_report = now
+        fraction = max(0.0, min(1.0, float(fraction)))
+        if guarded_write(lambda: _report(self.job_id, fraction, (message or "")[:255] or None)):
+            raise JobCancelled()
+
+
+def _report(job_id: int, fraction: float, message: Optional[str]) -> bool:
+    """
+    Writes progress and returns Cancel_Requested. Uses a connection of its own:
+    the job may be reading inside a read-only snapshot unit_of_work, which can
+    neither take this write nor see a cancel requested after it started.
+    """
+    conn = get_connection(shared=False)
+    try:
+        cur = conn.cursor()
+        try:
+            cur.execute(
+                "UPDATE jobs SET Progress=%s, Message=%s, Heartbeat_At=NOW() WHERE Job_ID=%s",
+                (fraction, message, int(job_id)),
+            )
+            conn.commit()
+            cur.execute("SELECT Cancel_Requested FROM jobs WHERE Job_ID=%s", (int(job_id),))
+            row = cur.fetchone()
+        finally:
+            cur.close()
+        return bool(row and int(row[0]))
+    finally:
+        _close(conn)
+
+
+def _claim(types: List[str], worker: str) -> Optional[dict]:
+    marks = ",".join(["%s"] * len(types))
+
+    def tx(conn):
+        cur = conn.cursor(dictionary=True)
+        try:
+            cur.execute(
+                f"""
+                SELECT Job_ID, Job_Type, Params_JSON, Attempts, Max_Attempts
+                FROM jobs
+                WHERE Status='QUEUED' AND Run_After <= NOW() AND Job_Type IN ({marks})
+                ORDER BY Job_ID
+                LIMIT 1
+                FOR UPDATE SKIP LOCKED
+                """,
+                tuple(types),
+            )
+            row = cur.fetchone()
+            if row is None:
+                return None
+            cur.execute(
+                """
+                UPDATE jobs
+                SET Status='RUNNING', Attempts=Attempts+1, Worker=%s, Message=NULL,
+                    Started_At=NOW(), Heartbeat_At=NOW()
+                WHERE Job_ID=%s
+                """,
+                (worker, row["Job_ID"]),
+            )
+            row["Attempts"] = int(row["Attempts"]) + 1
+            return row
+        finally:
+            cur.close()
+
+    return run_in_transaction(tx)
+
+
+def _finish(job_id: int, status: str, result: Optional[dict] = None, error: Optional[str] = None) -> None:
+    execute(
+        """
+        UPDATE jobs
+        SET Status=%s, Result_JSON=%s, Error=%s, Finished_At=NOW(), Heartbeat_At=NOW(),
+            Progress=IF(%s='DONE', 1, Progress)
+        WHERE Job_ID=%s
+        """,
+        (status, json.dumps(result, default=str) if result is not None else None, error, status, int(job_id)),
+    )
+
+
+def _requeue(job_id: int, delay_s: int, error: str) -> None:
+    execute(
+        """
+        UPDATE jobs
+        SET Status='QUEUED', Error=%s, Worker=NULL, Run_After=NOW() + INTERVAL %s SECOND
+        WHERE Job_ID=%s
+        """,
+        (error, int(delay_s), int(job_id)),
+    )
+
+
+def requeue_stale(stale_s: int = JOB_STALE_S) -> int:
+    """RUNNING jobs whose worker stopped heartbeating: queued again, or FAILED when out of attempts."""
+    return execute(
+        """
+        UPDATE jobs
+        SET Finished_At = IF(Attempts < Max_Attempts, NULL, NOW()),
+            Status = IF(Attempts < Max_Attempts, 'QUEUED', 'FAILED'),
+            Error = 'The worker stopped while running this job.',
+            Worker = NULL
+        WHERE Status='RUNNING' AND Heartbeat_At < NOW() - INTERVAL %s SECOND
+        """,
+        (int(stale_s),),
+    )
+
+
+def run_job(job: dict, worker: str = "inline") -> str:
+    """Runs one claimed job to its next state; returns the new status."""
+    job_id = int(job["Job_ID"])
+    jt = _TYPES.get(job["Job_Type"])
+    if jt is None:
+        _finish(job_id, STATUS_FAILED, error=f"Unknown job type: {job['Job_Type']}")
+        return STATUS_FAILED
+
+    ctx = JobContext(job_id, _loads(job.get("Params_JSON")) or {}, int(job["Attempts"]))
+    ctx.out_dir.mkdir(parents=True, exist_ok=True)
+    try:
+        summary = jt.fn(ctx, ctx.params)
+    except JobCancelled:
+        _finish(job_id, STATUS_CANCELLED, error="Cancelled.")
+        return STATUS_CANCELLED
+    except Exception as ex:
+        error = "".join(traceback.format_exception_only(type(ex), ex)).strip()
+        if ctx.attempt < int(job["Max_Attempts"]):
+            _requeue(job_id, jt.retry_delay_s * 2 ** (ctx.attempt - 1), error)
+            return STATUS_QUEUED
+        _finish(job_id, STATUS_FAILED, error=error + "\n\n" + traceback.format_exc()[-4000:])
+        return STATUS_FAILED
+
+    files = [p.name for p in result_files(job_id)]
+    _finish(job_id, STATUS_DONE, result={"summary": summary or {}, "files": files})
+    return STATUS_DONE
+
+
+# -----------------------------
+# Worker pool
+# -----------------------------
+
+class WorkerPool:
+    """
+    One dispatcher thread claims jobs while there is a free worker slot and
+    the job type is under its limit; each job runs in its own thread. The
+    dispatcher also heartbeats running jobs and requeues stale ones.
+    """
+
+    def __init__(self, workers: int = JOB_WORKERS, conn_params: Optional[dict] = None, poll_s: float = JOB_POLL_S):
+        self.workers = max(1, int(workers))
+        self.poll_s = poll_s
+        self.name = f"{socket.gethostname()}:{os.getpid()}"
+        self.last_error: Optional[str] = None
+        self._params = conn_params
+        self._running: Dict[int, str] = {}  # Job_ID -> Job_Type
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _bound(self):
+        return bound_conn_params(self._params) if self._params is not None else nullcontext()
+
+    def start(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name="ppc-jobs", daemon=True)
+        self._thread.start()
+
+    def stop(self, wait: bool = True) -> None:
+        """Stops claiming; with wait, returns when the running jobs have finished."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        while wait and self.running():
+            time.sleep(0.2)
+
+    def alive(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def running(self) -> Dict[int, str]:
+        with self._lock:
+            return dict(self._running)
+
+    def _free_types(self) -> List[str]:
+        with self._lock:
+            if len(self._running) >= self.workers:
+                return []
+            busy: Dict[str, int] = {}
+            for t in self._running.values():
+                busy[t] = busy.get(t, 0) + 1
+        return [name for name, jt in _TYPES.items() if busy.get(name, 0) < jt.limit]
+
+    def _heartbeat(self) -> None:
+        ids = list(self.running())
+        if ids:
+            marks = ",".join(["%s"] * len(ids))
+            execute(f"UPDATE jobs SET Heartbeat_At=NOW() WHERE Job_ID IN ({marks}) AND Status='RUNNING'", tuple(ids))
+
+    def _loop(self) -> None:
+        last_maintenance = 0.0
+        with self._bound():
+            while not self._stop.is_set():
+                try:
+                    if time.monotonic() - last_maintenance >= max(5.0, JOB_STALE_S / 4):
+                        last_maintenance = time.monotonic()
+                        self._heartbeat()
+                        requeue_stale()
+                    types = self._free_types()
+                    job = _claim(types, self.name) if types else None
+                    self.last_error = None
+                except Exception as ex:
+                    self.last_error = str(ex)
+                    job = None
+                if job is None:
+                    self._stop.wait(self.poll_s)
+                    continue
+                with self._lock:
+                    self._running[int(job["Job_ID"])] = job["Job_Type"]
+                threading.Thread(target=self._run, args=(job,), name=f"ppc-job-{job['Job_ID']}", daemon=True).start()
+
+    def _run(self, job: dict) -> None:
+        try:
+            with self._bound():
+                run_job(job, self.name)
+        except Exception as ex:
+            # the job stays RUNNING and is requeued as stale
+            self.last_error = str(ex)
+        finally:
+            with self._lock:
+                self._running.pop(int(job["Job_ID"]), None)
+
+
+_pool: Optional[WorkerPool] = None
+_pool_lock = threading.Lock()
+
+
+def ensure_workers() -> Optional[WorkerPool]:
+    """
+    Starts the worker pool of this Streamlit process once (JOBS_EMBEDDED);
+    core.startup calls it on the first page run, pages call it again to
+    restart a pool that died. Call from a script thread: the server-wide
+    connection params are resolved there, not those of the calling session.
+    """
+    global _pool
+    if not JOBS_EMBEDDED:
+        return None
+    if _pool is not None and _pool.alive():
+        return _pool
+    with _pool_lock:
+        if _pool is None or not _pool.alive():
+            _pool = WorkerPool(JOB_WORKERS, get_conn_params(session=False))
+            _pool.start()
+    return _pool
+
+
+def embedded_pool() -> Optional[WorkerPool]:
+    return _pool
+
+
+# -----------------------------
+# Built-in job types
+# -----------------------------
+
+def _counted(records, ctx: JobContext, total: int, label: str, every: int = 500):
+    for n, rec in enumerate(records, start=1):
+        if n % every == 0:
+            ctx.progress(n / total if total else 0, f"{n} {label}")
+        yield rec
+
+
+@job_type("export", "Export table (CSV/JSONL)", limit=2)
+def export_job(ctx: JobContext, params: dict) -> dict:
+    from core import services
+
+    kind, fmt = params["kind"], params.get("format", "csv")
+    if kind not in services.EXPORTS:
+        raise ValueError(f"Unknown export: {kind}")
+    with unit_of_work(snapshot=True, read_only=True):
+        total = int(query_df(f"SELECT COUNT(*) AS n FROM {services.EXPORTS[kind][0]}", site="batch").iloc[0]["n"])
+        with open(ctx.out_dir / f"{kind}.{fmt}", "w", encoding="utf-8", newline="") as out:
+            rows = services.write_records(_counted(services.export_rows(kind), ctx, total, "rows"), out, fmt)
+    return {"rows": rows}
+
+
+def _import(ctx: JobContext, params: dict, run: Callable) -> dict:
+    from core import services
+
+    fmt = params.get("format", "csv")
+    path = Path(params["input_path"])
+    with open(path, "r", encoding="utf-8-sig", newline="") as f:
+        total = max(0, sum(1 for _ in f) - (1 if fmt == "csv" else 0))
+    counts: Dict[str, int] = {}
+    with open(path, "r", encoding="utf-8-sig", newline="") as src, open(
+        ctx.out_dir / "results.jsonl", "w", encoding="utf-8"
+    ) as out:
+        results = run(services.read_records(src, fmt))
+        for n, r in enumerate(results, start=1):
+            counts[r["status"]] = counts.get(r["status"], 0) + 1
+            out.write(json.dumps(r, default=str, ensure_ascii=False) + "\n")
+            if n % 50 == 0:
+                ctx.progress(n / total if total else 0, f"{n} rows")
+    path.unlink(missing_ok=True)
+    return counts
+
+
+# not replayed: a retried import could register the same rows twice
+@job_type("import_surveyors", "Import surveyors", max_attempts=1)
+def import_surveyors_job(ctx: JobContext, params: dict) -> dict:
+    from core import services
+
+    return _import(
+        ctx,
+        params,
+        lambda rows: services.import_surveyors(
+            rows, allow_duplicates=bool(params.get("allow_duplicates")), dry_run=bool(params.get("dry_run"))
+        ),
+    )
+
+
+@job_type("import_assignments", "Import assignments", max_attempts=1)
+def import_assignments_job(ctx: JobContext, params: dict) -> dict:
+    from core import services
+
+    return _import(
+        ctx,
+        params,
+        lambda rows: services.import_assignments(
+            rows, allow_overlap=bool(params.get("allow_overlap")), dry_run=bool(params.get("dry_run"))
+        ),
+    )
+
+
+@job_type("payment_run", "Payment files")
+def payment_run_job(ctx: JobContext, params: dict) -> dict:
+    from core.payments import write_payment_run, zip_payment_run
+
+    project_id = params.get("project_id")
+    result = write_payment_run(ctx.out_dir, int(project_id) if project_id else None, params.get("amount") or None)
+    (ctx.out_dir / "payment_run.zip").write_bytes(zip_payment_run(result))
+    return {group: info["rows"] for group, info in result.items()}
+
+
+@job_type("backfill_analytics", "Backfill analytics rollups")
+def backfill_analytics_job(ctx: JobContext, params: dict) -> dict:
+    from core import analytics
+
+    if not params.get("start"):
+        first, last = analytics.extend()
+        return {"start": first, "end": last}
+    start = date.fromisoformat(params["start"])
+    end = date.fromisoformat(params["end"]) if params.get("end") else date.today()
+    total = max(1, (end - start).days + 1)
+    days = analytics.rebuild(
+        start,
+        end,
+        progress=lambda s, e: ctx.progress(((e - start).days + 1) / total, f"rolled up to {e}", force=True),
+    )
+    return {"start": start, "end": end, "days": days}
+
+
+@job_type("reindex", "Rebuild keys / indexes")
+def reindex_job(ctx: JobContext, params: dict) -> dict:
+    from core import services
+
+    return services.reindex(params["target"])
+
+
+@job_type("backup", "Database backup", max_attempts=1)
+def backup_job(ctx: JobContext, params: dict) -> dict:
+    from core import backup
+
+    result = backup.backup(
+        progress=lambda done, total: ctx.progress(done / total if total else 1, f"{done}/{total} chunks")
+    )
+    tables = result["tables"].values()
+    return {
+        "path": result["path"],
+        "tables": len(result["tables"]),
+        "chunks": sum(len(t["chunks"]) for t in tables),
+        "rows": sum(t["rows"] for t in tables),
+        "consistent": result["consistent"],
+        "elapsed_s": result["elapsed_s"],
+    }
+
+
+@job_type("thumbnails", "Generate Tazkira thumbnails")
+def thumbnails_job(ctx: JobContext, params: dict, batch_size: int = 200) -> dict:
+    from core.previews import tazkira_previews
+
+    top = query_df("SELECT COALESCE(MAX(Surveyor_ID), 0) AS m FROM surveyors", site="lookup")
+    max_id = int(top.iloc[0]["m"]) or 1
+    last, made = 0, 0
+    while True:
+        ids = query_df(
+            "SELECT Surveyor_ID FROM surveyors WHERE Surveyor_ID > %s ORDER BY Surveyor_ID LIMIT %s",
+            (last, batch_size),
+            site="batch",
+        )
+        if ids.empty:
+            break
+        batch = [int(i) for i in ids["Surveyor_ID"]]
+        made += len(tazkira_previews(batch))  # renders cache misses only
+        last = batch[-1]
+        ctx.progress(last / max_id, f"{made} thumbnails")
+    return {"thumbnails": made}
@@ -0,0 +1,160 @@
+from __future__ import annotations
+
+import re
+import unicodedata
+from typing import List, Optional, Tuple
+
+# حروف عربی که در فارسی/دری شکل دیگری دارند
+_ARABIC_TO_PERSIAN = str.maketrans(
+    {
+        "ي": "ی",  # ي -> ی
+        "ى": "ی",  # ى -> ی
+        "ك": "ک",  # ك -> ک
+        "ة": "ه",  # ة -> ه
+        "ۀ": "ه",  # ۀ -> ه
+        "ٱ": "ا",  # ٱ -> ا
+    }
+)
+
+# ارقام فارسی و عربی -> لاتین
+_DIGITS = str.maketrans("۰۱۲۳۴۵۶۷۸۹٠١٢٣٤٥٦٧٨٩", "01234567890123456789")
+
+# ZWNJ, ZWJ, tatweel, BOM, RLM/LRM
+_INVISIBLE_RE = re.compile("[‌‍ـ﻿‎‏]")
+_SEPARATOR_RE = re.compile(r"[\s\-_.,'\"`()/\\]+")
+_LATIN_RUN_RE = re.compile(r"[a-z]+")
+
+# ترتیب مهم است: ترکیب‌های دوحرفی قبل از حروف تکی
+_LATIN_FOLDS = (
+    ("ph", "f"),
+    ("ck", "k"),
+    ("q", "k"),
+    ("c", "k"),
+    ("w", "v"),
+    ("x", "ks"),
+)
+_LATIN_VOWELS = set("aeiouy")
+
+NAME_KEY_MAX_LEN = 150
+
+
+def _fold_latin(word: str) -> str:
+    """
+    Reduces a Latin transliteration to a consonant skeleton so that
+    Mohammad / Muhammad / Mohamed all give the same key ("mhmd").
+    The first letter is kept even if it is a vowel (Ahmad -> "ahmd").
+    """
+    for src, dst in _LATIN_FOLDS:
+        word = word.replace(src, dst)
+    if not word:
+        return ""
+    out = [word[0]]
+    for ch in word[1:]:
+        if ch in _LATIN_VOWELS:
+            continue
+        if out[-1] == ch:
+            continue
+        out.append(ch)
+    return "".join(out)
+
+
+def name_key(value: Optional[str]) -> str:
+    """
+    Canonical search key for a person name.
+
+    - Arabic code points are mapped to their Persian forms (ي/ی, ك/ک, ة/ه)
+    - diacritics, hamza marks, tatweel and ZWNJ are removed
+    - spaces and punctuation are dropped, so "محمد علی" == "محمدعلی"
+    - Latin transliterations are folded to a consonant skeleton
+
+    The same function must be used for stored keys and for queries.
+    Punctuation only ("." or "-") gives "", which must not be searched for.
+    """
+    return "".join(_name_words(value))[:NAME_KEY_MAX_LEN]
+
+
+def _name_words(value: Optional[str]) -> List[str]:
+    s = fold_text(value)
+    return [_LATIN_RUN_RE.sub(lambda m: _fold_latin(m.group(0)), t) for t in _SEPARATOR_RE.split(s) if t]
+
+
+def name_tokens(value: Optional[str]) -> List[str]:
+    """
+    Rows of surveyor_name_tokens for a name: the key of each word and the key
+    of the whole name, so both "Ahmadi" and "محمدعلی" find "محمد علی احمدی"
+    with a prefix match on the token index.
+    """
+    out = []
+    for token in _name_words(value) + [name_key(value)]:
+        token = token[:NAME_KEY_MAX_LEN]
+        if token and token not in out:
+            out.append(token)
+    return out
+
+
+def name_search_terms(value: Optional[str]) -> Optional[Tuple[str, str]]:
+    """
+    LIKE patterns for a name search, or None when the value has no name key:
+    a prefix of the longest query word for surveyor_name_tokens.Token (the
+    index range), and the whole query key as a substring of
+    Surveyor_Name_Key (checked on those rows only).
+    "Ahmadi" finds "Ali Ahmadi"; a fragment inside a word ("hmad") does not.
+    """
+    words = _name_words(value)
+    if not words:
+        return None
+    longest = max(words, key=len)[:NAME_KEY_MAX_LEN]
+    return like_prefix(longest), like_contains(name_key(value))
+
+
+def fold_text(value: Optional[str]) -> str:
+    """
+    Lower-cased text with Arabic letters, digits and diacritics folded like
+    name_key(), but keeping words and their separators (for token search).
+    """
+    if not value:
+        return ""
+    s = unicodedata.normalize("NFKD", str(value))
+    s = "".join(ch for ch in s if not unicodedata.combining(ch))
+    s = s.translate(_ARABIC_TO_PERSIAN).translate(_DIGITS)
+    return _INVISIBLE_RE.sub("", s).lower()
+
+
+def mask_phone(v: Optional[str]) -> str:
+    """Public display of a phone number: only the last 3-4 digits are shown."""
+    if v is None:
+        return ""
+    s = str(v).strip()
+    if not s:
+        return ""
+    digits = re.sub(r"\D+", "", s)
+    if len(digits) <= 4:
+        return "*" * len(digits)
+    keep = 4 if len(digits) >= 8 else 3
+    return ("*" * (len(digits) - keep)) + digits[-keep:]
+
+
+def mask_tazkira(v: Optional[str]) -> str:
+    """Public display of a Tazkira number: only the last 3 characters are shown."""
+    if v is None:
+        return ""
+    s = str(v).strip()
+    if not s:
+        return ""
+    if len(s) <= 3:
+        return "*" * len(s)
+    return ("*" * (len(s) - 3)) + s[-3:]
+
+
+def _like_escape(key: str) -> str:
+    return key.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def like_prefix(key: str) -> str:
+    """Escapes a key for use as ``LIKE %s`` prefix pattern."""
+    return _like_escape(key) + "%"
+
+
+def like_contains(key: str) -> str:
+    """Escapes a key for use as ``LIKE %s`` substring pattern."""
+    return "%" + _like_escape(key) + "%"
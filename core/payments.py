@@ -0,0 +1,153 @@
+from __future__ import annotations
+
+import csv
+import io
+import os
+import zipfile
+from datetime import date
+from pathlib import Path
+from typing import Dict, Iterator, Optional
+
+from core.db import get_connection, _close
+from core.validators import validate_payment_fields
+
+FETCH_SIZE = 5000
+
+GROUP_BANK_TRANSFER = "BANK_TRANSFER"
+GROUP_MOBILE_CREDIT = "MOBILE_CREDIT"
+GROUP_REJECTED = "REJECTED"
+
+BATCH_COLUMNS = {
+    GROUP_BANK_TRANSFER: ["Surveyor_Code", "Surveyor_Name", "Bank_Name", "Account_Title", "Account_Number", "Amount"],
+    GROUP_MOBILE_CREDIT: ["Surveyor_Code", "Surveyor_Name", "Bank_Name", "Account_Title", "Mobile_Number", "Amount"],
+    GROUP_REJECTED: ["Surveyor_Code", "Surveyor_Name", "Bank_Name", "Payment_Type", "Reason"],
+}
+
+_PAYEES_SQL = """
+    SELECT s.Surveyor_ID,
+           s.Surveyor_Code,
+           s.Surveyor_Name,
+           sba.Bank_Account_ID,
+           sba.Payment_Type,
+           sba.Account_Number,
+           sba.Mobile_Number,
+           sba.Account_Title,
+           b.Bank_Name,
+           b.Payment_Method
+    FROM (
+      SELECT DISTINCT Surveyor_ID
+      FROM project_surveyors
+      WHERE Status='ACTIVE' {project_filter}
+    ) a
+    JOIN surveyors s ON s.Surveyor_ID = a.Surveyor_ID
+    LEFT JOIN surveyor_bank_accounts sba
+           ON sba.Surveyor_ID = a.Surveyor_ID AND sba.Is_Default=1 AND sba.Is_Active=1
+    LEFT JOIN banks b ON b.Bank_ID = sba.Bank_ID
+    ORDER BY s.Surveyor_ID, sba.Bank_Account_ID DESC
+"""
+
+
+def iter_payees(project_id: Optional[int] = None, fetch_size: int = FETCH_SIZE) -> Iterator[dict]:
+    """
+    Streams every actively assigned surveyor with their default active account.
+    One set-based query; rows are fetched in batches from an unbuffered cursor.
+    Surveyors without a default account are yielded with Bank_Account_ID = None.
+    """
+    sql = _PAYEES_SQL.format(project_filter="AND Project_ID=%s" if project_id is not None else "")
+    params = (int(project_id),) if project_id is not None else ()
+
+    # own connection: the caller may run other queries between rows
+    conn = get_connection(shared=False)
+    try:
+        cur = conn.cursor(dictionary=True, buffered=False)
+        try:
+            cur.execute(sql, params)
+            last_sid = None
+            while True:
+                rows = cur.fetchmany(fetch_size)
+                if not rows:
+                    break
+                for r in rows:
+                    # اگر چند حساب پیش‌فرض ثبت شده باشد، فقط جدیدترین
+                    if r["Surveyor_ID"] == last_sid:
+                        continue
+                    last_sid = r["Surveyor_ID"]
+                    yield r
+        finally:
+            cur.close()
+    finally:
+        _close(conn)
+
+
+def classify_payee(row: dict) -> tuple:
+    """Returns (group, reason). Reason is only set for GROUP_REJECTED."""
+    if row.get("Bank_Account_ID") is None:
+        return GROUP_REJECTED, "No default active account."
+
+    payment_type = row.get("Payment_Type")
+    errs = validate_payment_fields(payment_type, row.get("Account_Number"), row.get("Mobile_Number"))
+    if errs:
+        return GROUP_REJECTED, "; ".join(errs.values())
+
+    if payment_type == "BANK_ACCOUNT" and row.get("Payment_Method") in ("BANK_TRANSFER", "BOTH"):
+        return GROUP_BANK_TRANSFER, None
+    if payment_type == "MOBILE_CREDIT" and row.get("Payment_Method") in ("MOBILE_WALLET", "BOTH"):
+        return GROUP_MOBILE_CREDIT, None
+    return GROUP_REJECTED, f"Bank does not support {payment_type} ({row.get('Payment_Method')})."
+
+
+def write_payment_run(
+    out_dir: Path,
+    project_id: Optional[int] = None,
+    amount: Optional[str] = None,
+    label: Optional[str] = None,
+) -> Dict[str, dict]:
+    """
+    Writes one CSV per group (bank transfer, mobile credit, rejected) into out_dir.
+    Rows are written as they are fetched, so memory does not grow with payee count.
+    Returns {group: {"path": Path, "rows": int}}.
+    """
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    stamp = date.today().strftime("%Y%m%d")
+    tag = label or (f"project{int(project_id)}" if project_id is not None else "all")
+
+    handles = {}
+    writers = {}
+    result: Dict[str, dict] = {}
+    try:
+        for group, cols in BATCH_COLUMNS.items():
+            path = out_dir / f"{group.lower()}_{tag}_{stamp}.csv"
+            f = open(path, "w", newline="", encoding="utf-8-sig")
+            handles[group] = f
+            w = csv.writer(f)
+            w.writerow(cols)
+            writers[group] = w
+            result[group] = {"path": path, "rows": 0}
+
+        for row in iter_payees(project_id):
+            group, reason = classify_payee(row)
+            if group == GROUP_BANK_TRANSFER:
+                values = [row["Surveyor_Code"], row["Surveyor_Name"], row["Bank_Name"],
+                          row["Account_Title"] or row["Surveyor_Name"], (row["Account_Number"] or "").strip(), amount or ""]
+            elif group == GROUP_MOBILE_CREDIT:
+                values = [row["Surveyor_Code"], row["Surveyor_Name"], row["Bank_Name"],
+                          row["Account_Title"] or row["Surveyor_Name"], (row["Mobile_Number"] or "").strip(), amount or ""]
+            else:
+                values = [row["Surveyor_Code"], row["Surveyor_Name"], row.get("Bank_Name") or "",
+                          row.get("Payment_Type") or "", reason]
+            writers[group].writerow(values)
+            result[group]["rows"] += 1
+    finally:
+        for f in handles.values():
+            f.close()
+
+    return result
+
+
+def zip_payment_run(result: Dict[str, dict]) -> bytes:
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+        for info in result.values():
+            zf.write(info["path"], arcname=os.path.basename(info["path"]))
+    return buf.getvalue()
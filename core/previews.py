@@ -0,0 +1,267 @@
+from __future__ import annotations
+
+import hashlib
+import io
+import os
+import tempfile
+import threading
+from pathlib import Path
+from typing import Dict, Iterable, Optional
+
+from core.db import query_df
+from core.settings import PREVIEW_CACHE_DIR, PREVIEW_CACHE_MAX_MB, PREVIEW_MAX_PX
+from core.uploads import open_stored, read_stored, KIND_TAZKIRA_IMAGE, KIND_TAZKIRA_PDF
+from core.startup import optional_import
+
+_evict_lock = threading.Lock()
+# running size of the cache directory; None until the first scan
+_cache_bytes: Optional[int] = None
+# eviction frees down to this share of the limit, so it does not run on every put
+_EVICT_TARGET = 0.9
+# legacy BLOB originals fetched per query on cache misses
+_LEGACY_BATCH = 20
+
+
+# -----------------------------
+# Disk-backed LRU cache
+# -----------------------------
+
+def _cache_path(key: str) -> Path:
+    digest = hashlib.sha1(key.encode("utf-8")).hexdigest()
+    return PREVIEW_CACHE_DIR / digest[:2] / f"{digest}.jpg"
+
+
+def _cache_get(key: str) -> Optional[bytes]:
+    path = _cache_path(key)
+    try:
+        data = path.read_bytes()
+    except OSError:
+        return None
+    # mtime = last use, used for LRU eviction
+    try:
+        os.utime(path, None)
+    except OSError:
+        pass
+    return data
+
+
+def _scan() -> list:
+    entries = []
+    for p in PREVIEW_CACHE_DIR.glob("*/*.jpg"):
+        try:
+            s = p.stat()
+        except OSError:
+            continue
+        entries.append((s.st_mtime, s.st_size, p))
+    return entries
+
+
+def _cache_put(key: str, data: bytes) -> None:
+    global _cache_bytes
+    path = _cache_path(key)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    try:
+        replaced = path.stat().st_size
+    except OSError:
+        replaced = 0
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=".thumb-")
+    with os.fdopen(fd, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+    with _evict_lock:
+        if _cache_bytes is None:
+            _cache_bytes = sum(size for _, size, _ in _scan())
+        else:
+            _cache_bytes += len(data) - replaced
+        over = _cache_bytes > PREVIEW_CACHE_MAX_MB * 1024 * 1024
+    if over:
+        _evict()
+
+
+def _evict() -> None:
+    """
+    Deletes least recently used thumbnails down to _EVICT_TARGET of the
+    limit. The directory scan also resyncs the running total with files
+    written by other processes.
+    """
+    global _cache_bytes
+    limit = PREVIEW_CACHE_MAX_MB * 1024 * 1024
+    with _evict_lock:
+        entries = _scan()
+        total = sum(size for _, size, _ in entries)
+        if total > limit:
+            entries.sort()
+            for _, size, p in entries:
+                if total <= limit * _EVICT_TARGET:
+                    break
+                try:
+                    p.unlink()
+                    total -= size
+                except OSError:
+                    pass
+        _cache_bytes = total
+
+
+def cache_stats() -> dict:
+    files = 0
+    total = 0
+    for p in PREVIEW_CACHE_DIR.glob("*/*.jpg"):
+        try:
+            total += p.stat().st_size
+            files += 1
+        except OSError:
+            pass
+    return {"files": files, "bytes": total, "limit_bytes": PREVIEW_CACHE_MAX_MB * 1024 * 1024}
+
+
+# -----------------------------
+# Rendering
+# -----------------------------
+
+def _to_jpeg(img) -> bytes:
+    img = img.convert("RGB")
+    img.thumbnail((PREVIEW_MAX_PX, PREVIEW_MAX_PX))
+    out = io.BytesIO()
+    img.save(out, format="JPEG", quality=70, optimize=True)
+    return out.getvalue()
+
+
+def _render_image(fileobj) -> Optional[bytes]:
+    Image = optional_import("PIL.Image")
+    if Image is None:
+        return None
+    try:
+        with Image.open(fileobj) as img:
+            img.draft("RGB", (PREVIEW_MAX_PX, PREVIEW_MAX_PX))
+            return _to_jpeg(img)
+    except Exception:
+        return None
+
+
+def _render_pdf(data: bytes) -> Optional[bytes]:
+    """First page only. Needs pypdfium2 (optional)."""
+    pdfium = optional_import("pypdfium2")
+    if pdfium is None or optional_import("PIL.Image") is None:
+        return None
+    try:
+        pdf = pdfium.PdfDocument(data)
+        try:
+            page = pdf[0]
+            width, height = page.get_size()
+            scale = PREVIEW_MAX_PX / max(width, height, 1)
+            pil = page.render(scale=max(scale, 0.1)).to_pil()
+            return _to_jpeg(pil)
+        finally:
+            pdf.close()
+    except Exception:
+        return None
+
+
+# -----------------------------
+# Public API
+# -----------------------------
+
+def tazkira_previews(surveyor_ids: Iterable[int]) -> Dict[int, bytes]:
+    """
+    Returns a small JPEG per surveyor (image preferred over PDF).
+
+    Only metadata is queried for the whole list; an original is read once,
+    on a cache miss, and never again while its thumbnail stays cached.
+    """
+    ids = sorted({int(x) for x in surveyor_ids})
+    if not ids:
+        return {}
+    marks = ",".join(["%s"] * len(ids))
+
+    sources: Dict[int, tuple] = {}
+
+    files = query_df(
+        f"""
+        SELECT Surveyor_ID, Kind, Storage_Key, Sha256
+        FROM surveyor_files
+        WHERE Surveyor_ID IN ({marks}) AND Kind IN (%s, %s)
+        ORDER BY File_ID DESC
+        """,
+        tuple(ids) + (KIND_TAZKIRA_IMAGE, KIND_TAZKIRA_PDF),
+    )
+    for r in files.itertuples():
+        sid = int(r.Surveyor_ID)
+        cur = sources.get(sid)
+        if cur is None or (cur[0] == KIND_TAZKIRA_PDF and r.Kind == KIND_TAZKIRA_IMAGE):
+            sources[sid] = (r.Kind, "file", r.Storage_Key, r.Sha256)
+
+    missing = [sid for sid in ids if sid not in sources]
+    if missing:
+        # ردیف‌های قدیمی که فایل را به صورت BLOB در جدول surveyors دارند
+        lmarks = ",".join(["%s"] * len(missing))
+        legacy = query_df(
+            f"""
+            SELECT Surveyor_ID,
+                   UNIX_TIMESTAMP(Updated_At) AS Version,
+                   (Tazkira_Image IS NOT NULL) AS Has_Image,
+                   (Tazkira_PDF IS NOT NULL) AS Has_PDF
+            FROM surveyors
+            WHERE Surveyor_ID IN ({lmarks})
+            """,
+            tuple(missing),
+        )
+        for r in legacy.itertuples():
+            if int(r.Has_Image or 0):
+                kind = KIND_TAZKIRA_IMAGE
+            elif int(r.Has_PDF or 0):
+                kind = KIND_TAZKIRA_PDF
+            else:
+                continue
+            sources[int(r.Surveyor_ID)] = (kind, "legacy", None, f"legacy-{int(r.Surveyor_ID)}-{r.Version}")
+
+    out: Dict[int, bytes] = {}
+    legacy_misses = []
+    for sid, (kind, origin, storage_key, version) in sources.items():
+        key = f"{version}:{kind}:{PREVIEW_MAX_PX}"
+        thumb = _cache_get(key)
+        if thumb is None:
+            if origin == "legacy":
+                legacy_misses.append((sid, kind, key))
+                continue
+            thumb = _render_file(kind, storage_key)
+            if thumb is None:
+                continue
+            _cache_put(key, thumb)
+        out[sid] = thumb
+
+    # BLOB originals: one query per _LEGACY_BATCH misses instead of one per surveyor
+    for i in range(0, len(legacy_misses), _LEGACY_BATCH):
+        batch = legacy_misses[i : i + _LEGACY_BATCH]
+        bmarks = ",".join(["%s"] * len(batch))
+        bodies = query_df(
+            f"""
+            SELECT Surveyor_ID, COALESCE(Tazkira_Image, Tazkira_PDF) AS Body
+            FROM surveyors
+            WHERE Surveyor_ID IN ({bmarks})
+            """,
+            tuple(sid for sid, _, _ in batch),
+            site="batch",
+        )
+        by_id = {int(r.Surveyor_ID): r.Body for r in bodies.itertuples()}
+        for sid, kind, key in batch:
+            body = by_id.get(sid)
+            if body is None:
+                continue
+            body = bytes(body)
+            thumb = _render_image(io.BytesIO(body)) if kind == KIND_TAZKIRA_IMAGE else _render_pdf(body)
+            if thumb is None:
+                continue
+            _cache_put(key, thumb)
+            out[sid] = thumb
+    return out
+
+
+def _render_file(kind: str, storage_key: str) -> Optional[bytes]:
+    try:
+        if kind == KIND_TAZKIRA_IMAGE:
+            with open_stored(storage_key) as f:
+                return _render_image(f)
+        return _render_pdf(read_stored(storage_key))
+    except OSError:
+        return None
@@ -0,0 +1,191 @@
+from __future__ import annotations
+
+import bisect
+import re
+import threading
+import time
+from datetime import timedelta
+from typing import Dict, List, Optional, Set, Tuple
+
+from core.db import query_df
+from core.normalize import fold_text
+
+# -----------------------------
+# In-memory project search
+# -----------------------------
+# فهرست پروژه‌ها (کد، نام، مشتری، شریک اجرایی) در حافظه‌ی process نگه داشته
+# می‌شود و با Updated_At به‌روز می‌شود؛ جستجو دیگر به دیتابیس نمی‌رود.
+#
+# Ranking: exact code > code/field prefix > every query word is a prefix of
+# a project word > substring anywhere. Ties: newest project first.
+
+RANK_EXACT_CODE = 0
+RANK_PREFIX = 1
+RANK_TOKEN = 2
+RANK_SUBSTRING = 3
+
+# at most one freshness check per interval per process
+REFRESH_INTERVAL_S = 5
+# incremental reads reach back this far before the newest Updated_At seen, so
+# a row stamped earlier but committed after the last check is still picked up
+REFRESH_OVERLAP_S = 60
+
+_TOKEN_RE = re.compile(r"\w+")
+
+_SELECT_SQL = """
+    SELECT Project_ID, Project_Code, Project_Name, Client_Name, Implementing_Partner, Updated_At
+    FROM projects
+"""
+
+
+def _entry(r) -> tuple:
+    """(folded code, folded fields, haystack, label, tokens)"""
+    fields = [fold_text(v) for v in (r.Project_Code, r.Project_Name, r.Client_Name, r.Implementing_Partner) if v]
+    tokens = {t for f in fields for t in _TOKEN_RE.findall(f)}
+    return fold_text(r.Project_Code), fields, " | ".join(fields), f"{r.Project_Code} - {r.Project_Name}", tokens
+
+
+class ProjectIndex:
+    def __init__(self):
+        self._lock = threading.Lock()  # data
+        self._refresh_lock = threading.Lock()
+        self._entries: Dict[int, tuple] = {}
+        self._codes: Dict[str, int] = {}
+        self._tokens: Dict[str, Set[int]] = {}
+        self._sorted_tokens: List[str] = []
+        self._newest: List[int] = []  # Project_IDs, newest first
+        self._last_updated = None
+        self._checked = 0.0
+        self._loaded = False
+
+    # ---- maintenance ----
+
+    def _put(self, pid: int, entry: tuple) -> None:
+        self._drop(pid)
+        self._entries[pid] = entry
+        self._codes[entry[0]] = pid
+        for t in entry[4]:
+            self._tokens.setdefault(t, set()).add(pid)
+
+    def _drop(self, pid: int) -> None:
+        old = self._entries.pop(pid, None)
+        if old is None:
+            return
+        if self._codes.get(old[0]) == pid:
+            del self._codes[old[0]]
+        for t in old[4]:
+            ids = self._tokens.get(t)
+            if ids is not None:
+                ids.discard(pid)
+                if not ids:
+                    del self._tokens[t]
+
+    def _apply(self, df, replace: bool) -> None:
+        entries = [(int(r.Project_ID), _entry(r)) for r in df.itertuples()]
+        with self._lock:
+            if replace:
+                self._entries, self._codes, self._tokens = {}, {}, {}
+            added = replace or any(pid not in self._entries for pid, _ in entries)
+            for pid, entry in entries:
+                self._put(pid, entry)
+            self._sorted_tokens = sorted(self._tokens)
+            if added:
+                self._newest = sorted(self._entries, reverse=True)
+        if not df.empty:
+            newest = df["Updated_At"].max()
+            if self._last_updated is None or newest > self._last_updated:
+                self._last_updated = newest
+
+    def refresh(self, force: bool = False) -> None:
+        """
+        Loads all projects on first use, then only rows whose Updated_At is
+        within REFRESH_OVERLAP_S of the newest one seen. A changed row count
+        (a delete) triggers a full reload. Searches keep using the current data while
+        another thread refreshes.
+        """
+        if self._loaded and not force and time.monotonic() - self._checked < REFRESH_INTERVAL_S:
+            return
+        if not self._refresh_lock.acquire(blocking=not self._loaded or force):
+            return
+        try:
+            if self._loaded and not force and time.monotonic() - self._checked < REFRESH_INTERVAL_S:
+                return
+            self._checked = time.monotonic()
+            if force or not self._loaded or self._last_updated is None:
+                self._apply(query_df(_SELECT_SQL + " ORDER BY Project_ID", site="batch"), replace=True)
+                self._loaded = True
+                return
+            # re-reading a row is harmless; _put replaces it
+            since = self._last_updated - timedelta(seconds=REFRESH_OVERLAP_S)
+            changed = query_df(_SELECT_SQL + " WHERE Updated_At >= %s", (since,), site="lookup")
+            self._apply(changed, replace=False)
+            total = query_df("SELECT COUNT(*) AS n FROM projects", site="lookup")
+            if int(total.iloc[0]["n"]) != len(self._entries):
+                self._apply(query_df(_SELECT_SQL + " ORDER BY Project_ID", site="batch"), replace=True)
+        finally:
+            self._refresh_lock.release()
+
+    def invalidate(self) -> None:
+        """Makes the next search check for changes (call after writing a project)."""
+        self._checked = 0.0
+
+    # ---- search ----
+
+    def _ids_with_prefix(self, token: str) -> Set[int]:
+        ids: Set[int] = set()
+        i = bisect.bisect_left(self._sorted_tokens, token)
+        while i < len(self._sorted_tokens) and self._sorted_tokens[i].startswith(token):
+            ids |= self._tokens[self._sorted_tokens[i]]
+            i += 1
+        return ids
+
+    def ranked(self, q: str, limit: int = 50) -> List[Tuple[int, int]]:
+        """[(Project_ID, rank)] best first; an empty query lists the newest projects."""
+        self.refresh()
+        qf = fold_text(q).strip()
+        with self._lock:
+            if not qf:
+                return [(pid, RANK_SUBSTRING) for pid in self._newest[:limit]]
+
+            ranks: Dict[int, int] = {}
+            exact = self._codes.get(qf)
+            if exact is not None:
+                ranks[exact] = RANK_EXACT_CODE
+
+            candidates: Optional[Set[int]] = None
+            for token in _TOKEN_RE.findall(qf):
+                ids = self._ids_with_prefix(token)
+                candidates = ids if candidates is None else candidates & ids
+                if not candidates:
+                    break
+            for pid in candidates or ():
+                if pid not in ranks:
+                    fields = self._entries[pid][1]
+                    ranks[pid] = RANK_PREFIX if any(f.startswith(qf) for f in fields) else RANK_TOKEN
+
+            # substring scan only to fill up the page, newest first
+            if len(ranks) < limit:
+                for pid in self._newest:
+                    if pid not in ranks and qf in self._entries[pid][2]:
+                        ranks[pid] = RANK_SUBSTRING
+                        if len(ranks) >= limit:
+                            break
+
+        return sorted(ranks.items(), key=lambda kv: (kv[1], -kv[0]))[:limit]
+
+    def search(self, q: str, limit: int = 50) -> List[Tuple[int, str]]:
+        """[(Project_ID, "CODE - Name")] best match first."""
+        hits = self.ranked(q, limit)
+        with self._lock:
+            return [(pid, self._entries[pid][3]) for pid, _ in hits if pid in self._entries]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "projects": len(self._entries),
+                "tokens": len(self._tokens),
+                "checked_s_ago": round(time.monotonic() - self._checked, 1) if self._loaded else None,
+            }
+
+
+projects = ProjectIndex()
@@ -0,0 +1,263 @@
+from __future__ import annotations
+
+import random
+import re
+import threading
+import time
+from collections import Counter, OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple
+
+# خطاهای گذرا: اتصال قطع شد، سرور در دسترس نیست، deadlock یا lock wait
+CONNECTION_ERRNOS = {2002, 2003, 2006, 2013, 2055, 1040, 1053}
+DEADLOCK_ERRNOS = {1213, 1205}
+TIMEOUT_ERRNOS = {3024}
+
+# a SELECT at the start of the text or of a ;-separated statement
+_SELECT_RE = re.compile(r"(^|;)(\s*)SELECT\b", re.IGNORECASE)
+
+_counters: Counter = Counter()
+_counters_lock = threading.Lock()
+
+
+class DatabaseUnavailable(RuntimeError):
+    """Raised when the circuit breaker is open and no cached result exists."""
+
+
+def count(name: str, n: int = 1) -> None:
+    with _counters_lock:
+        _counters[name] += n
+
+
+def stats() -> Dict[str, int]:
+    with _counters_lock:
+        out = dict(_counters)
+    out["breaker_state"] = breaker.state
+    return out
+
+
+def errno_of(ex: BaseException) -> Optional[int]:
+    return getattr(ex, "errno", None)
+
+
+def is_transient(ex: BaseException) -> bool:
+    return errno_of(ex) in CONNECTION_ERRNOS or errno_of(ex) in DEADLOCK_ERRNOS
+
+
+# -----------------------------
+# Timeouts
+# -----------------------------
+
+def timeout_ms(site: str) -> int:
+    from core.settings import QUERY_TIMEOUTS_MS
+
+    return int(QUERY_TIMEOUTS_MS.get(site, QUERY_TIMEOUTS_MS["default"]))
+
+
+def with_timeout(sql: str, ms: int) -> str:
+    """
+    Adds a MAX_EXECUTION_TIME optimizer hint to every SELECT statement (each
+    one of a multi-statement text) so the server aborts it after ms
+    milliseconds. Other statements are returned unchanged; the split on ";"
+    assumes no literal in the SQL contains one (values go in as parameters).
+    """
+    if ms <= 0 or "MAX_EXECUTION_TIME" in sql.upper():
+        return sql
+    return _SELECT_RE.sub(lambda m: f"{m.group(1)}{m.group(2)}SELECT /*+ MAX_EXECUTION_TIME({int(ms)}) */", sql)
+
+
+# -----------------------------
+# Backoff
+# -----------------------------
+
+def backoff_delay(attempt: int, base: float = 0.05, cap: float = 1.0) -> float:
+    """Full-jitter exponential backoff (attempt starts at 1)."""
+    return random.uniform(0, min(cap, base * (2 ** (attempt - 1))))
+
+
+def retry_call(fn: Callable[[], Any], attempts: int, retry_if: Callable[[BaseException], bool], counter: str):
+    for attempt in range(1, attempts + 1):
+        try:
+            return fn()
+        except Exception as ex:
+            if attempt >= attempts or not retry_if(ex):
+                raise
+            count(counter)
+            time.sleep(backoff_delay(attempt))
+
+
+# -----------------------------
+# Circuit breaker
+# -----------------------------
+
+class CircuitBreaker:
+    """
+    closed -> open after `threshold` consecutive connection failures;
+    open -> half_open after `reset_after` seconds; one probe call then
+    closes it again or re-opens it.
+    """
+
+    def __init__(self, threshold: int = 5, reset_after: float = 15.0):
+        self.threshold = threshold
+        self.reset_after = reset_after
+        self.state = "closed"
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == "closed":
+                return True
+            if self.state == "open" and time.monotonic() - self._opened_at >= self.reset_after:
+                self.state = "half_open"
+                self._probing = False
+            if self.state == "half_open" and not self._probing:
+                self._probing = True
+                return True
+            return False
+
+    def success(self) -> None:
+        with self._lock:
+            self._failures = 0
+            self._probing = False
+            self.state = "closed"
+
+    def failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            self._probing = False
+            if self.state == "half_open" or self._failures >= self.threshold:
+                if self.state != "open":
+                    count("breaker_opened")
+                self.state = "open"
+                self._opened_at = time.monotonic()
+
+
+breaker = CircuitBreaker()
+
+
+# -----------------------------
+# Stale results (served while the DB is unhealthy)
+# -----------------------------
+
+# only small, repeated reads are kept: never BLOB reads, exports or batch pages
+STALE_SITES = {"lookup", "dashboard", "public_search"}
+_STALE_MAX_ENTRIES = 256
+_STALE_MAX_ENTRY_BYTES = 1024 * 1024
+_STALE_MAX_BYTES = 32 * 1024 * 1024
+_stale: "OrderedDict[Tuple[str, str], Tuple[Any, int]]" = OrderedDict()  # key -> (frame(s), bytes)
+_stale_bytes = 0
+_stale_lock = threading.Lock()
+
+
+def _stale_key(sql: str, params) -> Tuple[str, str]:
+    return sql, repr(params)
+
+
+def _frame_bytes(df) -> int:
+    frames = df if isinstance(df, list) else [df]
+    return int(sum(f.memory_usage(index=True, deep=True).sum() for f in frames))
+
+
+def remember(site: str, sql: str, params, df) -> None:
+    """Keeps a copy of a good result of a STALE_SITES read, within the entry and total byte limits."""
+    global _stale_bytes
+    if site not in STALE_SITES:
+        return
+    # df: one frame, or a list of frames for multi-result reads
+    size = _frame_bytes(df)
+    if size > _STALE_MAX_ENTRY_BYTES:
+        return
+    copy = [f.copy() for f in df] if isinstance(df, list) else df.copy()
+    key = _stale_key(sql, params)
+    with _stale_lock:
+        old = _stale.pop(key, None)
+        if old is not None:
+            _stale_bytes -= old[1]
+        _stale[key] = (copy, size)
+        _stale_bytes += size
+        while len(_stale) > _STALE_MAX_ENTRIES or _stale_bytes > _STALE_MAX_BYTES:
+            _, (_, dropped) = _stale.popitem(last=False)
+            _stale_bytes -= dropped
+
+
+def stale(sql: str, params):
+    with _stale_lock:
+        entry = _stale.get(_stale_key(sql, params))
+    if entry is None:
+        return None
+    df = entry[0]
+    if isinstance(df, list):
+        frames = [f.copy() for f in df]
+        for f in frames:
+            f.attrs["stale"] = True
+        return frames
+    df = df.copy()
+    df.attrs["stale"] = True
+    return df
+
+
+# -----------------------------
+# Entry points used by core.db
+# -----------------------------
+
+def resilient_read(site: str, sql: str, params, run: Callable[[str], Any], attempts: int = 3):
+    """
+    Runs an idempotent read with a statement timeout, jittered retries on
+    connection errors and deadlocks, and the circuit breaker. When the DB is
+    unhealthy the last good result for the same (sql, params) is returned.
+    """
+    timed_sql = with_timeout(sql, timeout_ms(site))
+
+    if not breaker.allow():
+        count("breaker_rejected")
+        cached = stale(sql, params)
+        if cached is not None:
+            count("stale_served")
+            return cached
+        raise DatabaseUnavailable("Database is temporarily unavailable. Please try again shortly.")
+
+    try:
+        df = retry_call(lambda: run(timed_sql), attempts, is_transient, "read_retries")
+    except Exception as ex:
+        if errno_of(ex) in CONNECTION_ERRNOS:
+            count("read_failures")
+            breaker.failure()
+            cached = stale(sql, params)
+            if cached is not None:
+                count("stale_served")
+                return cached
+            raise
+        # the server answered (timeout, SQL error, ...): it is healthy
+        if errno_of(ex) in TIMEOUT_ERRNOS:
+            count(f"timeout:{site}")
+        breaker.success()
+        raise
+
+    breaker.success()
+    remember(site, sql, params, df)
+    return df
+
+
+def guarded_write(run: Callable[[], Any]):
+    """Writes are not retried (not idempotent) but still feed the breaker."""
+    if not breaker.allow():
+        count("breaker_rejected")
+        raise DatabaseUnavailable("Database is temporarily unavailable. Please try again shortly.")
+    try:
+        result = run()
+    except Exception as ex:
+        if errno_of(ex) in CONNECTION_ERRNOS:
+            count("write_failures")
+            breaker.failure()
+        else:
+            breaker.success()
+        raise
+    breaker.success()
+    return result
+
+
+def deadlock_retry(run: Callable[[], Any], attempts: int = 4):
+    """For short sequence transactions that can be replayed from scratch."""
+    return retry_call(run, attempts, lambda ex: errno_of(ex) in DEADLOCK_ERRNOS, "deadlock_retries")
@@ -0,0 +1,592 @@
+from __future__ import annotations
+
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Set, Tuple, Union
+
+from core.cache import cache
+from core.db import query_df, execute, ensure_name_key_columns, ensure_name_tokens_table, backfill_name_keys
+from core.settings import SCHEMA_STATUS_TTL_S
+
+# -----------------------------
+# Migrations
+# -----------------------------
+# هر migration یک شماره نسخه دارد و فقط یک بار اجرا می‌شود.
+# مرحله‌ها یا SQL هستند یا تابعی که خودش idempotent است.
+
+_BASE_TABLES = [
+    """
+    CREATE TABLE IF NOT EXISTS provinces (
+      Province_Code VARCHAR(10)  NOT NULL PRIMARY KEY,
+      Province_Name VARCHAR(100) NOT NULL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS province_sequences (
+      Province_Code VARCHAR(10) NOT NULL PRIMARY KEY,
+      Last_Number   INT         NOT NULL DEFAULT 0
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS surveyors (
+      Surveyor_ID             INT          NOT NULL AUTO_INCREMENT PRIMARY KEY,
+      Surveyor_Code           VARCHAR(30)  NOT NULL,
+      Surveyor_Name           VARCHAR(150) NOT NULL,
+      Gender                  ENUM('Male','Female') NOT NULL,
+      Father_Name             VARCHAR(150) NOT NULL,
+      Tazkira_No              VARCHAR(20)  NOT NULL,
+      Email_Address           VARCHAR(150) NULL,
+      Whatsapp_Number         VARCHAR(20)  NULL,
+      Phone_Number            VARCHAR(20)  NULL,
+      Permanent_Province_Code VARCHAR(10)  NULL,
+      Current_Province_Code   VARCHAR(10)  NULL,
+      CV_Link                 VARCHAR(500) NULL,
+      CV_File                 LONGBLOB     NULL,
+      CV_File_Name            VARCHAR(255) NULL,
+      CV_Mime                 VARCHAR(100) NULL,
+      Tazkira_Image           LONGBLOB     NULL,
+      Tazkira_Image_Name      VARCHAR(255) NULL,
+      Tazkira_Image_Mime      VARCHAR(100) NULL,
+      Tazkira_PDF             LONGBLOB     NULL,
+      Tazkira_PDF_Name        VARCHAR(255) NULL,
+      Tazkira_PDF_Mime        VARCHAR(100) NULL,
+      Tazkira_Word            LONGBLOB     NULL,
+      Tazkira_Word_Name       VARCHAR(255) NULL,
+      Tazkira_Word_Mime       VARCHAR(100) NULL,
+      Created_At              TIMESTAMP    NOT NULL DEFAULT CURRENT_TIMESTAMP,
+      Updated_At              TIMESTAMP    NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+      UNIQUE KEY uq_surveyors_code (Surveyor_Code)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS banks (
+      Bank_ID        INT          NOT NULL AUTO_INCREMENT PRIMARY KEY,
+      Bank_Name      VARCHAR(150) NOT NULL,
+      Payment_Method ENUM('BANK_TRANSFER','MOBILE_WALLET','BOTH') NOT NULL DEFAULT 'BANK_TRANSFER',
+      Is_Active      TINYINT(1)   NOT NULL DEFAULT 1,
+      Created_At     TIMESTAMP    NOT NULL DEFAULT CURRENT_TIMESTAMP,
+      Updated_At     TIMESTAMP    NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+      UNIQUE KEY uq_banks_name (Bank_Name)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS surveyor_bank_accounts (
+      Bank_Account_ID INT          NOT NULL AUTO_INCREMENT PRIMARY KEY,
+      Surveyor_ID     INT          NOT NULL,
+      Bank_ID         INT          NOT NULL,
+      Payment_Type    ENUM('BANK_ACCOUNT','MOBILE_CREDIT') NOT NULL,
+      Account_Number  VARCHAR(50)  NULL,
+      Mobile_Number   VARCHAR(20)  NULL,
+      Account_Title   VARCHAR(150) NULL,
+      Is_Default      TINYINT(1)   NOT NULL DEFAULT 0,
+      Is_Active       TINYINT(1)   NOT NULL DEFAULT 1,
+      Created_At      TIMESTAMP    NOT NULL DEFAULT CURRENT_TIMESTAMP,
+      Updated_At      TIMESTAMP    NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+      CONSTRAINT fk_sba_surveyor FOREIGN KEY (Surveyor_ID) REFERENCES surveyors (Surveyor_ID) ON DELETE CASCADE,
+      CONSTRAINT fk_sba_bank FOREIGN KEY (Bank_ID) REFERENCES banks (Bank_ID)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS projects (
+      Project_ID            INT          NOT NULL AUTO_INCREMENT PRIMARY KEY,
+      Project_Code          VARCHAR(60)  NOT NULL,
+      Project_Name          VARCHAR(200) NOT NULL,
+      Phase_Number          INT          NULL,
+      Project_Type          VARCHAR(20)  NOT NULL DEFAULT 'OTHER',
+      Client_Name           VARCHAR(150) NULL,
+      Implementing_Partner  VARCHAR(150) NULL,
+      Start_Date            DATE         NULL,
+      End_Date              DATE         NULL,
+      Status                VARCHAR(20)  NOT NULL DEFAULT 'PLANNED',
+      Notes                 TEXT         NULL,
+      Project_Document_Link VARCHAR(500) NULL,
+      Created_At            TIMESTAMP    NOT NULL DEFAULT CURRENT_TIMESTAMP,
+      Updated_At            TIMESTAMP    NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+      UNIQUE KEY uq_projects_code (Project_Code)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS project_phase_sequences (
+      Client_Code VARCHAR(20)  NOT NULL,
+      Project_Key VARCHAR(150) NOT NULL,
+      Start_Year  INT          NOT NULL,
+      Last_Phase  INT          NOT NULL DEFAULT 0,
+      PRIMARY KEY (Client_Code, Project_Key, Start_Year)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS project_surveyors (
+      Project_Surveyor_ID INT          NOT NULL AUTO_INCREMENT PRIMARY KEY,
+      Project_ID          INT          NOT NULL,
+      Surveyor_ID         INT          NOT NULL,
+      Role                VARCHAR(100) NOT NULL,
+      Work_Province_Code  VARCHAR(10)  NULL,
+      Start_Date          DATE         NULL,
+      End_Date            DATE         NULL,
+      Status              VARCHAR(20)  NOT NULL DEFAULT 'ACTIVE',
+      Created_At          TIMESTAMP    NOT NULL DEFAULT CURRENT_TIMESTAMP,
+      Updated_At          TIMESTAMP    NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+      CONSTRAINT fk_ps_project FOREIGN KEY (Project_ID) REFERENCES projects (Project_ID),
+      CONSTRAINT fk_ps_surveyor FOREIGN KEY (Surveyor_ID) REFERENCES surveyors (Surveyor_ID) ON DELETE CASCADE
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS audit_log (
+      Audit_ID    BIGINT       NOT NULL AUTO_INCREMENT PRIMARY KEY,
+      Actor_Role  VARCHAR(30)  NULL,
+      Actor_Name  VARCHAR(150) NULL,
+      Action      VARCHAR(30)  NOT NULL,
+      Entity      VARCHAR(50)  NOT NULL,
+      Entity_Key  VARCHAR(100) NULL,
+      Before_JSON JSON         NULL,
+      After_JSON  JSON         NULL,
+      Created_At  TIMESTAMP    NOT NULL DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+]
+
+
+def _dedup_table() -> None:
+    from core.dedup import ensure_dedup_table
+
+    ensure_dedup_table()
+
+
+def _rebuild_dedup_keys() -> None:
+    from core.dedup import rebuild_dedup_keys
+
+    rebuild_dedup_keys()
+
+
+def _files_table() -> None:
+    from core.uploads import ensure_files_table
+
+    ensure_files_table()
+
+
+def _change_log_table() -> None:
+    from core.changes import ensure_change_log_table
+
+    ensure_change_log_table()
+
+
+def _rollup_tables() -> None:
+    from core.analytics import ensure_rollup_tables
+
+    ensure_rollup_tables()
+
+
+def _jobs_table() -> None:
+    from core.jobs import ensure_jobs_table
+
+    ensure_jobs_table()
+
+
+def _fill_name_tokens() -> None:
+    backfill_name_keys(only_missing=False)
+
+
+Step = Union[str, Callable[[], None]]
+
+MIGRATIONS: List[Tuple[int, str, List[Step]]] = [
+    (1, "base tables", _BASE_TABLES),
+    (2, "surveyor name search keys", [ensure_name_key_columns]),
+    (3, "surveyor dedup keys", [_dedup_table]),
+    (4, "surveyor file references", [_files_table]),
+    (5, "change feed", [_change_log_table]),
+    (6, "analytics rollups", [_rollup_tables]),
+    (7, "background jobs", [_jobs_table]),
+    # 8 (dropping idx_surveyors_name) was retired; a database may have it recorded
+    (9, "surveyor name search tokens", [ensure_name_tokens_table, _fill_name_tokens]),
+    (10, "full-name duplicate keys", [_rebuild_dedup_keys]),
+]
+
+# a database created before migrations were tracked already has these; it
+# starts out at version 1 instead of having every page wait for migrate()
+_BASELINE_TABLES = ("provinces", "surveyors", "banks", "surveyor_bank_accounts", "projects", "project_surveyors")
+
+
+# -----------------------------
+# What each feature needs
+# -----------------------------
+# Pages check their features before touching these tables (ui.theme), so a
+# database with pending migrations only loses the features whose tables or
+# columns are missing; the Admin page stays usable to apply them.
+
+FEATURE_BASE = "base"
+FEATURE_CHANGES = "change feed"
+FEATURE_ROLLUPS = "analytics rollups"
+FEATURE_JOBS = "background jobs"
+FEATURE_DEDUP = "duplicate check"
+FEATURE_NAME_SEARCH = "name search"
+FEATURE_FILES = "surveyor files"
+
+# feature -> [(table, column or None for the table itself)]
+REQUIREMENTS: Dict[str, List[Tuple[str, Optional[str]]]] = {
+    FEATURE_BASE: [(t, None) for t in _BASELINE_TABLES],
+    FEATURE_CHANGES: [("change_log", None)],
+    FEATURE_ROLLUPS: [
+        ("rollup_registrations_daily", None),
+        ("rollup_assignments_daily", None),
+        ("rollup_state", None),
+    ],
+    FEATURE_JOBS: [("jobs", None)],
+    FEATURE_DEDUP: [("surveyor_dedup_keys", None)],
+    FEATURE_FILES: [("surveyor_files", None)],
+    FEATURE_NAME_SEARCH: [
+        ("surveyors", "Surveyor_Name_Key"),
+        ("surveyors", "Father_Name_Key"),
+        ("surveyor_name_tokens", None),
+    ],
+}
+
+
+# -----------------------------
+# Indexes required by core.db queries
+# -----------------------------
+# (table, index name, columns, unique). An existing index whose leading columns
+# match is accepted, whatever its name.
+
+INDEXES: List[Tuple[str, str, Tuple[str, ...], bool]] = [
+    ("surveyors", "uq_surveyors_code", ("Surveyor_Code",), True),
+    ("surveyors", "idx_surveyors_tazkira", ("Tazkira_No",), False),
+    ("surveyors", "idx_surveyors_phone", ("Phone_Number",), False),
+    ("surveyors", "idx_surveyors_whatsapp", ("Whatsapp_Number",), False),
+    ("surveyors", "idx_surveyors_perm_prov", ("Permanent_Province_Code",), False),
+    ("surveyors", "idx_surveyors_curr_prov", ("Current_Province_Code",), False),
+    ("surveyors", "idx_surveyors_name_key", ("Surveyor_Name_Key",), False),
+    ("surveyors", "idx_surveyors_father_key", ("Father_Name_Key",), False),
+    ("surveyors", "idx_surveyors_created", ("Created_At",), False),
+    ("surveyors", "idx_surveyors_updated", ("Updated_At", "Surveyor_ID"), False),
+    ("project_surveyors", "idx_ps_status", ("Status",), False),
+    ("project_surveyors", "idx_ps_project_status", ("Project_ID", "Status"), False),
+    ("project_surveyors", "idx_ps_surveyor_dates", ("Surveyor_ID", "Start_Date", "End_Date"), False),
+    ("project_surveyors", "idx_ps_start", ("Start_Date",), False),
+    ("project_surveyors", "idx_ps_end", ("End_Date",), False),
+    ("surveyor_bank_accounts", "idx_sba_surveyor_default", ("Surveyor_ID", "Is_Default"), False),
+    ("projects", "uq_projects_code", ("Project_Code",), True),
+    ("projects", "idx_projects_updated", ("Updated_At",), False),
+    ("banks", "idx_banks_active_name", ("Is_Active", "Bank_Name"), False),
+    ("audit_log", "idx_audit_entity", ("Entity", "Entity_Key"), False),
+    ("change_log", "idx_change_entity", ("Entity", "Change_ID"), False),
+    ("change_log", "idx_change_at", ("Changed_At",), False),
+    ("jobs", "idx_jobs_status_run", ("Status", "Run_After"), False),
+]
+
+
+# Hot queries checked with EXPLAIN. Sample parameters only need the right type.
+HOT_QUERIES: List[Tuple[str, str, tuple]] = [
+    (
+        "get_surveyor_by_code",
+        "SELECT Surveyor_ID, Surveyor_Code, Surveyor_Name FROM surveyors WHERE Surveyor_Code=%s",
+        ("PPC-KAB-001",),
+    ),
+    (
+        "surveyor_by_tazkira",
+        "SELECT Surveyor_ID FROM surveyors WHERE Tazkira_No=%s",
+        ("1234-5678-91011",),
+    ),
+    (
+        "surveyor_name_search",
+        "SELECT s.Surveyor_ID FROM surveyor_name_tokens t JOIN surveyors s ON s.Surveyor_ID = t.Surveyor_ID "
+        "WHERE t.Token LIKE %s AND s.Surveyor_Name_Key LIKE %s",
+        ("ahmd%", "%alahmd%"),
+    ),
+    (
+        "surveyor_name_unkeyed",
+        "SELECT Surveyor_ID FROM surveyors WHERE Surveyor_Name_Key IS NULL AND Surveyor_Name LIKE %s",
+        ("%Ahmad%",),
+    ),
+    (
+        "surveyors_by_province",
+        "SELECT Surveyor_ID FROM surveyors WHERE Permanent_Province_Code=%s",
+        ("KAB",),
+    ),
+    (
+        "active_assignments_count",
+        "SELECT COUNT(*) FROM project_surveyors WHERE Status='ACTIVE'",
+        (),
+    ),
+    (
+        "payment_run_assignments",
+        "SELECT DISTINCT Surveyor_ID FROM project_surveyors WHERE Status='ACTIVE' AND Project_ID=%s",
+        (1,),
+    ),
+    (
+        "list_surveyor_accounts",
+        "SELECT Bank_Account_ID FROM surveyor_bank_accounts WHERE Surveyor_ID=%s ORDER BY Is_Default DESC",
+        (1,),
+    ),
+    (
+        "get_project_by_code",
+        "SELECT Project_ID FROM projects WHERE Project_Code=%s",
+        ("PPC-CLIENT-2024-PH-01",),
+    ),
+    (
+        "assignment_overlap",
+        "SELECT Project_Surveyor_ID FROM project_surveyors WHERE Surveyor_ID=%s AND Status='ACTIVE' "
+        "AND Start_Date <= %s AND (End_Date IS NULL OR End_Date >= %s)",
+        (1, "2024-12-31", "2024-01-01"),
+    ),
+]
+
+# جدول‌های کوچک مرجع؛ full scan روی آن‌ها مشکلی ندارد
+SMALL_TABLES = {"provinces", "banks", "province_sequences"}
+
+_RETRY_AFTER_SECONDS = 60
+
+_startup_lock = threading.Lock()
+_startup_done = False
+_startup_attempt_at = 0.0
+_startup_report: Optional[dict] = None
+
+
+def _ensure_migrations_table() -> None:
+    execute(
+        """
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+          Version    INT          NOT NULL PRIMARY KEY,
+          Name       VARCHAR(150) NOT NULL,
+          Applied_At TIMESTAMP    NOT NULL DEFAULT CURRENT_TIMESTAMP
+        )
+        """
+    )
+
+
+CACHE_NS_SCHEMA = "schema"
+
+
+def _tables() -> Set[str]:
+    df = query_df("SELECT TABLE_NAME FROM information_schema.TABLES WHERE TABLE_SCHEMA = DATABASE()")
+    return {str(t).lower() for t in df["TABLE_NAME"].tolist()} if not df.empty else set()
+
+
+def _recorded_versions(tables: Set[str]) -> set:
+    if "schema_migrations" not in tables:
+        return set()
+    df = query_df("SELECT Version FROM schema_migrations")
+    return set(int(v) for v in df["Version"].tolist()) if not df.empty else set()
+
+
+def applied_versions() -> set:
+    """
+    Recorded versions, plus version 1 when the base tables are already there.
+    Read-only: the table itself is created by migrate().
+    """
+    tables = _tables()
+    done = _recorded_versions(tables)
+    if all(t in tables for t in _BASELINE_TABLES):
+        done.add(1)
+    return done
+
+
+def missing_schema(*features: str) -> List[str]:
+    """
+    Tables ("table") and columns ("table.column") the features need that the
+    database does not have yet. Shared through core.cache like schema_status().
+    """
+
+    def load():
+        df = query_df(
+            "SELECT TABLE_NAME, COLUMN_NAME FROM information_schema.COLUMNS WHERE TABLE_SCHEMA = DATABASE()"
+        )
+        have: Set[Tuple[str, Optional[str]]] = set()
+        for r in df.itertuples():
+            have.add((r.TABLE_NAME.lower(), None))
+            have.add((r.TABLE_NAME.lower(), r.COLUMN_NAME.lower()))
+        return have
+
+    have = cache.get_or_load(CACHE_NS_SCHEMA, "objects", load, ttl_s=SCHEMA_STATUS_TTL_S)
+    missing = []
+    for feature in features:
+        for table, column in REQUIREMENTS.get(feature, []):
+            name = f"{table}.{column}" if column else table
+            if (table.lower(), column.lower() if column else None) not in have and name not in missing:
+                missing.append(name)
+    return missing
+
+
+def migrate() -> List[str]:
+    """Applies pending migrations in order. Returns the names applied."""
+    _ensure_migrations_table()
+    done = applied_versions()
+    for version in sorted(done - _recorded_versions(_tables())):
+        # adopted baseline: the tables exist, only the record was missing
+        execute("INSERT INTO schema_migrations (Version, Name) VALUES (%s, %s)", (int(version), MIGRATIONS[0][1]))
+    applied = []
+    for version, name, steps in MIGRATIONS:
+        if version in done:
+            continue
+        for step in steps:
+            if callable(step):
+                step()
+            else:
+                execute(step)
+        execute("INSERT INTO schema_migrations (Version, Name) VALUES (%s, %s)", (int(version), name))
+        applied.append(f"{version}: {name}")
+    cache.invalidate(CACHE_NS_SCHEMA)
+    return applied
+
+
+def pending_migrations() -> List[str]:
+    done = applied_versions()
+    return [f"{v}: {n}" for v, n, _ in MIGRATIONS if v not in done]
+
+
+def schema_status() -> dict:
+    """
+    Schema version, pending migrations and index status for the admin page.
+    Shared through core.cache for SCHEMA_STATUS_TTL_S; migrate() and
+    apply_missing_indexes() invalidate it.
+    """
+
+    def load():
+        done = applied_versions()
+        return {
+            "version": max(done) if done else 0,
+            "pending": [f"{v}: {n}" for v, n, _ in MIGRATIONS if v not in done],
+            "indexes": index_status(),
+        }
+
+    return cache.get_or_load(CACHE_NS_SCHEMA, "status", load, ttl_s=SCHEMA_STATUS_TTL_S)
+
+
+def index_status() -> List[dict]:
+    """One row per declared index: whether a matching index exists."""
+    tables = sorted({t for t, _, _, _ in INDEXES})
+    marks = ",".join(["%s"] * len(tables))
+    stats = query_df(
+        f"""
+        SELECT TABLE_NAME, INDEX_NAME, SEQ_IN_INDEX, COLUMN_NAME
+        FROM information_schema.STATISTICS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME IN ({marks})
+        ORDER BY TABLE_NAME, INDEX_NAME, SEQ_IN_INDEX
+        """,
+        tuple(tables),
+    )
+    cols = query_df(
+        f"""
+        SELECT TABLE_NAME, COLUMN_NAME
+        FROM information_schema.COLUMNS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME IN ({marks})
+        """,
+        tuple(tables),
+    )
+
+    existing = {}
+    for r in stats.itertuples():
+        existing.setdefault((r.TABLE_NAME.lower(), r.INDEX_NAME), []).append(r.COLUMN_NAME.lower())
+    have_cols = {(r.TABLE_NAME.lower(), r.COLUMN_NAME.lower()) for r in cols.itertuples()}
+
+    out = []
+    for table, name, columns, unique in INDEXES:
+        want = [c.lower() for c in columns]
+        match = None
+        for (t, idx_name), idx_cols in existing.items():
+            if t == table and idx_cols[: len(want)] == want:
+                match = idx_name
+                break
+        out.append(
+            {
+                "table": table,
+                "index": name,
+                "columns": ", ".join(columns),
+                "unique": unique,
+                "present": match is not None,
+                "matched_by": match,
+                "columns_exist": all((table, c) in have_cols for c in want),
+            }
+        )
+    return out
+
+
+def apply_missing_indexes() -> List[str]:
+    """
+    Creates declared indexes that are missing, using online DDL
+    (ALGORITHM=INPLACE, LOCK=NONE) so reads and writes continue meanwhile.
+    """
+    created = []
+    for row in index_status():
+        if row["present"] or not row["columns_exist"]:
+            continue
+        kind = "UNIQUE INDEX" if row["unique"] else "INDEX"
+        execute(
+            f"ALTER TABLE {row['table']} ADD {kind} {row['index']} ({row['columns']}), "
+            "ALGORITHM=INPLACE, LOCK=NONE"
+        )
+        created.append(f"{row['table']}.{row['index']}")
+    if created:
+        cache.invalidate(CACHE_NS_SCHEMA)
+    return created
+
+
+def explain_hot_queries() -> List[dict]:
+    """
+    Runs EXPLAIN on every hot query. A row is flagged when it reads a
+    non-reference table with a full table scan (type=ALL) or a full index scan.
+    """
+    report = []
+    for name, sql, params in HOT_QUERIES:
+        try:
+            plan = query_df("EXPLAIN " + sql, params or None)
+        except Exception as ex:
+            report.append({"query": name, "table": None, "type": None, "key": None, "rows": None,
+                           "ok": False, "note": str(ex)})
+            continue
+        for r in plan.to_dict("records"):
+            table = r.get("table")
+            access = (r.get("type") or "").upper()
+            full_scan = access in ("ALL", "INDEX") and (table or "").lower() not in SMALL_TABLES
+            report.append(
+                {
+                    "query": name,
+                    "table": table,
+                    "type": access,
+                    "key": r.get("key"),
+                    "rows": r.get("rows"),
+                    "ok": not full_scan,
+                    "note": "full scan" if full_scan else "",
+                }
+            )
+    return report
+
+
+def ensure_schema(apply_indexes: bool = True) -> dict:
+    migrations = migrate()
+    indexes = apply_missing_indexes() if apply_indexes else []
+    plans = explain_hot_queries()
+    return {
+        "migrations": migrations,
+        "indexes": indexes,
+        "full_scans": [p for p in plans if not p["ok"]],
+    }
+
+
+def ensure_schema_once(apply_indexes: bool = True, migrate_now: bool = True) -> Optional[dict]:
+    """
+    Runs ensure_schema() once per process (first page render). With
+    migrate_now=False nothing is changed: the report only lists pending
+    migrations, and is rebuilt after _RETRY_AFTER_SECONDS until none are left.
+    A database that is not reachable yet must not break the page, so errors are
+    kept in the report and the check is retried after _RETRY_AFTER_SECONDS.
+    """
+    global _startup_done, _startup_attempt_at, _startup_report
+    if _startup_done or time.monotonic() - _startup_attempt_at < _RETRY_AFTER_SECONDS:
+        return _startup_report
+    with _startup_lock:
+        if _startup_done or time.monotonic() - _startup_attempt_at < _RETRY_AFTER_SECONDS:
+            return _startup_report
+        _startup_attempt_at = time.monotonic()
+        try:
+            if migrate_now:
+                _startup_report = ensure_schema(apply_indexes=apply_indexes)
+            else:
+                _startup_report = {"pending_migrations": pending_migrations()}
+            _startup_done = not _startup_report.get("pending_migrations")
+        except Exception as ex:
+            _startup_report = {"error": str(ex)}
+    return _startup_report
+
+
+def startup_report() -> Optional[dict]:
+    return _startup_report
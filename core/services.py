@@ -0,0 +1,571 @@
+from __future__ import annotations
+
+import csv
+import json
+import re
+from datetime import date, datetime
+from decimal import Decimal
+from pathlib import Path
+from typing import Any, Callable, Dict, IO, Iterable, Iterator, List, Optional, Set, Tuple
+
+import pandas as pd
+
+from core.db import (
+    add_surveyor_tx,
+    backfill_name_keys,
+    get_next_surveyor_code,
+    get_projects_by_codes,
+    get_surveyors_by_codes,
+    load_provinces,
+    query_df,
+    run_in_transaction,
+    update_surveyor_tx,
+)
+from core.dedup import blocking_keys, find_duplicates, register_keys_tx, rebuild_dedup_keys
+from core.resilience import errno_of, DEADLOCK_ERRNOS
+from core.uploads import record_files_tx, publish_files, discard_files
+from core.validators import validate_email, validate_tazkira, normalize_phone
+from core.assignments import assign, AssignmentConflict
+
+# -----------------------------
+# Service layer
+# -----------------------------
+# منطق ثبت و ورود داده؛ هم صفحه‌ها و هم CLI (tools/ppc.py) از همین توابع استفاده می‌کنند.
+# Nothing here imports streamlit. Records are dicts keyed by column name.
+
+GENDERS = ("Male", "Female")
+ASSIGNMENT_STATUSES = ("ACTIVE", "INACTIVE")
+DEFAULT_COUNTRY_CODE = "+93"
+
+IMPORT_BATCH_SIZE = 200
+EXPORT_BATCH_SIZE = 5000
+
+
+class ValidationError(ValueError):
+    def __init__(self, errors: Dict[str, str]):
+        super().__init__("; ".join(f"{k}: {v}" for k, v in errors.items()))
+        self.errors = errors
+
+
+class DuplicateSurveyor(ValueError):
+    def __init__(self, matches: pd.DataFrame):
+        codes = ", ".join(sorted({str(c) for c in matches["Surveyor_Code"]}))
+        super().__init__(f"Possible duplicate of {codes}.")
+        self.matches = matches
+
+
+def _text(value) -> str:
+    if value is None or (isinstance(value, float) and pd.isna(value)):
+        return ""
+    return str(value).strip()
+
+
+def _date(value) -> Optional[date]:
+    if value is None or value == "" or (not isinstance(value, (str, date)) and pd.isna(value)):
+        return None
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return date.fromisoformat(str(value).strip()[:10])
+
+
+def _batches(rows: Iterable[dict], size: int) -> Iterator[List[Tuple[int, dict]]]:
+    batch: List[Tuple[int, dict]] = []
+    for n, row in enumerate(rows, start=1):
+        batch.append((n, row))
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def province_codes() -> Set[str]:
+    return set(load_provinces()["Province_Code"].astype(str))
+
+
+# -----------------------------
+# Surveyors
+# -----------------------------
+
+def validate_surveyor(data: dict, provinces: Optional[Set[str]] = None) -> Tuple[Dict[str, str], dict]:
+    """
+    Checks and normalises one surveyor record. Phone numbers without "+" get
+    Whatsapp_Country_Code / Phone_Country_Code (default +93).
+    Returns (errors by column, cleaned record for add_surveyor_tx).
+    """
+    if provinces is None:
+        provinces = province_codes()
+    e: Dict[str, str] = {}
+
+    name = _text(data.get("Surveyor_Name"))
+    father = _text(data.get("Father_Name"))
+    if not name:
+        e["Surveyor_Name"] = "Surveyor name is required."
+    if not father:
+        e["Father_Name"] = "Father name is required."
+
+    gender = _text(data.get("Gender")).capitalize()
+    if gender not in GENDERS:
+        e["Gender"] = "Gender must be Male or Female."
+
+    tazkira = _text(data.get("Tazkira_No"))
+    t_err = validate_tazkira(tazkira)
+    if t_err:
+        e["Tazkira_No"] = t_err
+
+    email = _text(data.get("Email_Address"))
+    mail_err = validate_email(email)
+    if mail_err:
+        e["Email_Address"] = mail_err
+
+    w_norm, w_err = normalize_phone(
+        _text(data.get("Whatsapp_Number")), _text(data.get("Whatsapp_Country_Code")) or DEFAULT_COUNTRY_CODE
+    )
+    if w_err:
+        e["Whatsapp_Number"] = w_err
+    p_norm, p_err = normalize_phone(
+        _text(data.get("Phone_Number")), _text(data.get("Phone_Country_Code")) or DEFAULT_COUNTRY_CODE
+    )
+    if p_err:
+        e["Phone_Number"] = p_err
+
+    perm_code = _text(data.get("Permanent_Province_Code"))
+    curr_code = _text(data.get("Current_Province_Code"))
+    for col, code, label in (
+        ("Permanent_Province_Code", perm_code, "permanent"),
+        ("Current_Province_Code", curr_code, "current"),
+    ):
+        if not code:
+            e[col] = f"Select a {label} province."
+        elif code not in provinces:
+            e[col] = f"Unknown province code: {code}"
+
+    cleaned = {
+        "Surveyor_Name": name,
+        "Gender": gender,
+        "Father_Name": father,
+        "Tazkira_No": tazkira,
+        "Email_Address": email,
+        "Whatsapp_Number": w_norm,
+        "Phone_Number": p_norm,
+        "Permanent_Province_Code": perm_code,
+        "Current_Province_Code": curr_code,
+        "CV_Link": _text(data.get("CV_Link")) or None,
+    }
+    return e, cleaned
+
+
+def surveyor_dedup_keys(cleaned: dict) -> Set[Tuple[str, str]]:
+    return blocking_keys(
+        cleaned["Tazkira_No"],
+        (cleaned["Whatsapp_Number"], cleaned["Phone_Number"]),
+        cleaned["Surveyor_Name"],
+        cleaned["Father_Name"],
+    )
+
+
+def create_surveyor_tx(
+    conn,
+    cleaned: dict,
+    files: Iterable[dict] = (),
+    dedup_keys: Optional[Set[Tuple[str, str]]] = None,
+) -> Tuple[int, str]:
+    """
+    Inserts a validated surveyor inside the caller's transaction: next code of
+    the permanent province, the row, stored file references and (if given)
+    the dedup keys. Returns (Surveyor_ID, Surveyor_Code).
+    """
+    code = get_next_surveyor_code(cleaned["Permanent_Province_Code"], conn=conn)
+    new_id = add_surveyor_tx(conn, {**cleaned, "Surveyor_Code": code})
+    record_files_tx(conn, new_id, list(files))
+    if dedup_keys is not None:
+        register_keys_tx(conn, new_id, dedup_keys)
+    return new_id, code
+
+
+def edit_surveyor(surveyor_code: str, data: dict, dedup_keys: Set[Tuple[str, str]]) -> bool:
+    """
+    Admin edit: the profile fields and the dedup keys in one transaction, so
+    a failure cannot leave the keys of the old values. False if the code does
+    not exist.
+    """
+
+    def tx(conn):
+        sid = update_surveyor_tx(conn, surveyor_code, data)
+        if sid is not None:
+            register_keys_tx(conn, sid, dedup_keys)
+        return sid is not None
+
+    return run_in_transaction(tx)
+
+
+def register_surveyor(data: dict, allow_duplicate: bool = False, files: Iterable[dict] = ()) -> Tuple[int, str]:
+    """Validates, checks for duplicates and inserts one surveyor. Raises ValidationError / DuplicateSurveyor."""
+    errors, cleaned = validate_surveyor(data)
+    if errors:
+        raise ValidationError(errors)
+    keys = surveyor_dedup_keys(cleaned)
+    if not allow_duplicate:
+        dups = find_duplicates(keys)
+        if not dups.empty:
+            raise DuplicateSurveyor(dups)
+    files = list(files)
+    try:
+        result = run_in_transaction(lambda conn: create_surveyor_tx(conn, cleaned, files, keys))
+    except Exception:
+        discard_files(files)
+        raise
+    publish_files(files)
+    return result
+
+
+def _savepoint(conn, sql: str) -> None:
+    cur = conn.cursor()
+    try:
+        cur.execute(sql)
+    finally:
+        cur.close()
+
+
+def _import_surveyor_batch(
+    batch: List[Tuple[int, dict]],
+    provinces: Set[str],
+    allow_duplicates: bool,
+    dry_run: bool,
+) -> List[dict]:
+    results: Dict[int, dict] = {}
+    valid = []
+    for n, row in batch:
+        errors, cleaned = validate_surveyor(row, provinces)
+        if errors:
+            results[n] = {"row": n, "status": "invalid", "errors": errors}
+        else:
+            valid.append((n, cleaned, surveyor_dedup_keys(cleaned)))
+
+    if valid and not allow_duplicates:
+        # one lookup for the whole batch; rows of this batch are checked against each other in memory
+        existing = find_duplicates(set().union(*(keys for _, _, keys in valid)))
+        taken = {(r.Key_Type, r.Key_Value): str(r.Surveyor_Code) for r in existing.itertuples()}
+        kept = []
+        for n, cleaned, keys in valid:
+            matches = sorted({taken[k] for k in keys if k in taken})
+            if matches:
+                results[n] = {"row": n, "status": "duplicate", "matches": matches}
+                continue
+            for k in keys:
+                taken[k] = f"row {n}"
+            kept.append((n, cleaned, keys))
+        valid = kept
+
+    if valid and dry_run:
+        for n, _, _ in valid:
+            results[n] = {"row": n, "status": "valid"}
+    elif valid:
+        def tx(conn):
+            # one transaction per batch; a failing row is undone alone through its savepoint
+            done = {}
+            for n, cleaned, keys in valid:
+                _savepoint(conn, f"SAVEPOINT row_{n}")
+                try:
+                    sid, code = create_surveyor_tx(conn, cleaned, (), keys)
+                except Exception as ex:
+                    if errno_of(ex) in DEADLOCK_ERRNOS:
+                        raise  # the whole batch is replayed
+                    _savepoint(conn, f"ROLLBACK TO SAVEPOINT row_{n}")
+                    done[n] = {"row": n, "status": "error", "error": str(ex)}
+                    continue
+                _savepoint(conn, f"RELEASE SAVEPOINT row_{n}")
+                done[n] = {"row": n, "status": "created", "Surveyor_ID": sid, "Surveyor_Code": code}
+            return done
+
+        results.update(run_in_transaction(tx))
+
+    return [results[n] for n, _ in batch]
+
+
+def import_surveyors(
+    rows: Iterable[dict],
+    allow_duplicates: bool = False,
+    dry_run: bool = False,
+    batch_size: int = IMPORT_BATCH_SIZE,
+) -> Iterator[dict]:
+    """
+    Registers surveyors from an iterable of records (streamed; nothing is
+    held beyond one batch). Yields one result per input row, in order:
+    status created / valid (dry run) / invalid / duplicate / error.
+    """
+    provinces = province_codes()
+    for batch in _batches(rows, batch_size):
+        yield from _import_surveyor_batch(batch, provinces, allow_duplicates, dry_run)
+
+
+# -----------------------------
+# Assignments
+# -----------------------------
+
+_LIST_SPLIT_RE = re.compile(r"[;,|]")
+
+
+def import_assignments(
+    rows: Iterable[dict],
+    allow_overlap: bool = False,
+    dry_run: bool = False,
+    batch_size: int = IMPORT_BATCH_SIZE,
+) -> Iterator[dict]:
+    """
+    Records: Surveyor_Code, Project_Code, Role, Work_Province_Codes (or
+    Work_Province_Code; several separated by ; , or |), Start_Date,
+    End_Date (optional), Status (default ACTIVE). Codes are resolved per
+    batch; each hire is saved with core.assignments.assign (overlap check).
+    """
+    provinces = province_codes()
+    for batch in _batches(rows, batch_size):
+        surveyors = get_surveyors_by_codes(_text(r.get("Surveyor_Code")) for _, r in batch)
+        projects = get_projects_by_codes(_text(r.get("Project_Code")) for _, r in batch)
+
+        for n, r in batch:
+            e: Dict[str, str] = {}
+            surveyor = surveyors.get(_text(r.get("Surveyor_Code")))
+            project = projects.get(_text(r.get("Project_Code")))
+            if surveyor is None:
+                e["Surveyor_Code"] = "Unknown surveyor code."
+            if project is None:
+                e["Project_Code"] = "Unknown project code."
+
+            role = _text(r.get("Role"))
+            if not role:
+                e["Role"] = "Role is required."
+
+            work = [
+                p.strip()
+                for p in _LIST_SPLIT_RE.split(_text(r.get("Work_Province_Codes")) or _text(r.get("Work_Province_Code")))
+                if p.strip()
+            ]
+            unknown = [p for p in work if p not in provinces]
+            if not work:
+                e["Work_Province_Codes"] = "At least one work province is required."
+            elif unknown:
+                e["Work_Province_Codes"] = f"Unknown province code(s): {', '.join(unknown)}"
+
+            start = end = None
+            try:
+                start = _date(r.get("Start_Date"))
+                end = _date(r.get("End_Date"))
+            except ValueError:
+                e["Start_Date"] = "Dates must be YYYY-MM-DD."
+            if start is None and "Start_Date" not in e:
+                e["Start_Date"] = "Start date is required."
+            elif start and end and end < start:
+                e["End_Date"] = "End date is before the start date."
+
+            status = _text(r.get("Status")).upper() or "ACTIVE"
+            if status not in ASSIGNMENT_STATUSES:
+                e["Status"] = f"Status must be one of {', '.join(ASSIGNMENT_STATUSES)}."
+
+            if e:
+                yield {"row": n, "status": "invalid", "errors": e}
+                continue
+            if dry_run:
+                yield {"row": n, "status": "valid"}
+                continue
+            try:
+                ids = assign(
+                    int(project["Project_ID"]),
+                    int(surveyor["Surveyor_ID"]),
+                    role,
+                    work,
+                    start,
+                    end,
+                    status=status,
+                    allow_overlap=allow_overlap,
+                )
+            except AssignmentConflict as ex:
+                yield {"row": n, "status": "conflict", "matches": sorted({str(c) for c in ex.conflicts["Project_Code"]})}
+                continue
+            except Exception as ex:
+                yield {"row": n, "status": "error", "error": str(ex)}
+                continue
+            yield {"row": n, "status": "created", "Project_Surveyor_IDs": [int(i) for i in ids]}
+
+
+# -----------------------------
+# Export
+# -----------------------------
+
+# name -> (FROM clause, key column, key alias, select list); blob columns are never exported
+EXPORTS: Dict[str, Tuple[str, str, str, str]] = {
+    "surveyors": (
+        "surveyors s",
+        "s.Surveyor_ID",
+        "Surveyor_ID",
+        """s.Surveyor_ID, s.Surveyor_Code, s.Surveyor_Name, s.Gender, s.Father_Name, s.Tazkira_No,
+           s.Email_Address, s.Whatsapp_Number, s.Phone_Number, s.Permanent_Province_Code,
+           s.Current_Province_Code, s.CV_Link, s.Created_At, s.Updated_At""",
+    ),
+    "projects": (
+        "projects p",
+        "p.Project_ID",
+        "Project_ID",
+        """p.Project_ID, p.Project_Code, p.Project_Name, p.Phase_Number, p.Project_Type, p.Client_Name,
+           p.Implementing_Partner, p.Start_Date, p.End_Date, p.Status, p.Notes, p.Project_Document_Link,
+           p.Created_At, p.Updated_At""",
+    ),
+    "assignments": (
+        """project_surveyors ps
+           JOIN projects pr ON pr.Project_ID = ps.Project_ID
+           JOIN surveyors s ON s.Surveyor_ID = ps.Surveyor_ID""",
+        "ps.Project_Surveyor_ID",
+        "Project_Surveyor_ID",
+        """ps.Project_Surveyor_ID, s.Surveyor_Code, pr.Project_Code, ps.Role, ps.Work_Province_Code,
+           ps.Start_Date, ps.End_Date, ps.Status""",
+    ),
+    "accounts": (
+        """surveyor_bank_accounts sba
+           JOIN surveyors s ON s.Surveyor_ID = sba.Surveyor_ID
+           JOIN banks b ON b.Bank_ID = sba.Bank_ID""",
+        "sba.Bank_Account_ID",
+        "Bank_Account_ID",
+        """sba.Bank_Account_ID, s.Surveyor_Code, b.Bank_Name, sba.Payment_Type, sba.Account_Number,
+           sba.Mobile_Number, sba.Account_Title, sba.Is_Default, sba.Is_Active""",
+    ),
+}
+
+
+def export_rows(name: str, batch_size: int = EXPORT_BATCH_SIZE) -> Iterator[dict]:
+    """All rows of an export in key order, read in keyset pages of batch_size (memory stays flat)."""
+    if name not in EXPORTS:
+        raise ValueError(f"Unknown export: {name}")
+    source, key, alias, columns = EXPORTS[name]
+    last = 0
+    while True:
+        df = query_df(
+            f"SELECT {columns} FROM {source} WHERE {key} > %s ORDER BY {key} LIMIT %s",
+            (int(last), int(batch_size)),
+            site="batch",
+        )
+        if df.empty:
+            return
+        last = int(df.iloc[-1][alias])
+        yield from frame_records(df)
+
+
+# -----------------------------
+# Payments, reindex, backfill
+# -----------------------------
+
+def payment_run(out_dir: Path, project_code: Optional[str] = None, amount: Optional[str] = None) -> Dict[str, dict]:
+    """Payment batch files for one project (by code) or all projects; see core.payments."""
+    from core.payments import write_payment_run
+
+    project_id = None
+    if project_code:
+        project = get_projects_by_codes([project_code]).get(project_code.strip())
+        if project is None:
+            raise ValueError(f"Unknown project code: {project_code}")
+        project_id = int(project["Project_ID"])
+    return write_payment_run(Path(out_dir), project_id, amount)
+
+
+REINDEX_TARGETS = ("dedup", "names", "indexes")
+
+
+def reindex(target: str) -> dict:
+    """dedup: rebuild duplicate-check keys; names: recompute all name search keys; indexes: create missing indexes."""
+    if target == "dedup":
+        return {"rows": rebuild_dedup_keys()}
+    if target == "names":
+        return {"rows": backfill_name_keys(only_missing=False)}
+    if target == "indexes":
+        from core.schema import apply_missing_indexes
+
+        return {"created": apply_missing_indexes()}
+    raise ValueError(f"Unknown reindex target: {target}")
+
+
+def backfill_analytics(
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    progress: Optional[Callable[[date, date], None]] = None,
+) -> dict:
+    """Rebuilds the daily rollups for [start, end], or brings them up to date when start is None."""
+    from core import analytics
+
+    if start is None:
+        first, last = analytics.extend()
+        return {"start": first, "end": last}
+    end = end or date.today()
+    return {"start": start, "end": end, "days": analytics.rebuild(start, end, progress=progress)}
+
+
+def backfill_name_keys_missing() -> dict:
+    return {"rows": backfill_name_keys(only_missing=True)}
+
+
+# -----------------------------
+# Streaming CSV / JSONL
+# -----------------------------
+
+FORMATS = ("csv", "jsonl")
+
+
+def read_records(stream: IO[str], fmt: str) -> Iterator[dict]:
+    """Records from a text stream, one at a time. CSV needs a header row; empty cells are None."""
+    if fmt == "csv":
+        for row in csv.DictReader(stream):
+            yield {k: (v if v != "" else None) for k, v in row.items() if k}
+    elif fmt == "jsonl":
+        for line in stream:
+            line = line.strip()
+            if line:
+                yield json.loads(line)
+    else:
+        raise ValueError(f"Unknown format: {fmt}")
+
+
+def frame_records(df: pd.DataFrame) -> List[dict]:
+    """Rows as dicts with NaN/NaT replaced by None."""
+    return df.astype(object).where(df.notna(), None).to_dict("records")
+
+
+def json_default(value):
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    if isinstance(value, (bytes, bytearray)):
+        return None
+    if hasattr(value, "item"):  # numpy scalars
+        return value.item()
+    return str(value)
+
+
+def _csv_value(value) -> Any:
+    if value is None:
+        return ""
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, default=json_default, ensure_ascii=False)
+    return value
+
+
+def write_records(records: Iterable[dict], stream: IO[str], fmt: str) -> int:
+    """Writes records as they come; the CSV header is taken from the first record. Returns the count."""
+    n = 0
+    if fmt == "jsonl":
+        for rec in records:
+            stream.write(json.dumps(rec, default=json_default, ensure_ascii=False) + "\n")
+            n += 1
+    elif fmt == "csv":
+        writer = None
+        for rec in records:
+            if writer is None:
+                writer = csv.DictWriter(stream, fieldnames=list(rec.keys()), extrasaction="ignore")
+                writer.writeheader()
+            writer.writerow({k: _csv_value(v) for k, v in rec.items()})
+            n += 1
+    else:
+        raise ValueError(f"Unknown format: {fmt}")
+    return n
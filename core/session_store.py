@@ -0,0 +1,281 @@
+from __future__ import annotations
+
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, MutableMapping, Optional
+
+import pandas as pd
+import streamlit as st
+
+from core.resilience import count
+
+try:
+    from streamlit.runtime.scriptrunner import get_script_run_ctx
+except Exception:
+    get_script_run_ctx = None
+
+try:
+    import pyarrow  # noqa: F401
+
+    _STRING_DTYPE = "string[pyarrow]"
+except Exception:
+    _STRING_DTYPE = None
+
+# ستون‌های متنی که تعداد مقدار یکتای آن‌ها کمتر از این نسبت است category می‌شوند
+CATEGORY_MAX_RATIO = 0.5
+
+_STORE_KEY = "_session_store"
+
+
+# -----------------------------
+# Compact frames
+# -----------------------------
+
+def compact_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Low-cardinality text columns become categoricals, other text columns
+    Arrow strings (when pyarrow is installed), integers are downcast.
+    Floats are left alone (amounts must not lose precision).
+    """
+    if df is None or df.empty:
+        return df
+    out = df.copy()
+    n = len(out)
+    for col in out.columns:
+        s = out[col]
+        if s.dtype == object:
+            if not all(isinstance(v, str) or v is None for v in s.head(100)):
+                continue
+            if s.nunique(dropna=True) <= max(1, int(n * CATEGORY_MAX_RATIO)):
+                out[col] = s.astype("category")
+            elif _STRING_DTYPE:
+                out[col] = s.astype(_STRING_DTYPE)
+        elif pd.api.types.is_integer_dtype(s) and not pd.api.types.is_bool_dtype(s):
+            out[col] = pd.to_numeric(s, downcast="integer")
+    out.attrs.update(df.attrs)
+    return out
+
+
+def sizeof(value: Any) -> int:
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(index=True, deep=True).sum())
+    if isinstance(value, (bytes, bytearray, str)):
+        return len(value)
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(sizeof(k) + sizeof(v) for k, v in value.items())
+    if isinstance(value, (list, tuple, set)):
+        return sys.getsizeof(value) + sum(sizeof(v) for v in value)
+    return sys.getsizeof(value)
+
+
+# -----------------------------
+# Per-session store with a memory budget
+# -----------------------------
+
+_sessions: Dict[str, tuple] = {}
+_sessions_lock = threading.Lock()
+_SESSION_IDLE_SECONDS = 3600
+
+
+def _session_id() -> str:
+    if get_script_run_ctx is None:
+        return "-"
+    try:
+        ctx = get_script_run_ctx()
+    except Exception:
+        return "-"
+    return getattr(ctx, "session_id", None) or "-"
+
+
+def _state(state: Optional[MutableMapping]) -> MutableMapping:
+    return st.session_state if state is None else state
+
+
+def _store(state: Optional[MutableMapping]) -> "OrderedDict[str, tuple]":
+    s = _state(state)
+    store = s.get(_STORE_KEY)
+    if store is None:
+        store = OrderedDict()
+        s[_STORE_KEY] = store
+    return store
+
+
+def _account(store: "OrderedDict[str, tuple]") -> int:
+    total = sum(size for _, size in store.values())
+    with _sessions_lock:
+        _sessions[_session_id()] = (total, time.monotonic())
+    return total
+
+
+def put(key: str, value: Any, state: Optional[MutableMapping] = None) -> Any:
+    """
+    Keeps value for this session (DataFrames are compacted first). Older
+    entries are evicted when the session goes over SESSION_MEMORY_BUDGET_MB;
+    a value larger than the whole budget is not kept. Returns the stored value.
+    """
+    from core.settings import SESSION_MEMORY_BUDGET_MB
+
+    budget = SESSION_MEMORY_BUDGET_MB * 1024 * 1024
+    if isinstance(value, pd.DataFrame):
+        value = compact_frame(value)
+    size = sizeof(value)
+
+    store = _store(state)
+    store.pop(key, None)
+    if size > budget:
+        count("session_budget_rejected")
+        _account(store)
+        return value
+
+    total = sum(s for _, s in store.values())
+    while store and total + size > budget:
+        _, (_, evicted) = store.popitem(last=False)
+        total -= evicted
+        count("session_budget_evicted")
+    store[key] = (value, size)
+    _account(store)
+    return value
+
+
+def get(key: str, default: Any = None, state: Optional[MutableMapping] = None) -> Any:
+    store = _store(state)
+    item = store.get(key)
+    if item is None:
+        return default
+    store.move_to_end(key)
+    return item[0]
+
+
+def drop(key: str, state: Optional[MutableMapping] = None) -> None:
+    store = _store(state)
+    if store.pop(key, None) is not None:
+        _account(store)
+
+
+def session_usage(state: Optional[MutableMapping] = None) -> Dict[str, int]:
+    return {k: size for k, (_, size) in _store(state).items()}
+
+
+def process_usage() -> dict:
+    """Accounted bytes over all sessions seen in the last hour."""
+    now = time.monotonic()
+    with _sessions_lock:
+        for sid in [s for s, (_, seen) in _sessions.items() if now - seen > _SESSION_IDLE_SECONDS]:
+            del _sessions[sid]
+        sizes = [size for size, _ in _sessions.values()]
+    return {
+        "sessions": len(sizes),
+        "bytes": sum(sizes),
+        "largest_session_bytes": max(sizes) if sizes else 0,
+    }
+
+
+# -----------------------------
+# Shared label registry
+# -----------------------------
+
+class LabelRegistry:
+    """
+    One process-wide id -> label map per namespace, so widgets can keep
+    id-only option lists and format them lazily. Labels come from prime()
+    (rows a page already loaded) or from the namespace loader on a miss.
+    """
+
+    def __init__(self, max_per_namespace: int = 20000):
+        self.max_per_namespace = max_per_namespace
+        self._labels: Dict[str, "OrderedDict[Any, str]"] = {}
+        self._loaders: Dict[str, Callable[[list], Dict[Any, str]]] = {}
+        self._lock = threading.Lock()
+
+    def register(self, namespace: str, loader: Callable[[list], Dict[Any, str]]) -> None:
+        self._loaders[namespace] = loader
+
+    def prime(self, namespace: str, mapping: Dict[Any, str]) -> None:
+        with self._lock:
+            labels = self._labels.setdefault(namespace, OrderedDict())
+            for k, v in mapping.items():
+                labels[k] = v
+                labels.move_to_end(k)
+            while len(labels) > self.max_per_namespace:
+                labels.popitem(last=False)
+
+    def label(self, namespace: str, key: Any) -> str:
+        with self._lock:
+            labels = self._labels.get(namespace)
+            if labels is not None and key in labels:
+                return labels[key]
+        loader = self._loaders.get(namespace)
+        if loader is None:
+            return str(key)
+        try:
+            found = loader([key])
+        except Exception:
+            return str(key)
+        self.prime(namespace, found)
+        return found.get(key, str(key))
+
+    def formatter(self, namespace: str) -> Callable[[Any], str]:
+        return lambda key: self.label(namespace, key)
+
+    def invalidate(self, namespace: Optional[str] = None) -> None:
+        with self._lock:
+            if namespace is None:
+                self._labels.clear()
+            else:
+                self._labels.pop(namespace, None)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {ns: len(v) for ns, v in self._labels.items()}
+
+
+labels = LabelRegistry()
+
+
+def _load(sql: str, keys: Iterable, fmt: Callable[[Any], str], key_col: str) -> Dict[Any, str]:
+    from core.db import query_df
+
+    keys = list(keys)
+    marks = ",".join(["%s"] * len(keys))
+    df = query_df(sql.format(marks=marks), tuple(keys), site="lookup")
+    return {r[key_col]: fmt(r) for r in df.to_dict("records")}
+
+
+labels.register(
+    "project",
+    lambda keys: _load(
+        "SELECT Project_ID, Project_Code, Project_Name FROM projects WHERE Project_ID IN ({marks})",
+        [int(k) for k in keys],
+        lambda r: f'{r["Project_Code"]} - {r["Project_Name"]}',
+        "Project_ID",
+    ),
+)
+labels.register(
+    "surveyor",
+    lambda keys: _load(
+        "SELECT Surveyor_ID, Surveyor_Code, Surveyor_Name FROM surveyors WHERE Surveyor_ID IN ({marks})",
+        [int(k) for k in keys],
+        lambda r: f'{r["Surveyor_Code"]} - {r["Surveyor_Name"]}',
+        "Surveyor_ID",
+    ),
+)
+labels.register(
+    "province",
+    lambda keys: _load(
+        "SELECT Province_Code, Province_Name FROM provinces WHERE Province_Code IN ({marks})",
+        keys,
+        lambda r: f'{r["Province_Name"]} ({r["Province_Code"]})',
+        "Province_Code",
+    ),
+)
+labels.register(
+    "bank",
+    lambda keys: _load(
+        "SELECT Bank_ID, Bank_Name FROM banks WHERE Bank_ID IN ({marks})",
+        [int(k) for k in keys],
+        lambda r: str(r["Bank_Name"]),
+        "Bank_ID",
+    ),
+)
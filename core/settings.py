@@ -1,24 +1,52 @@
 import os
+from pathlib import Path
+
+# tools/ppc.py (CLI, cron) sets PPC_HEADLESS=1: streamlit is never imported
+# and secrets are read from .streamlit/secrets.toml directly.
+HEADLESS = os.getenv("PPC_HEADLESS", "") not in ("", "0")
 
 # اگر streamlit نصب نبود (مثلاً در بعضی اسکریپت‌ها)، خطا ندهد
-try:
-    import streamlit as st
-except Exception:
-    st = None
+st = None
+if not HEADLESS:
+    try:
+        import streamlit as st
+    except Exception:
+        st = None
 
 
 APP_TITLE = os.getenv("APP_TITLE", "PPC Surveyor Database")
 
+_file_secrets_cache = None
+
+
+def file_secrets() -> dict:
+    """secrets.toml of the project (or the working directory) without streamlit."""
+    global _file_secrets_cache
+    if _file_secrets_cache is None:
+        _file_secrets_cache = {}
+        try:
+            import tomllib
+        except Exception:
+            return _file_secrets_cache
+        root = Path(__file__).resolve().parent.parent
+        for path in (Path.cwd() / ".streamlit" / "secrets.toml", root / ".streamlit" / "secrets.toml"):
+            if path.is_file():
+                try:
+                    with open(path, "rb") as f:
+                        _file_secrets_cache = tomllib.load(f)
+                except Exception:
+                    pass
+                break
+    return _file_secrets_cache
+
 
 def _secret(path, default=None):
     """
     Reads from st.secrets if available, otherwise returns default.
     path format: "db.host" or "users.admin.password" etc.
     """
-    if st is None:
-        return default
     try:
-        cur = st.secrets
+        cur = st.secrets if st is not None else file_secrets()
         for part in path.split("."):
             if isinstance(cur, dict) and part in cur:
                 cur = cur[part]
@@ -37,6 +65,65 @@ DEFAULT_DB = {
     "password": os.getenv("DB_PASSWORD", _secret("db.password", "")),
     "database": os.getenv("DB_NAME", _secret("db.database", "surveyor_info")),
 }
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", _secret("db.pool_size", 10)))
+# unpooled connections allowed when the pool is empty; past that a checkout waits DB_POOL_WAIT_S
+DB_POOL_OVERFLOW = int(os.getenv("DB_POOL_OVERFLOW", _secret("db.pool_overflow", 5)))
+DB_POOL_WAIT_S = float(os.getenv("DB_POOL_WAIT_S", _secret("db.pool_wait_s", 5)))
+DB_PREPARED_CACHE_SIZE = int(os.getenv("DB_PREPARED_CACHE_SIZE", _secret("db.prepared_cache_size", 64)))
+# worker threads for core.db.run_many / query_many (shared by all sessions)
+DB_FANOUT_WORKERS = int(os.getenv("DB_FANOUT_WORKERS", _secret("db.fanout_workers", max(2, DB_POOL_SIZE))))
+# keys per IN (...) list in the core.db batch lookups
+DB_BATCH_CHUNK = int(os.getenv("DB_BATCH_CHUNK", _secret("db.batch_chunk", 500)))
+
+# ---- Query timeouts (ms) per call site; 0 = no limit ----
+QUERY_TIMEOUTS_MS = {
+    "default": int(os.getenv("QUERY_TIMEOUT_MS", _secret("db.timeout_ms", 10000))),
+    "public_search": int(os.getenv("QUERY_TIMEOUT_PUBLIC_MS", _secret("db.timeout_public_ms", 3000))),
+    "admin_search": int(os.getenv("QUERY_TIMEOUT_ADMIN_MS", _secret("db.timeout_admin_ms", 8000))),
+    "dashboard": int(os.getenv("QUERY_TIMEOUT_DASHBOARD_MS", _secret("db.timeout_dashboard_ms", 5000))),
+    "lookup": int(os.getenv("QUERY_TIMEOUT_LOOKUP_MS", _secret("db.timeout_lookup_ms", 2000))),
+    "batch": int(os.getenv("QUERY_TIMEOUT_BATCH_MS", _secret("db.timeout_batch_ms", 0))),
+}
+
+# ---- Admission control (per process) ----
+# public portal and internal pages get separate DB slots so a burst of public
+# searches cannot take the connections registration / payments need.
+_PUBLIC_SLOTS_DEFAULT = max(1, DB_POOL_SIZE * 3 // 10)
+ADMISSION_SLOTS = {
+    "public": int(os.getenv("ADMISSION_PUBLIC_SLOTS", _secret("admission.public_slots", _PUBLIC_SLOTS_DEFAULT))),
+    "internal": int(os.getenv("ADMISSION_INTERNAL_SLOTS", _secret("admission.internal_slots", max(1, DB_POOL_SIZE - _PUBLIC_SLOTS_DEFAULT)))),
+}
+ADMISSION_QUEUE = {
+    "public": int(os.getenv("ADMISSION_PUBLIC_QUEUE", _secret("admission.public_queue", 6))),
+    "internal": int(os.getenv("ADMISSION_INTERNAL_QUEUE", _secret("admission.internal_queue", 30))),
+}
+ADMISSION_WAIT_S = {
+    "public": float(os.getenv("ADMISSION_PUBLIC_WAIT_S", _secret("admission.public_wait_s", 1.5))),
+    "internal": float(os.getenv("ADMISSION_INTERNAL_WAIT_S", _secret("admission.internal_wait_s", 8.0))),
+}
+# per browser session, public search only
+PUBLIC_RATE_PER_MIN = float(os.getenv("PUBLIC_RATE_PER_MIN", _secret("admission.public_rate_per_min", 20)))
+PUBLIC_RATE_BURST = int(os.getenv("PUBLIC_RATE_BURST", _secret("admission.public_rate_burst", 6)))
+
+# ---- HTTP API (core.api; python tools/ppc.py serve-api) ----
+API_HOST = os.getenv("API_HOST", _secret("api.host", "127.0.0.1"))
+API_PORT = int(os.getenv("API_PORT", _secret("api.port", 8765)))
+# partner keys: [api.keys] in secrets.toml (key = "partner name") or API_KEYS="key1:partner1,key2:partner2"
+API_KEYS = dict(
+    pair.split(":", 1) for pair in os.getenv("API_KEYS", "").split(",") if ":" in pair
+) or dict(_secret("api.keys", {}) or {})
+API_PAGE_MAX = int(os.getenv("API_PAGE_MAX", _secret("api.page_max", 500)))
+API_PUBLIC_PAGE_MAX = int(os.getenv("API_PUBLIC_PAGE_MAX", _secret("api.public_page_max", 50)))
+# responses smaller than this are sent uncompressed
+API_GZIP_MIN_BYTES = int(os.getenv("API_GZIP_MIN_BYTES", _secret("api.gzip_min_bytes", 1024)))
+
+# ---- Startup ----
+# connections opened by the warm-up thread on the first page run (core.startup)
+WARMUP_POOL_CONNECTIONS = int(os.getenv("WARMUP_POOL_CONNECTIONS", _secret("startup.pool_connections", 3)))
+
+# ---- Session memory ----
+# results kept in st.session_state (core.session_store), per browser session
+SESSION_MEMORY_BUDGET_MB = float(os.getenv("SESSION_MEMORY_BUDGET_MB", _secret("session.memory_budget_mb", 16)))
 
 # ---- Auth ----
 # اگر لاگین را از secrets.toml می‌خوانی، این‌ها دیگر لازم نیست.
@@ -46,3 +133,65 @@ ADMIN_PASSWORD = os.getenv("ADMIN_PASSWORD", "")
 
 # ---- Other ----
 SURVEYOR_CODE_PREFIX = os.getenv("SURVEYOR_CODE_PREFIX", _secret("app.surveyor_code_prefix", "PPC"))
+
+# ---- File storage ----
+DATA_DIR = Path(os.getenv("DATA_DIR", _secret("app.data_dir", str(Path(__file__).resolve().parent.parent / "data"))))
+UPLOAD_DIR = Path(os.getenv("UPLOAD_DIR", _secret("app.upload_dir", str(DATA_DIR / "uploads"))))
+
+# حداکثر حجم هر فایل (MB)
+UPLOAD_LIMITS_MB = {
+    "image": int(os.getenv("UPLOAD_MAX_IMAGE_MB", _secret("app.upload_max_image_mb", 8))),
+    "pdf": int(os.getenv("UPLOAD_MAX_PDF_MB", _secret("app.upload_max_pdf_mb", 15))),
+    "word": int(os.getenv("UPLOAD_MAX_WORD_MB", _secret("app.upload_max_word_mb", 10))),
+    "cv": int(os.getenv("UPLOAD_MAX_CV_MB", _secret("app.upload_max_cv_mb", 10))),
+}
+UPLOAD_IMAGE_MAX_PX = int(os.getenv("UPLOAD_IMAGE_MAX_PX", _secret("app.upload_image_max_px", 2000)))
+UPLOAD_JPEG_QUALITY = int(os.getenv("UPLOAD_JPEG_QUALITY", _secret("app.upload_jpeg_quality", 85)))
+
+# ---- Previews (thumbnail cache) ----
+PREVIEW_CACHE_DIR = Path(os.getenv("PREVIEW_CACHE_DIR", _secret("app.preview_cache_dir", str(DATA_DIR / "previews"))))
+PREVIEW_CACHE_MAX_MB = int(os.getenv("PREVIEW_CACHE_MAX_MB", _secret("app.preview_cache_max_mb", 200)))
+PREVIEW_MAX_PX = int(os.getenv("PREVIEW_MAX_PX", _secret("app.preview_max_px", 320)))
+
+# ---- Shared cache (core.cache) ----
+# sqlite: one file shared by the server processes of this machine; redis: several machines; memory: per process
+CACHE_BACKEND = str(os.getenv("CACHE_BACKEND", _secret("cache.backend", "sqlite"))).lower()
+CACHE_DIR = Path(os.getenv("CACHE_DIR", _secret("cache.dir", str(DATA_DIR / "cache"))))
+CACHE_REDIS_URL = os.getenv("CACHE_REDIS_URL", _secret("cache.redis_url", "redis://localhost:6379/0"))
+CACHE_MEMORY_ENTRIES = int(os.getenv("CACHE_MEMORY_ENTRIES", _secret("cache.memory_entries", 512)))
+CACHE_SHARED_MAX_ENTRIES = int(os.getenv("CACHE_SHARED_MAX_ENTRIES", _secret("cache.shared_max_entries", 20000)))
+# how often a process reads the invalidation stream (bounds cross-process staleness)
+CACHE_POLL_S = float(os.getenv("CACHE_POLL_S", _secret("cache.poll_s", 2)))
+
+# ---- Background jobs (core.jobs) ----
+JOBS_DIR = Path(os.getenv("JOBS_DIR", _secret("jobs.dir", str(DATA_DIR / "jobs"))))
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", _secret("jobs.workers", 2)))
+# workers inside the Streamlit process; set 0 when `python tools/ppc.py worker` runs them instead
+JOBS_EMBEDDED = str(os.getenv("JOBS_EMBEDDED", _secret("jobs.embedded", "1"))) == "1"
+JOB_POLL_S = float(os.getenv("JOB_POLL_S", _secret("jobs.poll_s", 2)))
+# a RUNNING job without a heartbeat for this long is requeued (its worker died)
+JOB_STALE_S = int(os.getenv("JOB_STALE_S", _secret("jobs.stale_s", 120)))
+# per job type concurrency, e.g. [jobs.limits] export = 3
+JOB_LIMITS = {str(k): int(v) for k, v in dict(_secret("jobs.limits", {}) or {}).items()}
+
+# ---- Backup / restore (core.backup) ----
+BACKUP_DIR = Path(os.getenv("BACKUP_DIR", _secret("backup.dir", str(DATA_DIR / "backups"))))
+# parallel connections for dump and load; more than the DB server's cores rarely helps
+BACKUP_WORKERS = int(os.getenv("BACKUP_WORKERS", _secret("backup.workers", min(8, os.cpu_count() or 2))))
+# target uncompressed size of one primary-key range (chunk file)
+BACKUP_CHUNK_MB = float(os.getenv("BACKUP_CHUNK_MB", _secret("backup.chunk_mb", 64)))
+# gzip level 1: BLOBs (images, PDFs) barely compress, so spend little CPU on them
+BACKUP_GZIP_LEVEL = int(os.getenv("BACKUP_GZIP_LEVEL", _secret("backup.gzip_level", 1)))
+# auto = LOAD DATA LOCAL INFILE, falling back to multi-row INSERT if the server refuses it
+BACKUP_RESTORE_METHOD = str(os.getenv("BACKUP_RESTORE_METHOD", _secret("backup.restore_method", "auto")))
+# INSERT fallback: rows per statement up to this size (keep below max_allowed_packet)
+BACKUP_INSERT_BATCH_MB = float(os.getenv("BACKUP_INSERT_BATCH_MB", _secret("backup.insert_batch_mb", 4)))
+
+# ---- Schema ----
+# پیش‌فرض: DDL فقط با `python tools/ppc.py migrate` اجرا می‌شود، نه در اولین render.
+# With auto-migrate off, only the features whose tables are missing are blocked
+# (core.schema.REQUIREMENTS); the Admin page can apply the migrations.
+SCHEMA_AUTO_MIGRATE = str(os.getenv("SCHEMA_AUTO_MIGRATE", _secret("app.schema_auto_migrate", "0"))) == "1"
+SCHEMA_AUTO_INDEX = str(os.getenv("SCHEMA_AUTO_INDEX", _secret("app.schema_auto_index", "0"))) == "1"
+# how long the admin page reuses the migration / index status
+SCHEMA_STATUS_TTL_S = int(os.getenv("SCHEMA_STATUS_TTL_S", _secret("app.schema_status_ttl_s", 300)))
@@ -0,0 +1,124 @@
+from __future__ import annotations
+
+import importlib
+import threading
+import time
+from typing import Dict, Optional
+
+# -----------------------------
+# Lazy optional imports
+# -----------------------------
+# کتابخانه‌های سنگین (PIL، pypdfium2، matplotlib) فقط وقتی لازم شدند بارگذاری می‌شوند.
+
+_modules: Dict[str, object] = {}
+_modules_lock = threading.Lock()
+_timings: Dict[str, float] = {}
+
+
+def optional_import(name: str):
+    """Imports a module on first use; returns None if it is not installed."""
+    if name in _modules:
+        return _modules[name]
+    with _modules_lock:
+        if name not in _modules:
+            t0 = time.perf_counter()
+            try:
+                module = importlib.import_module(name)
+            except Exception:
+                module = None
+            _timings[f"import {name}"] = time.perf_counter() - t0
+            _modules[name] = module
+    return _modules[name]
+
+
+# -----------------------------
+# Warm-up (once per server process)
+# -----------------------------
+
+_warm_lock = threading.Lock()
+_warm_started = False
+_warm_error: Optional[str] = None
+
+
+def _timed(name: str, fn) -> None:
+    t0 = time.perf_counter()
+    try:
+        fn()
+    finally:
+        _timings[name] = time.perf_counter() - t0
+
+
+def _open_pool(n: int) -> None:
+    from core.db import get_connection, _close
+
+    conns = []
+    try:
+        for _ in range(n):
+            conns.append(get_connection())
+    finally:
+        for conn in conns:
+            _close(conn)
+
+
+def _prime_reference_data() -> None:
+    from core.db import load_provinces, load_banks
+    from core.session_store import labels
+
+    provinces = load_provinces()
+    labels.prime("province", {r.Province_Code: f"{r.Province_Name} ({r.Province_Code})" for r in provinces.itertuples()})
+    banks = load_banks(active_only=False)
+    labels.prime("bank", {int(r.Bank_ID): str(r.Bank_Name) for r in banks.itertuples()})
+
+
+def _warm_up(params: dict) -> None:
+    global _warm_error
+    from core.db import bound_conn_params
+    from core.settings import DB_POOL_SIZE, WARMUP_POOL_CONNECTIONS
+
+    try:
+        with bound_conn_params(params):
+            _timed("warm-up pool", lambda: _open_pool(min(WARMUP_POOL_CONNECTIONS, DB_POOL_SIZE)))
+            _timed("warm-up reference data", _prime_reference_data)
+        _timed("warm-up matplotlib", lambda: optional_import("matplotlib.figure"))
+    except Exception as ex:
+        _warm_error = str(ex)
+
+
+def warm_up_once() -> None:
+    """
+    Starts the warm-up in a background thread on the first page run of the
+    process, so the first render does not wait for it.
+    """
+    global _warm_started
+    if _warm_started:
+        return
+    with _warm_lock:
+        if _warm_started:
+            return
+        _warm_started = True
+    from core.db import get_conn_params
+
+    # resolved here: the warm-up thread has no access to st.session_state
+    params = get_conn_params()
+    threading.Thread(target=_warm_up, args=(params,), name="ppc-warm-up", daemon=True).start()
+    _start_workers()
+
+
+def _start_workers() -> None:
+    # queued jobs run without waiting for someone to open the Jobs page or submit
+    global _warm_error
+    from core import jobs
+
+    try:
+        _timed("start job workers", jobs.ensure_workers)
+    except Exception as ex:
+        _warm_error = str(ex)
+
+
+def startup_timings() -> Dict[str, float]:
+    """Seconds per warm-up step and per lazy import."""
+    return dict(_timings)
+
+
+def warm_up_error() -> Optional[str]:
+    return _warm_error
@@ -0,0 +1,296 @@
+from __future__ import annotations
+
+import gzip
+import hashlib
+import io
+import os
+import tempfile
+import zlib
+from pathlib import Path
+from typing import BinaryIO, Iterator, List, Optional
+
+from core.db import execute, query_df
+from core.settings import UPLOAD_DIR, UPLOAD_LIMITS_MB, UPLOAD_IMAGE_MAX_PX, UPLOAD_JPEG_QUALITY
+from core.startup import optional_import
+
+CHUNK_SIZE = 256 * 1024
+
+KIND_TAZKIRA_IMAGE = "TAZKIRA_IMAGE"
+KIND_TAZKIRA_PDF = "TAZKIRA_PDF"
+KIND_TAZKIRA_WORD = "TAZKIRA_WORD"
+KIND_CV = "CV"
+
+_LIMIT_GROUP = {
+    KIND_TAZKIRA_IMAGE: "image",
+    KIND_TAZKIRA_PDF: "pdf",
+    KIND_TAZKIRA_WORD: "word",
+    KIND_CV: "cv",
+}
+
+# فشرده‌سازی فقط وقتی نگه داشته می‌شود که حداقل ۱۰٪ کم کند
+_GZIP_MIN_SAVING = 0.10
+
+
+class UploadError(ValueError):
+    pass
+
+
+def tazkira_kind(mime: Optional[str]) -> Optional[str]:
+    m = (mime or "").lower()
+    if "image" in m:
+        return KIND_TAZKIRA_IMAGE
+    if "pdf" in m:
+        return KIND_TAZKIRA_PDF
+    if "word" in m:
+        return KIND_TAZKIRA_WORD
+    return None
+
+
+def max_bytes(kind: str) -> int:
+    return int(UPLOAD_LIMITS_MB[_LIMIT_GROUP[kind]]) * 1024 * 1024
+
+
+def check_size(fileobj, kind: str) -> Optional[str]:
+    """
+    Rejects oversized files before anything is read.
+    Streamlit's UploadedFile exposes .size; other objects are measured by seeking.
+    """
+    size = getattr(fileobj, "size", None)
+    if size is None:
+        pos = fileobj.tell()
+        fileobj.seek(0, os.SEEK_END)
+        size = fileobj.tell()
+        fileobj.seek(pos)
+    limit = max_bytes(kind)
+    if int(size) > limit:
+        return f"File is too large ({int(size) / 1048576:.1f} MB). Limit is {limit // 1048576} MB."
+    return None
+
+
+def _chunks(fileobj: BinaryIO, chunk_size: int = CHUNK_SIZE) -> Iterator[bytes]:
+    fileobj.seek(0)
+    while True:
+        chunk = fileobj.read(chunk_size)
+        if not chunk:
+            return
+        yield chunk
+
+
+def _prepend(first: bytes, rest: Iterator[bytes]) -> Iterator[bytes]:
+    if first:
+        yield first
+    yield from rest
+
+
+def _storage_path(storage_key: str) -> Path:
+    return UPLOAD_DIR / storage_key
+
+
+def _finalize(tmp_path: Path, storage_key: str) -> None:
+    dest = _storage_path(storage_key)
+    dest.parent.mkdir(parents=True, exist_ok=True)
+    if dest.exists():
+        # محتوا یکسان است (content-addressed)
+        tmp_path.unlink(missing_ok=True)
+    else:
+        os.replace(tmp_path, dest)
+
+
+def _reencode_image(fileobj: BinaryIO) -> Optional[bytes]:
+    """
+    Downscales to UPLOAD_IMAGE_MAX_PX and re-encodes as JPEG.
+    JPEG draft mode lets the decoder skip most of the full-size decode.
+    Returns None when Pillow is missing or the result is not smaller.
+    """
+    Image = optional_import("PIL.Image")
+    if Image is None:
+        return None
+    try:
+        fileobj.seek(0)
+        with Image.open(fileobj) as img:
+            img.draft("RGB", (UPLOAD_IMAGE_MAX_PX, UPLOAD_IMAGE_MAX_PX))
+            img = img.convert("RGB")
+            img.thumbnail((UPLOAD_IMAGE_MAX_PX, UPLOAD_IMAGE_MAX_PX))
+            out = io.BytesIO()
+            img.save(out, format="JPEG", quality=UPLOAD_JPEG_QUALITY, optimize=True)
+    except Exception:
+        return None
+    data = out.getvalue()
+    size = getattr(fileobj, "size", None)
+    if size is not None and len(data) >= int(size):
+        return None
+    return data
+
+
+def store_upload(fileobj: BinaryIO, file_name: str, mime: Optional[str], kind: str) -> dict:
+    """
+    Streams one uploaded file into a staging file and returns its reference.
+
+    The file is read in CHUNK_SIZE pieces while being hashed and (when the
+    first chunk shows it is worth it) gzip-compressed into a temp file, so
+    memory use does not depend on file size. Images are re-encoded first.
+    The file only enters the store through publish_files() once the
+    transaction that records it has committed; discard_files() drops it.
+    """
+    err = check_size(fileobj, kind)
+    if err:
+        raise UploadError(err)
+
+    UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
+
+    source: BinaryIO = fileobj
+    if kind == KIND_TAZKIRA_IMAGE:
+        reencoded = _reencode_image(fileobj)
+        if reencoded is not None:
+            source = io.BytesIO(reencoded)
+            mime = "image/jpeg"
+            file_name = os.path.splitext(file_name or "tazkira")[0] + ".jpg"
+
+    chunks = _chunks(source)
+    first = next(chunks, b"")
+    gzipped = False
+    if first and kind != KIND_TAZKIRA_IMAGE:
+        gzipped = len(zlib.compress(first, 6)) <= len(first) * (1 - _GZIP_MIN_SAVING)
+
+    sha = hashlib.sha256()
+    size = 0
+    limit = max_bytes(kind)
+
+    fd, tmp_name = tempfile.mkstemp(dir=UPLOAD_DIR, prefix=".upload-")
+    tmp_path = Path(tmp_name)
+    try:
+        raw = os.fdopen(fd, "wb")
+        out = gzip.GzipFile(fileobj=raw, mode="wb", compresslevel=6) if gzipped else raw
+        try:
+            for chunk in _prepend(first, chunks):
+                sha.update(chunk)
+                size += len(chunk)
+                if size > limit:
+                    raise UploadError(f"File is too large. Limit is {limit // 1048576} MB.")
+                out.write(chunk)
+        finally:
+            out.close()
+            raw.close()
+        stored = tmp_path.stat().st_size
+    except Exception:
+        tmp_path.unlink(missing_ok=True)
+        raise
+
+    return {
+        "Kind": kind,
+        "Storage_Key": f"{sha.hexdigest()[:2]}/{sha.hexdigest()}" + (".gz" if gzipped else ""),
+        "Staged_Path": str(tmp_path),
+        "File_Name": file_name,
+        "Mime": mime,
+        "Size_Bytes": size,
+        "Stored_Bytes": stored,
+        "Content_Encoding": "gzip" if gzipped else None,
+        "Sha256": sha.hexdigest(),
+    }
+
+
+def publish_files(files: List[dict]) -> None:
+    """Moves staged uploads into the store; call after the referencing transaction committed."""
+    for f in files:
+        staged = f.pop("Staged_Path", None)
+        if staged:
+            _finalize(Path(staged), f["Storage_Key"])
+
+
+def discard_files(files: List[dict]) -> None:
+    """Deletes staged uploads whose transaction rolled back."""
+    for f in files:
+        staged = f.pop("Staged_Path", None)
+        if staged:
+            Path(staged).unlink(missing_ok=True)
+
+
+def open_stored(storage_key: str) -> BinaryIO:
+    path = _storage_path(storage_key)
+    if storage_key.endswith(".gz"):
+        return gzip.open(path, "rb")
+    return open(path, "rb")
+
+
+def read_stored(storage_key: str) -> bytes:
+    with open_stored(storage_key) as f:
+        return f.read()
+
+
+def ensure_files_table() -> None:
+    execute(
+        """
+        CREATE TABLE IF NOT EXISTS surveyor_files (
+          File_ID          BIGINT       NOT NULL AUTO_INCREMENT PRIMARY KEY,
+          Surveyor_ID      INT          NOT NULL,
+          Kind             VARCHAR(16)  NOT NULL,
+          Storage_Key      VARCHAR(100) NOT NULL,
+          File_Name        VARCHAR(255) NULL,
+          Mime             VARCHAR(100) NULL,
+          Size_Bytes       BIGINT       NOT NULL,
+          Stored_Bytes     BIGINT       NOT NULL,
+          Content_Encoding VARCHAR(16)  NULL,
+          Sha256           CHAR(64)     NOT NULL,
+          Created_At       TIMESTAMP    NOT NULL DEFAULT CURRENT_TIMESTAMP,
+          KEY idx_files_surveyor_kind (Surveyor_ID, Kind),
+          CONSTRAINT fk_files_surveyor FOREIGN KEY (Surveyor_ID)
+            REFERENCES surveyors (Surveyor_ID) ON DELETE CASCADE
+        )
+        """
+    )
+
+
+def record_files_tx(conn, surveyor_id: int, files: List[dict]) -> None:
+    if not files:
+        return
+    cur = conn.cursor()
+    try:
+        cur.executemany(
+            """
+            INSERT INTO surveyor_files
+              (Surveyor_ID, Kind, Storage_Key, File_Name, Mime, Size_Bytes, Stored_Bytes, Content_Encoding, Sha256)
+            VALUES
+              (%s,%s,%s,%s,%s,%s,%s,%s,%s)
+            """,
+            [
+                (
+                    int(surveyor_id),
+                    f["Kind"],
+                    f["Storage_Key"],
+                    f["File_Name"],
+                    f["Mime"],
+                    int(f["Size_Bytes"]),
+                    int(f["Stored_Bytes"]),
+                    f["Content_Encoding"],
+                    f["Sha256"],
+                )
+                for f in files
+            ],
+        )
+    finally:
+        try:
+            cur.close()
+        except Exception:
+            pass
+
+
+def list_surveyor_files(surveyor_id: int, kind: Optional[str] = None):
+    if kind:
+        return query_df(
+            """
+            SELECT File_ID, Kind, Storage_Key, File_Name, Mime, Size_Bytes, Stored_Bytes, Content_Encoding, Created_At
+            FROM surveyor_files
+            WHERE Surveyor_ID=%s AND Kind=%s
+            ORDER BY File_ID DESC
+            """,
+            (int(surveyor_id), kind),
+        )
+    return query_df(
+        """
+        SELECT File_ID, Kind, Storage_Key, File_Name, Mime, Size_Bytes, Stored_Bytes, Content_Encoding, Created_At
+        FROM surveyor_files
+        WHERE Surveyor_ID=%s
+        ORDER BY Kind, File_ID DESC
+        """,
+        (int(surveyor_id),),
+    )
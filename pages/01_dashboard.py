@@ -1,15 +1,19 @@
 import streamlit as st
-import pandas as pd
-import matplotlib.pyplot as plt
-from ui.theme import init_page, apply_theme, theme_switcher
+from datetime import date, timedelta
+from ui.theme import init_page, apply_theme, theme_switcher, require_schema
 from ui.layout import navbar, sidebar_menu
-from core.db import query_df
+from core.db import query_many, run_many, unit_of_work
+from core.resilience import DatabaseUnavailable
+from core.admission import Overloaded
+from core.charts import chart, CHARTS
+from core import analytics
+from core.schema import FEATURE_BASE, FEATURE_CHANGES, FEATURE_ROLLUPS
 from core.auth import ensure_auth_state
 from core.settings import APP_TITLE
 from path_bootstrap import ROOT  # فقط برای اطمینان از sys.path
 
 def main():
-    init_page(title=APP_TITLE, layout="wide")
+    init_page(title=APP_TITLE, layout="wide", needs=(FEATURE_BASE, FEATURE_CHANGES))
     ensure_auth_state()
 
     sidebar_menu()
@@ -19,31 +23,98 @@ def main():
 
     st.title("Dashboard")
 
-    k1 = query_df("SELECT COUNT(*) AS n FROM surveyors")
-    k2 = query_df("SELECT COUNT(*) AS n FROM projects")
-    k3 = query_df("SELECT COUNT(*) AS n FROM project_surveyors WHERE Status='ACTIVE'")
+    # the counts and the charts are independent: fetch them concurrently
+    try:
+        k = query_many({
+            "surveyors": ("SELECT COUNT(*) AS n FROM surveyors", None, "dashboard"),
+            "projects": ("SELECT COUNT(*) AS n FROM projects", None, "dashboard"),
+            "active": ("SELECT COUNT(*) AS n FROM project_surveyors WHERE Status='ACTIVE'", None, "dashboard"),
+        })
+    except (DatabaseUnavailable, Overloaded) as ex:
+        st.warning(str(ex))
+        return
 
     c1, c2, c3 = st.columns(3)
-    c1.metric("Total Surveyors", int(k1.iloc[0]["n"]))
-    c2.metric("Total Projects", int(k2.iloc[0]["n"]))
-    c3.metric("Active Assignments", int(k3.iloc[0]["n"]))
+    c1.metric("Total Surveyors", int(k["surveyors"].iloc[0]["n"]))
+    c2.metric("Total Projects", int(k["projects"].iloc[0]["n"]))
+    c3.metric("Active Assignments", int(k["active"].iloc[0]["n"]))
 
     st.divider()
 
-    df = query_df("""
-      SELECT p.Province_Name, COUNT(*) AS cnt
-      FROM surveyors s
-      LEFT JOIN provinces p ON p.Province_Code = s.Permanent_Province_Code
-      GROUP BY p.Province_Name
-      ORDER BY cnt DESC
-      LIMIT 12
-    """)
-
-    if not df.empty:
-        fig = plt.figure()
-        plt.bar(df["Province_Name"], df["cnt"])
-        plt.xticks(rotation=45, ha="right")
-        st.pyplot(fig, use_container_width=True)
+    charts = run_many(
+        {name: (lambda name=name: chart(name, theme)) for name in CHARTS},
+        return_exceptions=True,
+    )
+
+    _chart("surveyors_by_province", charts)
+
+    left, right = st.columns(2)
+    with left:
+        _chart("assignments_by_project", charts)
+    with right:
+        _chart("registrations_by_month", charts)
+
+    st.divider()
+    _trends()
+
+def _trends() -> None:
+    st.subheader("Trends")
+    if not require_schema(FEATURE_ROLLUPS, stop=False):
+        return
+
+    try:
+        if analytics.last_rolled_day() is None:
+            st.info("Analytics rollups have not been built yet (Admin → Analytics Rollups).")
+            return
+        analytics.extend_if_due()
+    except Exception as ex:
+        st.warning(f"Analytics rollups could not be updated: {ex}")
+
+    c1, c2, c3 = st.columns(3)
+    with c1:
+        days = st.selectbox("Range", [30, 90, 365, 730], index=1, format_func=lambda d: f"Last {d} days", key="dash_range")
+    with c2:
+        granularity = st.selectbox("Granularity", list(analytics.GRANULARITIES), index=0, key="dash_granularity")
+    with c3:
+        by_province = st.checkbox("Split by province", key="dash_by_province")
+
+    end = date.today()
+    start = end - timedelta(days=int(days) - 1)
+
+    left, right = st.columns(2)
+    for col, metric, title in (
+        (left, analytics.METRIC_REGISTRATIONS, "Registrations"),
+        (right, analytics.METRIC_ACTIVE_ASSIGNMENTS, "Assignments running (by start/end date, any status)"),
+    ):
+        with col:
+            st.caption(title)
+            try:
+                df = analytics.series(metric, start, end, granularity, by_province=by_province)
+            except Exception as ex:
+                st.warning(f"Not available: {ex}")
+                continue
+            if df.empty:
+                st.info("No data in this range.")
+            elif by_province:
+                st.line_chart(df.pivot_table(index="Period", columns="Province_Code", values="Value", fill_value=0))
+            else:
+                st.line_chart(df.set_index("Period")["Value"])
+
+def _chart(name: str, charts: dict) -> None:
+    result = charts[name]
+    if isinstance(result, Exception):
+        st.warning(f"Chart not available: {result}")
+        return
+    png, df = result
+    if df.empty:
+        return
+    if png is not None:
+        st.image(png, use_container_width=True)
+    else:
+        title, _, _, x, y, _ = CHARTS[name]
+        st.caption(title)
+        st.bar_chart(df.set_index(x)[y])
 
 if __name__ == "__main__":
-    main()
+    with unit_of_work():
+        main()
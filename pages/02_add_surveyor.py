@@ -1,16 +1,26 @@
 import streamlit as st
 import re
 from ui.theme import init_page, apply_theme, theme_switcher
+from core.schema import FEATURE_BASE, FEATURE_CHANGES, FEATURE_DEDUP, FEATURE_FILES, FEATURE_NAME_SEARCH
 from ui.layout import navbar, sidebar_menu
 from ui.components import card_start, card_end, field_error
-from core.db import load_provinces, get_connection
-from core.validators import COUNTRY_CODES, validate_email, validate_tazkira, normalize_phone
-
-# Handle exception for SURVEYOR_CODE_PREFIX import
-try:
-    from core.settings import SURVEYOR_CODE_PREFIX
-except Exception:
-    SURVEYOR_CODE_PREFIX = "PPC"
+from core.db import load_provinces, run_in_transaction, unit_of_work
+from core.validators import COUNTRY_CODES
+from core.dedup import find_duplicates, KEY_LABELS
+from core.uploads import tazkira_kind, check_size, store_upload, publish_files, discard_files, UploadError, KIND_CV
+from core.services import validate_surveyor, surveyor_dedup_keys, create_surveyor_tx
+
+# services column -> form field that shows the error
+FIELD_KEYS = {
+    "Surveyor_Name": "surveyor_name",
+    "Father_Name": "father_name",
+    "Tazkira_No": "tazkira",
+    "Email_Address": "email",
+    "Whatsapp_Number": "whatsapp_raw",
+    "Phone_Number": "phone_raw",
+    "Permanent_Province_Code": "perm_prov",
+    "Current_Province_Code": "curr_prov",
+}
 
 def init_form_state():
     """ Initialize the form state with default values. """
@@ -30,6 +40,7 @@ def init_form_state():
         "phone_raw": "",
         "cv_link": "",
         "tazkira_image": None,
+        "allow_duplicate": False,
         "errors": {},
         "success_msg": "",
     }
@@ -37,25 +48,8 @@ def init_form_state():
         st.session_state.setdefault(k, v)
 
 def validate_all(name_to_code: dict):
-    """ Validate all fields and return any errors. """
-    e = {}
-
-    if not st.session_state.surveyor_name.strip():
-        e["surveyor_name"] = "Surveyor name is required."
-    if not st.session_state.father_name.strip():
-        e["father_name"] = "Father name is required."
-
-    # Tazkira validation
-    t_err = validate_tazkira(st.session_state.tazkira)
-    if t_err:
-        e["tazkira"] = t_err if isinstance(t_err, str) else "Invalid Tazkira number."
-
-    # Email validation
-    mail_err = validate_email(st.session_state.email)
-    if mail_err:
-        e["email"] = mail_err if isinstance(mail_err, str) else "Invalid email address."
-
-    # Normalize WhatsApp and Phone numbers
+    """ Validate all fields (core.services.validate_surveyor) and return errors by form field and the cleaned record. """
+    # Country codes of the WhatsApp and Phone numbers
     w_code = dict(COUNTRY_CODES).get(st.session_state.w_code_label, "+93")
     if st.session_state.w_code_label == "Other":
         w_code = st.session_state.w_custom.strip() or "+93"
@@ -64,53 +58,28 @@ def validate_all(name_to_code: dict):
     if st.session_state.p_code_label == "Other":
         p_code = st.session_state.p_custom.strip() or "+93"
 
-    w_norm, w_err = normalize_phone(st.session_state.whatsapp_raw, w_code)
-    if w_err:
-        e["whatsapp_raw"] = w_err if isinstance(w_err, str) else "Invalid WhatsApp number."
-
-    p_norm, p_err = normalize_phone(st.session_state.phone_raw, p_code)
-    if p_err:
-        e["phone_raw"] = p_err if isinstance(p_err, str) else "Invalid phone number."
-
-    # Validate provinces
-    perm_code = name_to_code.get(st.session_state.perm_prov)
-    curr_code = name_to_code.get(st.session_state.curr_prov)
-
-    if not perm_code:
-        e["perm_prov"] = "Select a permanent province."
-    if not curr_code:
-        e["curr_prov"] = "Select a current province."
-
-    return e, w_norm, p_norm, perm_code, curr_code
-
-def get_next_surveyor_code_tx(conn, perm_prov_code: str) -> str:
-    """ Generate next surveyor code based on province sequence. """
-    cur = conn.cursor()
-
-    cur.execute(
-        "INSERT IGNORE INTO province_sequences (Province_Code, Last_Number) VALUES (%s, 0)",
-        (perm_prov_code,)
-    )
-
-    cur.execute(
-        "SELECT Last_Number FROM province_sequences WHERE Province_Code=%s FOR UPDATE",
-        (perm_prov_code,)
-    )
-    row = cur.fetchone()
-    last = int(row[0]) if row else 0
-    nxt = last + 1
-
-    cur.execute(
-        "UPDATE province_sequences SET Last_Number=%s WHERE Province_Code=%s",
-        (nxt, perm_prov_code),
+    errors, cleaned = validate_surveyor(
+        {
+            "Surveyor_Name": st.session_state.surveyor_name,
+            "Gender": st.session_state.gender,
+            "Father_Name": st.session_state.father_name,
+            "Tazkira_No": st.session_state.tazkira,
+            "Email_Address": st.session_state.email,
+            "Whatsapp_Number": st.session_state.whatsapp_raw,
+            "Whatsapp_Country_Code": w_code,
+            "Phone_Number": st.session_state.phone_raw,
+            "Phone_Country_Code": p_code,
+            "Permanent_Province_Code": name_to_code.get(st.session_state.perm_prov),
+            "Current_Province_Code": name_to_code.get(st.session_state.curr_prov),
+            "CV_Link": st.session_state.cv_link,
+        },
+        set(name_to_code.values()),
     )
-
-    cur.close()
-    return f"{SURVEYOR_CODE_PREFIX}-{perm_prov_code}-{nxt:03d}"
+    return {FIELD_KEYS.get(k, k): v for k, v in errors.items()}, cleaned
 
 def main():
     """ Main function for adding a surveyor. """
-    init_page(title="PPC Surveyor Database", layout="wide")
+    init_page(title="PPC Surveyor Database", layout="wide", needs=(FEATURE_BASE, FEATURE_CHANGES, FEATURE_DEDUP, FEATURE_FILES, FEATURE_NAME_SEARCH))
     sidebar_menu()
     theme = theme_switcher(default="light")
     apply_theme(theme)
@@ -194,131 +163,84 @@ def main():
         st.markdown("### Tazkira Image or File (Optional)")
         tazkira_files = st.file_uploader("Upload Tazkira Image, PDF or Word", type=["jpg", "jpeg", "png", "pdf", "docx"], accept_multiple_files=True)
 
-        # Initialize file processing variables
-        tazkira_image_blob = None
-        tazkira_pdf_blob = None
-        tazkira_word_blob = None
-
-        tazkira_image_name = None
-        tazkira_pdf_name = None
-        tazkira_word_name = None
-        tazkira_image_mime = None
-        tazkira_pdf_mime = None
-        tazkira_word_mime = None
-
-        if tazkira_files:
-            for uploaded_file in tazkira_files:
-                file_name = uploaded_file.name
-                file_type = uploaded_file.type
-
-                # Process file and store in appropriate variable
-                file_blob = uploaded_file.getvalue()
-                
-                if "image" in file_type:
-                    tazkira_image_blob = file_blob
-                    tazkira_image_name = file_name
-                    tazkira_image_mime = file_type
-                elif "pdf" in file_type:
-                    tazkira_pdf_blob = file_blob
-                    tazkira_pdf_name = file_name
-                    tazkira_pdf_mime = file_type
-                elif "word" in file_type:
-                    tazkira_word_blob = file_blob
-                    tazkira_word_name = file_name
-                    tazkira_word_mime = file_type
+        field_error(st.session_state.errors.get("tazkira_files"))
+
+        # Files are only classified here; they are streamed to storage on submit
+        pending_files = []
+        for uploaded_file in tazkira_files or []:
+            kind = tazkira_kind(uploaded_file.type)
+            if kind:
+                pending_files.append((uploaded_file, kind))
 
         st.divider()
 
         st.markdown("### CV (Optional)")
         st.text_input("CV Link", key="cv_link")
         cv_file = st.file_uploader("Upload CV file (optional)", type=None)
+        field_error(st.session_state.errors.get("cv_file"))
+        if cv_file:
+            pending_files.append((cv_file, KIND_CV))
+
+        st.checkbox("Save even if a possible duplicate is found", key="allow_duplicate")
 
         submit = st.form_submit_button("Add to Database", type="primary")
 
         if submit:
             st.session_state.success_msg = ""
-            errors, w_norm, p_norm, perm_code, curr_code = validate_all(name_to_code)
+            errors, cleaned = validate_all(name_to_code)
+            for uploaded_file, kind in pending_files:
+                size_err = check_size(uploaded_file, kind)
+                if size_err:
+                    errors["cv_file" if kind == KIND_CV else "tazkira_files"] = f"{uploaded_file.name}: {size_err}"
             st.session_state.errors = errors
 
             if errors:
                 st.warning("Some fields have issues. Please fix the errors shown under the fields.")
                 st.stop()
 
-            conn = get_connection()
+            dedup_keys = surveyor_dedup_keys(cleaned)
             try:
-                if getattr(conn, "in_transaction", False):
-                    conn.rollback()
-
-                conn.start_transaction()
-
-                surveyor_code = get_next_surveyor_code_tx(conn, perm_code)
-
-                # Optionally, handle the CV upload
-                cv_blob = cv_file.getvalue() if cv_file else None
-                cv_name = cv_file.name if cv_file else None
-                cv_mime = cv_file.type if cv_file else None
-
-                # Insert Surveyor data into the database
-                cur = conn.cursor()
-                cur.execute(
-                    """
-                    INSERT INTO surveyors
-                      (Surveyor_Code, Surveyor_Name, Gender, Father_Name, Tazkira_No,
-                       Email_Address, Whatsapp_Number, Phone_Number,
-                       Permanent_Province_Code, Current_Province_Code,
-                       CV_Link, CV_File, CV_File_Name, CV_Mime,
-                       Tazkira_Image, Tazkira_Image_Name, Tazkira_Image_Mime,
-                       Tazkira_PDF, Tazkira_PDF_Name, Tazkira_PDF_Mime,
-                       Tazkira_Word, Tazkira_Word_Name, Tazkira_Word_Mime)
-                    VALUES
-                      (%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s)
-                    """,
-                    (
-                        surveyor_code,
-                        st.session_state.surveyor_name.strip(),
-                        st.session_state.gender,
-                        st.session_state.father_name.strip(),
-                        st.session_state.tazkira.strip(),
-                        st.session_state.email.strip(),
-                        w_norm,
-                        p_norm,
-                        perm_code,
-                        curr_code,
-                        (st.session_state.cv_link.strip() or None),
-                        cv_blob,
-                        cv_name,
-                        cv_mime,
-                        tazkira_image_blob,
-                        tazkira_image_name,
-                        tazkira_image_mime,
-                        tazkira_pdf_blob,
-                        tazkira_pdf_name,
-                        tazkira_pdf_mime,
-                        tazkira_word_blob,
-                        tazkira_word_name,
-                        tazkira_word_mime,
-                    ),
-                )
-                cur.close()
-
-                conn.commit()
+                dups = find_duplicates(dedup_keys)
+            except Exception as ex:
+                # only the check is skipped; the keys are still saved with the surveyor
+                dups = None
+                st.warning(f"Duplicate check is unavailable: {ex}")
+
+            if dups is not None and not dups.empty and not st.session_state.allow_duplicate:
+                st.warning("Possible duplicate surveyor(s) found. Tick the checkbox above to save anyway.")
+                for r in dups.itertuples():
+                    st.write(f"- {r.Surveyor_Code} - {r.Surveyor_Name} / {r.Father_Name} ({KEY_LABELS.get(r.Key_Type, r.Key_Type)})")
+                st.stop()
 
-                st.session_state.success_msg = f"Saved successfully. Surveyor Code: {surveyor_code}"
-                st.session_state.errors = {}
+            # Stage files before the transaction; only references go into the DB
+            stored_files = []
+            try:
+                for uploaded_file, kind in pending_files:
+                    stored_files.append(store_upload(uploaded_file, uploaded_file.name, uploaded_file.type, kind))
+            except (UploadError, OSError) as ex:
+                discard_files(stored_files)
+                st.error(f"File upload failed: {ex}")
+                st.stop()
+
+            def save_tx(conn):
+                # next code, surveyor row, file references and dedup keys
+                _, surveyor_code = create_surveyor_tx(conn, cleaned, stored_files, dedup_keys)
+                return surveyor_code
 
+            try:
+                # replayed from scratch on deadlock (province sequence row lock)
+                surveyor_code = run_in_transaction(save_tx)
             except Exception as ex:
-                try:
-                    conn.rollback()
-                except Exception:
-                    pass
+                discard_files(stored_files)
                 st.error(f"Save failed: {ex}")
-            finally:
-                try:
-                    conn.close()
-                except Exception:
-                    pass
+            else:
+                # committed: staged files move into the store
+                publish_files(stored_files)
+                st.session_state.success_msg = f"Saved successfully. Surveyor Code: {surveyor_code}"
+                st.session_state.errors = {}
 
     card_end()
 
 if __name__ == "__main__":
-    main()
+    with unit_of_work():
+        main()
@@ -1,13 +1,87 @@
 import streamlit as st
 import pandas as pd
 from io import BytesIO
+from datetime import date
 
-from ui.theme import init_page, apply_theme, theme_switcher
+from ui.theme import init_page, apply_theme, theme_switcher, require_schema
 from ui.layout import navbar, sidebar_menu
 from ui.components import card_start, card_end
 from core.auth import login_box
-from core.db import query_df, execute
+from core.db import query_df, backfill_name_keys, delete_surveyor, unit_of_work
+from core.services import edit_surveyor
 from core.validators import validate_email, validate_tazkira, normalize_phone, COUNTRY_CODES
+from core.normalize import name_search_terms
+from core.dedup import (
+    blocking_keys,
+    rebuild_dedup_keys,
+    find_duplicate_clusters,
+    KEY_LABELS,
+)
+from core.uploads import read_stored, KIND_CV
+from core.schema import (
+    migrate,
+    schema_status,
+    apply_missing_indexes,
+    explain_hot_queries,
+    FEATURE_BASE,
+    FEATURE_CHANGES,
+    FEATURE_DEDUP,
+    FEATURE_FILES,
+    FEATURE_NAME_SEARCH,
+)
+from core.previews import tazkira_previews
+from core import session_store
+from core import analytics
+
+def _render_previews(df: pd.DataFrame, per_row: int = 5):
+    try:
+        thumbs = tazkira_previews(df["Surveyor_ID"].tolist())
+    except Exception as ex:
+        st.error(f"Previews are not available: {ex}")
+        return
+    if not thumbs:
+        st.info("No Tazkira images or PDFs to preview.")
+        return
+
+    rows = [r for r in df.to_dict("records") if int(r["Surveyor_ID"]) in thumbs]
+    for i in range(0, len(rows), per_row):
+        cols = st.columns(per_row)
+        for col, r in zip(cols, rows[i:i + per_row]):
+            col.image(thumbs[int(r["Surveyor_ID"])], caption=f'{r["Surveyor_Code"]} - {r["Surveyor_Name"]}')
+
+def _schema_card():
+    card_start("Schema & Indexes", "Migrations, required indexes, and EXPLAIN checks for hot queries.")
+
+    try:
+        status = schema_status()
+        pending = status["pending"]
+        st.write(f"Schema version: **{status['version']}**")
+        if pending:
+            st.warning("Pending migrations: " + ", ".join(pending))
+            if st.button("Apply migrations"):
+                applied = migrate()
+                st.success("Applied: " + ", ".join(applied))
+
+        idx = status["indexes"]
+        missing = [r for r in idx if not r["present"]]
+        with st.expander(f"Indexes ({len(idx) - len(missing)}/{len(idx)} present)", expanded=bool(missing)):
+            st.dataframe(idx, use_container_width=True)
+        if missing and st.button("Create missing indexes (online)"):
+            created = apply_missing_indexes()
+            st.success("Created: " + (", ".join(created) or "none"))
+
+        if st.button("Check hot query plans"):
+            plans = explain_hot_queries()
+            bad = [p for p in plans if not p["ok"]]
+            if bad:
+                st.error(f"{len(bad)} hot query step(s) use a full scan.")
+            else:
+                st.success("All hot queries are index-served.")
+            st.dataframe(plans, use_container_width=True)
+    except Exception as ex:
+        st.error(f"Schema check failed: {ex}")
+
+    card_end()
 
 def admin_panel():
     st.success("Admin mode enabled")
@@ -20,13 +94,29 @@ def admin_panel():
 
     st.divider()
 
+    # the other cards read and write these tables; until they exist only the
+    # schema card is shown, so the migrations can be applied from here
+    needs = (FEATURE_BASE, FEATURE_CHANGES, FEATURE_DEDUP, FEATURE_FILES, FEATURE_NAME_SEARCH)
+    if not require_schema(*needs, stop=False):
+        _schema_card()
+        return
+
     card_start("Search Surveyor (Admin)", "Search by code, Tazkira, name, phone, or WhatsApp (up to 200 rows).")
 
     q = st.text_input("Search", placeholder="Example: PPC-KAB-001 or 1234-5678-91011")
     like = f"%{q.strip()}%" if q else "%"
+    # a query without a name key ("." or "-") leaves the name out instead of matching every row
+    terms = name_search_terms(q)
+    name_sql, name_params = "", ()
+    if terms:
+        name_sql = """
+           OR (s.Surveyor_Name_Key LIKE %s
+               AND s.Surveyor_ID IN (SELECT t.Surveyor_ID FROM surveyor_name_tokens t WHERE t.Token LIKE %s))
+           OR (s.Surveyor_Name_Key IS NULL AND s.Surveyor_Name LIKE %s)"""
+        name_params = (terms[1], terms[0], like)
 
     df = query_df(
-        """
+        f"""
         SELECT
           s.Surveyor_ID,
           s.Surveyor_Code,
@@ -48,14 +138,14 @@ def admin_panel():
         LEFT JOIN provinces pp ON pp.Province_Code = s.Permanent_Province_Code
         LEFT JOIN provinces cp ON cp.Province_Code = s.Current_Province_Code
         WHERE s.Surveyor_Code LIKE %s
-           OR s.Tazkira_No LIKE %s
-           OR s.Surveyor_Name LIKE %s
+           OR s.Tazkira_No LIKE %s{name_sql}
            OR s.Phone_Number LIKE %s
            OR s.Whatsapp_Number LIKE %s
         ORDER BY s.Surveyor_ID DESC
         LIMIT 200
         """,
-        (like, like, like, like, like),
+        (like, like) + name_params + (like, like),
+        site="admin_search",
     )
 
     if df.empty:
@@ -78,6 +168,9 @@ def admin_panel():
                 file_name="surveyors.xlsx",
                 mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
             )
+
+        if st.checkbox("Show Tazkira previews (first 50 results)", key="show_tazkira_previews"):
+            _render_previews(df.head(50))
         card_end()
 
     st.divider()
@@ -90,7 +183,7 @@ def admin_panel():
             st.error("Enter a Surveyor Code.")
         else:
             try:
-                rc = execute("DELETE FROM surveyors WHERE Surveyor_Code=%s", (del_code.strip(),))
+                rc = delete_surveyor(del_code)
                 if rc == 0:
                     st.warning("No matching record found.")
                 else:
@@ -102,7 +195,6 @@ def admin_panel():
     st.divider()
 
     st.session_state.setdefault("edit_errors", {})
-    st.session_state.setdefault("edit_record", None)
 
     card_start("Edit Surveyor", "Surveyor Code is fixed; other fields can be updated.")
 
@@ -111,15 +203,24 @@ def admin_panel():
         if not edit_code.strip():
             st.error("Enter a Surveyor Code.")
         else:
-            one = query_df("SELECT * FROM surveyors WHERE Surveyor_Code=%s", (edit_code.strip(),))
+            # فقط ستون‌های فرم؛ نه BLOBها
+            one = query_df(
+                """
+                SELECT Surveyor_ID, Surveyor_Code, Surveyor_Name, Gender, Father_Name, Tazkira_No,
+                       Email_Address, Whatsapp_Number, Phone_Number, CV_Link
+                FROM surveyors
+                WHERE Surveyor_Code=%s
+                """,
+                (edit_code.strip(),),
+            )
             if one.empty:
                 st.warning("Record not found.")
-                st.session_state.edit_record = None
+                session_store.drop("edit_record")
             else:
-                st.session_state.edit_record = one.iloc[0].to_dict()
+                session_store.put("edit_record", one.iloc[0].to_dict())
                 st.session_state.edit_errors = {}
 
-    rec = st.session_state.edit_record
+    rec = session_store.get("edit_record")
     if rec:
         with st.form("edit_form", clear_on_submit=False):
             st.write(f"Surveyor Code: **{rec.get('Surveyor_Code','')}**")
@@ -179,33 +280,22 @@ def admin_panel():
                     st.stop()
 
                 try:
-                    execute(
-                        """
-                        UPDATE surveyors
-                        SET Surveyor_Name=%s,
-                            Gender=%s,
-                            Father_Name=%s,
-                            Tazkira_No=%s,
-                            Email_Address=%s,
-                            Whatsapp_Number=%s,
-                            Phone_Number=%s,
-                            CV_Link=%s
-                        WHERE Surveyor_Code=%s
-                        """,
-                        (
-                            name.strip(),
-                            gender,
-                            father.strip(),
-                            tazkira.strip(),
-                            email.strip(),
-                            w_norm,
-                            p_norm,
-                            (cv_link.strip() or None),
-                            rec["Surveyor_Code"],
-                        ),
+                    edit_surveyor(
+                        rec["Surveyor_Code"],
+                        {
+                            "Surveyor_Name": name,
+                            "Gender": gender,
+                            "Father_Name": father,
+                            "Tazkira_No": tazkira,
+                            "Email_Address": email,
+                            "Whatsapp_Number": w_norm,
+                            "Phone_Number": p_norm,
+                            "CV_Link": cv_link,
+                        },
+                        blocking_keys(tazkira, (w_norm, p_norm), name, father),
                     )
                     st.success("Saved successfully.")
-                    st.session_state.edit_record = None
+                    session_store.drop("edit_record")
                 except Exception as ex:
                     st.error(f"Save failed: {ex}")
 
@@ -220,11 +310,36 @@ def admin_panel():
         if not code.strip():
             st.error("Enter a Surveyor Code.")
         else:
-            df_cv = query_df(
-                "SELECT CV_File, CV_File_Name, CV_Mime FROM surveyors WHERE Surveyor_Code=%s",
-                (code.strip(),),
+            stored_cv = query_df(
+                """
+                SELECT f.Storage_Key, f.File_Name, f.Mime
+                FROM surveyor_files f
+                JOIN surveyors s ON s.Surveyor_ID = f.Surveyor_ID
+                WHERE s.Surveyor_Code=%s AND f.Kind=%s
+                ORDER BY f.File_ID DESC
+                LIMIT 1
+                """,
+                (code.strip(), KIND_CV),
             )
-            if df_cv.empty:
+            df_cv = None
+            if stored_cv.empty:
+                df_cv = query_df(
+                    "SELECT CV_File, CV_File_Name, CV_Mime FROM surveyors WHERE Surveyor_Code=%s",
+                    (code.strip(),),
+                )
+
+            if not stored_cv.empty:
+                f = stored_cv.iloc[0]
+                try:
+                    st.download_button(
+                        "Download CV File",
+                        data=read_stored(f["Storage_Key"]),
+                        file_name=f["File_Name"] or "cv.bin",
+                        mime=f["Mime"] or "application/octet-stream",
+                    )
+                except OSError as ex:
+                    st.error(f"Stored file could not be read: {ex}")
+            elif df_cv.empty:
                 st.warning("Record not found.")
             else:
                 row = df_cv.iloc[0]
@@ -240,6 +355,132 @@ def admin_panel():
 
     card_end()
 
+    st.divider()
+
+    _schema_card()
+
+    st.divider()
+
+    card_start("File Storage", "Uploaded files are stored on disk; the database keeps references only.")
+
+    try:
+        usage = query_df(
+            """
+            SELECT Kind, COUNT(*) AS Files, SUM(Size_Bytes) AS Original_Bytes, SUM(Stored_Bytes) AS Stored_Bytes
+            FROM surveyor_files
+            GROUP BY Kind
+            """
+        )
+        if not usage.empty:
+            st.dataframe(usage, use_container_width=True)
+    except Exception:
+        st.caption("File reference table is not available yet.")
+
+    card_end()
+
+    st.divider()
+
+    card_start("Name Search Keys", "Rebuild normalized name keys used by name search.")
+
+    n1, n2 = st.columns(2)
+    with n1:
+        if st.button("Fill missing keys"):
+            try:
+                n = backfill_name_keys(only_missing=True)
+                st.success(f"Updated {n} surveyor(s).")
+            except Exception as ex:
+                st.error(f"Backfill failed: {ex}")
+    with n2:
+        if st.button("Rebuild all keys"):
+            try:
+                n = backfill_name_keys(only_missing=False)
+                st.success(f"Updated {n} surveyor(s).")
+            except Exception as ex:
+                st.error(f"Rebuild failed: {ex}")
+
+    card_end()
+
+    st.divider()
+
+    card_start("Analytics Rollups", "Daily registration and assignment rollups used by the dashboard trends.")
+
+    try:
+        last_day = analytics.last_rolled_day()
+        first_day = analytics.first_data_day()
+    except Exception as ex:
+        st.error(f"Rollups are not available: {ex}")
+        last_day = first_day = None
+    st.caption(f"Rolled up to: {last_day or 'never'} | Earliest data: {first_day or '-'}")
+
+    r1, r2 = st.columns(2)
+    with r1:
+        rb_start = st.date_input("From", value=first_day or date.today(), key="rollup_from")
+    with r2:
+        rb_end = st.date_input("To", value=date.today(), key="rollup_to")
+
+    if st.button("Backfill / rebuild range"):
+        bar = st.progress(0.0)
+        total_days = max(1, (rb_end - rb_start).days + 1)
+
+        def on_chunk(chunk_start, chunk_end):
+            bar.progress(min(1.0, ((chunk_end - rb_start).days + 1) / total_days))
+
+        try:
+            n = analytics.rebuild(rb_start, rb_end, progress=on_chunk)
+            st.success(f"Rolled up {n} day(s).")
+        except Exception as ex:
+            st.error(f"Rollup failed: {ex}")
+
+    card_end()
+
+    st.divider()
+
+    card_start("Duplicate Check", "Find surveyors sharing a Tazkira number, phone number, or name + father name.")
+
+    k1, k2 = st.columns(2)
+    with k1:
+        if st.button("Rebuild duplicate keys"):
+            try:
+                n = rebuild_dedup_keys()
+                st.success(f"Indexed {n} surveyor(s).")
+            except Exception as ex:
+                st.error(f"Rebuild failed: {ex}")
+    with k2:
+        find_dups = st.button("Find duplicate clusters")
+
+    if find_dups:
+        try:
+            clusters = find_duplicate_clusters()
+        except Exception as ex:
+            clusters = None
+            st.error(f"Duplicate search failed: {ex}")
+
+        if clusters is not None and not clusters:
+            st.info("No duplicates found.")
+        elif clusters:
+            ids = sorted({sid for c in clusters for sid in c["Surveyor_IDs"]})
+            by_id = {}
+            # bounded IN lists: a big cluster set must not become one huge statement
+            for i in range(0, len(ids), 500):
+                chunk = ids[i:i + 500]
+                marks = ",".join(["%s"] * len(chunk))
+                people = query_df(
+                    f"SELECT Surveyor_ID, Surveyor_Code, Surveyor_Name, Father_Name, Tazkira_No, Phone_Number "
+                    f"FROM surveyors WHERE Surveyor_ID IN ({marks})",
+                    tuple(chunk),
+                )
+                by_id.update({int(r["Surveyor_ID"]): r for r in people.to_dict("records")})
+            st.write(f"{len(clusters)} cluster(s) found.")
+            for i, c in enumerate(clusters, start=1):
+                reasons = ", ".join(KEY_LABELS.get(k, k) for k in c["Reasons"])
+                with st.expander(f"Cluster {i}: {len(c['Surveyor_IDs'])} surveyors ({reasons})"):
+                    st.dataframe(
+                        [by_id[sid] for sid in c["Surveyor_IDs"] if sid in by_id],
+                        use_container_width=True,
+                    )
+
+    card_end()
+
 def main():
     init_page(title="PPC Surveyor Database", layout="wide")
     sidebar_menu()
@@ -256,4 +497,5 @@ def main():
     admin_panel()
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    with unit_of_work():
+        main()
\ No newline at end of file
@@ -1,12 +1,13 @@
 import streamlit as st
 from ui.theme import init_page, apply_theme, theme_switcher
+from core.schema import FEATURE_BASE, FEATURE_CHANGES
 from ui.layout import navbar, sidebar_menu
 from ui.components import card_start, card_end
 from core.auth import login_box
-from core.db import load_banks, add_bank, set_bank_active
+from core.db import load_banks, add_bank, set_bank_active, unit_of_work
 
 def main():
-    init_page(title="PPC Surveyor Database", layout="wide")
+    init_page(title="PPC Surveyor Database", layout="wide", needs=(FEATURE_BASE, FEATURE_CHANGES))
     sidebar_menu()
     theme = theme_switcher(default="light")
     apply_theme(theme)
@@ -73,4 +74,5 @@ def main():
     card_end()
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    with unit_of_work():
+        main()
\ No newline at end of file
@@ -1,9 +1,10 @@
 import streamlit as st
 from ui.theme import init_page, apply_theme, theme_switcher
+from core.schema import FEATURE_BASE, FEATURE_CHANGES
 from ui.layout import navbar, sidebar_menu
 from ui.components import card_start, card_end
 from core.auth import login_box
-from core.db import search_projects, add_project_auto, update_project, get_project_by_id
+from core.db import search_projects, add_project_auto, update_project, get_project_by_id, unit_of_work
 
 PROJECT_TYPES = ["CBE", "PB", "WASH", "OTHER"]
 STATUSES = ["PLANNED", "ACTIVE", "ON_HOLD", "CLOSED"]
@@ -18,7 +19,7 @@ def _safe_index(options: list[str], value: str, default: str) -> int:
     return options.index(v)
 
 def main():
-    init_page(title="PPC Surveyor Database", layout="wide")
+    init_page(title="PPC Surveyor Database", layout="wide", needs=(FEATURE_BASE, FEATURE_CHANGES))
     sidebar_menu()
     theme = theme_switcher(default="light")
     apply_theme(theme)
@@ -185,4 +186,5 @@ def main():
     card_end()
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    with unit_of_work():
+        main()
\ No newline at end of file
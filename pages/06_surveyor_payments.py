@@ -1,17 +1,24 @@
 import streamlit as st
 from ui.theme import init_page, apply_theme, theme_switcher
+from core.schema import FEATURE_BASE, FEATURE_CHANGES, FEATURE_JOBS
 from ui.layout import navbar, sidebar_menu
-from ui.components import card_start, card_end, field_error
+from ui.components import card_start, card_end, field_error, file_download_button
 from core.auth import login_box
 from core.db import (
     get_connection,
     get_surveyor_by_code,
     load_banks,
+    run_many,
     list_surveyor_accounts,
     add_surveyor_account_tx,
     set_default_account_tx,
+    unit_of_work,
 )
+from core.payments import GROUP_BANK_TRANSFER, GROUP_MOBILE_CREDIT, GROUP_REJECTED
 from core.validators import E164_RE
+from core import jobs
+from core.session_store import labels
+from core.project_index import projects
 
 PAYMENT_TYPES = ["BANK_ACCOUNT", "MOBILE_CREDIT"]
 
@@ -27,8 +34,67 @@ def validate_dynamic(payment_type: str, account_number: str | None, mobile_numbe
             errs["mobile_number"] = "Invalid mobile format. Example: +937XXXXXXXX"
     return errs
 
+def payment_run_card():
+    card_start(
+        "Payment Run",
+        "Export bank-transfer and mobile-credit batch files for all active assignments of a project.",
+    )
+
+    q = st.text_input("Search Project", key="run_project_q", placeholder="Project code, name, or client")
+    hits = projects.search(q)
+    labels.prime("project", dict(hits))
+    options = ["ALL"] + [pid for pid, _ in hits]
+
+    c1, c2 = st.columns([2, 1])
+    with c1:
+        choice = st.selectbox(
+            "Project",
+            options,
+            format_func=lambda k: "All projects" if k == "ALL" else labels.label("project", k),
+            key="run_project",
+        )
+    with c2:
+        amount = st.text_input("Amount per payee (optional)", key="run_amount")
+
+    # the files are written by a background job (core.jobs); a refresh does not stop it
+    if st.button("Generate Payment Files", key="btn_payment_run"):
+        project_id = None if choice == "ALL" else int(choice)
+        try:
+            st.session_state.payment_run_job = jobs.submit(
+                "payment_run",
+                {"project_id": project_id, "amount": amount.strip() or None},
+                submitted_by=st.session_state.get("user_name"),
+            )
+            jobs.ensure_workers()
+        except Exception as ex:
+            st.error(f"Payment run failed: {ex}")
+
+    job_id = st.session_state.get("payment_run_job")
+    job = jobs.get_job(job_id) if job_id else None
+    if job is not None and job["Status"] in (jobs.STATUS_QUEUED, jobs.STATUS_RUNNING):
+        st.progress(float(job["Progress"] or 0), text=job["Message"] or f"Job {job_id}: {job['Status'].lower()}")
+        st.button("Refresh", key="btn_payment_run_refresh")
+    elif job is not None and job["Status"] == jobs.STATUS_DONE:
+        counts = (job["Result"] or {}).get("summary", {})
+        m1, m2, m3 = st.columns(3)
+        m1.metric("Bank transfer", counts.get(GROUP_BANK_TRANSFER, 0))
+        m2.metric("Mobile credit", counts.get(GROUP_MOBILE_CREDIT, 0))
+        m3.metric("Rejected", counts.get(GROUP_REJECTED, 0))
+        run_zip = jobs.result_dir(job_id) / "payment_run.zip"
+        if run_zip.is_file():
+            file_download_button(
+                "Download Payment Files (ZIP)",
+                run_zip,
+                key=f"payment_run_dl_{job_id}",
+                mime="application/zip",
+            )
+    elif job is not None:
+        st.error(f"Payment run failed: {(job['Error'] or job['Status']).splitlines()[0]}")
+
+    card_end()
+
 def main():
-    init_page(title="PPC Surveyor Database", layout="wide")
+    init_page(title="PPC Surveyor Database", layout="wide", needs=(FEATURE_BASE, FEATURE_CHANGES, FEATURE_JOBS))
     sidebar_menu()
     theme = theme_switcher(default="light")
     apply_theme(theme)
@@ -43,6 +109,10 @@ def main():
     st.session_state.setdefault("pay_errors", {})
     st.session_state.setdefault("selected_surveyor_id", None)
 
+    payment_run_card()
+
+    st.divider()
+
     card_start("Find Surveyor", "Enter the Surveyor Code to load accounts.")
 
     code = st.text_input("Surveyor Code", placeholder="Example: PPC-KAB-001", key="pay_surveyor_code")
@@ -62,8 +132,13 @@ def main():
 
     st.divider()
 
+    fetched = run_many({
+        "accounts": lambda: list_surveyor_accounts(sid),
+        "banks": lambda: load_banks(active_only=True),
+    })
+
     st.subheader("Existing Accounts")
-    acc = list_surveyor_accounts(sid)
+    acc = fetched["accounts"]
     if acc.empty:
         st.info("No accounts found for this surveyor.")
     else:
@@ -71,7 +146,7 @@ def main():
 
     st.divider()
 
-    banks = load_banks(active_only=True)
+    banks = fetched["banks"]
     if banks.empty:
         st.error("No active banks found. Add/activate a bank first.")
         card_end()
@@ -82,19 +157,16 @@ def main():
         card_end()
         return
 
-    bank_map = {
-        r.Bank_Name: {"id": int(r.Bank_ID), "method": str(r.Payment_Method)}
-        for r in banks.itertuples()
-    }
+    labels.prime("bank", {int(r.Bank_ID): str(r.Bank_Name) for r in banks.itertuples()})
+    bank_methods = dict(zip(banks["Bank_ID"].astype(int), banks["Payment_Method"].astype(str)))
 
     st.subheader("Add New Account")
     with st.form("add_payment_form", clear_on_submit=False):
         c1, c2 = st.columns(2)
 
         with c1:
-            bank_name = st.selectbox("Bank *", list(bank_map.keys()), key="pay_bank_name")
-            bank_id = bank_map[bank_name]["id"]
-            bank_method = bank_map[bank_name]["method"]
+            bank_id = st.selectbox("Bank *", list(bank_methods.keys()), format_func=labels.formatter("bank"), key="pay_bank_id")
+            bank_method = bank_methods[bank_id]
 
             show_account = bank_method in ("BANK_TRANSFER", "BOTH")
             show_mobile = bank_method in ("MOBILE_WALLET", "BOTH")
@@ -214,4 +286,5 @@ def main():
     card_end()
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    with unit_of_work(snapshot=True):
+        main()
\ No newline at end of file
@@ -1,14 +1,19 @@
 import streamlit as st
+import pandas as pd
 from datetime import date
 from ui.theme import init_page, apply_theme, theme_switcher
+from core.schema import FEATURE_BASE, FEATURE_CHANGES
 from ui.layout import navbar, sidebar_menu
 from ui.components import card_start, card_end
-from core.db import query_df, execute, load_provinces, search_projects
+from core.db import query_df, load_provinces, get_surveyors_by_codes, unit_of_work
+from core.project_index import projects
+from core.session_store import labels
+from core.assignments import assign, busy, free_in_province, week_bounds, check_batch, AssignmentConflict
 
 STATUSES = ["ACTIVE", "INACTIVE"]
 
 def main():
-    init_page(title="PPC Surveyor Database", layout="wide")
+    init_page(title="PPC Surveyor Database", layout="wide", needs=(FEATURE_BASE, FEATURE_CHANGES))
     sidebar_menu()
     theme = theme_switcher(default="light")
     apply_theme(theme)
@@ -19,17 +24,19 @@ def main():
     card_start("Assign Surveyor to Project", "Select a project and a surveyor, then assign one or more work provinces.")
 
     q = st.text_input("Search Project", placeholder="Type project code, name, client, or implementing partner")
-    proj_df = search_projects(q)
+    hits = projects.search(q)
 
-    if proj_df.empty:
+    if not hits:
         st.warning("No projects found.")
         card_end()
         return
 
-    proj = st.selectbox(
+    # فقط شناسه‌ها در گزینه‌های ویجت؛ برچسب‌ها از registry مشترک
+    labels.prime("project", dict(hits))
+    project_id = st.selectbox(
         "Select Project",
-        proj_df.to_dict("records"),
-        format_func=lambda r: f'{r.get("Project_Code","")} - {r.get("Project_Name","")}',
+        [pid for pid, _ in hits],
+        format_func=labels.formatter("project"),
     )
 
     surv_df = query_df(
@@ -40,10 +47,11 @@ def main():
         card_end()
         return
 
-    surv = st.selectbox(
+    labels.prime("surveyor", {int(r.Surveyor_ID): f"{r.Surveyor_Code} - {r.Surveyor_Name}" for r in surv_df.itertuples()})
+    surveyor_id = st.selectbox(
         "Select Surveyor",
-        surv_df.to_dict("records"),
-        format_func=lambda r: f'{r.get("Surveyor_Code","")} - {r.get("Surveyor_Name","")}',
+        surv_df["Surveyor_ID"].astype(int).tolist(),
+        format_func=labels.formatter("surveyor"),
     )
 
     prov_df = load_provinces()
@@ -52,10 +60,11 @@ def main():
         card_end()
         return
 
+    labels.prime("province", {r.Province_Code: f"{r.Province_Name} ({r.Province_Code})" for r in prov_df.itertuples()})
     provs = st.multiselect(
         "Work Provinces *",
-        prov_df.to_dict("records"),
-        format_func=lambda r: f'{r.get("Province_Name","")} ({r.get("Province_Code","")})',
+        prov_df["Province_Code"].tolist(),
+        format_func=labels.formatter("province"),
     )
 
     role = st.text_input("Role *", placeholder="Example: Field Surveyor, TPM Monitor, WASH Engineer")
@@ -63,6 +72,18 @@ def main():
     end_date = st.date_input("End Date", value=None)
     status = st.selectbox("Status", STATUSES, index=0)
 
+    allow_overlap = False
+    if status == "ACTIVE" and start_date is not None and (end_date is None or start_date <= end_date):
+        try:
+            current = busy(surveyor_id, start_date, end_date)
+        except Exception as ex:
+            current = None
+            st.warning(f"Could not check existing assignments: {ex}")
+        if current is not None and not current.empty:
+            st.warning("This surveyor already has active assignments in this period.")
+            st.dataframe(current, use_container_width=True, hide_index=True)
+            allow_overlap = st.checkbox("Assign anyway (allow overlapping assignment)", key="hire_allow_overlap")
+
     c1, c2 = st.columns([1, 3])
     with c1:
         save = st.button("Save Hiring", type="primary")
@@ -84,29 +105,112 @@ def main():
             return
 
         try:
-            for p in provs:
-                execute(
-                    """
-                    INSERT INTO project_surveyors
-                      (Project_ID, Surveyor_ID, Role, Work_Province_Code, Start_Date, End_Date, Status)
-                    VALUES
-                      (%s,%s,%s,%s,%s,%s,%s)
-                    """,
-                    (
-                        int(proj["Project_ID"]),
-                        int(surv["Surveyor_ID"]),
-                        role.strip(),
-                        p["Province_Code"],
-                        start_date,
-                        end_date,
-                        status,
-                    ),
-                )
+            assign(
+                project_id,
+                surveyor_id,
+                role,
+                provs,
+                start_date,
+                end_date,
+                status,
+                allow_overlap=allow_overlap,
+            )
             st.success("Saved successfully.")
+        except AssignmentConflict as ex:
+            st.error(str(ex))
+            st.dataframe(ex.conflicts, use_container_width=True, hide_index=True)
         except Exception as ex:
             st.error(f"Save failed: {ex}")
 
     card_end()
 
+    st.divider()
+    available_card(prov_df)
+
+    st.divider()
+    bulk_check_card()
+
+def available_card(prov_df: pd.DataFrame):
+    card_start("Available Surveyors", "Surveyors living in a province with no active assignment in the selected week.")
+
+    c1, c2 = st.columns(2)
+    with c1:
+        prov = st.selectbox(
+            "Province",
+            prov_df["Province_Code"].tolist(),
+            format_func=labels.formatter("province"),
+            key="free_prov",
+        )
+    with c2:
+        day = st.date_input("Week of", value=date.today(), key="free_week")
+
+    week_start, week_end = week_bounds(day)
+    st.caption(f"{week_start} – {week_end}")
+    if st.button("Find available surveyors", key="btn_free"):
+        try:
+            free = free_in_province(prov, week_start, week_end)
+        except Exception as ex:
+            st.error(f"Search failed: {ex}")
+        else:
+            if free.empty:
+                st.info("Nobody is free in this province for that week.")
+            else:
+                st.dataframe(free, use_container_width=True, hide_index=True)
+
+    card_end()
+
+def bulk_check_card():
+    card_start(
+        "Bulk Staffing Check",
+        "Upload a CSV with Surveyor_Code, Start_Date, End_Date (one row per hire) to find overlaps before importing.",
+    )
+
+    up = st.file_uploader("Staffing plan (CSV)", type=["csv"], key="bulk_plan")
+    if up is not None and st.button("Check conflicts", key="btn_bulk_check"):
+        try:
+            plan = pd.read_csv(up, dtype={"Surveyor_Code": str})
+            plan["Start_Date"] = pd.to_datetime(plan["Start_Date"]).dt.date
+            plan["End_Date"] = pd.to_datetime(plan["End_Date"], errors="coerce").dt.date
+            found = get_surveyors_by_codes(plan["Surveyor_Code"].dropna())
+        except Exception as ex:
+            st.error(f"Could not read the plan: {ex}")
+            card_end()
+            return
+
+        id_by_code = {code: row["Surveyor_ID"] for code, row in found.items() if row is not None}
+        plan["Surveyor_ID"] = plan["Surveyor_Code"].str.strip().map(id_by_code)
+        unknown = plan[plan["Surveyor_ID"].isna()]
+        if not unknown.empty:
+            st.warning(f"Unknown surveyor codes: {', '.join(unknown['Surveyor_Code'].astype(str))}")
+        known = plan[plan["Surveyor_ID"].notna()].reset_index(drop=True)
+
+        try:
+            pairs = check_batch(known.to_dict("records"))
+        except Exception as ex:
+            st.error(f"Check failed: {ex}")
+            card_end()
+            return
+
+        if not pairs:
+            st.success(f"No conflicts in {len(known)} row(s).")
+        else:
+            def describe(ref):
+                kind, key = ref
+                if kind == "new":
+                    r = known.iloc[key]
+                    end = "open" if pd.isna(r["End_Date"]) else r["End_Date"]
+                    return f"plan row {key + 1} ({r['Surveyor_Code']} {r['Start_Date']}–{end})"
+                return f"existing assignment #{key}"
+
+            st.error(f"{len(pairs)} conflict(s) found.")
+            st.dataframe(
+                pd.DataFrame([(describe(a), describe(b)) for a, b in pairs], columns=["Assignment", "Overlaps with"]),
+                use_container_width=True,
+                hide_index=True,
+            )
+
+    card_end()
+
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    with unit_of_work():
+        main()
\ No newline at end of file
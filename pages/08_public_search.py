@@ -1,36 +1,24 @@
+import re
+import time
 import streamlit as st
 import pandas as pd
-from core.db import query_df
+from core.db import query_df, run_many, unit_of_work
+from core.resilience import DatabaseUnavailable, TIMEOUT_ERRNOS, errno_of
+from core.admission import Overloaded, take_token
+from core.settings import PUBLIC_RATE_PER_MIN, PUBLIC_RATE_BURST
+from core import session_store
+from core.normalize import name_search_terms, mask_phone, mask_tazkira
 from ui.theme import init_page, apply_theme, theme_switcher
+from core.schema import FEATURE_BASE, FEATURE_NAME_SEARCH
 from ui.layout import navbar, sidebar_menu
 from ui.components import card_start, card_end
 
+_LAST_RESULT_TTL_S = 60
+
 # -----------------------------
 # Helpers (UI + Public Safety)
 # -----------------------------
 
-def _mask_phone(v: str) -> str:
-    if v is None:
-        return ""
-    s = str(v).strip()
-    if not s:
-        return ""
-    digits = re.sub(r"\D+", "", s)
-    if len(digits) <= 4:
-        return "*" * len(digits)
-    keep = 4 if len(digits) >= 8 else 3
-    return ("*" * (len(digits) - keep)) + digits[-keep:]
-
-def _mask_tazkira(v: str) -> str:
-    if v is None:
-        return ""
-    s = str(v).strip()
-    if not s:
-        return ""
-    if len(s) <= 3:
-        return "*" * len(s)
-    return ("*" * (len(s) - 3)) + s[-3:]
-
 def _safe_str(x):
     return "" if x is None else str(x)
 
@@ -54,7 +42,8 @@ def _get_province_options():
             SELECT province_code, province_name
             FROM provinces
             ORDER BY province_name
-            """
+            """,
+            site="public_search",
         )
         if p.empty:
             return []
@@ -69,7 +58,8 @@ def _get_project_options():
             SELECT project_id, project_name
             FROM projects
             ORDER BY project_name
-            """
+            """,
+            site="public_search",
         )
         if p.empty:
             return []
@@ -77,11 +67,39 @@ def _get_project_options():
     except Exception:
         return []
 
+def _search(where_sql: str, params: dict, page_size: int, offset: int) -> pd.DataFrame:
+    return query_df(
+        f"""
+        SELECT
+          s.surveyor_code,
+          s.surveyor_name,
+          s.gender,
+          s.father_name,
+          s.tazkira_no,
+          s.whatsapp_number,
+          s.phone_number,
+          pp.province_name AS permanent_province,
+          cp.province_name AS current_province,
+          p.project_name AS project_name,
+          DATE(s.created_at) AS created_date
+        FROM surveyors s
+        LEFT JOIN provinces pp ON pp.province_code = s.permanent_province_code
+        LEFT JOIN provinces cp ON cp.province_code = s.current_province_code
+        LEFT JOIN projects p ON p.project_id = s.project_id
+        WHERE {where_sql}
+        ORDER BY s.surveyor_id DESC
+        LIMIT {page_size} OFFSET {offset}
+        """,
+        params,
+        site="public_search",
+    )
+
+
 # -----------------------------
 # Main Page
 # -----------------------------
 def main():
-    init_page(title="PPC Surveyor Database", layout="wide")
+    init_page(title="PPC Surveyor Database", layout="wide", needs=(FEATURE_BASE, FEATURE_NAME_SEARCH))
     sidebar_menu()
     theme = theme_switcher(default="light")
     apply_theme(theme)
@@ -120,7 +138,9 @@ def main():
             help="Auto search runs when you type. Use filters for better results."
         )
 
-    province_options = _get_province_options()
+    # both option lists are independent of each other and of the widgets
+    options = run_many({"provinces": _get_province_options, "projects": _get_project_options})
+    province_options = options["provinces"]
     prov_map = {"ALL": "All Provinces"}
     for code, name in province_options:
         prov_map[str(code)] = name
@@ -133,7 +153,7 @@ def main():
             key="ps_prov"
         )
 
-    project_options = _get_project_options()
+    project_options = options["projects"]
     proj_map = {"ALL": "All Projects"}
     for code, name in project_options:
         proj_map[str(code)] = name
@@ -176,11 +196,22 @@ def main():
 
     if q_clean:
         params["like"] = f"%{q_clean}%"
-        where_parts.append(
+        # نام: پیشوند توکن روی surveyor_name_tokens؛ اگر کلید نام خالی است ("." یا "-") شرط نام حذف می‌شود
+        name_sql = ""
+        terms = name_search_terms(q_clean)
+        if terms:
+            params["name_token"], params["name_like"] = terms
+            name_sql = """
+                OR (s.surveyor_name_key LIKE %(name_like)s
+                    AND s.surveyor_id IN (SELECT t.surveyor_id FROM surveyor_name_tokens t
+                                          WHERE t.token LIKE %(name_token)s))
+                OR (s.surveyor_name_key IS NULL AND s.surveyor_name LIKE %(like)s)
             """
+        where_parts.append(
+            f"""
             (
                 s.surveyor_code LIKE %(like)s
-                OR s.surveyor_name LIKE %(like)s
+                {name_sql}
                 OR s.tazkira_no LIKE %(like)s
                 OR s.phone_number LIKE %(like)s
                 OR s.whatsapp_number LIKE %(like)s
@@ -217,30 +248,40 @@ def main():
     offset = page * page_size
 
     # Query data (Public-safe columns)
-    df = query_df(
-        f"""
-        SELECT
-          s.surveyor_code,
-          s.surveyor_name,
-          s.gender,
-          s.father_name,
-          s.tazkira_no,
-          s.whatsapp_number,
-          s.phone_number,
-          pp.province_name AS permanent_province,
-          cp.province_name AS current_province,
-          p.project_name AS project_name,
-          DATE(s.created_at) AS created_date
-        FROM surveyors s
-        LEFT JOIN provinces pp ON pp.province_code = s.permanent_province_code
-        LEFT JOIN provinces cp ON cp.province_code = s.current_province_code
-        LEFT JOIN projects p ON p.project_id = s.project_id
-        WHERE {where_sql}
-        ORDER BY s.surveyor_id DESC
-        LIMIT {page_size} OFFSET {offset}
-        """,
-        params
-    )
+    # نتیجه‌ی آخر همین جستجو برای وقتی که سهمیه تمام شده یا سرور شلوغ است
+    search_key = (where_sql, repr(sorted(params.items())), page_size, offset)
+    last = session_store.get("ps_last")
+    if last is not None and last[0] == search_key and time.monotonic() - last[2] < _LAST_RESULT_TTL_S:
+        df = last[1].copy()
+    else:
+        allowed, wait_s = take_token(st.session_state, "_ps_rate", PUBLIC_RATE_PER_MIN, PUBLIC_RATE_BURST)
+        if not allowed:
+            st.warning(f"Too many searches. Please try again in {int(wait_s) + 1} seconds.")
+            card_end()
+            return
+        df = None
+
+    try:
+        if df is None:
+            df = _search(where_sql, params, page_size, offset)
+            session_store.put("ps_last", (search_key, session_store.compact_frame(df), time.monotonic()))
+    except Overloaded as ex:
+        st.warning(f"{ex} (about {int(ex.retry_after) + 1}s)")
+        card_end()
+        return
+    except DatabaseUnavailable as ex:
+        st.warning(str(ex))
+        card_end()
+        return
+    except Exception as ex:
+        if errno_of(ex) in TIMEOUT_ERRNOS:
+            st.warning("The search took too long. Please use a more specific search or a filter.")
+            card_end()
+            return
+        raise
+
+    if df.attrs.get("stale"):
+        st.info("The database is busy; showing the last known results.")
 
     st.divider()
 
@@ -280,9 +321,9 @@ def main():
         return
 
     # Masking
-    df["phone_number"] = df["phone_number"].apply(_mask_phone)
-    df["whatsapp_number"] = df["whatsapp_number"].apply(_mask_phone)
-    df["tazkira_no"] = df["tazkira_no"].apply(_mask_tazkira)
+    df["phone_number"] = df["phone_number"].apply(mask_phone)
+    df["whatsapp_number"] = df["whatsapp_number"].apply(mask_phone)
+    df["tazkira_no"] = df["tazkira_no"].apply(mask_tazkira)
 
     # Styling and final rendering
     styled = _highlight_matches(df, q_clean)
@@ -305,4 +346,5 @@ def _render_header_stats(total_found: int, page: int, page_size: int):
     right.metric("Page size", page_size)
 
 if __name__ == "__main__":
-    main()
+    with unit_of_work(snapshot=True):
+        main()
@@ -0,0 +1,175 @@
+import streamlit as st
+import pandas as pd
+
+from ui.theme import init_page, apply_theme, theme_switcher, require_schema
+from ui.layout import navbar, sidebar_menu
+from ui.components import card_start, card_end
+from core import resilience
+from core.admission import gate_stats
+from core.db import query_df, unit_of_work
+from core import session_store
+from core.settings import SESSION_MEMORY_BUDGET_MB
+from core.startup import startup_timings, warm_up_error
+from core.charts import cache_info
+from core.cache import cache
+from core.project_index import projects
+from core.schema import startup_report, FEATURE_CHANGES
+
+
+def database_health():
+    card_start("Database Health", "Circuit breaker state, retries, timeouts and stale results served.")
+
+    stats = resilience.stats()
+    state = stats.pop("breaker_state")
+    if state == "closed":
+        st.success("Circuit breaker: closed (database healthy)")
+    elif state == "half_open":
+        st.warning("Circuit breaker: half-open (probing the database)")
+    else:
+        st.error("Circuit breaker: open (reads are served from the last known results)")
+
+    if stats:
+        st.dataframe(
+            pd.DataFrame(sorted(stats.items()), columns=["Counter", "Value"]),
+            use_container_width=True,
+            hide_index=True,
+        )
+    else:
+        st.caption("No retries, timeouts or failures since the server started.")
+
+    card_end()
+
+
+def admission_report():
+    card_start("Admission Control", "DB slots per class; rejected requests show up as shed_* counters above.")
+    st.dataframe(pd.DataFrame(gate_stats()), use_container_width=True, hide_index=True)
+    card_end()
+
+
+def session_memory():
+    card_start("Session Memory", "Results kept in session state, accounted against the per-session budget.")
+
+    usage = session_store.process_usage()
+    m1, m2, m3 = st.columns(3)
+    m1.metric("Active sessions", usage["sessions"])
+    m2.metric("All sessions (MB)", round(usage["bytes"] / 1024 / 1024, 2))
+    m3.metric("Largest session (MB)", round(usage["largest_session_bytes"] / 1024 / 1024, 2))
+    st.caption(f"Budget per session: {SESSION_MEMORY_BUDGET_MB:g} MB")
+
+    mine = session_store.session_usage()
+    if mine:
+        st.markdown("**This session**")
+        st.dataframe(
+            pd.DataFrame(sorted(mine.items()), columns=["Key", "Bytes"]),
+            use_container_width=True,
+            hide_index=True,
+        )
+
+    shared = cache.stats()
+    st.caption(
+        f"Shared cache ({shared['backend']}): {shared.get('memory_hits', 0)} memory hits, "
+        f"{shared.get('shared_hits', 0)} shared hits, {shared.get('misses', 0)} misses, "
+        f"{shared.get('invalidations_sent', 0)}/{shared.get('invalidations_received', 0)} invalidations sent/received, "
+        f"{shared['memory_entries']} entries in this process"
+    )
+    if shared.get("backend_error"):
+        st.warning(f"Shared cache tier unavailable, memory only: {shared['backend_error']}")
+
+    charts = cache_info()
+    if charts:
+        st.markdown("**Charts served by this process**")
+        st.dataframe(
+            pd.DataFrame([{"Chart": k, **v} for k, v in sorted(charts.items())]),
+            use_container_width=True,
+            hide_index=True,
+        )
+
+    registry = session_store.labels.stats()
+    if registry:
+        st.markdown("**Shared label registry**")
+        st.dataframe(
+            pd.DataFrame(sorted(registry.items()), columns=["Namespace", "Labels"]),
+            use_container_width=True,
+            hide_index=True,
+        )
+
+    index = projects.stats()
+    st.caption(
+        f"Project search index: {index['projects']} projects, {index['tokens']} words, "
+        f"last checked {index['checked_s_ago'] if index['checked_s_ago'] is not None else '-'} s ago"
+    )
+    card_end()
+
+
+def change_feed():
+    card_start("Change Feed", "Latest rows in change_log (written by core.db writers).")
+    if not require_schema(FEATURE_CHANGES, stop=False):
+        card_end()
+        return
+    try:
+        df = query_df(
+            """
+            SELECT Change_ID, Entity, Entity_ID, Op, Changed_At
+            FROM change_log
+            ORDER BY Change_ID DESC
+            LIMIT 50
+            """
+        )
+    except Exception as ex:
+        st.error(f"Change feed is not available: {ex}")
+        card_end()
+        return
+    if df.empty:
+        st.info("No changes recorded yet.")
+    else:
+        st.metric("Watermark", int(df["Change_ID"].iloc[0]))
+        st.dataframe(df, use_container_width=True, hide_index=True)
+    card_end()
+
+
+def schema_report():
+    card_start("Startup", "Schema check and warm-up run on the first page load of this server process.")
+    report = startup_report()
+    if report is None:
+        st.info("The startup check has not run yet.")
+    else:
+        st.json(report)
+
+    timings = startup_timings()
+    if timings:
+        st.markdown("**Warm-up and lazy imports**")
+        st.dataframe(
+            pd.DataFrame(
+                [(k, round(v * 1000, 1)) for k, v in sorted(timings.items())],
+                columns=["Step", "ms"],
+            ),
+            use_container_width=True,
+            hide_index=True,
+        )
+    if warm_up_error():
+        st.warning(f"Warm-up failed: {warm_up_error()}")
+    card_end()
+
+
+def main():
+    init_page(title="PPC Surveyor Database", layout="wide")
+    sidebar_menu()
+    theme = theme_switcher(default="light")
+    apply_theme(theme)
+    navbar("PPC Surveyor Database", right_text="Diagnostics")
+
+    st.title("Diagnostics")
+
+    from core.auth import require_login, require_role
+
+    require_login()
+    require_role("admin")
+    database_health()
+    admission_report()
+    session_memory()
+    change_feed()
+    schema_report()
+
+if __name__ == "__main__":
+    with unit_of_work():
+        main()
@@ -0,0 +1,113 @@
+import streamlit as st
+import pandas as pd
+from datetime import date
+from ui.theme import init_page, apply_theme, theme_switcher
+from core.schema import FEATURE_BASE, FEATURE_FILES
+from ui.layout import navbar, sidebar_menu
+from ui.components import card_start, card_end
+from core.db import get_surveyor_profile, unit_of_work
+
+
+def _is_current(r) -> bool:
+    today = date.today()
+    if r["Status"] != "ACTIVE":
+        return False
+    if pd.notna(r["Start_Date"]) and pd.Timestamp(r["Start_Date"]).date() > today:
+        return False
+    return pd.isna(r["End_Date"]) or pd.Timestamp(r["End_Date"]).date() >= today
+
+
+def _province(code, name) -> str:
+    if not code:
+        return "-"
+    return f"{name} ({code})" if name else str(code)
+
+
+def identity_card(s: dict, assignments: pd.DataFrame):
+    card_start(f"{s['Surveyor_Name']} ({s['Surveyor_Code']})", f"Father: {s['Father_Name']} | Gender: {s['Gender']}")
+
+    current = int(assignments.apply(_is_current, axis=1).sum()) if not assignments.empty else 0
+    c1, c2, c3 = st.columns(3)
+    c1.metric("Current Assignments", current)
+    c2.metric("All Assignments", len(assignments))
+    c3.metric("Registered", str(pd.Timestamp(s["Created_At"]).date()) if pd.notna(s["Created_At"]) else "-")
+
+    left, right = st.columns(2)
+    with left:
+        st.write(f"**Tazkira No:** {s['Tazkira_No']}")
+        st.write(f"**Phone:** {s['Phone_Number'] or '-'}")
+        st.write(f"**WhatsApp:** {s['Whatsapp_Number'] or '-'}")
+        st.write(f"**Email:** {s['Email_Address'] or '-'}")
+    with right:
+        st.write(f"**Permanent Province:** {_province(s['Permanent_Province_Code'], s['Permanent_Province_Name'])}")
+        st.write(f"**Current Province:** {_province(s['Current_Province_Code'], s['Current_Province_Name'])}")
+        st.write(f"**CV Link:** {s['CV_Link'] or '-'}")
+        st.caption(f"Last updated: {s['Updated_At']}")
+
+    card_end()
+
+
+def table_card(title: str, subtitle: str, df: pd.DataFrame, empty_text: str):
+    card_start(title, subtitle)
+    if df.empty:
+        st.info(empty_text)
+    else:
+        st.dataframe(df, use_container_width=True, hide_index=True)
+    card_end()
+
+
+def main():
+    init_page(title="PPC Surveyor Database", layout="wide", needs=(FEATURE_BASE, FEATURE_FILES))
+    sidebar_menu()
+    theme = theme_switcher(default="light")
+    apply_theme(theme)
+    navbar("PPC Surveyor Database", right_text="Profile")
+
+    st.title("Surveyor Profile")
+
+    from core.auth import require_login, require_role
+
+    require_login()
+    require_role("manager", "admin", "super_admin")
+
+    code = st.text_input(
+        "Surveyor Code",
+        value=st.query_params.get("code", ""),
+        placeholder="Example: PPC-KAB-001",
+        key="prof_code",
+    ).strip()
+    if not code:
+        st.info("Enter a surveyor code to see their profile.")
+        return
+
+    profile = get_surveyor_profile(code)
+    if profile is None:
+        st.warning("Surveyor not found.")
+        return
+    if profile["stale"]:
+        st.warning("The database is unavailable; showing the last loaded profile.")
+
+    identity_card(profile["surveyor"], profile["assignments"])
+
+    table_card(
+        "Assignments",
+        "All project assignments, newest first.",
+        profile["assignments"].drop(columns=["Project_Surveyor_ID", "Project_ID"], errors="ignore"),
+        "No assignments.",
+    )
+    table_card(
+        "Payment Accounts",
+        "Manage accounts on the Payments page.",
+        profile["accounts"],
+        "No accounts.",
+    )
+    table_card(
+        "Documents",
+        "Stored files (metadata only). Files are downloaded from the Admin page.",
+        profile["files"].drop(columns=["File_ID"], errors="ignore"),
+        "No documents.",
+    )
+
+if __name__ == "__main__":
+    with unit_of_work():
+        main()
@@ -0,0 +1,202 @@
+import streamlit as st
+from datetime import date, timedelta
+from ui.theme import init_page, apply_theme, theme_switcher
+from core.schema import FEATURE_JOBS
+from ui.layout import navbar, sidebar_menu
+from ui.components import card_start, card_end, file_download_button
+from core import jobs
+from core.db import get_projects_by_codes, unit_of_work
+from core.services import EXPORTS, FORMATS, REINDEX_TARGETS
+
+
+def workers_card():
+    card_start("Workers", "Jobs run in worker threads of this server (or of `python tools/ppc.py worker`).")
+
+    pool = jobs.ensure_workers()
+    counts = jobs.status_counts()
+    c1, c2, c3, c4 = st.columns(4)
+    c1.metric("Queued", counts.get(jobs.STATUS_QUEUED, 0))
+    c2.metric("Running", counts.get(jobs.STATUS_RUNNING, 0))
+    c3.metric("Done", counts.get(jobs.STATUS_DONE, 0))
+    c4.metric("Failed", counts.get(jobs.STATUS_FAILED, 0))
+
+    if pool is None:
+        st.caption("Embedded workers are off (JOBS_EMBEDDED=0); a separate worker process must be running.")
+    else:
+        running = pool.running()
+        st.caption(
+            f"Embedded pool {pool.name}: {len(running)}/{pool.workers} busy"
+            + (f" (jobs {', '.join(str(j) for j in running)})" if running else "")
+        )
+        if pool.last_error:
+            st.warning(f"Last worker error: {pool.last_error}")
+
+    limits = ", ".join(f"{jt.label}: {jt.limit}" for jt in jobs.job_types().values())
+    st.caption(f"Concurrent jobs per type: {limits}")
+    card_end()
+
+
+def _params_form(kind: str):
+    """Inputs for one job type; returns params or None when something is missing."""
+    if kind == "export":
+        c1, c2 = st.columns(2)
+        table = c1.selectbox("Table", sorted(EXPORTS), key="job_export_kind")
+        fmt = c2.selectbox("Format", FORMATS, key="job_export_format")
+        return {"kind": table, "format": fmt}
+
+    if kind in ("import_surveyors", "import_assignments"):
+        upload = st.file_uploader("Input file (CSV with a header row, or JSONL)", type=["csv", "jsonl"], key=f"job_{kind}_file")
+        flag = "allow_duplicates" if kind == "import_surveyors" else "allow_overlap"
+        allow = st.checkbox(
+            "Save possible duplicates" if kind == "import_surveyors" else "Skip the overlap check",
+            key=f"job_{kind}_{flag}",
+        )
+        dry_run = st.checkbox("Validate only (dry run)", key=f"job_{kind}_dry")
+        if upload is None:
+            return None
+        fmt = "jsonl" if upload.name.lower().endswith(".jsonl") else "csv"
+        return {"upload": upload, "format": fmt, flag: allow, "dry_run": dry_run}
+
+    if kind == "payment_run":
+        c1, c2 = st.columns(2)
+        code = c1.text_input("Project code (empty = all projects)", key="job_pay_project").strip()
+        amount = c2.text_input("Amount per payee (optional)", key="job_pay_amount").strip()
+        project_id = None
+        if code:
+            project = get_projects_by_codes([code]).get(code)
+            if project is None:
+                st.warning("Unknown project code.")
+                return None
+            project_id = int(project["Project_ID"])
+        return {"project_id": project_id, "amount": amount or None}
+
+    if kind == "backfill_analytics":
+        resume = st.checkbox("Continue from the last rolled-up day", value=True, key="job_bf_resume")
+        if resume:
+            return {}
+        c1, c2 = st.columns(2)
+        start = c1.date_input("Start", value=date.today() - timedelta(days=365), key="job_bf_start")
+        end = c2.date_input("End", value=date.today(), key="job_bf_end")
+        return {"start": start.isoformat(), "end": end.isoformat()}
+
+    if kind == "reindex":
+        return {"target": st.selectbox("Target", REINDEX_TARGETS, key="job_reindex_target")}
+
+    return {}
+
+
+def submit_card():
+    card_start("Submit Job", "The job is queued and runs in the background; follow it below.")
+
+    types = jobs.job_types()
+    kind = st.selectbox("Job", list(types), format_func=lambda k: types[k].label, key="job_kind")
+    params = _params_form(kind)
+
+    if st.button("Submit", type="primary", key="btn_job_submit", disabled=params is None):
+        try:
+            upload = params.pop("upload", None)
+            if upload is not None:
+                params["input_path"] = jobs.stage_input(upload.getvalue(), f".{params['format']}")
+            job_id = jobs.submit(kind, params, submitted_by=st.session_state.get("user_name"))
+            jobs.ensure_workers()
+            st.session_state.job_selected = job_id
+            st.success(f"Job {job_id} queued.")
+        except Exception as ex:
+            st.error(f"Submit failed: {ex}")
+    card_end()
+
+
+def jobs_card():
+    card_start("Jobs", "Latest 50 jobs. Press Refresh to update progress.")
+
+    c1, c2 = st.columns([3, 1])
+    status = c1.selectbox(
+        "Status",
+        ["ALL", jobs.STATUS_QUEUED, jobs.STATUS_RUNNING, jobs.STATUS_DONE, jobs.STATUS_FAILED, jobs.STATUS_CANCELLED],
+        key="job_filter",
+    )
+    c2.button("Refresh", key="btn_jobs_refresh", use_container_width=True)
+
+    df = jobs.list_jobs(50, None if status == "ALL" else status)
+    if df.empty:
+        st.info("No jobs.")
+        card_end()
+        return
+    shown = df.copy()
+    shown["Progress"] = (shown["Progress"].astype(float) * 100).round(0).astype(int).astype(str) + "%"
+    st.dataframe(shown, use_container_width=True, hide_index=True)
+
+    ids = df["Job_ID"].astype(int).tolist()
+    selected = st.session_state.get("job_selected")
+    job_id = st.selectbox(
+        "Job details",
+        ids,
+        index=ids.index(selected) if selected in ids else 0,
+        key="job_details_id",
+    )
+    card_end()
+    job_details(int(job_id))
+
+
+def job_details(job_id: int):
+    job = jobs.get_job(job_id)
+    if job is None:
+        return
+    types = jobs.job_types()
+    label = types[job["Job_Type"]].label if job["Job_Type"] in types else job["Job_Type"]
+    card_start(f"Job {job_id}: {label}", f"{job['Status']} | attempt {job['Attempts']}/{job['Max_Attempts']}")
+
+    if job["Status"] in (jobs.STATUS_QUEUED, jobs.STATUS_RUNNING):
+        st.progress(float(job["Progress"] or 0), text=job["Message"] or job["Status"].title())
+    params = {k: v for k, v in (job["Params"] or {}).items() if k != "input_path"}
+    if params:
+        st.write("**Parameters:**", params)
+    if job["Result"]:
+        st.write("**Summary:**", job["Result"].get("summary", {}))
+    if job["Error"]:
+        with st.expander("Error", expanded=job["Status"] == jobs.STATUS_FAILED):
+            st.code(job["Error"])
+
+    for path in jobs.result_files(job_id):
+        file_download_button(
+            f"Download {path.name} ({path.stat().st_size / 1024:.0f} KB)",
+            path,
+            key=f"job_dl_{job_id}_{path.name}",
+        )
+
+    b1, b2 = st.columns(2)
+    if job["Status"] in (jobs.STATUS_QUEUED, jobs.STATUS_RUNNING):
+        if b1.button("Cancel", key=f"btn_job_cancel_{job_id}"):
+            jobs.cancel(job_id)
+            st.rerun()
+    # types with max_attempts=1 (imports) must not be replayed by hand either
+    replayable = job["Job_Type"] in types and types[job["Job_Type"]].max_attempts > 1
+    if replayable and job["Status"] in (jobs.STATUS_FAILED, jobs.STATUS_CANCELLED):
+        if b2.button("Retry", key=f"btn_job_retry_{job_id}"):
+            jobs.retry(job_id)
+            jobs.ensure_workers()
+            st.rerun()
+    card_end()
+
+
+def main():
+    init_page(title="PPC Surveyor Database", layout="wide", needs=(FEATURE_JOBS,))
+    sidebar_menu()
+    theme = theme_switcher(default="light")
+    apply_theme(theme)
+    navbar("PPC Surveyor Database", right_text="Jobs")
+
+    st.title("Background Jobs")
+
+    from core.auth import require_login, require_role
+
+    require_login()
+    require_role("admin", "super_admin")
+
+    workers_card()
+    submit_card()
+    jobs_card()
+
+if __name__ == "__main__":
+    with unit_of_work():
+        main()
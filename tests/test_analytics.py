@@ -0,0 +1,83 @@
+from __future__ import annotations
+
+import os
+from datetime import date, timedelta
+
+import pytest
+
+os.environ.setdefault("PPC_HEADLESS", "1")
+pd = pytest.importorskip("pandas")
+
+from core import analytics  # noqa: E402
+
+# (Start_Date, End_Date, Work_Province_Code)
+ASSIGNMENTS = [
+    (date(2024, 1, 1), None, "KAB"),
+    (date(2024, 1, 3), date(2024, 1, 5), "KAB"),
+    (date(2024, 1, 5), date(2024, 1, 5), "HRT"),
+    (date(2023, 12, 20), date(2024, 1, 2), "HRT"),
+    (date(2024, 1, 9), date(2024, 1, 20), None),
+]
+
+
+def _fake_query_df(sql, params=None, site=None):
+    """The three aggregate reads of _assignment_rows, over ASSIGNMENTS."""
+    counts = {}
+    if "Start_Date < %s" in sql:
+        before, still_on = params
+        for s, e, p in ASSIGNMENTS:
+            if s < before and (e is None or e >= still_on):
+                counts[p or ""] = counts.get(p or "", 0) + 1
+        return pd.DataFrame([(p, n) for p, n in counts.items()], columns=["Province_Code", "n"])
+    column = 0 if "Start_Date BETWEEN" in sql else 1
+    lo, hi = params
+    for a in ASSIGNMENTS:
+        d = a[column]
+        if d is not None and lo <= d <= hi:
+            counts[(d, a[2] or "")] = counts.get((d, a[2] or ""), 0) + 1
+    return pd.DataFrame([(d, p, n) for (d, p), n in counts.items()], columns=["Day", "Province_Code", "n"])
+
+
+def _expected(start, end):
+    rows = []
+    d = start
+    while d <= end:
+        for p in ("KAB", "HRT", ""):
+            mine = [a for a in ASSIGNMENTS if (a[2] or "") == p]
+            active = sum(1 for s, e, _ in mine if s <= d and (e is None or e >= d))
+            started = sum(1 for s, _, _ in mine if s == d)
+            ended = sum(1 for _, e, _ in mine if e == d)
+            if active or started or ended:
+                rows.append((d, p, started, ended, active))
+        d += timedelta(days=1)
+    return sorted(rows)
+
+
+@pytest.mark.parametrize("start, end", [
+    (date(2024, 1, 1), date(2024, 1, 31)),
+    (date(2024, 1, 4), date(2024, 1, 10)),
+    (date(2024, 1, 6), date(2024, 1, 6)),
+])
+def test_assignment_rows_match_a_day_by_day_count(monkeypatch, start, end):
+    monkeypatch.setattr(analytics, "query_df", _fake_query_df)
+    assert sorted(analytics._assignment_rows(start, end)) == _expected(start, end)
+
+
+def test_weekly_average_counts_days_without_rows_as_zero(monkeypatch):
+    # Mon 2024-01-01 .. Sun 2024-01-07: 4 on two days, nothing stored for the other five
+    stored = pd.DataFrame({"Period": ["2024-01-01"], "Value": [8]})
+    monkeypatch.setattr(analytics, "query_df", lambda *args, **kwargs: stored.copy())
+
+    df = analytics.series(analytics.METRIC_ACTIVE_ASSIGNMENTS, date(2024, 1, 1), date(2024, 1, 7), "week")
+
+    assert df["Value"].tolist() == [round(8 / 7, 1)]
+
+
+def test_average_only_counts_days_inside_the_range(monkeypatch):
+    stored = pd.DataFrame({"Period": ["2024-02-01"], "Value": [30]})
+    monkeypatch.setattr(analytics, "query_df", lambda *args, **kwargs: stored.copy())
+
+    df = analytics.series(analytics.METRIC_ACTIVE_ASSIGNMENTS, date(2024, 2, 20), date(2024, 3, 31), "month")
+
+    # 20..29 February (leap year)
+    assert df["Value"].tolist() == [3.0]
@@ -0,0 +1,76 @@
+from __future__ import annotations
+
+import os
+from datetime import date
+
+import pytest
+
+os.environ.setdefault("PPC_HEADLESS", "1")
+pd = pytest.importorskip("pandas")
+
+from core import assignments  # noqa: E402
+from core.assignments import OPEN_END, check_batch, sweep_conflicts  # noqa: E402
+
+
+def _pairs(found):
+    return {frozenset(p) for p in found}
+
+
+def test_sweep_reports_overlaps_per_group_only():
+    found = sweep_conflicts([
+        ("a", 1, date(2024, 1, 1), date(2024, 1, 10)),
+        ("b", 1, date(2024, 1, 10), date(2024, 1, 20)),  # shares the 10th with a
+        ("c", 1, date(2024, 1, 21), OPEN_END),
+        ("d", 2, date(2024, 1, 1), date(2024, 1, 31)),  # same dates, other surveyor
+    ])
+    assert _pairs(found) == {frozenset({"a", "b"})}
+
+
+def test_sweep_reports_every_pair_of_a_stack():
+    found = sweep_conflicts([
+        ("long", 1, date(2024, 1, 1), OPEN_END),
+        ("x", 1, date(2024, 2, 1), date(2024, 2, 5)),
+        ("y", 1, date(2024, 2, 3), date(2024, 2, 4)),
+        ("z", 1, date(2024, 3, 1), date(2024, 3, 1)),
+    ])
+    assert _pairs(found) == {
+        frozenset({"long", "x"}),
+        frozenset({"long", "y"}),
+        frozenset({"x", "y"}),
+        frozenset({"long", "z"}),
+    }
+
+
+def test_check_batch_reads_existing_once_and_ignores_existing_pairs(monkeypatch):
+    calls = []
+
+    def existing_for(surveyor_ids, start, end):
+        calls.append((surveyor_ids, start, end))
+        return pd.DataFrame(
+            [
+                (10, 1, date(2024, 1, 1), None),
+                (11, 1, date(2023, 6, 1), date(2024, 6, 1)),  # overlaps 10: already accepted
+                (12, 2, date(2023, 1, 1), date(2023, 12, 31)),
+            ],
+            columns=["Project_Surveyor_ID", "Surveyor_ID", "Start_Date", "End_Date"],
+        )
+
+    monkeypatch.setattr(assignments, "_existing_for", existing_for)
+
+    found = check_batch([
+        {"Surveyor_ID": 1, "Start_Date": date(2024, 3, 1), "End_Date": date(2024, 3, 31)},
+        {"Surveyor_ID": 2, "Start_Date": date(2024, 1, 1), "End_Date": None},
+        {"Surveyor_ID": 2, "Start_Date": date(2024, 5, 1), "End_Date": date(2024, 5, 2)},
+    ])
+
+    assert calls == [([1, 2], date(2024, 1, 1), OPEN_END)]
+    assert _pairs(found) == {
+        frozenset({("existing", 10), ("new", 0)}),
+        frozenset({("existing", 11), ("new", 0)}),
+        frozenset({("new", 1), ("new", 2)}),
+    }
+
+
+def test_check_batch_without_hires_reads_nothing(monkeypatch):
+    monkeypatch.setattr(assignments, "_existing_for", lambda *args: pytest.fail("no query expected"))
+    assert check_batch([]) == []
@@ -0,0 +1,60 @@
+from __future__ import annotations
+
+import os
+
+import pytest
+
+os.environ.setdefault("PPC_HEADLESS", "1")
+
+from core.backup import _decode, _encode  # noqa: E402
+
+
+def _line(row):
+    return b"\t".join(_encode(v) for v in row) + b"\n"
+
+
+def _row(line):
+    return tuple(_decode(f) for f in line.rstrip(b"\n").split(b"\t"))
+
+
+def test_null_and_empty_are_distinct():
+    assert _encode(None) == b"\\N"
+    assert _encode(b"") == b""
+    assert _decode(b"\\N") is None
+    assert _decode(b"") == b""
+
+
+def test_separators_are_escaped():
+    assert _encode(b"a\tb\nc\rd\x00e\\f") == b"a\\tb\\nc\\rd\\0e\\\\f"
+    assert b"\t" not in _encode(b"\t\t") and b"\n" not in _encode(b"\n")
+
+
+@pytest.mark.parametrize("value", [
+    b"plain",
+    "کابل".encode("utf-8"),
+    b"\\N",  # the literal text, not NULL
+    b"\\",
+    b"ends with backslash\\",
+    b"\\t is not a tab",
+    b"tab\there, newline\nthere\r\n",
+    bytes(range(256)),
+])
+def test_round_trip(value):
+    assert _decode(_encode(value)) == value
+
+
+def test_row_round_trip_through_a_line():
+    row = (b"1", None, b"a\tb", b"", b"\\N", b"x\ny")
+    line = _line(row)
+    assert line.count(b"\n") == 1 and line.count(b"\t") == len(row) - 1
+    assert _row(line) == row
+
+
+def test_bytearray_values_from_raw_cursors():
+    assert _encode(bytearray(b"a\tb")) == b"a\\tb"
+
+
+def test_decode_accepts_mysql_escapes():
+    # SELECT ... INTO OUTFILE also writes \Z; unknown escapes stand for the character itself
+    assert _decode(b"\\Z") == b"\x1a"
+    assert _decode(b"\\x\\\\") == b"x\\"
@@ -0,0 +1,30 @@
+from __future__ import annotations
+
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+os.environ.setdefault("PPC_HEADLESS", "1")
+pytest.importorskip("pandas")
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "tools"))
+
+import ppc  # noqa: E402
+from core import backup, services  # noqa: E402
+
+
+def test_choices_match_core():
+    assert ppc.FORMATS == tuple(services.FORMATS)
+    assert ppc.EXPORT_KINDS == tuple(sorted(services.EXPORTS))
+    assert ppc.REINDEX_TARGETS == tuple(services.REINDEX_TARGETS)
+    assert ppc.RESTORE_METHODS == tuple(backup.METHODS)
+    assert ppc.IMPORT_BATCH_SIZE == services.IMPORT_BATCH_SIZE
+    assert ppc.EXPORT_BATCH_SIZE == services.EXPORT_BATCH_SIZE
+
+
+def test_settings_are_resolved_by_the_handlers():
+    args = ppc.build_parser().parse_args(["backup"])
+    assert args.workers is None
+    args = ppc.build_parser().parse_args(["serve-api", "--port", "9000"])
+    assert (args.host, args.port) == (None, 9000)
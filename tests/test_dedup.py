@@ -0,0 +1,67 @@
+from __future__ import annotations
+
+import os
+
+import pytest
+
+os.environ.setdefault("PPC_HEADLESS", "1")
+pd = pytest.importorskip("pandas")
+
+from core import dedup  # noqa: E402
+from core.dedup import KEY_NAME_FATHER, KEY_PHONE, KEY_TAZKIRA, blocking_keys  # noqa: E402
+
+
+def _name_key(keys):
+    return [v for t, v in keys if t == KEY_NAME_FATHER]
+
+
+def test_blocking_keys_fold_identifiers():
+    keys = blocking_keys("۱۲۳۴-۵۶۷۸-۹۱۰۱۱", ["+93731212123", "0731212123", None], "Ali", "Karim")
+    assert (KEY_TAZKIRA, "1234567891011") in keys
+    assert [v for t, v in keys if t == KEY_PHONE] == ["731212123"]
+
+
+def test_short_identifiers_are_not_keys():
+    assert blocking_keys("12-3", ["12345"], "", "Karim") == set()
+
+
+def test_name_block_keeps_every_letter():
+    mohammad = blocking_keys(None, [], "Mohammad", "Karim")
+    mahmood = blocking_keys(None, [], "Mahmood", "Karim")
+    assert _name_key(mohammad) != _name_key(mahmood)
+
+
+def test_name_block_ignores_spacing_and_arabic_letters():
+    assert _name_key(blocking_keys(None, [], "محمد علي", "كريم")) == _name_key(blocking_keys(None, [], "محمدعلی", "کریم"))
+
+
+def _clusters(monkeypatch, rows):
+    frame = pd.DataFrame(rows, columns=["Key_Type", "Key_Value", "Surveyor_ID"])
+    monkeypatch.setattr(dedup, "query_df", lambda *args, **kwargs: frame)
+    return dedup.find_duplicate_clusters()
+
+
+def test_name_blocks_are_not_chained(monkeypatch):
+    # 2 shares a name with 1 and a different name with 3: two clusters, not one
+    clusters = _clusters(monkeypatch, [
+        (KEY_NAME_FATHER, "ali|karim", 1),
+        (KEY_NAME_FATHER, "ali|karim", 2),
+        (KEY_NAME_FATHER, "ahmad|rahim", 2),
+        (KEY_NAME_FATHER, "ahmad|rahim", 3),
+    ])
+    assert clusters == [
+        {"Surveyor_IDs": [1, 2], "Reasons": [KEY_NAME_FATHER]},
+        {"Surveyor_IDs": [2, 3], "Reasons": [KEY_NAME_FATHER]},
+    ]
+
+
+def test_identifier_keys_are_merged(monkeypatch):
+    clusters = _clusters(monkeypatch, [
+        (KEY_TAZKIRA, "1234567", 1),
+        (KEY_TAZKIRA, "1234567", 2),
+        (KEY_PHONE, "731212123", 2),
+        (KEY_PHONE, "731212123", 3),
+        (KEY_NAME_FATHER, "ali|karim", 1),
+        (KEY_NAME_FATHER, "ali|karim", 3),
+    ])
+    assert clusters == [{"Surveyor_IDs": [1, 2, 3], "Reasons": [KEY_NAME_FATHER, KEY_PHONE, KEY_TAZKIRA]}]
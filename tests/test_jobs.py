@@ -0,0 +1,133 @@
+from __future__ import annotations
+
+import os
+
+import pytest
+
+os.environ.setdefault("PPC_HEADLESS", "1")
+pytest.importorskip("pandas")
+
+from core import db, jobs  # noqa: E402
+
+READ_ONLY_ERRNO = 1792
+
+
+class FakeError(Exception):
+    def __init__(self, errno: int, msg: str):
+        super().__init__(msg)
+        self.errno = errno
+
+
+class FakeDatabase:
+    """Just enough of MySQL for an export job: surveyors, one jobs row, read-only transactions."""
+
+    def __init__(self, surveyors: int):
+        self.surveyors = [{"Surveyor_ID": i, "Surveyor_Code": f"S{i:05d}"} for i in range(1, surveyors + 1)]
+        self.cancel_requested = 0
+        self.progress = []
+        self.connections = []
+
+    def connect(self):
+        conn = FakeConnection(self)
+        self.connections.append(conn)
+        return conn
+
+
+class FakeConnection:
+    def __init__(self, database: FakeDatabase):
+        self.database = database
+        self.in_transaction = False
+        self.read_only = False
+
+    def start_transaction(self, consistent_snapshot=False, readonly=None, **kwargs):
+        self.in_transaction = True
+        self.read_only = bool(readonly)
+
+    def commit(self):
+        self.in_transaction = False
+        self.read_only = False
+
+    rollback = commit
+
+    def cursor(self, dictionary=False, **kwargs):
+        return FakeCursor(self, dictionary)
+
+    def is_connected(self):
+        return True
+
+    def close(self):
+        pass
+
+
+class FakeCursor:
+    def __init__(self, conn: FakeConnection, dictionary: bool):
+        self.conn = conn
+        self.dictionary = dictionary
+        self.rows = []
+        self.rowcount = 0
+
+    def execute(self, sql, params=()):
+        database = self.conn.database
+        if sql.lstrip().upper().startswith("UPDATE"):
+            if self.conn.read_only:
+                raise FakeError(READ_ONLY_ERRNO, "Cannot execute statement in a READ ONLY transaction.")
+            database.progress.append(params[0])
+            self.rowcount = 1
+            return
+        if "Cancel_Requested" in sql:
+            rows = [{"Cancel_Requested": database.cancel_requested}]
+        elif "COUNT(*)" in sql:
+            rows = [{"n": len(database.surveyors)}]
+        elif "FROM surveyors" in sql:
+            last, limit = params
+            rows = [r for r in database.surveyors if r["Surveyor_ID"] > last][:limit]
+        else:
+            raise AssertionError(f"unexpected statement: {sql}")
+        self.rows = rows if self.dictionary else [tuple(r.values()) for r in rows]
+
+    def fetchall(self):
+        return list(self.rows)
+
+    def fetchone(self):
+        return self.rows[0] if self.rows else None
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def database(monkeypatch, tmp_path):
+    database = FakeDatabase(surveyors=1200)
+    monkeypatch.setattr(db, "_checkout", database.connect)
+    monkeypatch.setattr(jobs, "JOBS_DIR", tmp_path)
+    # every progress call is past the interval
+    monkeypatch.setattr(jobs, "_PROGRESS_INTERVAL_S", 0.0)
+    return database
+
+
+def _export_job(params: dict) -> jobs.JobContext:
+    ctx = jobs.JobContext(1, params, attempt=1)
+    ctx.out_dir.mkdir(parents=True, exist_ok=True)
+    return ctx
+
+
+def test_export_reports_progress_outside_its_read_only_snapshot(database):
+    ctx = _export_job({"kind": "surveyors", "format": "csv"})
+
+    summary = jobs.export_job(ctx, ctx.params)
+
+    assert summary == {"rows": 1200}
+    # _counted reports every 500 rows: twice for 1200 rows
+    assert database.progress == [500 / 1200, 1000 / 1200]
+    lines = (ctx.out_dir / "surveyors.csv").read_text(encoding="utf-8").splitlines()
+    assert len(lines) == 1201
+
+
+def test_export_stops_when_cancel_requested(database):
+    database.cancel_requested = 1
+    ctx = _export_job({"kind": "surveyors", "format": "jsonl"})
+
+    with pytest.raises(jobs.JobCancelled):
+        jobs.export_job(ctx, ctx.params)
+
+    assert database.progress == [500 / 1200]
@@ -0,0 +1,56 @@
+from __future__ import annotations
+
+import pytest
+
+from core.normalize import like_contains, like_prefix, name_key, name_search_terms, name_tokens
+
+
+def _finds(query: str, stored_name: str) -> bool:
+    """What the search SQL does: a token prefix range, then the whole key as a substring."""
+    token_like, key_like = name_search_terms(query)
+    prefix = token_like[:-1]
+    key = key_like[1:-1]
+    return any(t.startswith(prefix) for t in name_tokens(stored_name)) and key in name_key(stored_name)
+
+
+def test_name_key_folds_scripts_and_spelling():
+    assert name_key("محمد علی") == name_key("محمدعلی")
+    assert name_key("علي") == name_key("علی")
+    assert name_key("Mohammad") == name_key("Muhammad") == name_key("Mohamed")
+    assert name_key("۱۲۳") == "123"
+
+
+@pytest.mark.parametrize("value", [None, "", ".", "-", "_", "   ", "-_. "])
+def test_punctuation_has_no_key_and_no_search_terms(value):
+    assert name_key(value) == ""
+    assert name_tokens(value) == []
+    assert name_search_terms(value) is None
+
+
+def test_like_patterns_escape_wildcards():
+    assert like_contains("a%b_c") == "%a\\%b\\_c%"
+    assert like_prefix("a\\b") == "a\\\\b%"
+
+
+def test_name_tokens_hold_each_word_and_the_whole_name():
+    assert name_tokens("Mohammad Ali Ahmadi") == ["mhmd", "al", "ahmd", "mhmdalahmd"]
+    assert name_tokens("Ali Ali") == ["al", "alal"]
+
+
+def test_search_terms_use_the_longest_word_as_prefix():
+    assert name_search_terms("Ali Ahmadi") == ("ahmd%", "%alahmd%")
+
+
+@pytest.mark.parametrize(
+    "query, stored, found",
+    [
+        ("Ahmadi", "Mohammad Ali Ahmadi", True),
+        ("Ali Ahmadi", "Mohammad Ali Ahmadi", True),
+        ("محمدعلی", "محمد علی احمدی", True),
+        ("Muhammad", "Mohammad Ali", True),
+        ("Ahmadi Ali", "Mohammad Ali Ahmadi", False),
+        ("Karimi", "Mohammad Ali Ahmadi", False),
+    ],
+)
+def test_search_terms_match_stored_tokens(query, stored, found):
+    assert _finds(query, stored) is found
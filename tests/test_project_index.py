@@ -0,0 +1,66 @@
+from __future__ import annotations
+
+import os
+from datetime import datetime
+
+import pytest
+
+os.environ.setdefault("PPC_HEADLESS", "1")
+pd = pytest.importorskip("pandas")
+
+from core import project_index  # noqa: E402
+from core.project_index import (  # noqa: E402
+    RANK_EXACT_CODE,
+    RANK_PREFIX,
+    RANK_SUBSTRING,
+    RANK_TOKEN,
+    ProjectIndex,
+)
+
+PROJECTS = pd.DataFrame(
+    [
+        (1, "PPC-UNICEF-2023-PH-01", "Nutrition Survey", "UNICEF", "PPC", datetime(2024, 1, 1)),
+        (2, "PPC-WFP-2024-PH-01", "Market Monitoring", "WFP", "Partner Kabul", datetime(2024, 1, 2)),
+        (3, "PPC-WFP-2024-PH-02", "Market Assessment", "WFP", None, datetime(2024, 1, 3)),
+        (4, "PPC-IOM-2024-PH-01", "Returnee Survey Kandahar", "IOM", "PPC", datetime(2024, 1, 4)),
+    ],
+    columns=["Project_ID", "Project_Code", "Project_Name", "Client_Name", "Implementing_Partner", "Updated_At"],
+)
+
+
+@pytest.fixture
+def index(monkeypatch):
+    def query_df(sql, params=None, site=None):
+        if "COUNT(*)" in sql:
+            return pd.DataFrame({"n": [len(PROJECTS)]})
+        return PROJECTS.copy()
+
+    monkeypatch.setattr(project_index, "query_df", query_df)
+    return ProjectIndex()
+
+
+def test_exact_code_ranks_first(index):
+    assert index.ranked("ppc-wfp-2024-ph-02")[0] == (3, RANK_EXACT_CODE)
+
+
+def test_field_prefix_beats_word_prefix(index):
+    # "market" starts the name of 2 and 3; "kandahar" and "kabul" are later words
+    assert index.ranked("market") == [(3, RANK_PREFIX), (2, RANK_PREFIX)]
+    assert index.ranked("ka") == [(4, RANK_TOKEN), (2, RANK_TOKEN)]
+    assert index.ranked("wfp") == [(3, RANK_PREFIX), (2, RANK_PREFIX)]
+
+
+def test_every_query_word_must_prefix_a_project_word(index):
+    assert index.ranked("wfp assess") == [(3, RANK_TOKEN)]
+    assert index.ranked("wfp kandahar") == []
+
+
+def test_substring_fills_up_newest_first(index):
+    # "abul" is inside "Kabul" only; "rvey" is inside two names
+    assert index.ranked("abul") == [(2, RANK_SUBSTRING)]
+    assert index.ranked("rvey") == [(4, RANK_SUBSTRING), (1, RANK_SUBSTRING)]
+    assert index.ranked("rvey", limit=1) == [(4, RANK_SUBSTRING)]
+
+
+def test_empty_query_lists_newest(index):
+    assert [pid for pid, _ in index.ranked("  ", limit=3)] == [4, 3, 2]
@@ -0,0 +1,18 @@
+from __future__ import annotations
+
+from core.resilience import with_timeout
+
+
+def test_every_select_statement_gets_the_hint():
+    sql = with_timeout("SELECT a FROM t WHERE id = %s;\n    SELECT b FROM u UNION ALL SELECT c FROM v", 500)
+    assert sql.count("MAX_EXECUTION_TIME(500)") == 2
+    assert sql.startswith("SELECT /*+ MAX_EXECUTION_TIME(500) */ a")
+    # only the first block of a UNION takes the hint
+    assert "UNION ALL SELECT c" in sql
+
+
+def test_writes_and_hinted_queries_are_left_alone():
+    assert with_timeout("UPDATE t SET a = 1", 500) == "UPDATE t SET a = 1"
+    hinted = "SELECT /*+ MAX_EXECUTION_TIME(10) */ 1"
+    assert with_timeout(hinted, 500) == hinted
+    assert with_timeout("SELECT 1", 0) == "SELECT 1"
@@ -0,0 +1,58 @@
+"""
+Per-call cost of hot lookups: text protocol (query_df) vs cached prepared
+statements (query_prepared) over the same pooled connection.
+
+    python tools/bench_prepared.py --code PPC-KAB-001 --n 2000
+"""
+from __future__ import annotations
+
+import argparse
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from core.db import query_df, query_prepared  # noqa: E402
+
+SQL = "SELECT Surveyor_ID, Surveyor_Code, Surveyor_Name FROM surveyors WHERE Surveyor_Code=%s"
+
+
+def _bench(fn, params, n: int) -> list:
+    timings = []
+    for _ in range(n):
+        t0 = time.perf_counter()
+        fn(SQL, params)
+        timings.append((time.perf_counter() - t0) * 1e6)
+    return timings
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    ap.add_argument("--code", default="PPC-KAB-001")
+    ap.add_argument("--n", type=int, default=1000)
+    args = ap.parse_args()
+
+    params = (args.code,)
+    # warm up pool and statement cache
+    query_df(SQL, params)
+    query_prepared(SQL, params)
+
+    results = {
+        "text (query_df)": _bench(query_df, params, args.n),
+        "prepared (query_prepared)": _bench(query_prepared, params, args.n),
+    }
+    for name, t in results.items():
+        t.sort()
+        print(
+            f"{name:28s} mean={statistics.mean(t):8.1f}us  "
+            f"p50={t[len(t) // 2]:8.1f}us  p95={t[int(len(t) * 0.95)]:8.1f}us"
+        )
+    text_mean = statistics.mean(results["text (query_df)"])
+    prep_mean = statistics.mean(results["prepared (query_prepared)"])
+    print(f"saving per call: {text_mean - prep_mean:.1f}us ({(1 - prep_mean / text_mean) * 100:.1f}%)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""
+Cold-start cost per page, each measured in a fresh interpreter:
+
+  import  - importing the page and everything it imports (main() is not run)
+  render  - first full script run through streamlit's AppTest (needs the DB)
+
+    python tools/bench_startup.py
+    python tools/bench_startup.py --import-only --top 15
+    python tools/bench_startup.py --out bench_startup.jsonl   # append for tracking
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import re
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+PAGES = ["app.py"] + sorted(str(p.relative_to(ROOT)) for p in (ROOT / "pages").glob("[0-9]*.py"))
+
+_IMPORT_SNIPPET = """
+import runpy, sys, time
+sys.path.insert(0, {root!r})
+t0 = time.perf_counter()
+runpy.run_path({path!r}, run_name="bench_startup")
+print("ELAPSED", time.perf_counter() - t0)
+"""
+
+_RENDER_SNIPPET = """
+import sys, time
+sys.path.insert(0, {root!r})
+t0 = time.perf_counter()
+from streamlit.testing.v1 import AppTest
+at = AppTest.from_file({path!r}, default_timeout={timeout})
+at.run()
+print("ELAPSED", time.perf_counter() - t0)
+print("EXCEPTIONS", len(at.exception))
+"""
+
+_IMPORTTIME_RE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|\s+(.*)$")
+
+
+def _run(snippet: str, importtime: bool = False) -> subprocess.CompletedProcess:
+    cmd = [sys.executable]
+    if importtime:
+        cmd += ["-X", "importtime"]
+    cmd += ["-c", snippet]
+    return subprocess.run(cmd, cwd=ROOT, capture_output=True, text=True)
+
+
+def _elapsed(out: str):
+    for line in out.splitlines():
+        if line.startswith("ELAPSED "):
+            return float(line.split()[1])
+    return None
+
+
+def _top_imports(stderr: str, top: int) -> list:
+    """Largest cumulative import times (ms) of top-level packages."""
+    rows = []
+    for line in stderr.splitlines():
+        m = _IMPORTTIME_RE.match(line)
+        if m and not m.group(3).startswith(" "):
+            rows.append((int(m.group(2)) / 1000.0, m.group(3).strip()))
+    rows.sort(reverse=True)
+    return rows[:top]
+
+
+def bench_page(page: str, render: bool, top: int, timeout: int) -> dict:
+    path = str(ROOT / page)
+    res = _run(_IMPORT_SNIPPET.format(root=str(ROOT), path=path), importtime=True)
+    result = {
+        "page": page,
+        "import_s": _elapsed(res.stdout),
+        "top_imports_ms": _top_imports(res.stderr, top),
+    }
+    if res.returncode != 0:
+        result["import_error"] = res.stderr.strip().splitlines()[-1] if res.stderr.strip() else "failed"
+
+    if render:
+        res = _run(_RENDER_SNIPPET.format(root=str(ROOT), path=path, timeout=timeout))
+        result["render_s"] = _elapsed(res.stdout)
+        if res.returncode != 0:
+            result["render_error"] = res.stderr.strip().splitlines()[-1] if res.stderr.strip() else "failed"
+    return result
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    ap.add_argument("pages", nargs="*", help="pages to measure (default: all)")
+    ap.add_argument("--import-only", action="store_true", help="skip the AppTest render run")
+    ap.add_argument("--top", type=int, default=5, help="heaviest imports to list per page")
+    ap.add_argument("--timeout", type=int, default=60)
+    ap.add_argument("--out", help="append one JSON line with all results to this file")
+    args = ap.parse_args()
+
+    results = [bench_page(p, not args.import_only, args.top, args.timeout) for p in (args.pages or PAGES)]
+
+    def fmt(v):
+        return f"{v * 1000:8.0f} ms" if isinstance(v, float) else f"{'-':>11}"
+
+    print(f"{'page':<32} {'import':>11} {'render':>11}")
+    for r in results:
+        print(f"{r['page']:<32} {fmt(r.get('import_s'))} {fmt(r.get('render_s'))}")
+        for ms, name in r["top_imports_ms"]:
+            print(f"    {ms:8.1f} ms  {name}")
+        for key in ("import_error", "render_error"):
+            if key in r:
+                print(f"    {key}: {r[key]}")
+
+    if args.out:
+        with open(args.out, "a", encoding="utf-8") as f:
+            f.write(json.dumps({"at": time.strftime("%Y-%m-%dT%H:%M:%S"), "results": results}) + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,310 @@
+"""
+Headless batch operations on the surveyor database (no streamlit needed).
+
+    python tools/ppc.py import surveyors --input new.csv --dry-run
+    python tools/ppc.py import assignments --format jsonl < hires.jsonl > results.jsonl
+    python tools/ppc.py export surveyors --format csv --output surveyors.csv
+    python tools/ppc.py payment-run --project PRJ-001 --amount 5000 --out-dir out/
+    python tools/ppc.py reindex dedup
+    python tools/ppc.py backfill analytics --start 2024-01-01
+    python tools/ppc.py migrate
+    python tools/ppc.py serve-api --port 8765
+    python tools/ppc.py worker --workers 4
+    python tools/ppc.py backup --out-dir backups/nightly --workers 8
+    python tools/ppc.py verify backups/nightly
+    python tools/ppc.py restore backups/nightly --truncate
+
+Imports print one JSON result per input row on stdout and a summary on
+stderr; the exit code is 2 when any row was not accepted. Database settings
+come from .streamlit/secrets.toml or the DB_* environment variables.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import sys
+from collections import Counter
+from contextlib import contextmanager
+from datetime import date
+from pathlib import Path
+
+os.environ.setdefault("PPC_HEADLESS", "1")
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+EXIT_REJECTED = 2
+
+# Choices and defaults are spelled out here, so that parsing the command line
+# (and --help) does not import core.services, core.backup or pandas. They must
+# match services.FORMATS, services.EXPORTS, services.REINDEX_TARGETS,
+# backup.METHODS and the batch sizes in core.services (tests/test_cli.py).
+FORMATS = ("csv", "jsonl")
+EXPORT_KINDS = ("accounts", "assignments", "projects", "surveyors")
+REINDEX_TARGETS = ("dedup", "names", "indexes")
+RESTORE_METHODS = ("auto", "load_data", "insert")
+IMPORT_BATCH_SIZE = 200
+EXPORT_BATCH_SIZE = 5000
+
+
+@contextmanager
+def _open(path, mode: str, default):
+    if not path or path == "-":
+        yield default
+        return
+    with open(path, mode, encoding="utf-8", newline="") as f:
+        yield f
+
+
+def _print(obj) -> None:
+    print(json.dumps(obj, default=str, ensure_ascii=False))
+
+
+def cmd_import(args) -> int:
+    from core import services
+
+    with _open(args.input, "r", sys.stdin) as src:
+        rows = services.read_records(src, args.format)
+        if args.kind == "surveyors":
+            results = services.import_surveyors(
+                rows, allow_duplicates=args.allow_duplicates, dry_run=args.dry_run, batch_size=args.batch_size
+            )
+        else:
+            results = services.import_assignments(
+                rows, allow_overlap=args.allow_overlap, dry_run=args.dry_run, batch_size=args.batch_size
+            )
+        counts = Counter()
+        for r in results:
+            counts[r["status"]] += 1
+            sys.stdout.write(json.dumps(r, default=str, ensure_ascii=False) + "\n")
+
+    print(", ".join(f"{k}: {v}" for k, v in sorted(counts.items())) or "no rows", file=sys.stderr)
+    accepted = counts["valid" if args.dry_run else "created"]
+    return EXIT_REJECTED if accepted != sum(counts.values()) else 0
+
+
+def cmd_export(args) -> int:
+    from core import services
+    from core.db import unit_of_work
+
+    # one consistent snapshot across all pages of the export
+    with unit_of_work(snapshot=True, read_only=True), _open(args.output, "w", sys.stdout) as out:
+        n = services.write_records(services.export_rows(args.kind, args.batch_size), out, args.format)
+    print(f"{n} rows", file=sys.stderr)
+    return 0
+
+
+def cmd_payment_run(args) -> int:
+    from core import services
+
+    result = services.payment_run(Path(args.out_dir), args.project, args.amount)
+    _print({group: {"path": str(r["path"]), "rows": r["rows"]} for group, r in result.items()})
+    return 0
+
+
+def cmd_reindex(args) -> int:
+    from core import services
+
+    _print(services.reindex(args.target))
+    return 0
+
+
+def cmd_backfill(args) -> int:
+    from core import services
+
+    if args.target == "name-keys":
+        _print(services.backfill_name_keys_missing())
+        return 0
+
+    start = date.fromisoformat(args.start) if args.start else None
+    end = date.fromisoformat(args.end) if args.end else None
+
+    def progress(chunk_start, chunk_end):
+        print(f"{chunk_start} .. {chunk_end}", file=sys.stderr)
+
+    _print(services.backfill_analytics(start, end, progress=progress))
+    return 0
+
+
+def cmd_migrate(args) -> int:
+    from core.schema import ensure_schema
+
+    _print(ensure_schema(apply_indexes=not args.skip_indexes))
+    return 0
+
+
+def cmd_serve_api(args) -> int:
+    from core.api import serve
+    from core.settings import API_HOST, API_PORT
+
+    serve(args.host or API_HOST, args.port or API_PORT)
+    return 0
+
+
+def cmd_worker(args) -> int:
+    import time
+
+    from core import jobs
+    from core.settings import JOB_WORKERS
+
+    pool = jobs.WorkerPool(args.workers or JOB_WORKERS)
+    pool.start()
+    print(f"worker {pool.name}: {pool.workers} slots; Ctrl+C stops after the running jobs", file=sys.stderr)
+    try:
+        while pool.alive():
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pool.stop(wait=True)
+    return 0
+
+
+def _chunk_progress(done: int, total: int) -> None:
+    if done == total or done % 20 == 0:
+        print(f"{done}/{total} chunks", file=sys.stderr)
+
+
+def cmd_backup(args) -> int:
+    from core import backup
+    from core.settings import BACKUP_WORKERS
+
+    result = backup.backup(
+        Path(args.out_dir) if args.out_dir else None,
+        tables=args.table,
+        workers=args.workers or BACKUP_WORKERS,
+        chunk_mb=args.chunk_mb,
+        level=args.gzip_level,
+        progress=_chunk_progress,
+    )
+    if not result["consistent"]:
+        print("warning: no global read lock (RELOAD privilege); tables were not snapshotted together", file=sys.stderr)
+    _print(
+        {
+            "path": result["path"],
+            "consistent": result["consistent"],
+            "elapsed_s": result["elapsed_s"],
+            "tables": {name: {"rows": t["rows"], "chunks": len(t["chunks"])} for name, t in result["tables"].items()},
+        }
+    )
+    return 0
+
+
+def cmd_verify(args) -> int:
+    from core import backup
+    from core.settings import BACKUP_WORKERS
+
+    try:
+        _print(backup.verify(Path(args.src_dir), workers=args.workers or BACKUP_WORKERS))
+    except backup.BackupError as ex:
+        print(f"error: {ex}", file=sys.stderr)
+        return 1
+    return 0
+
+
+def cmd_restore(args) -> int:
+    from core import backup
+    from core.settings import BACKUP_WORKERS
+
+    try:
+        result = backup.restore(
+            Path(args.src_dir),
+            tables=args.table,
+            workers=args.workers or BACKUP_WORKERS,
+            method=args.method,
+            create_tables=not args.no_create,
+            truncate=args.truncate,
+            progress=_chunk_progress,
+        )
+    except backup.BackupError as ex:
+        print(f"error: {ex}", file=sys.stderr)
+        return 1
+    if result["fallback_reason"]:
+        print(f"LOAD DATA LOCAL INFILE refused, used INSERT: {result['fallback_reason']}", file=sys.stderr)
+    _print(result)
+    return 0
+
+
+def build_parser() -> argparse.ArgumentParser:
+    ap = argparse.ArgumentParser(prog="ppc", description=__doc__.splitlines()[1])
+    sub = ap.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("import", help="register surveyors or hire surveyors from CSV/JSONL")
+    p.add_argument("kind", choices=["surveyors", "assignments"])
+    p.add_argument("--input", help="file to read (default: stdin)")
+    p.add_argument("--format", choices=FORMATS, default="csv")
+    p.add_argument("--allow-duplicates", action="store_true", help="surveyors: save possible duplicates")
+    p.add_argument("--allow-overlap", action="store_true", help="assignments: skip the overlap check")
+    p.add_argument("--dry-run", action="store_true", help="validate only, write nothing")
+    p.add_argument("--batch-size", type=int, default=IMPORT_BATCH_SIZE)
+    p.set_defaults(fn=cmd_import)
+
+    p = sub.add_parser("export", help="write a table as CSV/JSONL")
+    p.add_argument("kind", choices=EXPORT_KINDS)
+    p.add_argument("--output", help="file to write (default: stdout)")
+    p.add_argument("--format", choices=FORMATS, default="csv")
+    p.add_argument("--batch-size", type=int, default=EXPORT_BATCH_SIZE)
+    p.set_defaults(fn=cmd_export)
+
+    p = sub.add_parser("payment-run", help="write payment batch files")
+    p.add_argument("--project", help="project code (default: all projects)")
+    p.add_argument("--amount", help="amount column value")
+    p.add_argument("--out-dir", required=True)
+    p.set_defaults(fn=cmd_payment_run)
+
+    p = sub.add_parser("reindex", help="rebuild dedup keys, name keys or missing indexes")
+    p.add_argument("target", choices=REINDEX_TARGETS)
+    p.set_defaults(fn=cmd_reindex)
+
+    p = sub.add_parser("backfill", help="fill analytics rollups or missing name keys")
+    p.add_argument("target", choices=["analytics", "name-keys"])
+    p.add_argument("--start", help="analytics: first day YYYY-MM-DD (default: continue from the last rolled day)")
+    p.add_argument("--end", help="analytics: last day YYYY-MM-DD (default: today)")
+    p.set_defaults(fn=cmd_backfill)
+
+    p = sub.add_parser("migrate", help="create missing tables, run migrations and add indexes")
+    p.add_argument("--skip-indexes", action="store_true")
+    p.set_defaults(fn=cmd_migrate)
+
+    p = sub.add_parser("serve-api", help="run the read-only JSON API for partners (core.api)")
+    p.add_argument("--host", help="default: API_HOST")
+    p.add_argument("--port", type=int, help="default: API_PORT")
+    p.set_defaults(fn=cmd_serve_api)
+
+    p = sub.add_parser("worker", help="run background jobs (core.jobs) until interrupted")
+    p.add_argument("--workers", type=int, help="default: JOB_WORKERS")
+    p.set_defaults(fn=cmd_worker)
+
+    p = sub.add_parser("backup", help="dump the database as parallel gzip chunks with a manifest (core.backup)")
+    p.add_argument("--out-dir", help="new directory (default: a timestamped one under BACKUP_DIR)")
+    p.add_argument("--table", action="append", help="only this table (repeatable)")
+    p.add_argument("--workers", type=int, help="default: BACKUP_WORKERS")
+    p.add_argument("--chunk-mb", type=float, help="uncompressed size of one chunk")
+    p.add_argument("--gzip-level", type=int, choices=range(1, 10))
+    p.set_defaults(fn=cmd_backup)
+
+    p = sub.add_parser("verify", help="check a backup's chunk checksums")
+    p.add_argument("src_dir")
+    p.add_argument("--workers", type=int, help="default: BACKUP_WORKERS")
+    p.set_defaults(fn=cmd_verify)
+
+    p = sub.add_parser("restore", help="bulk-load a backup into the configured (empty) database")
+    p.add_argument("src_dir")
+    p.add_argument("--table", action="append", help="only this table (repeatable)")
+    p.add_argument("--workers", type=int, help="default: BACKUP_WORKERS")
+    p.add_argument("--method", choices=RESTORE_METHODS, help="default: BACKUP_RESTORE_METHOD")
+    p.add_argument("--truncate", action="store_true", help="empty non-empty target tables first")
+    p.add_argument("--no-create", action="store_true", help="fail instead of creating missing tables")
+    p.set_defaults(fn=cmd_restore)
+
+    return ap
+
+
+def main(argv=None) -> int:
+    args = build_parser().parse_args(argv)
+    try:
+        return args.fn(args)
+    except ValueError as ex:
+        print(f"error: {ex}", file=sys.stderr)
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
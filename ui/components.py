@@ -1,5 +1,6 @@
 from __future__ import annotations
 import streamlit as st
+from streamlit.errors import StreamlitAPIException
 
 def card_start(title: str, subtitle: str | None = None):
     st.markdown("<div class='ppc-card'>", unsafe_allow_html=True)
@@ -20,3 +21,13 @@ def toast_ok(msg: str):
 
 def toast_err(msg: str):
     st.error(msg)
+
+def file_download_button(label: str, path, key: str, mime: str | None = None):
+    """download_button for a file on disk that does not read the file on every rerun."""
+    try:
+        # newer Streamlit calls data() only when the download is clicked
+        st.download_button(label, data=path.read_bytes, file_name=path.name, mime=mime, key=key)
+    except StreamlitAPIException:
+        # older Streamlit wants the bytes up front: read them only once asked for
+        if st.button(label, key=f"{key}_prepare"):
+            st.download_button(f"Save {path.name}", data=path.read_bytes(), file_name=path.name, mime=mime, key=key)
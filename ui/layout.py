@@ -18,10 +18,13 @@ def sidebar_menu():
         st.sidebar.page_link("pages/05_projects.py", label="Projects", icon="📁")
         st.sidebar.page_link("pages/07_hiring.py", label="Hiring", icon="🧩")
         st.sidebar.page_link("pages/06_surveyor_payments.py", label="Payments", icon="💳")
+        st.sidebar.page_link("pages/10_surveyor_profile.py", label="Surveyor Profile", icon="🪪")
 
     if role in ("admin", "super_admin"):
         st.sidebar.page_link("pages/04_banks.py", label="Banks", icon="🏦")
         st.sidebar.page_link("pages/03_admin.py", label="Admin", icon="🔐")
+        st.sidebar.page_link("pages/09_diagnostics.py", label="Diagnostics", icon="🩺")
+        st.sidebar.page_link("pages/11_jobs.py", label="Jobs", icon="⏳")
 
 
 def navbar(brand: str, right_text: str = "") -> None:
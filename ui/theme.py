@@ -1,22 +1,68 @@
 from __future__ import annotations
+from functools import lru_cache
 from pathlib import Path
 import streamlit as st
 
 CSS_DIR = Path(__file__).parent / "assets" / "css"
 
-def _inject_css(path: Path) -> None:
-    st.markdown(f"<style>{path.read_text(encoding='utf-8')}</style>", unsafe_allow_html=True)
+@lru_cache(maxsize=None)
+def _read_css(name: str) -> str:
+    # once per process; a missing file is cached as empty
+    try:
+        return (CSS_DIR / name).read_text(encoding="utf-8")
+    except OSError:
+        return ""
 
-def init_page(title: str = "PPC Surveyor Database", layout: str = "wide") -> None:
+@lru_cache(maxsize=None)
+def _theme_payload(theme: str) -> str:
+    variant = "dark.css" if theme == "dark" else "light.css"
+    return f"<style>{_read_css('base.css')}\n{_read_css(variant)}</style>"
+
+def init_page(title: str = "PPC Surveyor Database", layout: str = "wide", needs: tuple = ()) -> None:
+    """needs: core.schema features the whole page depends on (see require_schema)."""
     st.set_page_config(page_title=title, layout=layout)
+    _ensure_schema()
+    _warm_up()
+    if needs:
+        require_schema(*needs)
+
+def _warm_up() -> None:
+    from core.startup import warm_up_once
+
+    warm_up_once()
+
+def _ensure_schema() -> None:
+    from core.settings import SCHEMA_AUTO_MIGRATE, SCHEMA_AUTO_INDEX
+    from core.schema import ensure_schema_once
+
+    ensure_schema_once(apply_indexes=SCHEMA_AUTO_INDEX, migrate_now=SCHEMA_AUTO_MIGRATE)
+
+def require_schema(*features: str, stop: bool = True) -> bool:
+    """
+    True when the tables/columns of the features exist. Otherwise says which
+    are missing and stops the page (stop=False: returns False, so a page can
+    skip one card). Only features with pending migrations are lost.
+    """
+    from core.schema import missing_schema
+
+    try:
+        missing = missing_schema(*features)
+    except Exception:
+        # database not reachable: the page's own queries report that
+        return True
+    if not missing:
+        return True
+    st.error(
+        "This needs a database migration (missing: " + ", ".join(missing) + "). "
+        "An admin can apply it on the Admin page or with `python tools/ppc.py migrate`."
+    )
+    if stop:
+        st.stop()
+    return False
 
 def apply_theme(theme: str) -> None:
     theme = (theme or "light").lower().strip()
-    _inject_css(CSS_DIR / "base.css")
-    if theme == "dark":
-        _inject_css(CSS_DIR / "dark.css")
-    else:
-        _inject_css(CSS_DIR / "light.css")
+    st.markdown(_theme_payload(theme), unsafe_allow_html=True)
 
 def theme_switcher(default: str = "light") -> str:
     if "ppc_theme" not in st.session_state: